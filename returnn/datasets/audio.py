@@ -2,14 +2,21 @@
 Datasets dealing with audio
 """
 
+from __future__ import print_function
+
+import copy
+import os
 import numpy
 import typing
+from threading import Lock
 
 from .basic import DatasetSeq
 from .cached2 import CachedDataset2
 from .util.feature_extraction import ExtractAudioFeatures
+from .util.feature_cache import FeatureCache
 from .util.vocabulary import Vocabulary
 from returnn.util.basic import PY3
+from returnn.log import log
 
 
 class OggZipDataset(CachedDataset2):
@@ -37,12 +44,16 @@ class OggZipDataset(CachedDataset2):
   however, it does not have to match the real duration in any way.
   """
 
+  # With multiple prefetch workers, the random state is derived per seq. See _collect_single_seq.
+  _collect_single_seq_is_parallel_safe = True
+
   def __init__(self, path, audio, targets,
                targets_post_process=None,
                use_cache_manager=False, segment_file=None,
                zip_audio_files_have_name_as_prefix=True,
                fixed_random_seed=None, fixed_random_subset=None,
                epoch_wise_filter=None,
+               feature_cache_dir=None, feature_cache_max_size=None,
                **kwargs):
     """
     :param str|list[str] path: filename to zip
@@ -58,6 +69,10 @@ class OggZipDataset(CachedDataset2):
       If given, will use this random subset. This will be applied initially at loading time,
       i.e. not dependent on the epoch. It will use an internally hardcoded fixed random seed, i.e. it's deterministic.
     :param dict|None epoch_wise_filter: see init_seq_order
+    :param str|None feature_cache_dir: if given, the audio features (before post_process) are stored there
+      (see :class:`FeatureCache`), and reused in later epochs and by other runs with the same audio options.
+      Only possible if the features are deterministic (no random_permute, no pre_process).
+    :param int|None feature_cache_max_size: in bytes. the least recently used parts of the cache are deleted
     """
     import os
     import zipfile
@@ -111,9 +126,19 @@ class OggZipDataset(CachedDataset2):
         self.targets_post_process = get_post_processor_function(targets_post_process)
     self._fixed_random_seed = fixed_random_seed
     self._audio_random = numpy.random.RandomState(1)
+    self._random_seed = 1
+    self._targets_lock = Lock()
     self.feature_extractor = (
       ExtractAudioFeatures(random_state=self._audio_random, **audio) if audio is not None else None)
     self.num_inputs = self.feature_extractor.get_feature_dimension() if self.feature_extractor else 0
+    self._feature_cache = None  # type: typing.Optional[FeatureCache]
+    if feature_cache_dir and self.feature_extractor:
+      if self.feature_extractor.can_cache_features():
+        self._feature_cache = FeatureCache(
+          os.path.join(feature_cache_dir, self.feature_extractor.get_cache_hash()), max_size=feature_cache_max_size)
+        print("%s: using %s" % (self, self._feature_cache), file=log.v4)
+      else:
+        print("%s: features are not deterministic, not using feature_cache_dir" % self, file=log.v3)
     self.num_outputs = {
       "raw": {"dtype": "string", "shape": ()},
       "orth": [256, 1]}
@@ -237,6 +262,7 @@ class OggZipDataset(CachedDataset2):
     if not epoch:
       epoch = 1
     random_seed = self._fixed_random_seed or self._get_random_seed_for_epoch(epoch=epoch)
+    self._random_seed = random_seed
     self._audio_random.seed(random_seed)
     if self.targets:
       self.targets.set_random_seed(random_seed)
@@ -264,7 +290,7 @@ class OggZipDataset(CachedDataset2):
     else:
       num_seqs = len(self._data)
       self._seq_order = self.get_seq_order_for_epoch(
-        epoch=epoch, num_seqs=num_seqs, get_seq_len=get_seq_len)
+        epoch=epoch, num_seqs=num_seqs, get_seq_len=get_seq_len, seq_lens_cache_key="duration")
       if self.epoch_wise_filter:
         self.epoch_wise_filter.debug_msg_prefix = str(self)
         self._seq_order = self.epoch_wise_filter.filter(epoch=epoch, seq_order=self._seq_order, get_seq_len=get_seq_len)
@@ -349,23 +375,66 @@ class OggZipDataset(CachedDataset2):
     if self.targets:
       if self.targets_post_process:
         targets_txt = self.targets_post_process(targets_txt)
-      targets_seq = self.targets.get_seq(targets_txt)
+      if self._is_parallel_prefetch():
+        with self._targets_lock:
+          self.targets.set_random_seed(self._get_seq_random_seed(seq_idx))
+          targets_seq = self.targets.get_seq(targets_txt)
+      else:
+        targets_seq = self.targets.get_seq(targets_txt)
     else:
       targets_seq = []
     return targets_seq, raw_targets_txt
 
-  def _open_audio_file(self, seq_idx):
+  def _is_parallel_prefetch(self):
+    """
+    :return: whether _collect_single_seq is called concurrently by multiple prefetch workers
+    :rtype: bool
+    """
+    return bool(self._prefetch) and self._prefetch_num_workers > 1
+
+  def _get_seq_random_seed(self, seq_idx):
     """
     :param int seq_idx:
-    :return: io.FileIO
+    :return: random seed, deterministic for the epoch and the seq
+    :rtype: int
+    """
+    return (self._random_seed * 1000003 + self._get_ref_seq_idx(seq_idx)) % (2 ** 32)
+
+  def _get_audio_file_name(self, seq_idx):
+    """
+    :param int seq_idx:
+    :return: (audio_fn, zip_index)
+    :rtype: (str, int)
     """
-    import io
     seq = self._data[self._get_ref_seq_idx(seq_idx)]
     if self.zip_audio_files_have_name_as_prefix:
       audio_fn = "%s/%s" % (self._names[seq['_zip_file_index']], seq["file"])
     else:
       audio_fn = seq["file"]
-    raw_bytes = self._read(audio_fn, seq['_zip_file_index'])
+    return audio_fn, seq['_zip_file_index']
+
+  def _get_feature_cache_key(self, seq_idx):
+    """
+    :param int seq_idx:
+    :return: key for self._feature_cache, which changes when the zip file changes
+    :rtype: str
+    """
+    audio_fn, zip_index = self._get_audio_file_name(seq_idx)
+    path = os.path.abspath(self.paths[zip_index])
+    if self._zip_files is None:  # directly from the filesystem
+      path = os.path.join(path, audio_fn)
+      audio_fn = ""
+    stat = os.stat(path)
+    return "%s:%i:%i:%s" % (path, stat.st_size, stat.st_mtime, audio_fn)
+
+  def _open_audio_file(self, seq_idx):
+    """
+    :param int seq_idx:
+    :return: io.FileIO
+    """
+    import io
+    audio_fn, zip_index = self._get_audio_file_name(seq_idx)
+    raw_bytes = self._read(audio_fn, zip_index)
     return io.BytesIO(raw_bytes)
 
   def _collect_single_seq(self, seq_idx):
@@ -375,8 +444,23 @@ class OggZipDataset(CachedDataset2):
     """
     seq_tag = self.get_tag(seq_idx)
     if self.feature_extractor:
-      with self._open_audio_file(seq_idx) as audio_file:
-        features = self.feature_extractor.get_audio_features_from_raw_bytes(audio_file, seq_name=seq_tag)
+      feature_extractor = self.feature_extractor
+      if self._is_parallel_prefetch():
+        # The shared self._audio_random would be used in arbitrary order. Use a random state per seq instead.
+        feature_extractor = copy.copy(feature_extractor)
+        feature_extractor.random_state = numpy.random.RandomState(self._get_seq_random_seed(seq_idx))
+      if self._feature_cache is not None:
+        cache_key = self._get_feature_cache_key(seq_idx)
+        features = self._feature_cache.get(cache_key)
+        if features is None:
+          with self._open_audio_file(seq_idx) as audio_file:
+            features = feature_extractor.get_audio_features_from_raw_bytes(
+              audio_file, seq_name=seq_tag, apply_post_process=False)
+          self._feature_cache.add(cache_key, features)
+        features = feature_extractor.apply_post_process(features, seq_name=seq_tag)
+      else:
+        with self._open_audio_file(seq_idx) as audio_file:
+          features = feature_extractor.get_audio_features_from_raw_bytes(audio_file, seq_name=seq_tag)
     else:
       features = numpy.zeros(())  # currently the API requires some dummy values...
     targets, txt = self._get_transcription(seq_idx)
@@ -17,15 +17,16 @@ from threading import RLock
 from random import Random, random
 
 import sys
+import time
 import os
 import numpy
 import functools
 import typing
 
 from returnn.log import log
-from returnn.engine.batch import Batch, BatchSetGenerator
+from returnn.engine.batch import Batch, BatchSetGenerator, BatchSetArrays, get_batch_boundaries
 from returnn.datasets.util.vocabulary import Vocabulary
-from returnn.util.basic import try_run, NumbersDict, unicode, OptionalNotImplementedError
+from returnn.util.basic import try_run, NumbersDict, unicode, OptionalNotImplementedError, CollectionReadCheckCovered
 
 
 class Dataset(object):
@@ -125,7 +126,9 @@ class Dataset(object):
     self.seq_tags_filter = set(self._load_seq_list_file(seq_list_filter_file)) if seq_list_filter_file else None
     self.unique_seq_tags = unique_seq_tags
     self._seq_order_seq_lens_file = seq_order_seq_lens_file
-    self._seq_order_seq_lens_by_idx = None
+    self._seq_order_seq_lens_by_idx = None  # type: typing.Optional[numpy.ndarray]
+    # (cache key, num seqs, seq lens), see get_seq_order_for_epoch
+    self._seq_order_seq_lens_cache = None  # type: typing.Optional[typing.Tuple[typing.Hashable,int,numpy.ndarray]]
     # There is probably no use case for combining the two, so avoid potential misconfiguration.
     assert self.partition_epoch == 1 or self.repeat_epoch == 1, (
       "Combining partition_epoch and repeat_epoch is prohibited.")
@@ -274,6 +277,17 @@ class Dataset(object):
     """
     raise NotImplementedError
 
+  def get_all_seq_lengths(self):
+    """
+    This is optional. It allows for faster batch generation, see :func:`_generate_batches`.
+
+    :return: the seq lengths of all seqs of the current epoch, i.e. the same as :func:`get_seq_length`
+      for each seq idx, as dict data-key -> int array of shape (num_seqs,),
+      or None if this is not available (e.g. without loading all the seqs)
+    :rtype: dict[str,numpy.ndarray]|None
+    """
+    return None
+
   def get_estimated_seq_length(self, seq_idx):
     """
     In contrast to self.get_seq_length(), this method is designed to work for sequences that have not been loaded yet
@@ -351,7 +365,14 @@ class Dataset(object):
     :param int seq_idx:
     :rtype: int
     """
-    if not self._seq_order_seq_lens_by_idx:
+    return self._get_seq_order_seq_lens_from_file()[seq_idx]
+
+  def _get_seq_order_seq_lens_from_file(self):
+    """
+    :return: seq lens by seq idx, via seq_order_seq_lens_file
+    :rtype: numpy.ndarray
+    """
+    if self._seq_order_seq_lens_by_idx is None:
       assert self._seq_order_seq_lens_file
       if self._seq_order_seq_lens_file.endswith(".gz"):
         import gzip
@@ -361,18 +382,46 @@ class Dataset(object):
       seq_lens = eval(raw)
       assert isinstance(seq_lens, dict)
       all_tags = self.get_all_tags()
-      self._seq_order_seq_lens_by_idx = [seq_lens[tag] for tag in all_tags]
-    return self._seq_order_seq_lens_by_idx[seq_idx]
+      self._seq_order_seq_lens_by_idx = numpy.array([seq_lens[tag] for tag in all_tags], dtype="int64")
+    return self._seq_order_seq_lens_by_idx
 
-  def get_seq_order_for_epoch(self, epoch, num_seqs, get_seq_len=None):
+  def _get_seq_lens_for_seq_order(self, num_seqs, get_seq_len, cache_key=None):
+    """
+    :param int num_seqs:
+    :param ((int) -> int)|numpy.ndarray get_seq_len:
+    :param typing.Hashable|None cache_key: if given, the result is cached in this dataset instance under this key
+    :return: seq lens by seq idx, shape (num_seqs,)
+    :rtype: numpy.ndarray
+    """
+    if isinstance(get_seq_len, numpy.ndarray):
+      assert get_seq_len.shape == (num_seqs,), "%s: seq lens shape %r, num seqs %i" % (
+        self, get_seq_len.shape, num_seqs)
+      return get_seq_len
+    if cache_key is not None and self._seq_order_seq_lens_cache:
+      key, cached_num_seqs, seq_lens = self._seq_order_seq_lens_cache
+      if key == cache_key and cached_num_seqs == num_seqs:
+        return seq_lens
+    start_time = time.time()
+    seq_lens = numpy.fromiter((get_seq_len(i) for i in range(num_seqs)), dtype="int64", count=num_seqs)
+    if cache_key is not None:
+      print("%s: collected %i seq lens for the seq order in %.3f secs, cached for further epochs." % (
+        self, num_seqs, time.time() - start_time), file=log.v4)
+      self._seq_order_seq_lens_cache = (cache_key, num_seqs, seq_lens)
+    return seq_lens
+
+  def get_seq_order_for_epoch(self, epoch, num_seqs, get_seq_len=None, seq_lens_cache_key=None):
     """
     Returns the order of the given epoch.
     This is mostly a static method, except that is depends on the configured type of ordering,
     such as 'default' (= as-is), 'sorted' or 'random'. 'sorted' also uses the sequence length.
+    All orderings work on a numpy array of all the seq lens, i.e. get_seq_len is called at most once per seq.
 
     :param int epoch: for 'random', this determines the random seed
     :param int num_seqs:
-    :param ((int) -> int)|None get_seq_len: function (originalSeqIdx: int) -> int
+    :param ((int) -> int)|numpy.ndarray|None get_seq_len: function (originalSeqIdx: int) -> int,
+      or directly the seq lens of all seqs, shape (num_seqs,)
+    :param typing.Hashable|None seq_lens_cache_key: if the seq lens via get_seq_len are static,
+      pass some key here (e.g. the name of the data source), and they are cached across epochs
     :return: the order for the given epoch. such that seq_idx -> underlying idx
     :rtype: typing.Sequence[int]
     """
@@ -380,7 +429,14 @@ class Dataset(object):
     repeat_epoch = self.repeat_epoch or 1
     assert num_seqs > 0
     if self._seq_order_seq_lens_file:
-      get_seq_len = self._get_seq_order_seq_lens_by_idx
+      get_seq_len = self._get_seq_order_seq_lens_from_file()
+
+    def _get_seq_lens():
+      """
+      :rtype: numpy.ndarray
+      """
+      assert get_seq_len is not None, "%s: seq ordering %r needs the seq lens" % (self, self.seq_ordering)
+      return self._get_seq_lens_for_seq_order(num_seqs, get_seq_len, cache_key=seq_lens_cache_key)
 
     if self.seq_ordering == 'default':
       seq_index = range(num_seqs)
@@ -395,10 +451,8 @@ class Dataset(object):
     elif self.seq_ordering == 'reverse':
       seq_index = range(num_seqs - 1, -1, -1)
     elif self.seq_ordering in ['sorted', 'sorted_reverse']:
-      assert get_seq_len
       reverse = -1 if self.seq_ordering == 'sorted_reverse' else 1
-      seq_lens = [reverse * get_seq_len(i) for i in range(num_seqs)]
-      seq_index = numpy.argsort(seq_lens, kind="stable")
+      seq_index = numpy.argsort(reverse * _get_seq_lens(), kind="stable")
     elif self.seq_ordering.startswith('random'):
       tmp = self.seq_ordering.split(':')
       nth = int(tmp[1]) if len(tmp) > 1 else 1
@@ -408,7 +462,7 @@ class Dataset(object):
       seq_index = random_generator.permutation(num_seqs)
     elif self.seq_ordering.startswith('sort_bin_shuffle'):
       # Shuffle seqs, sort by length, and shuffle bins (then shuffle seqs within each bin if sort_bin_shuffle_x2).
-      assert get_seq_len
+      seq_lens = _get_seq_lens()
       tmp = self.seq_ordering.split(':')[1:]
       # Keep this deterministic! Use fixed seed.
       if len(tmp) <= 1:
@@ -417,8 +471,8 @@ class Dataset(object):
         nth = int(tmp[1])
       rnd_seed = self._get_random_seed_for_epoch(epoch=epoch, num_epochs_fixed=nth)
       random_generator = numpy.random.RandomState(rnd_seed)
-      seq_index = random_generator.permutation(num_seqs).tolist()  # type: typing.List[int]
-      seq_index.sort(key=get_seq_len)  # Sort by length, starting with shortest.
+      seq_index = random_generator.permutation(num_seqs)  # type: numpy.ndarray
+      seq_index = seq_index[numpy.argsort(seq_lens[seq_index], kind="stable")]  # Sort by length, shortest first.
       if len(tmp) == 0:
         bins = 2
       else:
@@ -430,15 +484,15 @@ class Dataset(object):
       out_index = []
       for i in bin_ids:
         if i == bins - 1:
-          part = seq_index[i * len(seq_index) // bins:][:]
+          part = seq_index[i * len(seq_index) // bins:].copy()
         else:
-          part = seq_index[i * len(seq_index) // bins:(i + 1) * len(seq_index) // bins][:]
+          part = seq_index[i * len(seq_index) // bins:(i + 1) * len(seq_index) // bins].copy()
         if self.seq_ordering.startswith('sort_bin_shuffle_x2'):
           random_generator.shuffle(part)  # Shuffle within the bin.
         out_index.append(part)
       seq_index = numpy.concatenate(out_index)
     elif self.seq_ordering.startswith('laplace'):
-      assert get_seq_len
+      seq_lens = _get_seq_lens()
       tmp = self.seq_ordering.split(':')[1:]
       if len(tmp) == 0:
         bins = 2
@@ -457,12 +511,13 @@ class Dataset(object):
       out_index = []
       for i in range(bins):
         if i == bins - 1:
-          part = seq_index[i * len(seq_index) // bins:].tolist()
+          part = seq_index[i * len(seq_index) // bins:]
         else:
-          part = seq_index[i * len(seq_index) // bins:(i + 1) * len(seq_index) // bins].tolist()
-        part.sort(key=get_seq_len, reverse=(i % 2 == 1))
-        out_index += part
-      seq_index = out_index
+          part = seq_index[i * len(seq_index) // bins:(i + 1) * len(seq_index) // bins]
+        # Sort by length, alternating ascending and descending. Stable, like list.sort (also with reverse).
+        part_seq_lens = seq_lens[part]
+        out_index.append(part[numpy.argsort(-part_seq_lens if i % 2 == 1 else part_seq_lens, kind="stable")])
+      seq_index = numpy.concatenate(out_index)
     else:
       assert False, "invalid batching specified: " + self.seq_ordering
 
@@ -479,7 +534,7 @@ class Dataset(object):
       seq_index = list(seq_index) * repeat_epoch
     if self.seq_tags_filter is not None:
       # Note: This is as generic as possible, but requires that get_all_tags is implemented.
-      assert seq_index
+      assert len(seq_index) > 0
       all_seq_tags = self.get_all_tags()
       assert len(all_seq_tags) == num_seqs == self.get_total_num_seqs(), "%r vs %r vs %r" % (
         len(all_seq_tags), num_seqs, self.get_total_num_seqs())
@@ -994,6 +1049,89 @@ class Dataset(object):
             break
       s += 1
 
+  def _iterate_seqs_arrays(self, chunk_size, chunk_step, used_data_keys=None):
+    """
+    Like :func:`iterate_seqs`, but for all seqs at once, based on :func:`get_all_seq_lengths`.
+
+    :param int|NumbersDict chunk_size:
+    :param int|NumbersDict chunk_step:
+    :param set(str)|None used_data_keys:
+    :return: (keys, seq_idx, seq_start, seq_end), with seq_idx of shape (num_parts,),
+      and seq_start/seq_end of shape (num_parts,len(keys)),
+      or None if not supported for this dataset or these settings. Use :func:`iterate_seqs` then.
+    :rtype: (list[str],numpy.ndarray,numpy.ndarray,numpy.ndarray)|None
+    """
+    all_lengths = self.get_all_seq_lengths()
+    if all_lengths is None:
+      return None
+    chunk_size = NumbersDict(chunk_size)
+    chunk_step = NumbersDict(chunk_step)
+    if chunk_size == 0:
+      keys = sorted(all_lengths.keys())
+      num_seqs = self.num_seqs
+      lengths = numpy.zeros((num_seqs, len(keys)), dtype="int64")
+      for i, key in enumerate(keys):
+        lengths[:, i] = all_lengths[key]
+      return keys, numpy.arange(num_seqs), numpy.zeros_like(lengths), lengths
+    if self.chunking_variance > 0:
+      return None  # uses rnd_seq_drop per seq
+    default_key = "data"
+    if used_data_keys is not None:
+      if not set(used_data_keys).issubset(all_lengths.keys()):
+        return None
+      all_lengths = {k: all_lengths[k] for k in used_data_keys}
+      if default_key not in used_data_keys:
+        default_key = sorted(used_data_keys)[0]
+      if chunk_step[default_key] == 0:
+        if chunk_step.max_value() <= 0:
+          return None
+        default_key = [key for key in sorted(used_data_keys) if chunk_step[key] > 0][0]
+    keys = sorted(all_lengths.keys())
+    if default_key not in keys or not chunk_size.keys_set.issubset(keys) or not chunk_step.keys_set.issubset(keys):
+      return None
+    try:
+      chunk_sizes = numpy.array([chunk_size[key] for key in keys], dtype="int64")
+      chunk_steps = numpy.array([chunk_step[key] for key in keys], dtype="int64")
+    except KeyError:
+      return None
+    default_idx = keys.index(default_key)
+    if chunk_steps[default_idx] <= 0:
+      return None
+    lengths = numpy.zeros((self.num_seqs, len(keys)), dtype="int64")
+    for i, key in enumerate(keys):
+      lengths[:, i] = all_lengths[key]
+    default_lengths = lengths[:, default_idx]
+    # See iterate_seqs for the logic. Keys with length 0 or 1 (and otherwise mismatching length)
+    # will get the full seq repeated for every chunk.
+    same_step = (chunk_steps == chunk_steps[default_idx])[None, :]  # (1,keys)
+    matching = same_step & (lengths == default_lengths[:, None])  # (seqs,keys)
+    full_seqs = ~matching & (lengths <= 1)
+    chunked = ~matching & ~full_seqs
+    if numpy.any(chunked & same_step):
+      return None  # iterate_seqs raises an exception for this
+    if numpy.any(chunked):
+      if numpy.any(chunked & (chunk_steps == 0)[None, :]):
+        return None
+      limit, limit_default = numpy.ones_like(chunk_sizes), 1
+      if self.min_chunk_size == chunk_sizes[default_idx]:
+        limit, limit_default = chunk_sizes, chunk_sizes[default_idx]
+      num_chunks_per_key = (lengths - limit[None, :]) // numpy.maximum(chunk_steps, 1)[None, :] + 1  # ignore step 0
+      num_chunks_default = (default_lengths - limit_default) // chunk_steps[default_idx] + 1
+      if numpy.any(chunked & (num_chunks_per_key != num_chunks_default[:, None])):
+        return None  # iterate_seqs asserts this
+    num_chunks = numpy.where(
+      default_lengths > 0,
+      numpy.maximum(-((self.min_chunk_size - default_lengths) // chunk_steps[default_idx]), 1),
+      0)
+    seq_idx = numpy.repeat(numpy.arange(self.num_seqs), num_chunks)
+    chunk_idx = numpy.arange(len(seq_idx)) - numpy.repeat(numpy.cumsum(num_chunks) - num_chunks, num_chunks)
+    seq_start = chunk_idx[:, None] * chunk_steps[None, :]
+    seq_end = numpy.minimum(seq_start + chunk_sizes[None, :], lengths[seq_idx])
+    part_full_seqs = full_seqs[seq_idx]
+    seq_start[part_full_seqs] = 0
+    seq_end = numpy.where(part_full_seqs, lengths[seq_idx], seq_end)
+    return keys, seq_idx, seq_start, seq_end
+
   def get_start_end_frames_full_seq(self, seq_idx):
     """
     :param int seq_idx:
@@ -1029,7 +1167,7 @@ class Dataset(object):
                         max_pad_size=None,
                         min_seq_length=0, pruning=0.0,
                         seq_drop=0.0, max_total_num_seqs=-1,
-                        used_data_keys=None):
+                        used_data_keys=None, length_bucketing=None):
     """
     :param bool recurrent_net: If True, the batch might have a batch seq dimension > 1.
       Otherwise, the batch seq dimension is always 1 and multiple seqs will be concatenated.
@@ -1039,6 +1177,11 @@ class Dataset(object):
     :param int max_total_num_seqs:
     :param int|dict[str,int]|NumbersDict max_seq_length:
     :param set(str)|None used_data_keys:
+    :param bool|dict[str]|None length_bucketing: if enabled, instead of filling the batches in the seq order,
+      group the seqs into length buckets, pack the batches within each bucket,
+      and shuffle the batch order. See :func:`_get_length_bucketed_batches` for the options.
+      Only supported for datasets which implement :func:`get_all_seq_lengths`, in the recurrent case,
+      and only used if :func:`can_load_seq_ranges_sparsely`.
     """
     if not batch_size:
       batch_size = sys.maxsize
@@ -1063,6 +1206,10 @@ class Dataset(object):
       if chunk_size != 0:
         print("Non-recurrent network, chunk size %s:%s ignored" % (chunk_size, chunk_step), file=log.v4)
         chunk_size = 0
+    if length_bucketing and not self.can_load_seq_ranges_sparsely():
+      print("%s: length bucketing would load (and cache) almost the whole epoch for every batch,"
+            " using the default batching in the seq order." % self, file=log.v2)
+      length_bucketing = None
     batch = Batch()
     total_num_seqs = 0
     last_seq_idx = -1
@@ -1070,6 +1217,23 @@ class Dataset(object):
     for idx in self.weights:
       self.weights[idx][1] = random() * avg_weight * pruning
       self.weights[idx][0] *= (1. + pruning)
+    if recurrent_net and max_total_num_seqs == float("inf"):
+      batch_set = self._generate_batch_set_arrays(
+        batch_size=batch_size, max_seqs=max_seqs, max_seq_length=max_seq_length, max_pad_size=max_pad_size,
+        min_seq_length=min_seq_length, seq_drop=seq_drop,
+        chunk_size=chunk_size, chunk_step=chunk_step, used_data_keys=used_data_keys,
+        length_bucketing=length_bucketing)
+      if batch_set is not None:
+        if length_bucketing:
+          print("%s, length bucketing: %i batches, padding ratio %s" % (
+            self, len(batch_set),
+            ", ".join(["%s %.4f" % item for item in sorted(batch_set.get_padding_ratio().items())])), file=log.v4)
+        for batch in batch_set:
+          yield batch
+        return
+    if length_bucketing:
+      print("%s: length bucketing not supported here, using the default batching in the seq order." % self,
+            file=log.v2)
     for seq_idx, t_start, t_end in self.iterate_seqs(
           chunk_size=chunk_size, chunk_step=chunk_step, used_data_keys=used_data_keys):
       if not self.sample(seq_idx):
@@ -1120,6 +1284,124 @@ class Dataset(object):
     if batch.get_all_slices_num_frames().max_value() > 0:
       yield batch
 
+  def _generate_batch_set_arrays(self, batch_size, max_seqs, max_seq_length, max_pad_size, min_seq_length,
+                                 seq_drop, chunk_size, chunk_step, used_data_keys, length_bucketing=None):
+    """
+    Vectorized variant of :func:`_generate_batches` for the recurrent case.
+    All batch boundaries are computed in bulk, based on :func:`get_all_seq_lengths`.
+    The resulting batches are exactly the same as with the generic code path,
+    except with length_bucketing.
+
+    :param NumbersDict batch_size:
+    :param int|float max_seqs:
+    :param NumbersDict max_seq_length:
+    :param NumbersDict max_pad_size:
+    :param NumbersDict min_seq_length:
+    :param float seq_drop:
+    :param int|NumbersDict chunk_size:
+    :param int|NumbersDict chunk_step:
+    :param set(str)|None used_data_keys:
+    :param bool|dict[str]|None length_bucketing: see :func:`_get_length_bucketed_batches`
+    :return: batches, or None if not supported for this dataset or these settings
+    :rtype: BatchSetArrays|None
+    """
+    if max_pad_size.value is not None and max_pad_size.value < 0:
+      return None
+    parts = self._iterate_seqs_arrays(chunk_size=chunk_size, chunk_step=chunk_step, used_data_keys=used_data_keys)
+    if parts is None:
+      return None
+    keys, seq_idx, seq_start, seq_end = parts
+    for ctx in [self.ctx_left, self.ctx_right]:
+      if ctx.value is not None or not ctx.keys_set.issubset(keys):
+        return None  # would add further keys or a broadcast value
+    ctx_left = numpy.array([self.ctx_left.dict.get(key, 0) for key in keys], dtype="int64")
+    ctx_right = numpy.array([self.ctx_right.dict.get(key, 0) for key in keys], dtype="int64")
+
+    def _limits(d, default):
+      """
+      :param NumbersDict d:
+      :param float default: if there is no limit for some key
+      :return: like any_compare with d, shape (len(keys),)
+      :rtype: numpy.ndarray
+      """
+      return numpy.array([
+        d[key] if key in d.keys_set else (d.value if d.value is not None else default) for key in keys],
+        dtype="float64")
+
+    if self.weights:
+      mask = numpy.array([self.sample(i) for i in seq_idx.tolist()], dtype=bool)
+      seq_idx, seq_start, seq_end = seq_idx[mask], seq_start[mask], seq_end[mask]
+    seq_start -= ctx_left[None, :]
+    seq_end += ctx_right[None, :]
+    lengths = seq_end - seq_start
+    mask = numpy.all(lengths <= _limits(max_seq_length, float("inf"))[None, :], axis=1)
+    mask &= numpy.all(lengths >= _limits(min_seq_length, float("-inf"))[None, :], axis=1)
+    seq_idx, seq_start, seq_end, lengths = seq_idx[mask], seq_start[mask], seq_end[mask], lengths[mask]
+    batch_size_limits = _limits(batch_size, float("inf"))
+    for i in numpy.flatnonzero(numpy.any(lengths > batch_size_limits[None, :], axis=1)):
+      length = NumbersDict(dict(zip(keys, lengths[i].tolist())))
+      print("warning: sequence length (%r) larger than limit (%r)" % (length, batch_size), file=log.v4)
+    # Same random numbers as in the generic code path.
+    mask = numpy.array([self.rnd_seq_drop.random() >= seq_drop for _ in range(len(seq_idx))], dtype=bool)
+    seq_idx, seq_start, seq_end, lengths = seq_idx[mask], seq_start[mask], seq_end[mask], lengths[mask]
+    if length_bucketing:
+      order, batch_start = self._get_length_bucketed_batches(
+        keys=keys, lengths=lengths, batch_size=batch_size_limits, max_seqs=max_seqs,
+        max_pad_size=_limits(max_pad_size, float("inf")),
+        opts=length_bucketing if isinstance(length_bucketing, dict) else {})
+      return BatchSetArrays(
+        keys=keys, seq_idx=seq_idx[order], seq_start=seq_start[order], seq_end=seq_end[order], batch_start=batch_start)
+    batch_start = get_batch_boundaries(
+      lengths, batch_size=batch_size_limits, max_seqs=max_seqs, max_pad_size=_limits(max_pad_size, float("inf")))
+    if len(batch_start) > 1 and numpy.max(lengths[batch_start[-2]:], initial=0) <= 0:
+      batch_start = batch_start[:-1]  # the generic code path does not yield the last batch if it is empty
+    return BatchSetArrays(keys=keys, seq_idx=seq_idx, seq_start=seq_start, seq_end=seq_end, batch_start=batch_start)
+
+  def _get_length_bucketed_batches(self, keys, lengths, batch_size, max_seqs, max_pad_size, opts):
+    """
+    The parts are grouped into buckets with similar length (of one key, by default "data"),
+    where the bucket boundaries grow geometrically, i.e. [l, l * (1 + bucket_width)).
+    Within each bucket, the parts are shuffled, and packed into batches via :func:`get_batch_boundaries`,
+    i.e. the batch limits for all keys are respected.
+    Then the order of all batches is shuffled.
+    This is deterministic per epoch (like the "random" seq ordering).
+
+    :param list[str] keys:
+    :param numpy.ndarray lengths: (num_parts,len(keys))
+    :param numpy.ndarray batch_size: (len(keys),), use inf for no limit
+    :param int|float max_seqs: use inf for no limit
+    :param numpy.ndarray max_pad_size: (len(keys),), use inf for no limit
+    :param dict[str] opts: "key" (default "data" or the first key), "bucket_width" (default 0.1)
+    :return: order of the parts (num_parts,), batch offsets (num_batches+1,) in that order
+    :rtype: (numpy.ndarray,numpy.ndarray)
+    """
+    opts = CollectionReadCheckCovered(opts)
+    key = opts.get("key", "data" if "data" in keys else keys[0])
+    bucket_width = opts.get("bucket_width", 0.1)
+    opts.assert_all_read()
+    assert key in keys, "%s: length_bucketing key %r not in %r" % (self, key, keys)
+    assert bucket_width > 0
+    num_parts = len(lengths)
+    rnd = numpy.random.RandomState(self._get_random_seed_for_epoch(epoch=self.epoch))
+    bucket = numpy.floor(
+      numpy.log(numpy.maximum(lengths[:, keys.index(key)], 1)) / numpy.log1p(bucket_width)).astype("int64")
+    order = numpy.lexsort((rnd.random_sample(num_parts), bucket))  # by bucket, random within the bucket
+    bucket_offsets = numpy.concatenate([[0], numpy.flatnonzero(numpy.diff(bucket[order])) + 1, [num_parts]])
+    batch_start = [numpy.zeros((1,), dtype="int64")]
+    for start, end in zip(bucket_offsets[:-1], bucket_offsets[1:]):
+      if start == end:
+        continue
+      boundaries = get_batch_boundaries(
+        lengths[order[start:end]], batch_size=batch_size, max_seqs=max_seqs, max_pad_size=max_pad_size)
+      batch_start.append(boundaries[1:] + start)
+    batch_start = numpy.concatenate(batch_start)
+    batch_sizes = batch_start[1:] - batch_start[:-1]
+    batch_order = rnd.permutation(len(batch_sizes))
+    order = numpy.concatenate(
+      [order[batch_start[i]:batch_start[i + 1]] for i in batch_order] or [numpy.zeros((0,), dtype="int64")])
+    batch_start = numpy.concatenate([[0], numpy.cumsum(batch_sizes[batch_order])]).astype("int64")
+    return order, batch_start
+
   def batch_set_generator_cache_whole_epoch(self):
     """
     The BatchSetGenerator can cache the list of batches which we generated across epochs.
@@ -1135,17 +1417,35 @@ class Dataset(object):
     """
     return False
 
-  def generate_batches(self, shuffle_batches=False, **kwargs):
+  def can_load_seq_ranges_sparsely(self):
+    """
+    Non-contiguous batches (e.g. via length_bucketing, see :func:`_generate_batches`)
+    cover a seq range which spans almost the whole epoch,
+    and :func:`load_seqs` is called for that whole range (e.g. in the TF data pipeline).
+
+    :return: whether :func:`load_seqs` for such a range is cheap, i.e. does not load or cache the unused seqs
+    :rtype: bool
+    """
+    return False
+
+  def generate_batches(self, shuffle_batches=False, seq_filter=None, **kwargs):
     """
     :param bool shuffle_batches:
+    :param ((int)->bool)|None seq_filter: seq_idx -> whether to keep the seq.
+      The other seqs are removed from the batches (and empty batches are skipped).
     :param kwargs: will be passed to :func:`_generate_batches`
     :rtype: BatchSetGenerator
     """
+    generator = self._generate_batches(**kwargs)
+    if seq_filter:
+      generator = (
+        batch for batch in (batch_.filter_seqs(seq_filter) for batch_ in generator) if batch.seqs)
     return BatchSetGenerator(
       dataset=self,
-      generator=self._generate_batches(**kwargs),
+      generator=generator,
       shuffle_batches=shuffle_batches,
-      cache_whole_epoch=self.batch_set_generator_cache_whole_epoch())
+      # With length_bucketing, the batches are different in every epoch.
+      cache_whole_epoch=self.batch_set_generator_cache_whole_epoch() and not kwargs.get("length_bucketing"))
 
   @classmethod
   def index_shape_for_batches(cls, batches, data_key="data"):
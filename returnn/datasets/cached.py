@@ -78,10 +78,12 @@ class CachedDataset(Dataset):
     if seq_order is not None:
       seq_index = seq_order
     elif seq_list is not None:
-      self._update_tag_idx()
-      seq_index = [self._tag_idx[tag] for tag in seq_list]
+      seq_index = self._get_real_idxs_by_tags(seq_list)
     else:
-      seq_index = self.get_seq_order_for_epoch(epoch, self._num_seqs, lambda s: self._get_seq_length_by_real_idx(s)[0])
+      all_seq_lens = self._get_all_seq_lengths_by_real_idx()
+      seq_index = self.get_seq_order_for_epoch(
+        epoch, self._num_seqs,
+        all_seq_lens[:, 0] if all_seq_lens is not None else (lambda s: self._get_seq_length_by_real_idx(s)[0]))
 
     old_index_map = self._index_map[:]
     self._index_map = range(len(seq_index))  # sorted seq idx -> seq_index idx
@@ -128,6 +130,15 @@ class CachedDataset(Dataset):
     for i in range(self._num_seqs):
       self._tag_idx[self._get_tag_by_real_idx(i)] = i
 
+  def _get_real_idxs_by_tags(self, tags):
+    """
+    :param list[str] tags:
+    :return: real seq idx for each tag
+    :rtype: list[int]
+    """
+    self._update_tag_idx()
+    return [self._tag_idx[tag] for tag in tags]
+
   def batch_set_generator_cache_whole_epoch(self):
     return True
 
@@ -483,6 +494,32 @@ class CachedDataset(Dataset):
     real_seq_idx = self._seq_index[self._index_map[sorted_seq_idx]]
     return self._get_seq_length_by_real_idx(real_seq_idx)
 
+  def _get_all_seq_lengths_by_real_idx(self):
+    """
+    :return: lengths of all seqs by real seq idx, shape (num_real_seqs,num_keys),
+      like :func:`_get_seq_length_by_real_idx`, or None if this is not available
+    :rtype: numpy.ndarray|None
+    """
+    return None
+
+  def get_all_seq_lengths(self):
+    """
+    :rtype: dict[str,numpy.ndarray]|None
+    """
+    lengths = self._get_all_seq_lengths_by_real_idx()
+    if lengths is None or len(self._index_map) != self.num_seqs:
+      return None
+    real_seq_idxs = numpy.asarray(self._seq_index, dtype="int64")[numpy.asarray(self._index_map, dtype="int64")]
+    lengths = lengths[real_seq_idxs]
+    d = {}
+    first_target_idx = 0
+    if self.num_inputs > 0:
+      d["data"] = lengths[:, 0]
+      first_target_idx = 1
+    for i, k in enumerate(self.target_keys[:lengths.shape[1] - first_target_idx]):
+      d[k] = lengths[:, first_target_idx + i]
+    return d
+
   def get_seq_length(self, seq_idx):
     """
     :rtype: NumbersDict
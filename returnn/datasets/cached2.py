@@ -26,9 +26,24 @@ class CachedDataset2(Dataset):
   - handle seq ordering by overriding `init_seq_order`
   - you can set `_estimated_num_seqs`
   - you can set `_num_seqs` or `_num_timesteps` if you know them in advance
+  - set `_collect_single_seq_is_parallel_safe` if `_collect_single_seq` can run concurrently (see `prefetch`)
   """
 
-  def __init__(self, **kwargs):
+  # Whether `_collect_single_seq` can be called concurrently for different seq indices, in arbitrary order.
+  # This requires that there is no sequential state (like in LmDataset),
+  # and that any randomness only depends on the seq (and epoch), not on the call order.
+  _collect_single_seq_is_parallel_safe = False
+
+  def __init__(self, prefetch=0, prefetch_num_workers=1, **kwargs):
+    """
+    :param int prefetch: number of seqs to collect ahead (following the current seq order) in background threads,
+      such that the consumer does not need to wait for `_collect_single_seq`. 0 disables prefetching.
+      At most this many seqs (plus the requested ones) are kept in memory in addition to the loaded seqs.
+    :param int prefetch_num_workers: number of background threads used for prefetching.
+      With a single worker, the seqs are collected in exactly the same order as without prefetching,
+      thus any random state is used in the same way and the data is identical.
+      More workers are only allowed if `_collect_single_seq_is_parallel_safe` is set.
+    """
     super(CachedDataset2, self).__init__(**kwargs)
     self._num_timesteps = None
     self.epoch = None
@@ -36,6 +51,15 @@ class CachedDataset2(Dataset):
     self.added_data = []  # type: typing.List[DatasetSeq]
     self.expected_load_seq_start = 0
     self._num_timesteps_accumulated = 0
+    assert prefetch >= 0 and prefetch_num_workers >= 1
+    assert prefetch_num_workers == 1 or not prefetch or self._collect_single_seq_is_parallel_safe, (
+      "%s: prefetch_num_workers > 1 not supported by %s" % (self, self.__class__.__name__))
+    self._prefetch = prefetch
+    self._prefetch_num_workers = prefetch_num_workers
+    self._prefetch_executor = None  # type: typing.Optional[concurrent.futures.ThreadPoolExecutor]
+    self._prefetch_futures = {}  # type: typing.Dict[int,concurrent.futures.Future]  # seq_idx -> DatasetSeq|None
+    self._prefetch_end = 0  # all seq idx below are either loaded, or in _prefetch_futures
+    self._prefetch_reached_end = False
 
   def init_seq_order(self, epoch=None, seq_list=None, seq_order=None):
     """
@@ -49,6 +73,8 @@ class CachedDataset2(Dataset):
     This is called when we start a new epoch, or at initialization.
     Call this when you reset the seq list.
     """
+    # Wait for pending background work before the subclass modifies its state for the new epoch.
+    self._reset_prefetch()
     super(CachedDataset2, self).init_seq_order(epoch=epoch, seq_list=seq_list, seq_order=seq_order)
     if not epoch:
       epoch = 1
@@ -60,6 +86,74 @@ class CachedDataset2(Dataset):
     self.epoch = epoch
     return True
 
+  def finish_epoch(self):
+    """
+    Stop prefetching.
+    """
+    self._reset_prefetch()
+    super(CachedDataset2, self).finish_epoch()
+
+  def _reset_prefetch(self):
+    """
+    Cancels all pending prefetch jobs, waits for the running ones, and shuts down the background workers.
+    """
+    for future in self._prefetch_futures.values():
+      future.cancel()
+    if self._prefetch_executor is not None:
+      self._prefetch_executor.shutdown(wait=True)
+      self._prefetch_executor = None
+    self._prefetch_futures.clear()
+    self._prefetch_end = 0
+    self._prefetch_reached_end = False
+
+  def _get_prefetch_num_seqs_limit(self):
+    """
+    :return: num seqs, if known cheaply, otherwise None
+    :rtype: int|None
+    """
+    if self._num_seqs is not None:
+      return self._num_seqs
+    # noinspection PyBroadException
+    try:
+      return self.num_seqs
+    except Exception:  # can fail, e.g. if self.num_seqs is not defined
+      return None
+
+  def _collect_seqs_prefetch(self, start, end):
+    """
+    Like collecting the seqs in [start,end) directly via `_collect_single_seq`,
+    but all the work is done by the background workers, which also run ahead by `prefetch` seqs.
+
+    :param int start: inclusive seq idx start
+    :param int end: exclusive seq idx end. can be more than num_seqs
+    :rtype: list[DatasetSeq|None]
+    """
+    if self._prefetch_executor is None:
+      # Only imported here, as concurrent.futures is not available in Python 2 (e.g. tests/DummySprintExec.py).
+      # noinspection PyCompatibility
+      from concurrent.futures import ThreadPoolExecutor
+      self._prefetch_executor = ThreadPoolExecutor(max_workers=self._prefetch_num_workers)
+    for seq_idx in [seq_idx for seq_idx in self._prefetch_futures if seq_idx < start]:
+      self._prefetch_futures.pop(seq_idx).cancel()
+    self._prefetch_end = max(self._prefetch_end, start)
+    limit = end + self._prefetch
+    num_seqs = self._get_prefetch_num_seqs_limit()
+    if num_seqs is not None:
+      limit = min(limit, max(num_seqs, end))
+    while self._prefetch_end < limit and not self._prefetch_reached_end:
+      # Submitted in seq order. With a single worker, they are also executed in this order.
+      self._prefetch_futures[self._prefetch_end] = self._prefetch_executor.submit(
+        self._collect_single_seq, seq_idx=self._prefetch_end)
+      self._prefetch_end += 1
+    seqs = []
+    for seq_idx in range(start, end):
+      future = self._prefetch_futures.pop(seq_idx, None)
+      seq = future.result() if future else None
+      if seq is None:
+        self._prefetch_reached_end = True
+      seqs.append(seq)
+    return seqs
+
   def _cleanup_old_seqs(self, seq_idx_end):
     """
     :param int seq_idx_end:
@@ -116,7 +210,10 @@ class CachedDataset2(Dataset):
       self.expected_load_seq_start = start
     if self.added_data:
       start = max(self.added_data[-1].seq_idx + 1, start)
-    seqs = [self._collect_single_seq(seq_idx=seq_idx) for seq_idx in range(start, end)]
+    if self._prefetch:
+      seqs = self._collect_seqs_prefetch(start, end)
+    else:
+      seqs = [self._collect_single_seq(seq_idx=seq_idx) for seq_idx in range(start, end)]
     seqs = list(filter(None, seqs))  # We might not know the num seqs in advance.
     self._num_timesteps_accumulated += sum([seq.num_frames for seq in seqs])
     self.added_data += seqs
@@ -7,6 +7,7 @@ from __future__ import print_function
 import typing
 import collections
 import gc
+import os
 import h5py
 import numpy
 from .cached import CachedDataset
@@ -28,23 +29,36 @@ class HDFDataset(CachedDataset):
   This was the main original dataset format of RETURNN.
   """
 
-  def __init__(self, files=None, use_cache_manager=False, **kwargs):
+  def __init__(self, files=None, use_cache_manager=False, index_cache_dir=None, use_mmap=False, **kwargs):
     """
     :param None|list[str] files:
     :param bool use_cache_manager: uses :func:`Util.cf` for files
+    :param str|None index_cache_dir: if given, we store an index (seq lengths, sorted seq tags) for every file there,
+      keyed by file path, size and mtime.
+      On the next init, these are memory-mapped from there and not read from the HDF file again.
+    :param bool use_mmap: only without cache (cache_byte_size=0).
+      For uncompressed contiguous data in the HDF file, we memory-map the file,
+      and get_data returns read-only views into it, without going through h5py.
+      Other data (chunked, compressed) is still read via h5py.
     """
     super(HDFDataset, self).__init__(**kwargs)
     assert self.partition_epoch == 1 or self.cache_byte_size_total_limit == 0, (
       "To use partition_epoch in HDFDatasets, disable caching by setting cache_byte_size=0")
     self._use_cache_manager = use_cache_manager
+    self._index_cache_dir = index_cache_dir
+    self._use_mmap = use_mmap
     self.files = []  # type: typing.List[str]  # file names
     self.h5_files = []  # type: typing.List[h5py.File]
     # We cache the h5py.Dataset objects that are created each time when accessing a h5py.File, e.g. via fin['inputs'],
     # as this access seems to have a significant overhead. Speeds up going through a HDFDataset by up to factor 3
     # (tested with h5py 3.1.0).
     self.cached_h5_datasets = []  # type: typing.List[typing.Dict[str,h5py.Dataset]]
+    # Per file, HDF dataset name -> memory-mapped array, or None if not possible. See _get_mmap_array.
+    self._mmap_arrays = []  # type: typing.List[typing.Dict[str,typing.Optional[numpy.ndarray]]]
     self.file_start = [0]
     self.file_seq_start = []  # type: typing.List[numpy.ndarray]
+    # Per file: (tags sorted, real file seq idx for sorted tags), or None. See _get_file_sorted_tags.
+    self._file_sorted_tags = []  # type: typing.List[typing.Optional[typing.Tuple[numpy.ndarray,numpy.ndarray]]]
     self.data_dtype = {}  # type: typing.Dict[str,str]
     self.data_sparse = {}  # type: typing.Dict[str,bool]
     self._num_codesteps = None  # type: typing.Optional[typing.List[int]]  # accumulated sequence length per target
@@ -61,7 +75,9 @@ class HDFDataset(CachedDataset):
       except Exception:  # e.g. at shutdown. but does not matter
         pass
     del self.h5_files[:]
+    del self._mmap_arrays[:]
     del self.file_seq_start[:]
+    del self._file_sorted_tags[:]
 
   @staticmethod
   def _decode(s):
@@ -102,6 +118,7 @@ class HDFDataset(CachedDataset):
     self.files.append(filename)
     self.h5_files.append(fin)
     self.cached_h5_datasets.append({})
+    self._mmap_arrays.append({})
     print("parsing file", filename, file=log.v5)
     if 'times' in fin:
       if self.timestamps is None:
@@ -118,12 +135,24 @@ class HDFDataset(CachedDataset):
     else:
       self.target_keys = ['classes']
 
-    seq_lengths = fin[attr_seqLengths][...]  # shape (num_seqs,num_target_keys + 1)
     num_input_keys = 1 if 'inputs' in fin else 0
-    if len(seq_lengths.shape) == 1:
-      seq_lengths = numpy.array(
-        zip(*[seq_lengths.tolist() for _ in range(num_input_keys + len(self.target_keys))]))
-    assert seq_lengths.ndim == 2 and seq_lengths.shape[1] == num_input_keys + len(self.target_keys)
+    index = self._load_index_cache(filename) if self._index_cache_dir else None
+    if index:
+      seq_start, sorted_tags = index
+    else:
+      seq_lengths = fin[attr_seqLengths][...]  # shape (num_seqs,num_target_keys + 1)
+      if len(seq_lengths.shape) == 1:
+        seq_lengths = numpy.array(
+          zip(*[seq_lengths.tolist() for _ in range(num_input_keys + len(self.target_keys))]))
+      seq_start = numpy.zeros((seq_lengths.shape[0] + 1, seq_lengths.shape[1]), dtype="int64")
+      numpy.cumsum(seq_lengths, axis=0, dtype="int64", out=seq_start[1:])
+      # May be large, so better delete them early, we don't need them anymore.
+      del seq_lengths
+      sorted_tags = None
+      if self._index_cache_dir:
+        sorted_tags = self._get_sorted_tags_from_file(fin)
+        self._save_index_cache(filename, seq_start=seq_start, sorted_tags=sorted_tags)
+    assert seq_start.ndim == 2 and seq_start.shape[1] == num_input_keys + len(self.target_keys)
 
     if prev_target_keys is not None and prev_target_keys != self.target_keys:
       print("Warning: %s: loaded prev files %s, which defined target keys %s. Now loaded %s and got target keys %s." % (
@@ -133,26 +162,22 @@ class HDFDataset(CachedDataset):
       # were a subset (so the order in which you load the files matters).
       assert all([key in self.target_keys for key in prev_target_keys])  # check if subset
       # Filter out the relevant seq lengths
-      seq_lengths = seq_lengths[:, [0] + [self.target_keys.index(key) + 1 for key in prev_target_keys]]
-      assert seq_lengths.shape[1] == len(prev_target_keys) + 1
+      seq_start = seq_start[:, [0] + [self.target_keys.index(key) + 1 for key in prev_target_keys]]
+      assert seq_start.shape[1] == len(prev_target_keys) + 1
       self.target_keys = prev_target_keys
 
-    seq_start = numpy.zeros((seq_lengths.shape[0] + 1, seq_lengths.shape[1]), dtype="int64")
-    numpy.cumsum(seq_lengths, axis=0, dtype="int64", out=seq_start[1:])
-
-    self._num_timesteps += numpy.sum(seq_lengths[:, 0])
+    # The last entry of seq_start is the sum of all seq lengths.
+    self._num_timesteps += seq_start[-1, 0]
     if self._num_codesteps is None:
-      self._num_codesteps = [0 for _ in range(num_input_keys, len(seq_lengths[0]))]
-    for i in range(num_input_keys, len(seq_lengths[0])):
-      self._num_codesteps[i - 1] += numpy.sum(seq_lengths[:, i])
+      self._num_codesteps = [0 for _ in range(num_input_keys, seq_start.shape[1])]
+    for i in range(num_input_keys, seq_start.shape[1]):
+      self._num_codesteps[i - 1] += seq_start[-1, i]
 
     if not self._seq_start:
-      self._seq_start = [numpy.zeros((seq_lengths.shape[1],), 'int64')]
-
-    # May be large, so better delete them early, we don't need them anymore.
-    del seq_lengths
+      self._seq_start = [numpy.zeros((seq_start.shape[1],), 'int64')]
 
     self.file_seq_start.append(seq_start)
+    self._file_sorted_tags.append(sorted_tags)
     nseqs = len(seq_start) - 1
     self._num_seqs += nseqs
     self.file_start.append(self.file_start[-1] + nseqs)
@@ -207,6 +232,13 @@ class HDFDataset(CachedDataset):
       self.data_dtype["data"] = str(fin['inputs'].dtype)
     assert num_input_keys + len(self.target_keys) == len(self.file_seq_start[0][0])
 
+  def can_load_seq_ranges_sparsely(self):
+    """
+    :rtype: bool
+    """
+    # Without the cache, _load_seqs does not load anything, the seqs are read on demand.
+    return self.cache_byte_size_total_limit == 0
+
   def _load_seqs(self, start, end):
     """
     Load data sequences.
@@ -286,6 +318,8 @@ class HDFDataset(CachedDataset):
         self.cached_h5_datasets[file_idx]["inputs"] = fin["inputs"]  # cached for efficiency, see comment in __init__()
 
       inputs = self.cached_h5_datasets[file_idx]["inputs"]
+      if self._use_mmap:
+        inputs = self._get_mmap_array(file_idx, "inputs", inputs)
       data = inputs[start_pos[0]:end_pos[0]]
       if self.window > 1:
         data = self._sliding_window(data)
@@ -296,12 +330,39 @@ class HDFDataset(CachedDataset):
         self.cached_h5_datasets[file_idx][key] = fin["targets/data/" + key]  # see comment in __init__()
 
       targets = self.cached_h5_datasets[file_idx][key]
+      if self._use_mmap:
+        targets = self._get_mmap_array(file_idx, "targets/data/" + key, targets)
       first_target_idx = 1 if self.num_inputs > 0 else 0  # self.num_inputs == 0 if no 'inputs' in HDF file
       ldx = first_target_idx + self.target_keys.index(key)
       data = targets[start_pos[ldx]:end_pos[ldx]]
 
     return data
 
+  def _get_mmap_array(self, file_idx, name, h5_dataset):
+    """
+    :param int file_idx:
+    :param str name: HDF dataset name
+    :param h5py.Dataset h5_dataset:
+    :return: memory-mapped array of the whole HDF dataset if it is stored contiguously, otherwise h5_dataset
+    :rtype: numpy.ndarray|h5py.Dataset
+    """
+    # Only used when we read directly from the file. The cache (CachedDataset) has its own loading.
+    assert self.cache_byte_size_total_limit == 0
+    mmap_arrays = self._mmap_arrays[file_idx]
+    if name not in mmap_arrays:
+      mmap_arrays[name] = None
+      # Filters (compression etc) are only possible with chunked layout, so chunks=None means plain contiguous data.
+      offset = h5_dataset.id.get_offset() if h5_dataset.chunks is None else None
+      if offset is not None and h5_dataset.dtype.kind in "biuf" and h5_dataset.size > 0:
+        mmap_arrays[name] = numpy.memmap(
+          self.files[file_idx], mode="r", dtype=h5_dataset.dtype, offset=offset, shape=h5_dataset.shape)
+      else:
+        print("%s: cannot memory-map %r in %s (chunks %r), using h5py" % (
+          self, name, self.files[file_idx], h5_dataset.chunks), file=log.v4)
+    if mmap_arrays[name] is None:
+      return h5_dataset
+    return mmap_arrays[name]
+
   def get_input_data(self, sorted_seq_idx):
     """
     :param int sorted_seq_idx:
@@ -344,6 +405,14 @@ class HDFDataset(CachedDataset):
 
     return end_pos - start_pos
 
+  def _get_all_seq_lengths_by_real_idx(self):
+    """
+    :rtype: numpy.ndarray|None
+    """
+    if not self.file_seq_start:
+      return None
+    return numpy.concatenate([numpy.diff(seq_start, axis=0) for seq_start in self.file_seq_start], axis=0)
+
   def _get_tag_by_real_idx(self, real_seq_idx):
     file_idx = self._get_file_index(real_seq_idx)
     real_file_seq_idx = real_seq_idx - self.file_start[file_idx]
@@ -363,6 +432,110 @@ class HDFDataset(CachedDataset):
     ids = self._seq_index[self._index_map[sorted_seq_idx]]
     return self._get_tag_by_real_idx(ids)
 
+  @classmethod
+  def _get_sorted_tags_from_file(cls, fin):
+    """
+    :param h5py.File fin:
+    :return: (tags sorted, real file seq idx for the sorted tags)
+    :rtype: (numpy.ndarray,numpy.ndarray)
+    """
+    if "seqTags" not in fin:
+      return numpy.zeros((0,), dtype="S1"), numpy.zeros((0,), dtype="int64")
+    tags = numpy.array([cls._decode(tag).encode("utf8") for tag in fin["seqTags"][...].tolist()], dtype="S")
+    tags_idx = numpy.argsort(tags, kind="mergesort")  # stable, such that the last of equal tags is the last one
+    return tags[tags_idx], tags_idx.astype("int64")
+
+  def _get_file_sorted_tags(self, file_idx):
+    """
+    :param int file_idx:
+    :return: (tags sorted, real file seq idx for the sorted tags)
+    :rtype: (numpy.ndarray,numpy.ndarray)
+    """
+    if self._file_sorted_tags[file_idx] is None:
+      self._file_sorted_tags[file_idx] = self._get_sorted_tags_from_file(self.h5_files[file_idx])
+    return self._file_sorted_tags[file_idx]
+
+  def _get_real_idxs_by_tags(self, tags):
+    """
+    Binary search in the sorted tags of every file.
+    Like the generic implementation, if a tag occurs multiple times, the last seq wins.
+
+    :param list[str] tags:
+    :rtype: list[int]
+    """
+    if not tags:
+      return []
+    queries = numpy.array([tag.encode("utf8") for tag in tags], dtype="S")
+    real_idxs = numpy.full((len(tags),), -1, dtype="int64")
+    for file_idx in reversed(range(len(self.files))):
+      sorted_tags, sorted_tags_idx = self._get_file_sorted_tags(file_idx)
+      missing = numpy.flatnonzero(real_idxs < 0)
+      if len(missing) == 0:
+        break
+      if len(sorted_tags) == 0:
+        continue
+      pos = numpy.searchsorted(sorted_tags, queries[missing], side="right") - 1
+      found = (pos >= 0) & (sorted_tags[numpy.maximum(pos, 0)] == queries[missing])
+      real_idxs[missing[found]] = sorted_tags_idx[pos[found]] + self.file_start[file_idx]
+    if numpy.any(real_idxs < 0):
+      raise KeyError(tags[int(numpy.flatnonzero(real_idxs < 0)[0])])
+    return real_idxs.tolist()
+
+  def _get_index_cache_path(self, filename):
+    """
+    :param str filename: HDF file
+    :return: path in index_cache_dir, which depends on the file path, size and mtime
+    :rtype: str
+    """
+    import hashlib
+    filename = os.path.abspath(filename)
+    stat = os.stat(filename)
+    key = "%s:%i:%r" % (filename, stat.st_size, stat.st_mtime)
+    return os.path.join(
+      self._index_cache_dir, "%s.%s" % (os.path.basename(filename), hashlib.sha1(key.encode("utf8")).hexdigest()))
+
+  def _load_index_cache(self, filename):
+    """
+    :param str filename: HDF file
+    :return: (seq_start, sorted_tags), memory-mapped, or None if there is no index cache for this file
+    :rtype: (numpy.ndarray,(numpy.ndarray,numpy.ndarray))|None
+    """
+    path = self._get_index_cache_path(filename)
+    if not os.path.isdir(path):
+      return None
+    print("%s: using index cache %s" % (self, path), file=log.v5)
+    seq_start = numpy.load(os.path.join(path, "seq_start.npy"), mmap_mode="r")
+    tags = numpy.load(os.path.join(path, "tags.npy"), mmap_mode="r")
+    tags_idx = numpy.load(os.path.join(path, "tags_idx.npy"), mmap_mode="r")
+    return seq_start, (tags, tags_idx)
+
+  def _save_index_cache(self, filename, seq_start, sorted_tags):
+    """
+    :param str filename: HDF file
+    :param numpy.ndarray seq_start:
+    :param (numpy.ndarray,numpy.ndarray) sorted_tags:
+    """
+    import tempfile
+    import shutil
+    path = self._get_index_cache_path(filename)
+    if not os.path.isdir(self._index_cache_dir):
+      try:
+        os.makedirs(self._index_cache_dir)  # no exist_ok, for Python 2
+      except OSError:  # e.g. created concurrently by another process
+        if not os.path.isdir(self._index_cache_dir):
+          raise
+    # Write to a temp dir and rename it, such that concurrent readers only see complete index caches.
+    tmp_path = tempfile.mkdtemp(dir=self._index_cache_dir, prefix=".tmp-")
+    numpy.save(os.path.join(tmp_path, "seq_start.npy"), seq_start)
+    numpy.save(os.path.join(tmp_path, "tags.npy"), sorted_tags[0])
+    numpy.save(os.path.join(tmp_path, "tags_idx.npy"), sorted_tags[1])
+    try:
+      os.rename(tmp_path, path)
+    except OSError:  # e.g. some other process was faster
+      shutil.rmtree(tmp_path, ignore_errors=True)
+    else:
+      print("%s: stored index cache %s" % (self, path), file=log.v4)
+
   def get_all_tags(self):
     """
     :rtype: list[str]
@@ -661,7 +834,8 @@ class NextGenHDFDataset(CachedDataset2):
       self.seq_order = [self.seq_name_to_idx[s] for s in seq_list]
     else:
       epoch = epoch or 1
-      self.seq_order = self.get_seq_order_for_epoch(epoch, len(self.all_seq_names), self._get_seq_length)
+      self.seq_order = self.get_seq_order_for_epoch(
+        epoch, len(self.all_seq_names), self._get_seq_length, seq_lens_cache_key=self.input_stream_name)
 
   def _get_seq_length(self, orig_seq_idx):
     """
@@ -845,7 +1019,8 @@ class SiameseHDFDataset(CachedDataset2):
       self.seq_order = [self.seq_name_to_idx[s] for s in seq_list]
     else:
       epoch = epoch or 1
-      self.seq_order = self.get_seq_order_for_epoch(epoch, len(self.all_seq_names), self._get_seq_length)
+      self.seq_order = self.get_seq_order_for_epoch(
+        epoch, len(self.all_seq_names), self._get_seq_length, seq_lens_cache_key=self.input_stream_name)
 
     # init random seed for siamese triplet sampling
     numpy.random.seed()
@@ -971,15 +1146,21 @@ class SiameseHDFDataset(CachedDataset2):
     return 1  # unknown
 
 
-class SimpleHDFWriter:
+class SimpleHDFWriter(object):
   """
   Intended for a simple interface, to dump data on-the-fly into a HDF file,
   which can be read later by :class:`HDFDataset`.
 
   Note that we dump to a temp file first, and only at :func:`close` we move it over to the real destination.
+
+  The inserted seqs are buffered in memory, and written in bulk (see :func:`flush`).
+  The HDF datasets grow geometrically, and are truncated to the exact size in :func:`close`.
   """
 
-  def __init__(self, filename, dim, labels=None, ndim=None, extra_type=None, swmr=False, extend_existing_file=False):
+  GrowthFactor = 2
+
+  def __init__(self, filename, dim, labels=None, ndim=None, extra_type=None, swmr=False, extend_existing_file=False,
+               buffer_size=32 * 1024 * 1024):
     """
     :param str filename: Create file, truncate if exists
     :param int|None dim:
@@ -988,6 +1169,7 @@ class SimpleHDFWriter:
     :param dict[str,(int,int,str)]|None extra_type: key -> (dim,ndim,dtype)
     :param bool swmr: see https://docs.h5py.org/en/stable/swmr.html
     :param bool extend_existing_file: True also means we expect that it exists
+    :param int buffer_size: in bytes. we write to the file when the buffered data exceeds this. 0 means no buffering
     """
     from returnn.util.basic import hdf5_strings, unicode
     import tempfile
@@ -1047,11 +1229,22 @@ class SimpleHDFWriter:
       dt = h5py.special_dtype(vlen=unicode)
       self._seq_tags = self._file.create_dataset('seqTags', (0,), dtype=dt, maxshape=(None,))
 
+    # Logical sizes, including the buffered seqs. The HDF datasets might be bigger (see _write_at).
+    self._num_seqs = int(self._file.attrs['numSeqs'])
+    self._num_timesteps = int(self._file.attrs['numTimesteps'])
     self._extra_num_time_steps = {}  # type: typing.Dict[str,int]  # key -> num-steps
+    self._written_num_seqs = self._num_seqs
+    self._written_num_time_steps = {"inputs": self._num_timesteps}  # type: typing.Dict[str,int]  # incl. extra
     self._prepared_extra = set()
     if extra_type:
       self._prepare_extra(extra_type)
 
+    self.buffer_size = buffer_size
+    self._buffer_num_bytes = 0
+    self._buffer_seq_tags = []  # type: typing.List[typing.Union[str,bytes]]
+    self._buffer_seq_lens = []  # type: typing.List[typing.Dict[str,int]]  # per seq, "inputs" or extra key -> len
+    self._buffer_data = {}  # type: typing.Dict[str,typing.List[numpy.ndarray]]  # "inputs" or extra key -> data
+
     if swmr:
       assert not self._file.swmr_mode  # this also checks whether the attribute exists (right version)
       self._file.swmr_mode = True
@@ -1098,6 +1291,7 @@ class SimpleHDFWriter:
           data_key, shape=[d if d else 0 for d in shape], dtype=dtype, maxshape=shape)
         self._file['targets/size'].attrs[data_key] = [dim or 1, ndim]
         self._extra_num_time_steps[data_key] = 0
+      self._written_num_time_steps[data_key] = self._extra_num_time_steps[data_key]
       self._prepared_extra.add(data_key)
       added_count += 1
     if added_count and not self.extend_existing_file:
@@ -1105,28 +1299,20 @@ class SimpleHDFWriter:
       self._seq_lengths.resize(1 + len(self._prepared_extra), axis=1)
     return bool(added_count)
 
-  def _insert_h5_inputs(self, raw_data):
+  def _insert_h5_inputs(self, raw_data, seq_tag):
     """
-    Inserts a record into the hdf5-file.
-    Resizes if necessary.
+    Adds a new seq to the buffer.
 
     :param numpy.ndarray raw_data: shape=(time,data) or shape=(time,)
+    :param str|bytes seq_tag:
     """
     assert raw_data.ndim >= 1
-    name = "inputs"
-    if self.extend_existing_file:
-      # Just expect that the same dataset already exists.
-      self._datasets[name] = self._file[name]
-    if name not in self._datasets:
-      self._datasets[name] = self._file.create_dataset(
-        name, raw_data.shape, raw_data.dtype, maxshape=tuple(None for _ in raw_data.shape))
-    else:
-      old_shape = self._datasets[name].shape
-      self._datasets[name].resize(old_shape[0] + raw_data.shape[0], axis=0)
-    # append raw data to dataset
-    self._datasets[name][self._file.attrs['numTimesteps']:] = raw_data
-    self._file.attrs['numTimesteps'] += raw_data.shape[0]
-    self._file.attrs['numSeqs'] += 1
+    self._buffer_seq_tags.append(seq_tag)
+    self._buffer_seq_lens.append({"inputs": raw_data.shape[0]})
+    self._buffer_data.setdefault("inputs", []).append(numpy.array(raw_data))  # copy, the caller might reuse it
+    self._buffer_num_bytes += raw_data.nbytes
+    self._num_timesteps += raw_data.shape[0]
+    self._num_seqs += 1
 
   def _insert_h5_other(self, data_key, raw_data, dtype=None, add_time_dim=False, dim=None):
     """
@@ -1152,10 +1338,10 @@ class SimpleHDFWriter:
         dim = 1  # dummy
 
     # We assume that _insert_h5_inputs was called before.
-    assert self._file.attrs['numSeqs'] > 0 and self._seq_lengths.shape[0] > 0
-    seq_idx = self._file.attrs['numSeqs'] - 1
+    assert self._num_seqs > 0 and self._buffer_seq_lens
+    seq_idx = self._num_seqs - 1
 
-    if raw_data.dtype == numpy.object:
+    if raw_data.dtype == numpy.object_:
       # Is this a string?
       assert isinstance(raw_data.flat[0], (str, bytes))
       dtype = "string"
@@ -1163,20 +1349,13 @@ class SimpleHDFWriter:
       dtype = raw_data.dtype.name
     if self._prepare_extra({data_key: (dim, raw_data.ndim, dtype)}):
       # We added it now. Maybe other extra data keys were added before. The data_key_idx is different now.
-      # Thus, seq_lengths might have become invalid. Reinit them.
+      # The seq lengths are only written in flush(), by data key, so they stay valid.
       assert seq_idx == 0 or self.extend_existing_file  # We can only do that in the beginning.
-      for data_key_idx_0, data_key_ in enumerate(sorted(self._prepared_extra)):
-        self._seq_lengths[seq_idx, data_key_idx_0 + 1] = self._extra_num_time_steps[data_key_]
 
     self._extra_num_time_steps[data_key] += raw_data.shape[0]
-    self._datasets[data_key].resize(self._extra_num_time_steps[data_key], axis=0)
-
-    data_key_idx = sorted(self._prepared_extra).index(data_key) + 1
-    self._seq_lengths[seq_idx, data_key_idx] = raw_data.shape[0]
-
-    offset = self._extra_num_time_steps[data_key] - raw_data.shape[0]
-    hdf_data = self._datasets[data_key]
-    hdf_data[offset:] = raw_data
+    self._buffer_seq_lens[-1][data_key] = raw_data.shape[0]
+    self._buffer_data.setdefault(data_key, []).append(numpy.array(raw_data))  # copy, the caller might reuse it
+    self._buffer_num_bytes += raw_data.nbytes
 
   def insert_batch(self, inputs, seq_len, seq_tag, extra=None):
     """
@@ -1211,12 +1390,7 @@ class SimpleHDFWriter:
       assert all([n_batch == value.shape[0] for value in extra.values()]), (
         "n_batch %i, extra shapes: %r" % (n_batch, {key: value.shape for (key, value) in extra.items()}))
 
-    seqlen_offset = self._seq_lengths.shape[0]
-    self._seq_lengths.resize(seqlen_offset + n_batch, axis=0)
-    self._seq_tags.resize(seqlen_offset + n_batch, axis=0)
-
     for i in range(n_batch):
-      self._seq_tags[seqlen_offset + i] = numpy.array(seq_tag[i], dtype=self._seq_tags.dtype)
       # Note: Currently, our HDFDataset does not support to have multiple axes with dynamic length.
       # Thus, we flatten all together, and calculate the flattened seq len.
       # (Ignore this if there is only a single time dimension.)
@@ -1225,11 +1399,10 @@ class SimpleHDFWriter:
       flat_shape = [flat_seq_len]
       if self.dim and not sparse:
         flat_shape.append(self.dim)
-      self._seq_lengths[seqlen_offset + i, 0] = flat_seq_len
       data = inputs[i]
       data = data[tuple([slice(None, seq_len[axis][i]) for axis in range(ndim_with_seq_len)])]
       data = numpy.reshape(data, flat_shape)
-      self._insert_h5_inputs(data)
+      self._insert_h5_inputs(data, seq_tag=seq_tag[i])
       if len(seq_len) > 1:
         # Note: Because we have flattened multiple axes with dynamic len into a single one,
         # we want to store the individual axes lengths. We store those in a separate data entry "sizes".
@@ -1249,6 +1422,80 @@ class SimpleHDFWriter:
             file=log.v3)
           raise
 
+    if self._buffer_num_bytes >= self.buffer_size:
+      self._flush_buffer()
+
+  def _write_at(self, name, offset, data):
+    """
+    Writes data into the HDF dataset at offset, and grows it geometrically if needed.
+
+    :param str name: "inputs", "seqLengths", "seqTags" or extra data key
+    :param int offset:
+    :param numpy.ndarray data:
+    """
+    end = offset + data.shape[0]
+    if name in {"seqLengths", "seqTags"}:
+      hdf_data = self._seq_lengths if name == "seqLengths" else self._seq_tags
+    elif name == "inputs" and name not in self._datasets:
+      if self.extend_existing_file:
+        # Just expect that the same dataset already exists.
+        self._datasets[name] = self._file[name]
+      else:
+        self._datasets[name] = self._file.create_dataset(
+          name, data.shape, data.dtype, maxshape=tuple(None for _ in data.shape))
+      hdf_data = self._datasets[name]
+    else:
+      hdf_data = self._datasets[name]
+    if hdf_data.shape[0] < end:
+      hdf_data.resize(max(end, hdf_data.shape[0] * self.GrowthFactor), axis=0)
+    hdf_data[offset:end] = data
+
+  def flush(self):
+    """
+    Writes all the buffered seqs to the HDF file.
+    In SWMR mode, also flushes the HDF file, such that readers see the seqs.
+    """
+    self._flush_buffer()
+    if self._file.swmr_mode:
+      self._file.flush()
+
+  def _flush_buffer(self):
+    if not self._buffer_seq_tags:
+      return
+    num_seqs = len(self._buffer_seq_tags)
+    seq_lengths = numpy.zeros((num_seqs, self._seq_lengths.shape[1]), dtype=self._seq_lengths.dtype)
+    data_key_idxs = {"inputs": 0}
+    for data_key_idx_0, data_key in enumerate(sorted(self._prepared_extra)):
+      data_key_idxs[data_key] = data_key_idx_0 + 1
+    for i, lens in enumerate(self._buffer_seq_lens):
+      for data_key, seq_len in lens.items():
+        seq_lengths[i, data_key_idxs[data_key]] = seq_len
+    self._write_at("seqLengths", self._written_num_seqs, seq_lengths)
+    self._write_at("seqTags", self._written_num_seqs, numpy.array(self._buffer_seq_tags, dtype=self._seq_tags.dtype))
+    for name, data_list in sorted(self._buffer_data.items()):
+      data = numpy.concatenate(data_list, axis=0)
+      self._write_at(name, self._written_num_time_steps[name], data)
+      self._written_num_time_steps[name] += data.shape[0]
+    self._written_num_seqs += num_seqs
+    self._file.attrs['numTimesteps'] = self._num_timesteps
+    self._file.attrs['numSeqs'] = self._num_seqs
+    self._buffer_seq_tags = []
+    self._buffer_seq_lens = []
+    self._buffer_data = {}
+    self._buffer_num_bytes = 0
+
+  def _truncate(self):
+    """
+    Resizes all the HDF datasets to the exact size.
+    """
+    for hdf_data, size in [(self._seq_lengths, self._num_seqs), (self._seq_tags, self._num_seqs)]:
+      if hdf_data.shape[0] != size:
+        hdf_data.resize(size, axis=0)
+    for name, hdf_data in self._datasets.items():
+      size = self._num_timesteps if name == "inputs" else self._extra_num_time_steps[name]
+      if hdf_data.shape[0] != size:
+        hdf_data.resize(size, axis=0)
+
   def close(self):
     """
     Closes the file.
@@ -1256,6 +1503,8 @@ class SimpleHDFWriter:
     import os
     import shutil
     if self._file:
+      self.flush()
+      self._truncate()
       self._file.close()
       self._file = None
     if self.tmp_filename:
@@ -1269,6 +1518,131 @@ class SimpleHDFWriter:
       self.tmp_filename = None
 
 
+class AsyncSimpleHDFWriter(SimpleHDFWriter):
+  """
+  Like :class:`SimpleHDFWriter`, but :func:`insert_batch` only puts the data into a bounded queue,
+  and a background thread does the actual writing to the HDF file.
+  This is useful when the caller is e.g. the step loop of the forward pass,
+  such that the computation does not need to wait for the HDF writes.
+
+  Any exception in the writer thread is raised again in the next call of :func:`insert_batch`,
+  :func:`flush` or :func:`close`.
+  :func:`close` waits until all queued batches are written.
+  """
+
+  def __init__(self, filename, dim, max_queue_size=10, **kwargs):
+    """
+    :param str filename:
+    :param int|None dim:
+    :param int max_queue_size: max number of queued batches. if the queue is full, :func:`insert_batch` blocks
+    :param kwargs: passed to :class:`SimpleHDFWriter`
+    """
+    from threading import Thread
+    try:
+      # noinspection PyCompatibility
+      from Queue import Queue
+    except ImportError:
+      # noinspection PyCompatibility
+      from queue import Queue
+    super(AsyncSimpleHDFWriter, self).__init__(filename=filename, dim=dim, **kwargs)
+    assert max_queue_size > 0
+    self._queue = Queue(maxsize=max_queue_size)
+    self._exc_info = None  # type: typing.Optional[typing.Tuple[typing.Type[BaseException],BaseException,typing.Any]]
+    self._thread = Thread(target=self._thread_main, name="%s %r" % (self.__class__.__name__, filename))
+    self._thread.daemon = True  # e.g. when the main thread exits due to some error without calling close()
+    self._thread.start()
+
+  def _thread_main(self):
+    import sys
+    while True:
+      item = self._queue.get()
+      try:
+        if item is None:  # close
+          return
+        if self._exc_info:  # just skip everything after an error
+          continue
+        func, kwargs = item
+        func(**kwargs)
+      except Exception:
+        self._exc_info = sys.exc_info()
+        print("%s: exception in writer thread:" % self, file=log.v1)
+        sys.excepthook(*self._exc_info)
+      finally:
+        self._queue.task_done()
+
+  def _check_exception(self):
+    """
+    Raises the exception from the writer thread, if there was one.
+    """
+    if self._exc_info:
+      raise self._exc_info[1]
+
+  def _put(self, item):
+    """
+    :param ((**kwargs)->None,dict[str])|None item:
+    """
+    try:
+      # noinspection PyCompatibility
+      from Queue import Full
+    except ImportError:
+      # noinspection PyCompatibility
+      from queue import Full
+    while True:
+      self._check_exception()
+      assert self._thread.is_alive()
+      try:
+        self._queue.put(item, timeout=1.)
+        return
+      except Full:
+        continue
+
+  def insert_batch(self, inputs, seq_len, seq_tag, extra=None):
+    """
+    See :func:`SimpleHDFWriter.insert_batch`.
+    We copy the data, as the caller might reuse the arrays (e.g. when called via ``tf.py_func``).
+
+    :param numpy.ndarray inputs: shape=(n_batch,time,data) (or (n_batch,time), or (n_batch,time1,time2), ...)
+    :param list[int]|dict[int,list[int]|numpy.ndarray] seq_len: sequence lengths (per axis, excluding batch axis)
+    :param list[str|bytes] seq_tag: sequence tags of length n_batch
+    :param dict[str,numpy.ndarray]|None extra:
+    """
+    if isinstance(seq_len, dict):
+      seq_len = {key: numpy.array(value) for (key, value) in seq_len.items()}
+    else:
+      seq_len = numpy.array(seq_len)
+    if extra:
+      extra = {key: numpy.array(value) for (key, value) in extra.items()}
+    self._put((super(AsyncSimpleHDFWriter, self).insert_batch, dict(
+      inputs=numpy.array(inputs), seq_len=seq_len, seq_tag=list(seq_tag), extra=extra)))
+
+  def flush(self):
+    """
+    Waits until all queued batches are written, and then writes all the buffered seqs to the HDF file.
+    """
+    if self._thread.is_alive():
+      self._queue.join()
+    self._check_exception()
+    super(AsyncSimpleHDFWriter, self).flush()
+
+  def close(self):
+    """
+    Waits until all queued batches are written, and closes the file.
+    """
+    if self._thread.is_alive():
+      self._queue.put(None)
+      self._thread.join()
+    if self._exc_info:
+      # Do not move the incomplete file to the destination.
+      if self._file:
+        self._file.close()
+        self._file = None
+      if self.tmp_filename:
+        os.remove(self.tmp_filename)
+        self.tmp_filename = None
+      self._check_exception()
+    super(AsyncSimpleHDFWriter, self).close()
+
+
 class HDFDatasetWriter:
   """
   Similar as :class:`SimpleHDFWriter`, but is mostly intended to copy an existing dataset,
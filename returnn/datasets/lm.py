@@ -267,7 +267,7 @@ class LmDataset(CachedDataset2):
       self.seq_order = [int(s[len(self._tag_prefix):]) for s in seq_list]
     else:
       self.seq_order = self.get_seq_order_for_epoch(
-        epoch=epoch, num_seqs=len(self.orths), get_seq_len=lambda i: len(self.orths[i]))
+        epoch=epoch, num_seqs=len(self.orths), get_seq_len=lambda i: len(self.orths[i]), seq_lens_cache_key="orths")
     self.next_orth_idx = 0
     self.next_seq_idx = 0
     self.num_skipped = 0
@@ -1398,7 +1398,8 @@ class TranslationDataset(CachedDataset2):
       num_seqs = self._get_data_len()
       self._seq_order = self.get_seq_order_for_epoch(
         epoch=epoch, num_seqs=num_seqs,
-        get_seq_len=lambda i: len(self._get_data(key=self.main_source_data_key, line_nr=i)))
+        get_seq_len=lambda i: len(self._get_data(key=self.main_source_data_key, line_nr=i)),
+        seq_lens_cache_key=self.main_source_data_key)
     self._num_seqs = len(self._seq_order)
     return True
 
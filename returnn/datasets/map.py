@@ -73,6 +73,10 @@ class MapDatasetWrapper(CachedDataset2):
   """
   Takes a MapDataset and turns it into a returnn.datasets.Dataset by providing the required class methods.
   """
+
+  # MapDatasetBase.__getitem__ allows arbitrary order, but it is not necessarily thread-safe.
+  # Thus no parallel prefetching by default. A subclass can opt in via _collect_single_seq_is_parallel_safe.
+
   def __init__(self, map_dataset, **kwargs):
     """
     :param MapDatasetBase map_dataset: the MapDataset to be wrapped
@@ -15,6 +15,11 @@ try:
 except ImportError:
   import _thread as thread
 from threading import Condition, currentThread, Thread
+from collections import deque
+try:
+  from Queue import Queue, Full
+except ImportError:
+  from queue import Queue, Full
 import time
 import numpy
 import typing
@@ -613,16 +618,31 @@ class ExternSprintDataset(SprintDatasetBase):
   This class is like SprintDatasetBase, except that we will start an external Sprint instance ourselves
   which will forward the data to us over a pipe.
   The Sprint subprocess will use SprintExternInterface to communicate with us.
+
+  With ``num_workers > 1``, we start multiple Sprint instances per epoch,
+  each on a disjoint part of the corpus (via the Sprint corpus partitioning, or via the predefined seq list),
+  and each with its own pipe and reader thread.
+  Their seqs are merged in a fixed round-robin order over the workers, i.e. this is deterministic.
+
+  With ``shm_ring_buffer_size``, each Sprint child writes the numpy arrays into a shared memory ring buffer
+  (:class:`returnn.util.task_system.ShmRingBuffer`), and the pipe only transfers the references to them.
+  We use the arrays in the buffer directly (zero-copy),
+  i.e. they are only valid until the seq is removed from the seq cache (see :func:`_cleanup_old_seq_cache`).
+  If the buffer is full, the child falls back to sending the data over the pipe.
   """
 
   # Do not change the argument names here, to not break existing configs.
   # noinspection PyPep8Naming
-  def __init__(self, sprintTrainerExecPath, sprintConfigStr, partitionEpoch=None, **kwargs):
+  def __init__(self, sprintTrainerExecPath, sprintConfigStr, partitionEpoch=None, num_workers=1,
+               shm_ring_buffer_size=None, **kwargs):
     """
     :param str|list[str] sprintTrainerExecPath:
     :param str | list[str] | ()->str | list[()->str] | ()->list[str] | ()->list[()->str] sprintConfigStr:
       via eval_shell_str
     :param int|None partitionEpoch: deprecated. use partition_epoch instead
+    :param int num_workers: number of Sprint subprocesses per epoch, each on a disjoint part of the corpus
+    :param int|None shm_ring_buffer_size: in bytes, per worker. if set, transfer the data via shared memory.
+      It should be big enough for all the seqs in the seq cache (see SprintCachedSeqsMax)
     """
     super(ExternSprintDataset, self).__init__(**kwargs)
     self.add_data_thread_id = None
@@ -631,11 +651,23 @@ class ExternSprintDataset(SprintDatasetBase):
     if partitionEpoch:
       assert self.partition_epoch == 1, "don't provide partitionEpoch and partition_epoch"
       self.partition_epoch = partitionEpoch
+    assert num_workers >= 1
+    self.num_workers = num_workers
     self._num_seqs = None
-    self.child_pid = None  # type: typing.Optional[int]
+    # All of these are per worker (child proc). We always use the same num of workers per epoch.
+    self.child_pids = []  # type: typing.List[typing.Optional[int]]  # None if the child is joined
+    self.pipes_c2p = []  # type: typing.List[typing.Tuple[typing.BinaryIO,typing.BinaryIO]]  # (read, write)
+    self.pipes_p2c = []  # type: typing.List[typing.Tuple[typing.BinaryIO,typing.BinaryIO]]  # (read, write)
+    self.seq_list_files = []  # type: typing.List[str]
+    self.worker_reader_threads = []  # type: typing.List[Thread]  # only with num_workers > 1
+    self.worker_queues = []  # type: typing.List[Queue]  # only with num_workers > 1
+    self.worker_readers_stop = False
+    self.shm_ring_buffer_size = shm_ring_buffer_size
+    self.shm_ring_buffers = []  # type: typing.List[task_system.ShmRingBuffer]
+    # (seq idx, ring buffer, end pos), in the order of the seqs, to release the buffer once the seq is not used anymore.
+    self.shm_ring_buffer_pending = deque()  # type: typing.Deque[typing.Tuple[int,task_system.ShmRingBuffer,int]]
     self.parent_pid = os.getpid()
     self.reader_thread = None  # type: typing.Optional[Thread]
-    self.seq_list_file = None
     self.use_multiple_epochs()
     # There is no generic way to see whether Python is exiting.
     # This is our workaround. We check for it in self.run_inner().
@@ -666,51 +698,135 @@ class ExternSprintDataset(SprintDatasetBase):
 
   def _exit_child(self, wait_thread=True):
     """
+    Exits all the child procs (workers).
+
     :param bool wait_thread:
     """
-    if self.child_pid:
-      expected_exit_status = 0 if wait_thread and not self.python_exit else None
-      if self._join_child(wait=False, expected_exit_status=expected_exit_status) is False:  # Not yet terminated.
+    if not self.child_pids:
+      return
+    expected_exit_status = 0 if wait_thread and not self.python_exit else None
+    for worker_idx, child_pid in enumerate(self.child_pids):
+      if not child_pid:
+        continue
+      if self._join_child(worker_idx, wait=False, expected_exit_status=expected_exit_status) is False:
+        # Not yet terminated.
         interrupt = not self.reached_final_seq_seen_all or not wait_thread
         if interrupt:
-          print("%s: interrupt child proc %s" % (self, self.child_pid), file=log.v5)
-          os.kill(self.child_pid, signal.SIGKILL)
+          print("%s: interrupt child proc %s" % (self, child_pid), file=log.v5)
+          os.kill(child_pid, signal.SIGKILL)
           # Also join such that the process is cleaned up, and pipes get closed.
-          self._join_child(wait=True, expected_exit_status=None)
-          self.child_pid = None
+          self._join_child(worker_idx, wait=True, expected_exit_status=None)
+          self.child_pids[worker_idx] = None
       else:  # child process terminated
-        self.child_pid = None
-      if wait_thread and self.reader_thread:
-        # Load all remaining data so that the reader thread is not waiting in self.add_new_data().
-        while self.is_less_than_num_seqs(self.expected_load_seq_start + 1):
-          if self.reached_final_seq:  # this is set by the reader thread
-            break
-          self.load_seqs(self.expected_load_seq_start + 1, self.expected_load_seq_start + 2)
-        self.reader_thread.join()
-        self.reader_thread = None
+        self.child_pids[worker_idx] = None
+    if wait_thread and self.reader_thread:
+      # Load all remaining data so that the reader thread is not waiting in self.add_new_data().
+      while self.is_less_than_num_seqs(self.expected_load_seq_start + 1):
+        if self.reached_final_seq:  # this is set by the reader thread
+          break
+        self.load_seqs(self.expected_load_seq_start + 1, self.expected_load_seq_start + 2)
+      self.reader_thread.join()
+      self.reader_thread = None
+    if wait_thread and self.worker_reader_threads:
+      # They might wait to put more data into their queue, or they get EOF because we killed the child.
+      self.worker_readers_stop = True
+      for thread_ in self.worker_reader_threads:
+        thread_.join()
+      self.worker_reader_threads = []
+      self.worker_queues = []
+    for worker_idx in range(len(self.child_pids)):
       try:
-        self.pipe_p2c[1].close()
+        self.pipes_p2c[worker_idx][1].close()
       except IOError:
         pass
       try:
-        self.pipe_c2p[0].close()
+        self.pipes_c2p[worker_idx][0].close()
       except IOError:
         pass
-      if self.child_pid:
-        self._join_child(wait=True, expected_exit_status=expected_exit_status)
-        self.child_pid = None
+      if self.child_pids[worker_idx]:
+        self._join_child(worker_idx, wait=True, expected_exit_status=expected_exit_status)
+        self.child_pids[worker_idx] = None
+    if not self.worker_reader_threads and not self.reader_thread:
+      self.child_pids = []
+      self.pipes_c2p = []
+      self.pipes_p2c = []
+      with self.lock:
+        # The arrays which are still in use keep the mapping alive.
+        for ring_buffer in self.shm_ring_buffers:
+          ring_buffer.close()
+        self.shm_ring_buffers = []
+        self.shm_ring_buffer_pending.clear()
 
   def _start_child(self, epoch, get_dim_only=False):
     """
+    Starts all the child procs (workers), or only a single one if get_dim_only.
+
     :param int|None epoch:
     :param bool get_dim_only:
     """
-    assert self.child_pid is None
+    assert not self.child_pids
     assert self.reader_thread is None
-    self.pipe_c2p = self._pipe_open()
-    self.pipe_p2c = self._pipe_open()
-    args = self._build_sprint_args()
-    print("%s: epoch" % self, epoch, "exec", args, file=log.v5)
+    assert not self.shm_ring_buffers
+    num_workers = 1 if get_dim_only else self.num_workers
+    if self.shm_ring_buffer_size and not get_dim_only:
+      self.shm_ring_buffers = [task_system.ShmRingBuffer.create(self.shm_ring_buffer_size) for _ in range(num_workers)]
+    self._remove_seq_list_files()
+    for worker_idx in range(num_workers):
+      self._start_child_proc(epoch=epoch, worker_idx=worker_idx, num_workers=num_workers)
+
+    dims = None
+    for worker_idx in range(num_workers):
+      try:
+        init_signal, (input_dim, output_dim, num_segments) = self._read_next_raw(worker_idx)
+        assert init_signal == b"init"
+        assert isinstance(input_dim, int) and isinstance(output_dim, int)
+        assert dims is None or dims == (input_dim, output_dim), "%s: worker %i dims %r, other workers %r" % (
+          self, worker_idx, (input_dim, output_dim), dims)
+        if dims is None:
+          dims = (input_dim, output_dim)
+          # Ignore num_segments. It can be totally different than the real number of sequences.
+          self.set_dimensions(input_dim, output_dim)
+      except Exception:
+        print("%s: Sprint child process %i (worker %i) caused an exception." % (
+          self, self.child_pids[worker_idx], worker_idx), file=log.v1)
+        sys.excepthook(*sys.exc_info())
+        self._exit_child(wait_thread=False)
+        raise Exception("%s Sprint init failed" % self)
+    for ring_buffer in self.shm_ring_buffers:
+      ring_buffer.unlink()  # all the children have opened it now
+
+    if get_dim_only:
+      self._exit_child(wait_thread=False)
+
+    else:
+      if num_workers > 1:
+        self.worker_readers_stop = False
+        self.worker_queues = [Queue(maxsize=self.SprintCachedSeqsMin) for _ in range(num_workers)]
+        self.worker_reader_threads = [
+          Thread(
+            target=self._worker_reader_thread_proc, args=(worker_idx,),
+            name="%s worker %i reader thread" % (self, worker_idx))
+          for worker_idx in range(num_workers)]
+        for thread_ in self.worker_reader_threads:
+          thread_.daemon = True
+          thread_.start()
+      self.reader_thread = Thread(target=self._reader_thread_proc, args=(list(self.child_pids), epoch),
+                                  name="%s reader thread" % self)
+      self.reader_thread.daemon = True
+      self.reader_thread.start()
+
+  def _start_child_proc(self, epoch, worker_idx, num_workers):
+    """
+    :param int|None epoch:
+    :param int worker_idx:
+    :param int num_workers:
+    """
+    pipe_c2p = self._pipe_open()
+    pipe_p2c = self._pipe_open()
+    self.pipes_c2p.append(pipe_c2p)
+    self.pipes_p2c.append(pipe_p2c)
+    args = self._build_sprint_args(worker_idx=worker_idx, num_workers=num_workers)
+    print("%s: epoch" % self, epoch, "worker %i/%i" % (worker_idx, num_workers), "exec", args, file=log.v5)
 
     pid = os.fork()
     if pid == 0:  # child
@@ -723,8 +839,10 @@ class ExternSprintDataset(SprintDatasetBase):
       # noinspection PyBroadException
       try:
         sys.stdin.close()  # Force no tty stdin.
-        self.pipe_c2p[0].close()
-        self.pipe_p2c[1].close()
+        # Also the parent ends of the pipes of the other workers, such that they get EOF when the parent closes them.
+        for pipe_c2p_, pipe_p2c_ in zip(self.pipes_c2p, self.pipes_p2c):
+          pipe_c2p_[0].close()
+          pipe_p2c_[1].close()
         os.execv(args[0], args)  # Does not return if successful.
         print("%s child exec failed." % self)
       except BaseException:
@@ -737,30 +855,9 @@ class ExternSprintDataset(SprintDatasetBase):
         return  # Not reached.
 
     # parent
-    self.pipe_c2p[1].close()
-    self.pipe_p2c[0].close()
-    self.child_pid = pid
-
-    try:
-      init_signal, (input_dim, output_dim, num_segments) = self._read_next_raw()
-      assert init_signal == b"init"
-      assert isinstance(input_dim, int) and isinstance(output_dim, int)
-      # Ignore num_segments. It can be totally different than the real number of sequences.
-      self.set_dimensions(input_dim, output_dim)
-    except Exception:
-      print("%s: Sprint child process (%r) caused an exception." % (self, args), file=log.v1)
-      sys.excepthook(*sys.exc_info())
-      self._exit_child(wait_thread=False)
-      raise Exception("%s Sprint init failed" % self)
-
-    if get_dim_only:
-      self._exit_child(wait_thread=False)
-
-    else:
-      self.reader_thread = Thread(target=self._reader_thread_proc, args=(pid, epoch),
-                                  name="%s reader thread" % self)
-      self.reader_thread.daemon = True
-      self.reader_thread.start()
+    pipe_c2p[1].close()
+    pipe_p2c[0].close()
+    self.child_pids.append(pid)
 
   # noinspection PyMethodMayBeStatic
   def _pipe_open(self):
@@ -781,14 +878,18 @@ class ExternSprintDataset(SprintDatasetBase):
     from returnn import __root_dir__
     return __root_dir__
 
-  def _build_sprint_args(self):
+  def _build_sprint_args(self, worker_idx=0, num_workers=1):
     """
+    :param int worker_idx:
+    :param int num_workers:
     :rtype: list[str]
     """
     config_str = "action:ExternSprintDataset,c2p_fd:%i,p2c_fd:%i" % (
-      self.pipe_c2p[1].fileno(), self.pipe_p2c[0].fileno())
+      self.pipes_c2p[worker_idx][1].fileno(), self.pipes_p2c[worker_idx][0].fileno())
     if task_system.SharedMemNumpyConfig["enabled"]:
       config_str += ",EnableAutoNumpySharedMemPickling:True"
+    if self.shm_ring_buffers:
+      config_str += ",shm_ring_buffer:%s" % self.shm_ring_buffers[worker_idx].filename
     epoch = self.returnn_epoch or 1
     assert epoch >= 1
     if isinstance(self.sprint_trainer_exec_path, (list, tuple)):
@@ -800,10 +901,11 @@ class ExternSprintDataset(SprintDatasetBase):
     # Now our options. They might overwrite some of the config settings. (That is why we do it after the user opts.)
     args += [
       "--*.seed=%i" % (self._get_random_seed_for_epoch(epoch=epoch) - 1)]
-    if self.partition_epoch > 1:
+    if (self.partition_epoch > 1 or num_workers > 1) and not self.predefined_seq_list_order:
+      # Each worker gets its own sub-partition of the partition of this epoch.
       args += [
-        "--*.corpus.partition=%i" % self.partition_epoch,
-        "--*.corpus.select-partition=%i" % ((epoch - 1) % self.partition_epoch)]
+        "--*.corpus.partition=%i" % (self.partition_epoch * num_workers),
+        "--*.corpus.select-partition=%i" % (((epoch - 1) % self.partition_epoch) * num_workers + worker_idx)]
     args += [
       "--*.python-segment-order=true",
       "--*.python-segment-order-pymod-path=%s" % self._my_python_mod_path,
@@ -814,36 +916,52 @@ class ExternSprintDataset(SprintDatasetBase):
       "--*.pymod-name=returnn.sprint.extern_interface",
       "--*.pymod-config=%s" % config_str]
     if self.predefined_seq_list_order:
-      import tempfile
-      self.seq_list_file = tempfile.mktemp(prefix="returnn-sprint-predefined-seq-list")
-      with open(self.seq_list_file, "w") as f:
-        for tag in self.predefined_seq_list_order:
-          f.write(tag)
-          f.write("\n")
-        f.close()
+      # The round-robin merge of the workers results in exactly this order again.
+      seq_list_file = self._write_seq_list_file(
+        self.predefined_seq_list_order[worker_idx::num_workers], prefix="returnn-sprint-predefined-seq-list")
       args += [
         "--*.corpus.segment-order-shuffle=false",
-        "--*.corpus.segments.file=%s" % self.seq_list_file,
-        "--*.corpus.segment-order=%s" % self.seq_list_file]
+        "--*.corpus.segments.file=%s" % seq_list_file,
+        "--*.corpus.segment-order=%s" % seq_list_file]
     if self.seq_tags_filter is not None:
       assert not self.predefined_seq_list_order
-      import tempfile
-      self.seq_list_file = tempfile.mktemp(prefix="returnn-sprint-predefined-seq-filter")
-      with open(self.seq_list_file, "w") as f:
-        for tag in self.seq_tags_filter:
-          f.write(tag)
-          f.write("\n")
-        f.close()
-      args += ["--*.corpus.segments.file=%s" % self.seq_list_file]
+      seq_list_file = self._write_seq_list_file(self.seq_tags_filter, prefix="returnn-sprint-predefined-seq-filter")
+      args += ["--*.corpus.segments.file=%s" % seq_list_file]
     return args
 
-  def _read_next_raw(self):
+  def _write_seq_list_file(self, seq_tags, prefix):
+    """
+    :param typing.Iterable[str] seq_tags:
+    :param str prefix:
+    :return: filename. will be removed at the end of the epoch
+    :rtype: str
+    """
+    import tempfile
+    seq_list_file = tempfile.mktemp(prefix=prefix)
+    with open(seq_list_file, "w") as f:
+      for tag in seq_tags:
+        f.write(tag)
+        f.write("\n")
+    self.seq_list_files.append(seq_list_file)
+    return seq_list_file
+
+  def _remove_seq_list_files(self):
+    while self.seq_list_files:
+      seq_list_file = self.seq_list_files.pop(0)
+      try:
+        os.remove(seq_list_file)
+      except Exception as e:
+        print("%s: error when removing %r: %r" % (self, seq_list_file, e), file=log.v5)
+
+  def _read_next_raw(self, worker_idx=0):
     """
+    :param int worker_idx:
     :return: (data_type, args)
     :rtype: (str, object)
     """
     import struct
-    size_raw = self.pipe_c2p[0].read(4)
+    pipe = self.pipes_c2p[worker_idx][0]
+    size_raw = pipe.read(4)
     if len(size_raw) < 4:
       raise EOFError
     size, = struct.unpack("<i", size_raw)
@@ -851,7 +969,7 @@ class ExternSprintDataset(SprintDatasetBase):
     stream = BytesIO()
     read_size = 0
     while read_size < size:
-      data_raw = self.pipe_c2p[0].read(size - read_size)
+      data_raw = pipe.read(size - read_size)
       if len(data_raw) == 0:
         raise EOFError("%s: expected to read %i bytes but got EOF after %i bytes" % (self, size, read_size))
       read_size += len(data_raw)
@@ -868,26 +986,74 @@ class ExternSprintDataset(SprintDatasetBase):
       raise Exception("%s: parse error of %i bytes (%r)" % (self, size, stream.getvalue()))
     return data_type, args
 
-  def _join_child(self, wait=True, expected_exit_status=None):
+  def _worker_reader_thread_proc(self, worker_idx):
+    """
+    With num_workers > 1, this reads from the pipe of this worker into its queue.
+    Any exception (e.g. EOF when the child was killed) is also forwarded via the queue.
+
+    :param int worker_idx:
+    """
+    queue = self.worker_queues[worker_idx]
+    while True:
+      # noinspection PyBroadException
+      try:
+        item = self._read_next_raw(worker_idx)
+      except BaseException as exc:
+        item = (None, exc)
+      while True:
+        try:
+          queue.put(item, timeout=1.)
+          break
+        except Full:
+          if self.worker_readers_stop:
+            return
+      if item[0] is None or item[0] == b"exit":
+        return
+
+  def _read_next_merged(self, active_workers):
     """
+    :param list[int] active_workers: the workers which did not finish yet, in the order of the next reads.
+      This will get updated.
+    :return: (data_type, args, worker_idx), the next one in a fixed round-robin order over the workers.
+      (b"exit", None, None) if all workers have finished.
+    :rtype: (str, object, int|None)
+    """
+    while active_workers:
+      worker_idx = active_workers.pop(0)
+      if self.num_workers == 1:
+        data_type, args = self._read_next_raw(worker_idx)
+      else:
+        data_type, args = self.worker_queues[worker_idx].get()
+        if data_type is None:
+          raise args
+      if data_type == b"exit":
+        continue  # This worker finished. Continue with the others.
+      active_workers.append(worker_idx)
+      return data_type, args, worker_idx
+    return b"exit", None, None
+
+  def _join_child(self, worker_idx, wait=True, expected_exit_status=None):
+    """
+    :param int worker_idx:
     :param bool wait:
     :param int|None expected_exit_status:
     :return: whether the child has exited now
     :rtype: bool
     """
-    assert self.child_pid
+    child_pid = self.child_pids[worker_idx]
+    assert child_pid
     options = 0 if wait else os.WNOHANG
-    pid, exit_status = os.waitpid(self.child_pid, options)
+    pid, exit_status = os.waitpid(child_pid, options)
     if not wait and pid == 0:
       return False
-    assert pid == self.child_pid
+    assert pid == child_pid
     if expected_exit_status is not None:
       assert exit_status == expected_exit_status, "%s: Sprint exit code is %i" % (self, exit_status)
     return True
 
-  def _reader_thread_proc(self, child_pid, epoch):
+  def _reader_thread_proc(self, child_pids, epoch):
     """
-    :param int child_pid:
+    :param list[int] child_pids:
     :param int epoch:
     """
     try:
@@ -895,24 +1061,25 @@ class ExternSprintDataset(SprintDatasetBase):
 
       self.init_sprint_epoch(epoch)
       have_seen_the_whole = False
+      active_workers = list(range(len(child_pids)))
 
       seq_count = 0
-      while not self.python_exit and self.child_pid:
+      while not self.python_exit and any(self.child_pids):
         try:
-          data_type, args = self._read_next_raw()
+          data_type, args, worker_idx = self._read_next_merged(active_workers)
         except (IOError, EOFError):
           with self.lock:
             if epoch != self.returnn_epoch:
               # We have passed on to a new epoch. This is a valid reason that the child has been killed.
               break
-            if self.python_exit or not self.child_pid:
+            if self.python_exit or not any(self.child_pids):
               break
           raise
 
         with self.lock:
           if epoch != self.returnn_epoch:
             break
-          if self.python_exit or not self.child_pid:
+          if self.python_exit or not any(self.child_pids):
             break
 
           if data_type == b"data":
@@ -927,27 +1094,42 @@ class ExternSprintDataset(SprintDatasetBase):
               numpy_copy_and_set_unused(features),
               numpy_copy_and_set_unused(targets),
               segment_name=segment_name)
+          elif data_type == b"data_shm":
+            seq_count += 1
+            segment_name, features, targets = args
+            if segment_name is not None:
+              segment_name = segment_name.decode("utf8")
+            ring_buffer = self.shm_ring_buffers[worker_idx]
+            end_pos = None
+            # Tuples are references into the ring buffer. Everything else was sent over the pipe.
+            if isinstance(features, tuple):
+              end_pos = features[1]
+              features = ring_buffer.get_array(features)
+            assert isinstance(features, numpy.ndarray)
+            targets_ = {}
+            for key, value in targets.items():
+              if isinstance(value, tuple):
+                end_pos = max(end_pos or 0, value[1])
+                value = ring_buffer.get_array(value)
+              targets_[key.decode("utf8")] = value
+            seq_idx = self.add_new_data(features, targets_, segment_name=segment_name)
+            if end_pos is not None:
+              self.shm_ring_buffer_pending.append((seq_idx, ring_buffer, end_pos))
           elif data_type == b"exit":
             have_seen_the_whole = True
             break
           else:
             assert False, "not handled: (%r, %r)" % (data_type, args)
 
-      if self.seq_list_file:
-        try:
-          os.remove(self.seq_list_file)
-        except Exception as e:
-          print("%s: error when removing %r: %r" % (self, self.seq_list_file, e), file=log.v5)
-        finally:
-          self.seq_list_file = None
+      self._remove_seq_list_files()
 
       if not self.python_exit:
         with self.lock:
           self.finish_sprint_epoch(seen_all=have_seen_the_whole)
           if have_seen_the_whole:
             self._num_seqs = self.next_seq_to_be_added
-      print("%s (proc %i) finished reading epoch %i, seen all %r (finished), num seqs %i" % (
-        self, child_pid, epoch, have_seen_the_whole, seq_count), file=log.v5)
+      print("%s (procs %s) finished reading epoch %i, seen all %r (finished), num seqs %i" % (
+        self, ", ".join(map(str, child_pids)), epoch, have_seen_the_whole, seq_count), file=log.v5)
 
     except Exception as exc:
       if not self.python_exit:
@@ -966,6 +1148,13 @@ class ExternSprintDataset(SprintDatasetBase):
           # Exceptions are fatal. If we can recover, we should handle it in run_inner().
           interrupt_main()
 
+  def _cleanup_old_seq_cache(self, seq_end):
+    super(ExternSprintDataset, self)._cleanup_old_seq_cache(seq_end)
+    # The seqs are removed in order, and per worker, the ring buffer positions are in the same order.
+    while self.shm_ring_buffer_pending and self.shm_ring_buffer_pending[0][0] < seq_end:
+      _, ring_buffer, end_pos = self.shm_ring_buffer_pending.popleft()
+      ring_buffer.release(end_pos)
+
   def init_seq_order(self, epoch=None, seq_list=None, seq_order=None):
     """
     :param int epoch:
@@ -1009,16 +1198,22 @@ class SprintCacheDataset(CachedDataset2):
     """
     Helper class to read a Sprint cache directly.
     """
-    def __init__(self, data_key, filename, data_type=None, allophone_labeling=None):
+    def __init__(self, data_key, filename, data_type=None, allophone_labeling=None, use_mmap=True,
+                 bundle_index=False):
       """
       :param str data_key: e.g. "data" or "classes"
       :param str filename: to Sprint cache archive
       :param str|None data_type: "feat" or "align"
       :param dict[str] allophone_labeling: kwargs for :class:`AllophoneLabeling`
+      :param bool use_mmap: use :class:`FileArchiveMmap`, which decodes whole seqs at once via numpy
+      :param bool bundle_index: if filename is a bundle, store the merged index of its archives next to it
+        (``<bundle>.index``, if possible), and use it in later runs. see :class:`FileArchiveBundle`.
+        Disabled by default, as this writes a file next to the data
       """
       self.data_key = data_key
       from returnn.sprint.cache import open_file_archive
-      self.sprint_cache = open_file_archive(filename)
+      self.use_mmap = use_mmap
+      self.sprint_cache = open_file_archive(filename, use_mmap=use_mmap, bundle_index=bundle_index)
       if not data_type:
         if data_key == "data":
           data_type = "feat"
@@ -1065,6 +1260,10 @@ class SprintCacheDataset(CachedDataset2):
       """
       assert self.type == "feat"
       assert self.content_keys
+      if self.use_mmap:
+        times, feats = self.sprint_cache.read_features(self.content_keys[0])
+        assert len(times) == len(feats) > 0
+        return feats.shape[1]
       times, feats = self.sprint_cache.read(self.content_keys[0], "feat")
       assert len(times) == len(feats) > 0
       feat = feats[0]
@@ -1078,6 +1277,8 @@ class SprintCacheDataset(CachedDataset2):
       :return: numpy array of shape (time, [num_labels])
       :rtype: numpy.ndarray
       """
+      if self.use_mmap:
+        return self._read_mmap(name)
       res = self.sprint_cache.read(name, typ=self.type)
       if self.type == "align":
         label_seq = numpy.array([self.allophone_labeling.get_label_idx(a, s) for (t, a, s) in res], dtype=self.dtype)
@@ -1097,6 +1298,45 @@ class SprintCacheDataset(CachedDataset2):
       else:
         assert False
 
+    def _read_mmap(self, name):
+      """
+      :param str name: content-filename for sprint cache
+      :return: numpy array of shape (time, [num_labels])
+      :rtype: numpy.ndarray
+      """
+      if self.type == "align_raw":
+        times, allo_state_idxs = self.sprint_cache.read_alignment(name)
+        unique_idxs, inverse = numpy.unique(allo_state_idxs, return_inverse=True)
+        unique_labels = numpy.array(
+          [self.allophone_labeling.state_tying_by_allo_state_idx[i] for i in unique_idxs.tolist()], dtype=self.dtype)
+        return unique_labels[inverse]
+      elif self.type == "align":
+        # Same mapping as in :func:`read`, i.e. the archive splits the states, and then get_label_idx(a, s).
+        times, allos, states = self.sprint_cache.read_alignment(name, split_states=True)
+        # Map each distinct (allophone, state) only once.
+        unique_pairs, inverse = numpy.unique(
+          numpy.stack([allos, states], axis=1), axis=0, return_inverse=True)
+        unique_labels = numpy.array(
+          [self.allophone_labeling.get_label_idx(a, s) for (a, s) in unique_pairs.tolist()], dtype=self.dtype)
+        return unique_labels[inverse]
+      elif self.type == "feat":
+        times, feat_mat = self.sprint_cache.read_features(name)
+        assert feat_mat.shape == (len(times), self.num_labels) and len(times) > 0
+        return feat_mat
+      else:
+        assert False
+
+    def get_size(self, name):
+      """
+      :param str name: content-filename for sprint cache
+      :return: size in bytes of the entry
+      :rtype: int
+      """
+      from returnn.sprint.cache import FileArchive
+      if isinstance(self.sprint_cache, FileArchive):
+        return self.sprint_cache.ft[name].size
+      return self.sprint_cache.get_size(name)
+
   def __init__(self, data, **kwargs):
     """
     :param dict[str,dict[str]] data: data-key -> dict which keys such as filename, see SprintCacheReader constructor
@@ -1147,7 +1387,7 @@ class SprintCacheDataset(CachedDataset2):
       :param int s:
       :rtype: int
       """
-      return data0.sprint_cache.ft[self.seq_list_original[s]].size
+      return data0.get_size(self.seq_list_original[s])
     seq_index = self.get_seq_order_for_epoch(epoch, self.num_seqs, get_seq_len=get_seq_size)
     self.seq_list_ordered = [self.seq_list_original[s] for s in seq_index]
     return True
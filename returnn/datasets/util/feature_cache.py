@@ -0,0 +1,265 @@
+"""
+Persistent cache for extracted features, e.g. for :class:`returnn.datasets.audio.OggZipDataset`.
+"""
+
+from __future__ import print_function
+
+import os
+import binascii
+import json
+import time
+import mmap
+import numpy
+import typing
+from threading import RLock
+from returnn.log import log
+
+
+class FeatureCache:
+  """
+  Stores numpy arrays (e.g. the features of one utterance) by a str key on disk,
+  such that they can be reused across epochs and across different processes/runs.
+
+  The storage is a directory with shards. Each shard consists of two files:
+
+    - ``<name>.data``: the raw array data, appended one after another (aligned)
+    - ``<name>.index``: one JSON line ``[key, offset, dtype, shape]`` per array
+
+  A shard is only written by the process which created it (append-only),
+  thus multiple processes can use the same directory.
+  The index line is written after the data, so a reader never sees incomplete entries.
+  The data files are read via mmap.
+
+  If ``max_size`` is given, the least recently used shards are deleted
+  such that the total size stays below that limit.
+  The last usage time of a shard is the mtime of its index file.
+  """
+
+  DataFileExt = ".data"
+  IndexFileExt = ".index"
+  Alignment = 64
+  TouchInterval = 60.  # secs
+
+  def __init__(self, directory, max_size=None, shard_max_size=64 * 1024 * 1024):
+    """
+    :param str directory: will be created if it does not exist
+    :param int|None max_size: in bytes, for all shards together. None means unlimited
+    :param int shard_max_size: in bytes. after this, a new shard is started
+    """
+    self.directory = directory
+    self.max_size = max_size
+    self.shard_max_size = shard_max_size
+    self._lock = RLock()
+    self._entries = {}  # type: typing.Dict[str,typing.Tuple[str,int,str,typing.Tuple[int,...]]]  # key -> info
+    self._mmaps = {}  # type: typing.Dict[str,mmap.mmap]  # shard name -> mmap
+    self._last_touch = {}  # type: typing.Dict[str,float]  # shard name -> time
+    self._write_shard = None  # type: typing.Optional[str]
+    self._write_data_file = None  # type: typing.Optional[typing.BinaryIO]
+    self._write_index_file = None  # type: typing.Optional[typing.TextIO]
+    self.num_hits = 0
+    self.num_misses = 0
+    if not os.path.exists(directory):
+      try:
+        os.makedirs(directory)
+      except OSError:  # e.g. created concurrently by another process
+        if not os.path.isdir(directory):
+          raise
+    self._load_indices()
+    self._evict()
+
+  def __repr__(self):
+    return "<%s %r, %i entries>" % (self.__class__.__name__, self.directory, len(self._entries))
+
+  def __contains__(self, key):
+    """
+    :param str key:
+    :rtype: bool
+    """
+    return key in self._entries
+
+  def __len__(self):
+    return len(self._entries)
+
+  def _get_filename(self, shard, ext):
+    """
+    :param str shard:
+    :param str ext:
+    :rtype: str
+    """
+    return os.path.join(self.directory, shard + ext)
+
+  def _get_shard_names(self):
+    """
+    :return: all shards with an index file in the directory
+    :rtype: list[str]
+    """
+    return sorted(
+      fn[:-len(self.IndexFileExt)] for fn in os.listdir(self.directory) if fn.endswith(self.IndexFileExt))
+
+  def _load_indices(self):
+    for shard in self._get_shard_names():
+      self._load_index(shard)
+
+  def _load_index(self, shard):
+    """
+    :param str shard:
+    """
+    try:
+      data_size = os.path.getsize(self._get_filename(shard, self.DataFileExt))
+      with open(self._get_filename(shard, self.IndexFileExt), "r") as f:
+        lines = f.readlines()
+    except (IOError, OSError):  # e.g. just deleted by some other process
+      return
+    for line in lines:
+      try:
+        key, offset, dtype, shape = json.loads(line)
+      except ValueError:  # incomplete last line, when the writer is still running
+        continue
+      shape = tuple(shape)
+      if offset + int(numpy.prod(shape)) * numpy.dtype(dtype).itemsize > data_size:
+        continue
+      self._entries[key] = (shard, offset, dtype, shape)
+
+  def _get_mmap(self, shard, end):
+    """
+    :param str shard:
+    :param int end: we need at least this size
+    :rtype: mmap.mmap
+    """
+    mm = self._mmaps.get(shard)
+    if mm is None or len(mm) < end:
+      if mm is not None:
+        mm.close()
+      with open(self._get_filename(shard, self.DataFileExt), "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+      self._mmaps[shard] = mm
+    return mm
+
+  def _touch(self, shard):
+    """
+    Marks the shard as recently used, for the LRU eviction.
+
+    :param str shard:
+    """
+    now = time.time()
+    if now - self._last_touch.get(shard, 0.) < self.TouchInterval:
+      return
+    self._last_touch[shard] = now
+    try:
+      os.utime(self._get_filename(shard, self.IndexFileExt), None)
+    except (IOError, OSError):
+      pass
+
+  def get(self, key):
+    """
+    :param str key:
+    :return: a copy of the stored array, or None if not in the cache
+    :rtype: numpy.ndarray|None
+    """
+    with self._lock:
+      info = self._entries.get(key)
+      if info is None:
+        self.num_misses += 1
+        return None
+      shard, offset, dtype, shape = info
+      dtype = numpy.dtype(dtype)
+      count = int(numpy.prod(shape))
+      try:
+        mm = self._get_mmap(shard, offset + count * dtype.itemsize)
+      except (IOError, OSError, ValueError):  # e.g. deleted by some other process
+        self._remove_shard_entries(shard)
+        self.num_misses += 1
+        return None
+      self._touch(shard)
+      self.num_hits += 1
+      return numpy.frombuffer(mm, dtype=dtype, count=count, offset=offset).reshape(shape).copy()
+
+  def add(self, key, value):
+    """
+    :param str key:
+    :param numpy.ndarray value:
+    """
+    value = numpy.ascontiguousarray(value)
+    assert value.dtype != numpy.object_
+    with self._lock:
+      if key in self._entries:
+        return
+      if self._write_data_file is None or self._write_data_file.tell() >= self.shard_max_size:
+        self._new_write_shard()
+      f = self._write_data_file
+      offset = f.tell()
+      if offset % self.Alignment:
+        f.write(b"\0" * (self.Alignment - offset % self.Alignment))
+        offset = f.tell()
+      f.write(value.tobytes())
+      f.flush()
+      self._write_index_file.write(json.dumps([key, offset, value.dtype.str, list(value.shape)]) + "\n")
+      self._write_index_file.flush()
+      self._entries[key] = (self._write_shard, offset, value.dtype.str, value.shape)
+
+  def _new_write_shard(self):
+    self._close_write_shard()
+    shard = "%i-%i-%s" % (int(time.time() * 1000), os.getpid(), binascii.hexlify(os.urandom(4)).decode("ascii"))
+    self._write_data_file = open(self._get_filename(shard, self.DataFileExt), "wb")
+    self._write_index_file = open(self._get_filename(shard, self.IndexFileExt), "w")
+    self._write_shard = shard
+    self._evict()
+
+  def _close_write_shard(self):
+    if self._write_data_file is not None:
+      self._write_data_file.close()
+      self._write_index_file.close()
+    self._write_data_file = None
+    self._write_index_file = None
+    self._write_shard = None
+
+  def _remove_shard_entries(self, shard):
+    """
+    :param str shard:
+    """
+    for key in [key for (key, info) in self._entries.items() if info[0] == shard]:
+      del self._entries[key]
+    mm = self._mmaps.pop(shard, None)
+    if mm is not None:
+      mm.close()
+
+  def _evict(self):
+    """
+    Deletes the least recently used shards until we are below max_size.
+    """
+    if self.max_size is None:
+      return
+    shards = []
+    total_size = 0
+    for shard in self._get_shard_names():
+      try:
+        size = os.path.getsize(self._get_filename(shard, self.DataFileExt))
+        last_used = os.path.getmtime(self._get_filename(shard, self.IndexFileExt))
+      except (IOError, OSError):
+        continue
+      shards.append((last_used, shard, size))
+      total_size += size
+    for last_used, shard, size in sorted(shards):
+      if total_size <= self.max_size:
+        break
+      if shard == self._write_shard:
+        continue
+      print("FeatureCache: delete %s (%i bytes), total size %i > max size %i" % (
+        shard, size, total_size, self.max_size), file=log.v4)
+      for ext in [self.IndexFileExt, self.DataFileExt]:
+        try:
+          os.remove(self._get_filename(shard, ext))
+        except (IOError, OSError):
+          pass
+      self._remove_shard_entries(shard)
+      total_size -= size
+
+  def close(self):
+    """
+    Closes all open files.
+    """
+    with self._lock:
+      self._close_write_shard()
+      for mm in self._mmaps.values():
+        mm.close()
+      self._mmaps.clear()
@@ -3,6 +3,7 @@ ExtractAudioFeatures class and related helpers
 """
 
 import numpy
+import typing
 
 from returnn.util.basic import CollectionReadCheckCovered
 
@@ -103,10 +104,48 @@ class ExtractAudioFeatures:
     assert value.shape == (self.get_feature_dimension(),)
     return value.astype("float32")
 
-  def get_audio_features_from_raw_bytes(self, raw_bytes, seq_name=None):
+  def can_cache_features(self):
+    """
+    :return: whether the features (before post_process) are deterministic, such that they can be cached
+    :rtype: bool
+    """
+    if self.random_permute_opts and self.random_permute_opts.truth_value:
+      return False
+    if self.pre_process or callable(self.features):
+      return False  # might use the random state, and we cannot hash it
+    return True
+
+  def get_cache_hash(self):
+    """
+    :return: hash of all the options which influence the features before post_process (see :func:`can_cache_features`)
+    :rtype: str
+    """
+    import hashlib
+
+    def _opt_repr(value):
+      if isinstance(value, numpy.ndarray):
+        return "array(%s,%s)" % (value.dtype, hashlib.sha1(value.tobytes()).hexdigest())
+      if isinstance(value, dict):
+        return "{%s}" % ", ".join("%r: %s" % (k, _opt_repr(v)) for (k, v) in sorted(value.items()))
+      return repr(value)
+
+    assert self.can_cache_features()
+    opts = [
+      ("version", 2),
+      ("window_len", self.window_len), ("step_len", self.step_len),
+      ("num_feature_filters", self.num_feature_filters), ("with_delta", self.with_delta),
+      ("norm_mean", self.norm_mean), ("norm_std_dev", self.norm_std_dev),
+      ("features", self.features), ("feature_options", self.feature_options), ("raw_ogg_opts", self.raw_ogg_opts),
+      ("sample_rate", self.sample_rate), ("num_channels", self.num_channels),
+      ("peak_normalization", self.peak_normalization), ("preemphasis", self.preemphasis),
+      ("join_frames", self.join_frames)]
+    return hashlib.sha1(", ".join("%s=%s" % (k, _opt_repr(v)) for (k, v) in opts).encode("utf8")).hexdigest()
+
+  def get_audio_features_from_raw_bytes(self, raw_bytes, seq_name=None, apply_post_process=True):
     """
     :param io.BytesIO raw_bytes:
     :param str|None seq_name:
+    :param bool apply_post_process: if False, you should call :func:`apply_post_process` yourself
     :return: shape (time,feature_dim)
     :rtype: numpy.ndarray
     """
@@ -131,16 +170,72 @@ class ExtractAudioFeatures:
     import soundfile  # noqa  # pip install pysoundfile
     # integer audio formats are automatically transformed in the range [-1,1]
     audio, sample_rate = soundfile.read(raw_bytes)
-    return self.get_audio_features(audio=audio, sample_rate=sample_rate, seq_name=seq_name)
+    return self.get_audio_features(
+      audio=audio, sample_rate=sample_rate, seq_name=seq_name, apply_post_process=apply_post_process)
 
-  def get_audio_features(self, audio, sample_rate, seq_name=None):
+  def get_audio_features(self, audio, sample_rate, seq_name=None, apply_post_process=True):
     """
     :param numpy.ndarray audio: raw audio samples, shape (audio_len,)
     :param int sample_rate: e.g. 22050
     :param str|None seq_name:
+    :param bool apply_post_process: if False, you should call :func:`apply_post_process` yourself
     :return: array (time,dim), dim == self.get_feature_dimension()
     :rtype: numpy.ndarray
     """
+    return self.get_audio_features_batch(
+      [audio], sample_rate=sample_rate, seq_names=[seq_name], apply_post_process=apply_post_process)[0]
+
+  def get_audio_features_batch(self, audios, sample_rate, seq_names=None, apply_post_process=True):
+    """
+    Like :func:`get_audio_features`, but for multiple utterances.
+    For the standard feature types, the STFT/mel computation is done for all utterances together.
+
+    :param list[numpy.ndarray] audios: raw audio samples, each of shape (audio_len,)
+    :param int sample_rate: e.g. 22050
+    :param list[str|None]|None seq_names:
+    :param bool apply_post_process: if False, you should call :func:`apply_post_process` yourself
+    :return: list of arrays (time,dim), dim == self.get_feature_dimension()
+    :rtype: list[numpy.ndarray]
+    """
+    if seq_names is None:
+      seq_names = [None] * len(audios)
+    assert len(seq_names) == len(audios)
+    audios = [self._pre_process_audio(audio, sample_rate=sample_rate) for audio in audios]
+
+    if self.features == "raw":
+      feature_datas = [self._get_raw_features(audio) for audio in audios]
+
+    else:
+      kwargs = {
+        "sample_rate": sample_rate,
+        "window_len": self.window_len,
+        "step_len": self.step_len,
+        "num_feature_filters": self.num_feature_filters}
+
+      if self.feature_options is not None:
+        assert isinstance(self.feature_options, dict)
+        kwargs.update(self.feature_options)
+
+      if callable(self.features):
+        feature_datas = [self.features(random_state=self.random_state, audio=audio, **kwargs) for audio in audios]
+      elif self.features in _BatchFeatureFunctions:
+        feature_datas = _BatchFeatureFunctions[self.features](audios=audios, **kwargs)
+      elif self.features == "linear_spectrogram":
+        feature_datas = [_get_audio_linear_spectrogram(audio=audio, **kwargs) for audio in audios]
+      else:
+        raise Exception("non-supported feature type %r" % (self.features,))
+
+    return [
+      self._finalize_features(feature_data, seq_name=seq_name, apply_post_process=apply_post_process)
+      for (feature_data, seq_name) in zip(feature_datas, seq_names)]
+
+  def _pre_process_audio(self, audio, sample_rate):
+    """
+    :param numpy.ndarray audio: raw audio samples, shape (audio_len,)
+    :param int sample_rate:
+    :return: audio, after preemphasis, normalization, random permutation, pre_process
+    :rtype: numpy.ndarray
+    """
     if self.sample_rate is not None:
       assert sample_rate == self.sample_rate, "currently no conversion implemented..."
 
@@ -163,45 +258,32 @@ class ExtractAudioFeatures:
     if self.pre_process:
       audio = self.pre_process(audio=audio, sample_rate=sample_rate, random_state=self.random_state)
       assert isinstance(audio, numpy.ndarray) and len(audio.shape) == 1
+    return audio
 
-    if self.features == "raw":
-      assert self.num_feature_filters == 1
-      if audio.ndim == 1:
-        audio = numpy.expand_dims(audio, axis=1)  # add dummy feature axis
-      if self.num_channels is not None:
-        if audio.ndim == 2:
-          audio = numpy.expand_dims(audio, axis=2)  # add dummy feature axis
-        assert audio.shape[1] == self.num_channels
-        assert audio.ndim == 3  # time, channel, feature
-      feature_data = audio.astype("float32")
-
-    else:
-      kwargs = {
-        "sample_rate": sample_rate,
-        "window_len": self.window_len,
-        "step_len": self.step_len,
-        "num_feature_filters": self.num_feature_filters,
-        "audio": audio}
-
-      if self.feature_options is not None:
-        assert isinstance(self.feature_options, dict)
-        kwargs.update(self.feature_options)
-
-      if callable(self.features):
-        feature_data = self.features(random_state=self.random_state, **kwargs)
-      elif self.features == "mfcc":
-        feature_data = _get_audio_features_mfcc(**kwargs)
-      elif self.features == "log_mel_filterbank":
-        feature_data = _get_audio_log_mel_filterbank(**kwargs)
-      elif self.features == "log_log_mel_filterbank":
-        feature_data = _get_audio_log_log_mel_filterbank(**kwargs)
-      elif self.features == "db_mel_filterbank":
-        feature_data = _get_audio_db_mel_filterbank(**kwargs)
-      elif self.features == "linear_spectrogram":
-        feature_data = _get_audio_linear_spectrogram(**kwargs)
-      else:
-        raise Exception("non-supported feature type %r" % (self.features,))
-
+  def _get_raw_features(self, audio):
+    """
+    :param numpy.ndarray audio: (audio_len,) or (audio_len,num_channels)
+    :return: (audio_len,1) or (audio_len,num_channels,1)
+    :rtype: numpy.ndarray
+    """
+    assert self.num_feature_filters == 1
+    if audio.ndim == 1:
+      audio = numpy.expand_dims(audio, axis=1)  # add dummy feature axis
+    if self.num_channels is not None:
+      if audio.ndim == 2:
+        audio = numpy.expand_dims(audio, axis=2)  # add dummy feature axis
+      assert audio.shape[1] == self.num_channels
+      assert audio.ndim == 3  # time, channel, feature
+    return audio.astype("float32")
+
+  def _finalize_features(self, feature_data, seq_name=None, apply_post_process=True):
+    """
+    :param numpy.ndarray feature_data: (time,num_feature_filters)
+    :param str|None seq_name:
+    :param bool apply_post_process:
+    :return: (time,dim), after deltas, normalization, joining frames, post_process
+    :rtype: numpy.ndarray
+    """
     assert feature_data.ndim == self.num_dim, "got feature data shape %r" % (feature_data.shape,)
     assert feature_data.shape[-1] == self.num_feature_filters
 
@@ -252,6 +334,17 @@ class ExtractAudioFeatures:
       feature_data = numpy.reshape(feature_data, newshape=new_shape, order='C')
 
     assert feature_data.shape[-1] == self.get_feature_dimension()
+    if apply_post_process:
+      feature_data = self.apply_post_process(feature_data, seq_name=seq_name)
+    return feature_data
+
+  def apply_post_process(self, feature_data, seq_name=None):
+    """
+    :param numpy.ndarray feature_data: (time,dim), from :func:`get_audio_features` without post processing
+    :param str|None seq_name:
+    :return: (time,dim)
+    :rtype: numpy.ndarray
+    """
     if self.post_process:
       feature_data = self.post_process(feature_data, seq_name=seq_name)
       assert isinstance(feature_data, numpy.ndarray) and feature_data.ndim == self.num_dim
@@ -295,6 +388,268 @@ def _get_audio_linear_spectrogram(audio, sample_rate, window_len=0.025, step_len
   return spectrogram
 
 
+# The following is a pure NumPy reimplementation of the librosa functions which we used before
+# (stft, melspectrogram, mfcc, rms, power_to_db, mel filters; Slaney-style mel scale),
+# numerically equivalent (up to float rounding), but faster:
+# The window, mel filterbank and DCT matrices are cached,
+# and multiple utterances are processed together with one framed FFT and one matrix multiplication.
+
+_hann_window_cache = {}  # type: typing.Dict[int,numpy.ndarray]  # n_fft -> window
+_mel_filterbank_cache = {}  # type: typing.Dict[typing.Tuple[int,int,int,float,float],numpy.ndarray]
+_mel_filterbank_sparse_cache = {}  # type: typing.Dict[typing.Tuple[int,int,int,float,float],typing.Any]  # csc_matrix
+_dct_matrix_cache = {}  # type: typing.Dict[typing.Tuple[int,int],numpy.ndarray]
+
+
+def _hz_to_mel(frequencies):
+  """
+  Slaney-style mel scale, like `librosa.hz_to_mel` (htk=False).
+
+  :param numpy.ndarray frequencies:
+  :rtype: numpy.ndarray
+  """
+  frequencies = numpy.asarray(frequencies, dtype="float64")
+  f_sp = 200.0 / 3
+  mels = frequencies / f_sp
+  min_log_hz = 1000.0
+  min_log_mel = min_log_hz / f_sp
+  log_step = numpy.log(6.4) / 27.0
+  log_mels = min_log_mel + numpy.log(numpy.maximum(frequencies, min_log_hz) / min_log_hz) / log_step
+  return numpy.where(frequencies >= min_log_hz, log_mels, mels)
+
+
+def _mel_to_hz(mels):
+  """
+  Inverse of :func:`_hz_to_mel`.
+
+  :param numpy.ndarray mels:
+  :rtype: numpy.ndarray
+  """
+  mels = numpy.asarray(mels, dtype="float64")
+  f_sp = 200.0 / 3
+  freqs = f_sp * mels
+  min_log_hz = 1000.0
+  min_log_mel = min_log_hz / f_sp
+  log_step = numpy.log(6.4) / 27.0
+  log_freqs = min_log_hz * numpy.exp(log_step * (numpy.maximum(mels, min_log_mel) - min_log_mel))
+  return numpy.where(mels >= min_log_mel, log_freqs, freqs)
+
+
+def get_mel_filterbank_matrix(sample_rate, n_fft, n_mels, fmin=0.0, fmax=None):
+  """
+  Like `librosa.filters.mel` (Slaney mel scale and area normalization). The result is cached.
+
+  :param int sample_rate:
+  :param int n_fft:
+  :param int n_mels:
+  :param float fmin:
+  :param float|None fmax: sample_rate / 2 by default
+  :return: (n_mels, n_fft // 2 + 1), float32. do not modify
+  :rtype: numpy.ndarray
+  """
+  if fmax is None:
+    fmax = float(sample_rate) / 2
+  key = (sample_rate, n_fft, n_mels, float(fmin), float(fmax))
+  if key in _mel_filterbank_cache:
+    return _mel_filterbank_cache[key]
+  fft_freqs = numpy.linspace(0, float(sample_rate) / 2, int(1 + n_fft // 2), endpoint=True)
+  mel_freqs = _mel_to_hz(numpy.linspace(_hz_to_mel(fmin), _hz_to_mel(fmax), n_mels + 2))
+  mel_freqs_diff = numpy.diff(mel_freqs)
+  ramps = numpy.subtract.outer(mel_freqs, fft_freqs)
+  lower = -ramps[:-2] / mel_freqs_diff[:-1, None]
+  upper = ramps[2:] / mel_freqs_diff[1:, None]
+  weights = numpy.maximum(0, numpy.minimum(lower, upper)).astype("float32")
+  weights *= (2.0 / (mel_freqs[2:n_mels + 2] - mel_freqs[:n_mels]))[:, None]
+  weights.flags.writeable = False
+  _mel_filterbank_cache[key] = weights
+  return weights
+
+
+def _get_hann_window(n_fft):
+  """
+  :param int n_fft:
+  :return: periodic Hann window, like `scipy.signal.get_window("hann", n_fft)`, float64. do not modify
+  :rtype: numpy.ndarray
+  """
+  if n_fft not in _hann_window_cache:
+    window = 0.5 - 0.5 * numpy.cos(2.0 * numpy.pi * numpy.arange(n_fft) / n_fft)
+    window.flags.writeable = False
+    _hann_window_cache[n_fft] = window
+  return _hann_window_cache[n_fft]
+
+
+def _get_dct_matrix(n_in, n_out):
+  """
+  :param int n_in:
+  :param int n_out:
+  :return: (n_in, n_out), orthonormal DCT-II, like `scipy.fftpack.dct(x, type=2, norm="ortho")[:n_out]`.
+    do not modify
+  :rtype: numpy.ndarray
+  """
+  key = (n_in, n_out)
+  if key not in _dct_matrix_cache:
+    n = numpy.arange(n_in)[:, None]
+    k = numpy.arange(n_out)[None, :]
+    matrix = numpy.cos(numpy.pi * k * (2 * n + 1) / (2.0 * n_in)) * numpy.sqrt(2.0 / n_in)
+    matrix[:, 0] = numpy.sqrt(1.0 / n_in)
+    matrix.flags.writeable = False
+    _dct_matrix_cache[key] = matrix
+  return _dct_matrix_cache[key]
+
+
+def _get_frames(audio, frame_length, hop_length, center=True):
+  """
+  Like `librosa.util.frame`, with reflection padding if center.
+
+  :param numpy.ndarray audio: (audio_len,)
+  :param int frame_length:
+  :param int hop_length:
+  :param bool center:
+  :return: frames (num_frames, frame_length), float64, read-only strided view
+  :rtype: numpy.ndarray
+  """
+  from numpy.lib.stride_tricks import as_strided
+  audio = numpy.asarray(audio, dtype="float64")
+  assert audio.ndim == 1, "only mono audio supported"
+  if center:
+    audio = numpy.pad(audio, int(frame_length // 2), mode="reflect")
+  num_frames = 1 + (len(audio) - frame_length) // hop_length
+  assert num_frames >= 1, "audio too short (%i samples) for frame length %i" % (len(audio), frame_length)
+  return as_strided(
+    audio, shape=(num_frames, frame_length), strides=(audio.strides[0] * hop_length, audio.strides[0]),
+    writeable=False)
+
+
+def _split_frames(x, num_frames):
+  """
+  :param numpy.ndarray x: (total_num_frames, ...)
+  :param list[int] num_frames:
+  :rtype: list[numpy.ndarray]
+  """
+  return numpy.split(x, numpy.cumsum(num_frames)[:-1], axis=0)
+
+
+def _get_mel_filterbank_sparse(sample_rate, n_fft, n_mels, fmin=0.0, fmax=None):
+  """
+  :param int sample_rate:
+  :param int n_fft:
+  :param int n_mels:
+  :param float fmin:
+  :param float|None fmax:
+  :return: like :func:`get_mel_filterbank_matrix`, but transposed (n_fft // 2 + 1, n_mels), float64, sparse.
+    Each FFT bin contributes to at most two mel bands, thus this is much faster than the dense matmul.
+  :rtype: scipy.sparse.csc_matrix
+  """
+  import scipy.sparse
+  if fmax is None:
+    fmax = float(sample_rate) / 2
+  key = (sample_rate, n_fft, n_mels, float(fmin), float(fmax))
+  if key not in _mel_filterbank_sparse_cache:
+    dense = get_mel_filterbank_matrix(sample_rate, n_fft=n_fft, n_mels=n_mels, fmin=fmin, fmax=fmax)
+    _mel_filterbank_sparse_cache[key] = scipy.sparse.csc_matrix(dense.T.astype("float64"))
+  return _mel_filterbank_sparse_cache[key]
+
+
+def _get_mel_spectrogram_batch(audios, sample_rate, n_fft, hop_length, n_mels, fmin=0.0, fmax=None, center=True,
+                               with_energy=False, block_size=512):
+  """
+  Like `librosa.feature.melspectrogram` (power 2) for all audios together.
+  The frames of all audios are processed together in blocks of `block_size` frames
+  (one FFT and one matmul per block), which stays in the CPU cache.
+
+  :param list[numpy.ndarray] audios: each (audio_len,)
+  :param int sample_rate:
+  :param int n_fft: also the window length
+  :param int hop_length:
+  :param int n_mels:
+  :param float fmin:
+  :param float|None fmax:
+  :param bool center:
+  :param bool with_energy: also return the RMS energy per frame, like `librosa.feature.rms`
+  :param int block_size: in frames
+  :return: mel spectrogram (total_num_frames, n_mels), float64, energy (total_num_frames,) or None,
+    num frames per audio
+  :rtype: (numpy.ndarray, numpy.ndarray|None, list[int])
+  """
+  window = _get_hann_window(n_fft)
+  mel_filterbank = _get_mel_filterbank_sparse(sample_rate, n_fft=n_fft, n_mels=n_mels, fmin=fmin, fmax=fmax)
+  frames_list = [_get_frames(audio, frame_length=n_fft, hop_length=hop_length, center=center) for audio in audios]
+  num_frames = [len(frames) for frames in frames_list]
+  total_num_frames = sum(num_frames)
+  mel_spectrogram = numpy.empty((total_num_frames, n_mels), dtype="float64")
+  energy = numpy.empty((total_num_frames,), dtype="float64") if with_energy else None
+  buffer = numpy.empty((min(block_size, total_num_frames), n_fft), dtype="float64")
+
+  def _flush(block_end, size):
+    """
+    :param int block_end: exclusive end of the block, in total frames
+    :param int size: num frames in buffer
+    """
+    block_start = block_end - size
+    windowed = buffer[:size]
+    if with_energy:
+      energy[block_start:block_end] = numpy.sqrt(numpy.einsum("ij,ij->i", windowed, windowed) / n_fft)
+    windowed *= window
+    spectrum = numpy.fft.rfft(windowed, axis=1)  # (size, n_fft // 2 + 1)
+    power_spectrum = spectrum.real * spectrum.real
+    power_spectrum += spectrum.imag * spectrum.imag
+    mel_spectrogram[block_start:block_end] = mel_filterbank.T.dot(power_spectrum.T).T  # sparse dot
+
+  pos, buffer_pos = 0, 0
+  for frames in frames_list:
+    frame_idx = 0
+    while frame_idx < len(frames):
+      n = min(len(frames) - frame_idx, len(buffer) - buffer_pos)
+      buffer[buffer_pos:buffer_pos + n] = frames[frame_idx:frame_idx + n]
+      frame_idx += n
+      buffer_pos += n
+      pos += n
+      if buffer_pos == len(buffer):
+        _flush(pos, buffer_pos)
+        buffer_pos = 0
+  if buffer_pos:
+    _flush(pos, buffer_pos)
+  return mel_spectrogram, energy, num_frames
+
+
+def _power_to_db(x, amin=1e-10, top_db=80.0):
+  """
+  Like `librosa.power_to_db` with ref 1.
+
+  :param numpy.ndarray x: power spectrogram of one utterance
+  :param float amin:
+  :param float|None top_db: relative to the max over the utterance
+  :rtype: numpy.ndarray
+  """
+  log_spec = 10.0 * numpy.log10(numpy.maximum(amin, x))
+  if top_db is not None:
+    log_spec = numpy.maximum(log_spec, log_spec.max() - top_db)
+  return log_spec
+
+
+def _get_audio_features_mfcc_batch(audios, sample_rate, window_len=0.025, step_len=0.010, num_feature_filters=40):
+  """
+  MFCC (based on 128 mel bands), where the first coefficient is replaced by the RMS energy.
+
+  :param list[numpy.ndarray] audios: raw audio samples, each of shape (audio_len,)
+  :param int sample_rate: e.g. 22050
+  :param float window_len: in seconds
+  :param float step_len: in seconds
+  :param int num_feature_filters:
+  :return: each (audio_len // int(step_len * sample_rate), num_feature_filters), float32
+  :rtype: list[numpy.ndarray]
+  """
+  n_fft, hop_length, n_mels = int(window_len * sample_rate), int(step_len * sample_rate), 128
+  assert num_feature_filters <= n_mels
+  mel_spectrogram, energy, num_frames = _get_mel_spectrogram_batch(
+    audios, sample_rate=sample_rate, n_fft=n_fft, hop_length=hop_length, n_mels=n_mels, with_energy=True)
+  # The dB conversion clips relative to the max per utterance.
+  log_mel_spectrogram = numpy.concatenate(
+    [_power_to_db(x) for x in _split_frames(mel_spectrogram, num_frames)], axis=0)
+  features = numpy.dot(log_mel_spectrogram, _get_dct_matrix(n_mels, num_feature_filters))
+  features[:, 0] = energy  # replace first MFCC with energy, per convention
+  return [x.astype("float32") for x in _split_frames(features, num_frames)]
+
+
 def _get_audio_features_mfcc(audio, sample_rate, window_len=0.025, step_len=0.010, num_feature_filters=40):
   """
   :param numpy.ndarray audio: raw audio samples, shape (audio_len,)
@@ -305,23 +660,28 @@ def _get_audio_features_mfcc(audio, sample_rate, window_len=0.025, step_len=0.01
   :return: (audio_len // int(step_len * sample_rate), num_feature_filters), float32
   :rtype: numpy.ndarray
   """
-  import librosa  # noqa
-  features = librosa.feature.mfcc(
-    audio, sr=sample_rate,
-    n_mfcc=num_feature_filters,
-    hop_length=int(step_len * sample_rate), n_fft=int(window_len * sample_rate))
-  librosa_version = librosa.__version__.split(".")
-  if int(librosa_version[0]) >= 1 or (int(librosa_version[0]) == 0 and int(librosa_version[1]) >= 7):
-    rms_func = librosa.feature.rms
-  else:
-    rms_func = librosa.feature.rmse  # noqa
-  energy = rms_func(
-    audio,
-    hop_length=int(step_len * sample_rate), frame_length=int(window_len * sample_rate))
-  features[0] = energy  # replace first MFCC with energy, per convention
-  assert features.shape[0] == num_feature_filters  # (dim, time)
-  features = features.transpose().astype("float32")  # (time, dim)
-  return features
+  return _get_audio_features_mfcc_batch(
+    [audio], sample_rate=sample_rate, window_len=window_len, step_len=step_len,
+    num_feature_filters=num_feature_filters)[0]
+
+
+def _get_audio_log_mel_filterbank_batch(audios, sample_rate, window_len=0.025, step_len=0.010,
+                                        num_feature_filters=80):
+  """
+  :param list[numpy.ndarray] audios: raw audio samples, each of shape (audio_len,)
+  :param int sample_rate: e.g. 22050
+  :param float window_len: in seconds
+  :param float step_len: in seconds
+  :param int num_feature_filters:
+  :return: each (audio_len // int(step_len * sample_rate), num_feature_filters), float32
+  :rtype: list[numpy.ndarray]
+  """
+  mel_filterbank, _, num_frames = _get_mel_spectrogram_batch(
+    audios, sample_rate=sample_rate, n_fft=int(window_len * sample_rate), hop_length=int(step_len * sample_rate),
+    n_mels=num_feature_filters)
+  log_noise_floor = 1e-3  # prevent numeric overflow in log
+  log_mel_filterbank = numpy.log(numpy.maximum(log_noise_floor, mel_filterbank)).astype("float32")
+  return _split_frames(log_mel_filterbank, num_frames)
 
 
 def _get_audio_log_mel_filterbank(audio, sample_rate, window_len=0.025, step_len=0.010, num_feature_filters=80):
@@ -340,16 +700,34 @@ def _get_audio_log_mel_filterbank(audio, sample_rate, window_len=0.025, step_len
   :return: (audio_len // int(step_len * sample_rate), num_feature_filters), float32
   :rtype: numpy.ndarray
   """
-  import librosa  # noqa
-  mel_filterbank = librosa.feature.melspectrogram(
-    audio, sr=sample_rate,
-    n_mels=num_feature_filters,
-    hop_length=int(step_len * sample_rate), n_fft=int(window_len * sample_rate))
-  log_noise_floor = 1e-3  # prevent numeric overflow in log
-  log_mel_filterbank = numpy.log(numpy.maximum(log_noise_floor, mel_filterbank))
-  assert log_mel_filterbank.shape[0] == num_feature_filters
-  log_mel_filterbank = log_mel_filterbank.transpose().astype("float32")  # (time, dim)
-  return log_mel_filterbank
+  return _get_audio_log_mel_filterbank_batch(
+    [audio], sample_rate=sample_rate, window_len=window_len, step_len=step_len,
+    num_feature_filters=num_feature_filters)[0]
+
+
+def _get_audio_db_mel_filterbank_batch(audios, sample_rate,
+                                       window_len=0.025, step_len=0.010, num_feature_filters=80,
+                                       fmin=0, fmax=None, min_amp=1e-10, center=True):
+  """
+  :param list[numpy.ndarray] audios: raw audio samples, each of shape (audio_len,)
+  :param int sample_rate: e.g. 22050
+  :param float window_len: in seconds
+  :param float step_len: in seconds
+  :param int num_feature_filters: number of mel-filterbanks
+  :param int fmin: minimum frequency covered by mel filters
+  :param int|None fmax: maximum frequency covered by mel filters
+  :param int min_amp: silence clipping for small amplitudes
+  :param bool center: pads the signal with reflection so that the window center starts at 0.
+  :return: each (audio_len // int(step_len * sample_rate), num_feature_filters), float32
+  :rtype: list[numpy.ndarray]
+  """
+  assert fmin >= 0
+  assert min_amp > 0
+  mel_filterbank, _, num_frames = _get_mel_spectrogram_batch(
+    audios, sample_rate=sample_rate, n_fft=int(window_len * sample_rate), hop_length=int(step_len * sample_rate),
+    n_mels=num_feature_filters, fmin=fmin, fmax=fmax, center=center)
+  log_mel_filterbank = (20 * numpy.log10(numpy.maximum(min_amp, mel_filterbank))).astype("float32")
+  return _split_frames(log_mel_filterbank, num_frames)
 
 
 def _get_audio_db_mel_filterbank(audio, sample_rate,
@@ -371,23 +749,31 @@ def _get_audio_db_mel_filterbank(audio, sample_rate,
   :return: (audio_len // int(step_len * sample_rate), num_feature_filters), float32
   :rtype: numpy.ndarray
   """
-  # noinspection PyPackageRequirements
-  assert fmin >= 0
-  assert min_amp > 0
+  return _get_audio_db_mel_filterbank_batch(
+    [audio], sample_rate=sample_rate, window_len=window_len, step_len=step_len,
+    num_feature_filters=num_feature_filters, fmin=fmin, fmax=fmax, min_amp=min_amp, center=center)[0]
 
-  import librosa  # noqa
-  mel_filterbank = librosa.feature.melspectrogram(
-    audio, sr=sample_rate,
-    n_mels=num_feature_filters,
-    hop_length=int(step_len * sample_rate),
-    n_fft=int(window_len * sample_rate),
-    fmin=fmin, fmax=fmax, center=center
-   )
 
-  log_mel_filterbank = 20 * numpy.log10(numpy.maximum(min_amp, mel_filterbank))
-  assert log_mel_filterbank.shape[0] == num_feature_filters
-  log_mel_filterbank = log_mel_filterbank.transpose().astype("float32")  # (time, dim)
-  return log_mel_filterbank
+def _get_audio_log_log_mel_filterbank_batch(audios, sample_rate, window_len=0.025, step_len=0.010,
+                                            num_feature_filters=80):
+  """
+  :param list[numpy.ndarray] audios: raw audio samples, each of shape (audio_len,)
+  :param int sample_rate: e.g. 22050
+  :param float window_len: in seconds
+  :param float step_len: in seconds
+  :param int num_feature_filters:
+  :return: each (audio_len // int(step_len * sample_rate), num_feature_filters), float32
+  :rtype: list[numpy.ndarray]
+  """
+  mel_filterbank, _, num_frames = _get_mel_spectrogram_batch(
+    audios, sample_rate=sample_rate, n_fft=int(window_len * sample_rate), hop_length=int(step_len * sample_rate),
+    n_mels=num_feature_filters)
+  log_noise_floor = 1e-3  # prevent numeric overflow in log
+  log_mel_filterbank = numpy.log(numpy.maximum(log_noise_floor, mel_filterbank))
+  # Like librosa.amplitude_to_db, i.e. clipped relative to the max per utterance.
+  return [
+    _power_to_db(numpy.square(x), amin=1e-10).astype("float32")
+    for x in _split_frames(log_mel_filterbank, num_frames)]
 
 
 def _get_audio_log_log_mel_filterbank(audio, sample_rate, window_len=0.025, step_len=0.010, num_feature_filters=80):
@@ -406,17 +792,17 @@ def _get_audio_log_log_mel_filterbank(audio, sample_rate, window_len=0.025, step
   :return: (audio_len // int(step_len * sample_rate), num_feature_filters), float32
   :rtype: numpy.ndarray
   """
-  import librosa  # noqa
-  mel_filterbank = librosa.feature.melspectrogram(
-    audio, sr=sample_rate,
-    n_mels=num_feature_filters,
-    hop_length=int(step_len * sample_rate), n_fft=int(window_len * sample_rate))
-  log_noise_floor = 1e-3  # prevent numeric overflow in log
-  log_mel_filterbank = numpy.log(numpy.maximum(log_noise_floor, mel_filterbank))
-  log_log_mel_filterbank = librosa.core.amplitude_to_db(log_mel_filterbank)
-  assert log_log_mel_filterbank.shape[0] == num_feature_filters
-  log_log_mel_filterbank = log_log_mel_filterbank.transpose().astype("float32")  # (time, dim)
-  return log_log_mel_filterbank
+  return _get_audio_log_log_mel_filterbank_batch(
+    [audio], sample_rate=sample_rate, window_len=window_len, step_len=step_len,
+    num_feature_filters=num_feature_filters)[0]
+
+
+_BatchFeatureFunctions = {
+  "mfcc": _get_audio_features_mfcc_batch,
+  "log_mel_filterbank": _get_audio_log_mel_filterbank_batch,
+  "log_log_mel_filterbank": _get_audio_log_log_mel_filterbank_batch,
+  "db_mel_filterbank": _get_audio_db_mel_filterbank_batch,
+}  # type: typing.Dict[str,typing.Callable[...,typing.List[numpy.ndarray]]]
 
 
 def _get_random_permuted_audio(audio, sample_rate, opts, random_state):
@@ -6,6 +6,7 @@ This is shared across different backends.
 
 import random
 import typing
+import numpy
 from returnn.util import NumbersDict
 
 
@@ -63,6 +64,7 @@ class Batch:
     # original data_shape = [0, 0], format (time,batch/slice)
     #          data_shape = [max_num_frames_per_slice, num_slices]
     self.seqs = []  # type: typing.List[BatchSeqCopyPart]
+    self._seq_idx_range_cache = None  # type: typing.Optional[typing.Tuple[int,int,int]]  # len(seqs),start,end
 
   def __repr__(self):
     return "<Batch start_seq:%r, len(seqs):%i>" % (self.start_seq, len(self.seqs))
@@ -137,6 +139,16 @@ class Batch:
     """
     return sum([s.frame_length for s in self.seqs])
 
+  def _get_seq_idx_range(self):
+    """
+    :return: (start_seq, end_seq). cached, as long as no seqs are added
+    :rtype: (int,int)
+    """
+    if not self._seq_idx_range_cache or self._seq_idx_range_cache[0] != len(self.seqs):
+      seq_idxs = [s.seq_idx for s in self.seqs]
+      self._seq_idx_range_cache = (len(self.seqs), min(seq_idxs), max(seq_idxs) + 1)
+    return self._seq_idx_range_cache[1:]
+
   @property
   def start_seq(self):
     """
@@ -144,7 +156,7 @@ class Batch:
     """
     if not self.seqs:
       return None
-    return min([s.seq_idx for s in self.seqs])
+    return self._get_seq_idx_range()[0]
 
   @property
   def end_seq(self):
@@ -153,7 +165,7 @@ class Batch:
     """
     if not self.seqs:
       return None
-    return max([s.seq_idx for s in self.seqs]) + 1
+    return self._get_seq_idx_range()[1]
 
   def get_num_seqs(self):
     """
@@ -163,6 +175,151 @@ class Batch:
       return 0
     return self.end_seq - self.start_seq
 
+  def filter_seqs(self, seq_filter):
+    """
+    :param (int)->bool seq_filter: seq_idx -> whether to keep the seq
+    :return: new batch, only with the seqs where seq_filter returns True. the slices are renumbered
+    :rtype: Batch
+    """
+    batch = Batch()
+    slice_map = {}  # type: typing.Dict[int,int]  # old batch slice -> new batch slice
+    for part in self.seqs:
+      if not seq_filter(part.seq_idx):
+        continue
+      if part.batch_slice not in slice_map:
+        slice_map[part.batch_slice] = len(slice_map)
+      batch.seqs.append(BatchSeqCopyPart(
+        seq_idx=part.seq_idx, seq_start_frame=part.seq_start_frame, seq_end_frame=part.seq_end_frame,
+        batch_slice=slice_map[part.batch_slice], batch_frame_offset=part.batch_frame_offset))
+      batch.max_num_frames_per_slice = NumbersDict.max(
+        [batch.max_num_frames_per_slice, part.batch_frame_offset + part.frame_length])
+    batch.num_slices = len(slice_map)
+    return batch
+
+
+class BatchSetArrays:
+  """
+  Compact array-backed description of all batches of an epoch in the recurrent case,
+  where every part (full seq or chunk) is one slice of the batch.
+  The batch boundaries are computed in bulk via :func:`get_batch_boundaries`,
+  and the :class:`Batch` instances are only created on demand.
+  This is used by :func:`Dataset._generate_batches`
+  and yields exactly the same batches as the generic (seq-by-seq) code path.
+  """
+
+  def __init__(self, keys, seq_idx, seq_start, seq_end, batch_start):
+    """
+    :param list[str] keys: data keys, corresponding to the last axis of seq_start/seq_end
+    :param numpy.ndarray seq_idx: (num_parts,)
+    :param numpy.ndarray seq_start: (num_parts,len(keys)), start frame per part
+    :param numpy.ndarray seq_end: (num_parts,len(keys)), end frame per part
+    :param numpy.ndarray batch_start: (num_batches+1,), part offsets of the batches
+    """
+    self.keys = list(keys)
+    self.seq_idx = seq_idx
+    self.seq_start = seq_start
+    self.seq_end = seq_end
+    self.batch_start = batch_start
+
+  def __repr__(self):
+    return "<BatchSetArrays keys %r, num parts %i, num batches %i>" % (self.keys, len(self.seq_idx), len(self))
+
+  def __len__(self):
+    return len(self.batch_start) - 1
+
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self.get_batch(i)
+
+  def get_batch(self, batch_idx):
+    """
+    :param int batch_idx:
+    :rtype: Batch
+    """
+    start, end = self.batch_start[batch_idx], self.batch_start[batch_idx + 1]
+    seq_idxs = self.seq_idx[start:end].tolist()
+    seq_starts = self.seq_start[start:end].tolist()
+    seq_ends = self.seq_end[start:end].tolist()
+    max_lens = numpy.max(self.seq_end[start:end] - self.seq_start[start:end], axis=0, initial=0).tolist()
+    batch = Batch()
+    batch.max_num_frames_per_slice = NumbersDict(numbers_dict=dict(zip(self.keys, max_lens)), broadcast_value=0)
+    batch.num_slices = len(seq_idxs)
+    batch.seqs = [
+      BatchSeqCopyPart(
+        seq_idx=seq_idx,
+        seq_start_frame=dict(zip(self.keys, seq_start)), seq_end_frame=dict(zip(self.keys, seq_end)),
+        batch_slice=i, batch_frame_offset=0)
+      for i, (seq_idx, seq_start, seq_end) in enumerate(zip(seq_idxs, seq_starts, seq_ends))]
+    return batch
+
+  def get_num_frames(self):
+    """
+    :return: (padded, used) num frames per data key, summed over all batches,
+      where padded is max seq len * num seqs per batch
+    :rtype: (dict[str,int],dict[str,int])
+    """
+    lengths = self.seq_end - self.seq_start
+    if len(self) == 0:
+      return {key: 0 for key in self.keys}, {key: 0 for key in self.keys}
+    batch_sizes = self.batch_start[1:] - self.batch_start[:-1]
+    max_lens = numpy.maximum.reduceat(lengths, self.batch_start[:-1], axis=0)
+    padded = numpy.sum(max_lens * batch_sizes[:, None], axis=0)
+    used = numpy.sum(lengths, axis=0)
+    return dict(zip(self.keys, padded.tolist())), dict(zip(self.keys, used.tolist()))
+
+  def get_padding_ratio(self):
+    """
+    :return: per data key, fraction of zero-padded frames, i.e. 1 - used frames / padded frames.
+      This is the same as 1 - "fraction used frames" in ``tools/analyze-dataset-batches.py``.
+    :rtype: dict[str,float]
+    """
+    padded, used = self.get_num_frames()
+    return {key: (1. - float(used[key]) / padded[key]) if padded[key] else 0. for key in self.keys}
+
+
+def get_batch_boundaries(lengths, batch_size, max_seqs, max_pad_size):
+  """
+  Greedy packing of consecutive parts into batches, as in :func:`Dataset._generate_batches` (recurrent case):
+  A new batch is started when adding the next part would make
+  max_len * num_seqs > batch_size (for any key), num_seqs > max_seqs,
+  or the number of padded frames > max_pad_size (for any key).
+  A part alone always makes up a batch.
+
+  :param numpy.ndarray lengths: (num_parts,num_keys), ints
+  :param numpy.ndarray batch_size: (num_keys,), use inf for no limit
+  :param int|float max_seqs: use inf for no limit
+  :param numpy.ndarray max_pad_size: (num_keys,), use inf for no limit
+  :return: (num_batches+1,), part offsets of the batches
+  :rtype: numpy.ndarray
+  """
+  num_parts = len(lengths)
+  batch_starts = [0]
+  window = 64
+  start = 0
+  while start < num_parts:
+    while True:
+      window_lens = lengths[start:start + window]
+      num_seqs = numpy.arange(1, len(window_lens) + 1)
+      max_lens = numpy.maximum.accumulate(window_lens, axis=0)
+      total_lens = numpy.cumsum(window_lens, axis=0)
+      padded_lens = max_lens * num_seqs[:, None]
+      ok = numpy.all(padded_lens <= batch_size, axis=1)
+      ok &= numpy.all(padded_lens - total_lens <= max_pad_size, axis=1)
+      ok &= num_seqs <= max_seqs
+      ok[0] = True
+      end_idxs = numpy.flatnonzero(~ok)
+      if len(end_idxs) > 0:
+        start += int(end_idxs[0])
+        break
+      if start + window >= num_parts:
+        start = num_parts
+        break
+      window *= 2
+    # The next batch is probably of similar size, so adapt the window.
+    window = max(64, 2 * (start - batch_starts[-1]))
+    batch_starts.append(start)
+  return numpy.array(batch_starts, dtype="int64")
+
 
 class BatchSetGenerator:
   """
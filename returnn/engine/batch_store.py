@@ -0,0 +1,130 @@
+"""
+Provides :class:`MmapBatchStore`, a read-only file of precomputed (padded) batches, which is memory-mapped for reading.
+This is shared across different backends, and used e.g. by :class:`returnn.tf.data_pipeline.BatchStoreDataProvider`
+for the repeated trainings in :mod:`returnn.tf.hyper_param_tuning`.
+"""
+
+from __future__ import print_function
+
+import os
+import json
+import struct
+import typing
+import numpy
+
+
+class MmapBatchStore:
+  """
+  The batches are written once via :func:`write`.
+  Then any number of readers (threads or processes) can open the file,
+  and get the batches via :func:`get_batch`.
+  The arrays are read-only views into the mapped file, i.e. there is no copy,
+  and the memory (page cache) is shared by all processes which use the same file.
+
+  File layout: header (magic, offset and size of the index), then the arrays (aligned),
+  then the index as JSON, which has the array positions and the non-array values (e.g. seq tags) per batch.
+  An instance can be pickled, which just reopens the file, e.g. in a subprocess.
+  """
+
+  Magic = b"RETURNN-BATCH-STORE-1\n"
+  HeaderSize = 64
+  Alignment = 64
+
+  def __init__(self, filename):
+    """
+    :param str filename: created via :func:`write`
+    """
+    import mmap
+    self.filename = filename
+    with open(filename, "rb") as f:
+      self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic_size = len(self.Magic)
+    assert self.mmap[:magic_size] == self.Magic, "%s: invalid file %r" % (self.__class__.__name__, filename)
+    index_offset, index_size = struct.unpack("<QQ", self.mmap[magic_size:magic_size + 16])
+    index = json.loads(self.mmap[index_offset:index_offset + index_size].decode("utf8"))
+    self.meta = index["meta"]  # type: typing.Dict[str]
+    self._batches = index["batches"]  # type: typing.List[typing.Dict[str,typing.Dict[str]]]
+
+  @classmethod
+  def write(cls, filename, batches, meta=None):
+    """
+    :param str filename:
+    :param typing.Iterable[dict[str,numpy.ndarray|list|int|str]] batches: per batch: key -> value.
+      The numpy arrays are stored as raw data. Other values (e.g. the list of seq tags) must be JSON serializable.
+    :param dict[str]|None meta: any JSON serializable info, e.g. the options which were used for the batches
+    :return: the store, opened for reading
+    :rtype: MmapBatchStore
+    """
+    batch_infos = []
+    with open(filename, "wb") as f:
+      f.write(b"\0" * cls.HeaderSize)
+      for batch in batches:
+        batch_info = {}
+        for key, value in batch.items():
+          if isinstance(value, numpy.ndarray):
+            assert not value.dtype.hasobject, "%s: cannot store %r with dtype %s" % (cls.__name__, key, value.dtype)
+            f.write(b"\0" * (-f.tell() % cls.Alignment))
+            batch_info[key] = {"offset": f.tell(), "shape": list(value.shape), "dtype": value.dtype.str}
+            f.write(numpy.ascontiguousarray(value).data)
+          else:
+            batch_info[key] = {"value": value}
+        batch_infos.append(batch_info)
+      index_offset = f.tell()
+      index_raw = json.dumps({"meta": meta or {}, "batches": batch_infos}, default=_json_default).encode("utf8")
+      f.write(index_raw)
+      f.seek(0)
+      f.write(cls.Magic + struct.pack("<QQ", index_offset, len(index_raw)))
+    return cls(filename)
+
+  def __repr__(self):
+    return "<%s %r, %i batches>" % (self.__class__.__name__, self.filename, len(self))
+
+  def __reduce__(self):
+    return self.__class__, (self.filename,)
+
+  def __len__(self):
+    """
+    :return: number of batches
+    :rtype: int
+    """
+    return len(self._batches)
+
+  def get_num_bytes(self):
+    """
+    :return: file size
+    :rtype: int
+    """
+    return self.mmap.size()
+
+  def get_batch(self, batch_idx):
+    """
+    :param int batch_idx:
+    :return: key -> value, like given to :func:`write`. The arrays are read-only views into the mapped file
+    :rtype: dict[str,numpy.ndarray|list|int|str]
+    """
+    batch = {}
+    for key, info in self._batches[batch_idx].items():
+      if "value" in info:
+        batch[key] = info["value"]
+      else:
+        count = int(numpy.prod(info["shape"], dtype="int64"))
+        batch[key] = numpy.frombuffer(
+          self.mmap, dtype=info["dtype"], count=count, offset=info["offset"]).reshape(info["shape"])
+    return batch
+
+  def unlink(self):
+    """
+    Removes the file. Every process which has it already opened can continue to use it.
+    """
+    if os.path.exists(self.filename):
+      os.remove(self.filename)
+
+
+def _json_default(obj):
+  """
+  :param object obj: e.g. a numpy scalar, like the seq idx in some batches
+  :rtype: int|float|list
+  """
+  if isinstance(obj, (numpy.generic, numpy.ndarray)):
+    return obj.tolist()
+  raise TypeError("%r is not JSON serializable" % (obj,))
@@ -0,0 +1,193 @@
+"""
+Provides :class:`DynamicBatcher`, which merges concurrent inference requests into batches.
+This is shared across different backends, and used e.g. by :func:`returnn.tf.engine.Engine.web_server`.
+"""
+
+from __future__ import print_function
+
+import time
+import typing
+import numpy
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from threading import Thread, Condition
+from returnn.log import log
+
+
+class DynamicBatcher:
+  """
+  Requests can be submitted from any thread via :func:`submit`.
+  A single worker thread collects the pending requests into one batch,
+  until one of these limits is reached:
+
+    - ``max_batch_size`` requests
+    - ``max_batch_frames`` padded frames, i.e. max num frames * num requests (like ``batch_size`` in RETURNN)
+    - ``max_wait_time`` seconds after the oldest pending request was submitted
+
+  and calls ``run_batch_func`` with all of them at once (e.g. one ``session.run``).
+  The results are passed back to the callers via :class:`concurrent.futures.Future`.
+
+  We also keep some statistics about the latency (time from :func:`submit` until the result is available),
+  the batch sizes and the queue depth. See :func:`get_stats`.
+  """
+
+  def __init__(self, run_batch_func, max_batch_size=32, max_batch_frames=None, max_wait_time=0.01,
+               max_latency_history=1000, report_interval=60., name=None):
+    """
+    :param ((list[T])->list) run_batch_func: gets a list of request inputs, returns the list of results (same order)
+    :param int max_batch_size: max number of requests in one batch
+    :param int|None max_batch_frames: max number of padded frames in one batch
+    :param float max_wait_time: in secs. how long the oldest request waits for further requests
+    :param int max_latency_history: num of last requests to calculate the latency percentiles from
+    :param float|None report_interval: in secs. print the stats to log.v3 in this interval. None to disable
+    :param str|None name:
+    """
+    assert max_batch_size > 0
+    self.run_batch_func = run_batch_func
+    self.max_batch_size = max_batch_size
+    self.max_batch_frames = max_batch_frames
+    self.max_wait_time = max_wait_time
+    self.report_interval = report_interval
+    self.name = name or self.__class__.__name__
+    self._cond = Condition()
+    self._queue = deque()  # type: typing.Deque[typing.Tuple[typing.Any,int,float,Future]]  # inputs,frames,time,fut
+    self._latencies = deque(maxlen=max_latency_history)  # type: typing.Deque[float]
+    self._num_requests = 0
+    self._num_batches = 0
+    self._max_queue_depth = 0
+    self._last_report_time = time.time()
+    self._quit = False
+    self._thread = Thread(target=self._thread_main, name=self.name)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def __repr__(self):
+    return "<%s %r, queue depth %i>" % (self.__class__.__name__, self.name, len(self._queue))
+
+  def submit(self, inputs, num_frames=1):
+    """
+    :param T inputs: whatever run_batch_func expects for one request
+    :param int num_frames: e.g. the seq len of the inputs, for max_batch_frames
+    :return: future, which gets the result of this request
+    :rtype: Future
+    """
+    fut = Future()
+    with self._cond:
+      assert not self._quit, "%s: already closed" % self
+      self._queue.append((inputs, num_frames, time.time(), fut))
+      self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+      self._cond.notify_all()
+    return fut
+
+  def __call__(self, inputs, num_frames=1):
+    """
+    Submits the request and waits for the result.
+
+    :param T inputs:
+    :param int num_frames:
+    :return: the result for this request
+    """
+    fut = self.submit(inputs, num_frames=num_frames)
+    while True:
+      try:
+        # With a timeout, because of :func:`returnn.util.basic.init_thread_join_hack` in the main thread.
+        return fut.result(timeout=1.)
+      except FutureTimeoutError:
+        continue
+
+  def _collect_batch(self):
+    """
+    Waits for requests and collects the next batch.
+
+    :return: list of (inputs, num_frames, submit time, future). empty if we should quit
+    :rtype: list[(object,int,float,Future)]
+    """
+    with self._cond:
+      while not self._queue and not self._quit:
+        self._cond.wait()
+      if not self._queue:
+        return []
+      deadline = self._queue[0][2] + self.max_wait_time
+      while len(self._queue) < self.max_batch_size and not self._quit:
+        if self.max_batch_frames and self._get_padded_frames(self._queue) >= self.max_batch_frames:
+          break
+        timeout = deadline - time.time()
+        if timeout <= 0:
+          break
+        self._cond.wait(timeout)
+      batch = [self._queue.popleft()]
+      while self._queue and len(batch) < self.max_batch_size:
+        if self.max_batch_frames and self._get_padded_frames(batch + [self._queue[0]]) > self.max_batch_frames:
+          break
+        batch.append(self._queue.popleft())
+      return batch
+
+  @staticmethod
+  def _get_padded_frames(requests):
+    """
+    :param typing.Sequence[(object,int,float,Future)] requests:
+    :rtype: int
+    """
+    return max([num_frames for (_, num_frames, _, _) in requests]) * len(requests)
+
+  def _thread_main(self):
+    while True:
+      batch = self._collect_batch()
+      if not batch:
+        return
+      futures = [fut for (_, _, _, fut) in batch]
+      # noinspection PyBroadException
+      try:
+        results = self.run_batch_func([inputs for (inputs, _, _, _) in batch])
+        assert len(results) == len(batch), "%s: expected %i results, got %i" % (self, len(batch), len(results))
+      except Exception as exc:
+        print("%s: exception in run_batch_func with batch size %i: %s: %s" % (
+          self, len(batch), type(exc).__name__, exc), file=log.v2)
+        for fut in futures:
+          fut.set_exception(exc)
+      else:
+        for fut, result in zip(futures, results):
+          fut.set_result(result)
+      end_time = time.time()
+      with self._cond:
+        self._num_batches += 1
+        self._num_requests += len(batch)
+        self._latencies.extend([end_time - submit_time for (_, _, submit_time, _) in batch])
+      if self.report_interval is not None and end_time - self._last_report_time >= self.report_interval:
+        self._last_report_time = end_time
+        print("%s stats: %s" % (self.name, self.get_stats_str()), file=log.v3)
+
+  def get_stats(self):
+    """
+    :return: num_requests, num_batches, avg_batch_size, queue_depth, max_queue_depth,
+      and latency_p50, latency_p90, latency_p99 (in secs, over the last requests)
+    :rtype: dict[str,int|float|None]
+    """
+    with self._cond:
+      latencies = numpy.array(self._latencies, dtype="float64")
+      stats = {
+        "num_requests": self._num_requests,
+        "num_batches": self._num_batches,
+        "avg_batch_size": float(self._num_requests) / self._num_batches if self._num_batches else None,
+        "queue_depth": len(self._queue),
+        "max_queue_depth": self._max_queue_depth}
+    for p in [50, 90, 99]:
+      stats["latency_p%i" % p] = float(numpy.percentile(latencies, p)) if len(latencies) else None
+    return stats
+
+  def get_stats_str(self):
+    """
+    :rtype: str
+    """
+    return ", ".join(
+      "%s %s" % (key, ("%.4f" % value) if isinstance(value, float) else value)
+      for (key, value) in self.get_stats().items())
+
+  def close(self):
+    """
+    Processes all pending requests and stops the worker thread.
+    """
+    with self._cond:
+      self._quit = True
+      self._cond.notify_all()
+    self._thread.join()
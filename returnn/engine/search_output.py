@@ -0,0 +1,144 @@
+"""
+Provides :class:`SearchOutputRecordFile`, used to stream the search output to disk.
+This is shared across different backends.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import pickle
+import struct
+import typing
+import numpy
+from returnn.log import log
+
+
+class SearchOutputRecordFile:
+  """
+  Append-only file of search output records, where each record is ``(corpus_seq_idx, seq_tag, data)``.
+  Every record is written and flushed as soon as the seq is decoded,
+  so we do not need to keep all the outputs in memory,
+  and after a crash (or preemption), we can continue where we stopped (see ``search_resume``).
+
+  At the end, :func:`write_final` writes the records ordered by the corpus seq idx into the final output file,
+  in the same format as before (txt or py).
+
+  Each record is stored as 8 bytes length (little-endian uint64), followed by the pickled record.
+  An incomplete record at the end (e.g. when the process was killed while writing) is ignored and removed.
+  """
+
+  HeaderFormat = "<Q"
+
+  def __init__(self, filename, resume=False):
+    """
+    :param str filename: e.g. "<search_output_file>.partial"
+    :param bool resume: if True, and the file exists, we load the existing records and append to it.
+      Otherwise, we expect that the file does not exist.
+    """
+    self.filename = filename
+    self._index = {}  # type: typing.Dict[int,int]  # corpus seq idx -> file offset
+    self._seq_tags = {}  # type: typing.Dict[str,int]  # seq tag -> corpus seq idx
+    if os.path.exists(filename):
+      assert resume, "%s: file %r exists already, maybe from an earlier run. Use search_resume." % (self, filename)
+      self._load_index()
+      print("%s: resume from %r with %i existing seqs." % (self.__class__.__name__, filename, len(self)), file=log.v2)
+    self._file = open(filename, "ab")
+
+  def __repr__(self):
+    return "<%s %r>" % (self.__class__.__name__, self.filename)
+
+  def __len__(self):
+    return len(self._index)
+
+  def __contains__(self, seq_tag):
+    """
+    :param str seq_tag:
+    :rtype: bool
+    """
+    return seq_tag in self._seq_tags
+
+  def _load_index(self):
+    header_size = struct.calcsize(self.HeaderFormat)
+    with open(self.filename, "rb") as f:
+      offset = 0
+      while True:
+        header = f.read(header_size)
+        if len(header) < header_size:
+          break
+        size, = struct.unpack(self.HeaderFormat, header)
+        raw = f.read(size)
+        if len(raw) < size:
+          break
+        corpus_seq_idx, seq_tag, _ = pickle.loads(raw)
+        self._index[corpus_seq_idx] = offset
+        self._seq_tags[seq_tag] = corpus_seq_idx
+        offset += header_size + size
+    if offset < os.path.getsize(self.filename):
+      print("%s: remove incomplete last record in %r." % (self.__class__.__name__, self.filename), file=log.v3)
+      with open(self.filename, "r+b") as f:
+        f.truncate(offset)
+
+  def add(self, corpus_seq_idx, seq_tag, data):
+    """
+    :param int corpus_seq_idx:
+    :param str seq_tag:
+    :param str|list[(float,str)]|dict[str]|numpy.ndarray data: whatever we want to write for this seq
+    """
+    assert corpus_seq_idx not in self._index, "%s: seq %i %r added twice" % (self, corpus_seq_idx, seq_tag)
+    raw = pickle.dumps((corpus_seq_idx, seq_tag, data), protocol=pickle.HIGHEST_PROTOCOL)
+    offset = self._file.tell()
+    self._file.write(struct.pack(self.HeaderFormat, len(raw)) + raw)
+    self._file.flush()
+    self._index[corpus_seq_idx] = offset
+    self._seq_tags[seq_tag] = corpus_seq_idx
+
+  def _read_record(self, f, offset):
+    """
+    :param typing.BinaryIO f:
+    :param int offset:
+    :return: (corpus_seq_idx, seq_tag, data)
+    :rtype: (int,str,object)
+    """
+    header_size = struct.calcsize(self.HeaderFormat)
+    f.seek(offset)
+    size, = struct.unpack(self.HeaderFormat, f.read(header_size))
+    return pickle.loads(f.read(size))
+
+  def write_final(self, output_filename, output_file_format):
+    """
+    Writes all records, ordered by corpus seq idx, to the final output file.
+    Only one record at a time is loaded into memory.
+    Afterwards, the record file is deleted.
+
+    :param str output_filename:
+    :param str output_file_format: "txt" or "py"
+    """
+    from returnn.util.basic import better_repr
+    assert output_file_format in {"txt", "py"}, "invalid output_file_format %r" % output_file_format
+    self.close()
+    assert self._index
+    assert 0 in self._index
+    assert len(self._index) - 1 in self._index
+    tmp_output_filename = output_filename + ".tmp"
+    with open(self.filename, "rb") as f, open(tmp_output_filename, "w") as output_file:
+      if output_file_format == "txt":
+        for corpus_seq_idx in range(len(self._index)):
+          _, seq_tag, data = self._read_record(f, self._index[corpus_seq_idx])
+          output_file.write("%s\n" % (data,))
+      else:
+        output_file.write("{\n")
+        with numpy.printoptions(threshold=sys.maxsize):
+          for corpus_seq_idx in range(len(self._index)):
+            _, seq_tag, data = self._read_record(f, self._index[corpus_seq_idx])
+            output_file.write("%r: %s,\n" % (seq_tag, better_repr(data)))
+        output_file.write("}\n")
+    os.rename(tmp_output_filename, output_filename)
+    os.remove(self.filename)
+
+  def close(self):
+    """
+    Closes the record file. Records which were added so far stay there, e.g. for a later resume.
+    """
+    if not self._file.closed:
+      self._file.close()
@@ -0,0 +1,142 @@
+"""
+Provides :class:`StepProfiler`, which collects a cheap per-phase time breakdown of the steps in an epoch,
+e.g. to see whether the training is input-bound or compute-bound.
+This is shared across different backends, and used e.g. by :func:`returnn.tf.engine.Runner.run`.
+"""
+
+from __future__ import print_function
+
+import os
+import time
+import json
+import typing
+
+
+class StepProfiler:
+  """
+  Usage in the step loop::
+
+    profiler.mark()  # start
+    while have_more_data():
+      profiler.mark("data_wait")  # time since the last mark is accounted to "data_wait"
+      ...
+      profiler.mark("session_run")
+      ...
+      profiler.end_step(queue_fill=...)  # remaining time is accounted to "other"
+
+  At the end of the epoch, :func:`get_summary` returns the aggregated stats,
+  which can be written via :func:`write_json_line`.
+  The overhead is just a few ``time.time()`` calls per step, and reading the RSS of the process.
+  """
+
+  def __init__(self):
+    self.phase_times = {}  # type: typing.Dict[str,float]  # phase name -> accumulated time in secs
+    self.phase_order = []  # type: typing.List[str]
+    self.num_steps = 0
+    self.start_time = None  # type: typing.Optional[float]
+    self._last_mark_time = None  # type: typing.Optional[float]
+    self._queue_fill_sum = 0.
+    self._queue_fill_min = None  # type: typing.Optional[float]
+    self._queue_fill_num_empty = 0
+    self._queue_fill_num = 0
+    self._rss_max = 0
+    self._rss_last = 0
+
+  def mark(self, phase=None):
+    """
+    :param str|None phase: the time since the last mark is accounted to this phase. None to just (re)start
+    """
+    now = time.time()
+    if self.start_time is None:
+      self.start_time = now
+    if phase is not None:
+      assert self._last_mark_time is not None
+      if phase not in self.phase_times:
+        self.phase_times[phase] = 0.
+        self.phase_order.append(phase)
+      self.phase_times[phase] += now - self._last_mark_time
+    self._last_mark_time = now
+
+  def end_step(self, queue_fill=None):
+    """
+    :param float|None queue_fill: fill level (between 0 and 1) of the data queue, e.g. sampled before the step
+    """
+    self.mark("other")
+    self.num_steps += 1
+    if queue_fill is not None:
+      self._queue_fill_sum += queue_fill
+      self._queue_fill_num += 1
+      if queue_fill <= 0:
+        self._queue_fill_num_empty += 1
+      self._queue_fill_min = queue_fill if self._queue_fill_min is None else min(self._queue_fill_min, queue_fill)
+    rss = get_host_rss_bytes()
+    if rss is not None:
+      self._rss_last = rss
+      self._rss_max = max(self._rss_max, rss)
+
+  def get_summary(self):
+    """
+    :return: num_steps, elapsed (secs), time per phase (secs), fraction per phase,
+      queue fill level avg/min, fraction of steps with an empty queue, RSS max/last (bytes)
+    :rtype: dict[str]
+    """
+    elapsed = (self._last_mark_time - self.start_time) if self.start_time is not None else 0.
+    summary = {
+      "num_steps": self.num_steps,
+      "elapsed": elapsed,
+      "time": {phase: self.phase_times[phase] for phase in self.phase_order},
+      "frac": {phase: (self.phase_times[phase] / elapsed) if elapsed > 0 else 0. for phase in self.phase_order}}
+    if self._queue_fill_num:
+      summary["queue_fill_avg"] = self._queue_fill_sum / self._queue_fill_num
+      summary["queue_fill_min"] = self._queue_fill_min
+      summary["queue_empty_frac"] = float(self._queue_fill_num_empty) / self._queue_fill_num
+    if self._rss_max:
+      summary["rss_max"] = self._rss_max
+      summary["rss_last"] = self._rss_last
+    return summary
+
+  def get_summary_str(self):
+    """
+    :return: short human-readable summary, e.g. for the log
+    :rtype: str
+    """
+    from returnn.util.basic import human_bytes_size
+    summary = self.get_summary()
+    parts = ["%s %.1f%%" % (phase, frac * 100.) for (phase, frac) in summary["frac"].items()]
+    if "queue_fill_avg" in summary:
+      parts.append("queue fill avg %.2f (empty in %.1f%% of steps)" % (
+        summary["queue_fill_avg"], summary["queue_empty_frac"] * 100.))
+    if "rss_max" in summary:
+      parts.append("max RSS %s" % human_bytes_size(summary["rss_max"]))
+    return ", ".join(parts)
+
+  def write_json_line(self, filename, **info):
+    """
+    Appends the summary as one JSON line to the file.
+
+    :param str filename:
+    :param info: additional info, e.g. epoch and dataset name
+    """
+    d = dict(info)
+    d.update(self.get_summary())
+    with open(filename, "a") as f:
+      f.write(json.dumps(d, sort_keys=True) + "\n")
+
+
+def get_host_rss_bytes():
+  """
+  :return: current resident set size (RSS) of this process in bytes, or max RSS if we cannot get the current one
+  :rtype: int|None
+  """
+  try:
+    with open("/proc/self/statm") as f:
+      return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+  except (IOError, OSError, ValueError, IndexError):
+    pass
+  try:
+    import resource
+    import sys
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024  # macOS: bytes, Linux: kilobytes
+  except ImportError:
+    return None
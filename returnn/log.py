@@ -273,7 +273,7 @@ def wrap_log_streams(alternative_stream, also_sys_stdout=False, tf_log_verbosity
   :param int|str|None tf_log_verbosity: e.g. "WARNING"
   :return: context manager which yields (original info stream v1, alternative_stream)
   """
-  v_attrib_keys = ["v%i" % i for i in range(6)] + ["error"]
+  v_attrib_keys = [key for key in ["v%i" % i for i in range(6)] + ["error"] if hasattr(log, key)]
   # Store original values.
   orig_v_list = log.v
   orig_v_attribs = {key: getattr(log, key) for key in v_attrib_keys}
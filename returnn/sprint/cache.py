@@ -12,7 +12,7 @@ import sys
 import os
 import typing
 import array
-from struct import pack, unpack
+from struct import pack, unpack, unpack_from
 import numpy
 import zlib
 import mmap
@@ -124,9 +124,11 @@ class FileArchive:
   # write routines
   def write_str(self, s):
     """
-    :param str s:
+    :param str|bytes s:
     :rtype: int
     """
+    if not isinstance(s, bytes):
+      s = s.encode("ascii")
     return self.f.write(pack("%ds" % len(s), s))
 
   def write_char(self, i):
@@ -395,7 +397,7 @@ class FileArchive:
       a = array.array('b')
       a.fromfile(self.f, comp)
       # unpack
-      b = zlib.decompress(a.tostring(), 15+32)
+      b = zlib.decompress(a.tobytes() if hasattr(a, "tobytes") else a.tostring(), 15+32)  # tostring for Python 2
       # substitute self.f by an anonymous memmap file object
       # restore original file handle after we're done
       backup_f = self.f
@@ -494,29 +496,457 @@ class FileArchive:
     self.ft[filename] = FileInfo(filename, pos, size, 0, len(self.ft))
 
 
+class FileArchiveMmap:
+  """
+  Fast read-only access to a Sprint archive, as an alternative to :class:`FileArchive`.
+  The archive is memory-mapped and the file info table is kept in arrays.
+  Features and alignments are decoded as a whole via numpy (:func:`read_features`, :func:`read_alignment`),
+  instead of frame by frame.
+  """
+
+  def __init__(self, filename):
+    """
+    :param str filename:
+    """
+    self.filename = filename
+    self.allophones = []  # type: typing.List[str]
+    with open(filename, "rb") as f:
+      self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header_len = len(FileArchive.SprintCacheHeader)
+    assert self.mmap[:header_len].decode("ascii") == FileArchive.SprintCacheHeader
+    self.names = []  # type: typing.List[str]
+    if unpack_from("b", self.mmap, header_len)[0]:
+      positions, sizes, compressed = self._read_file_info_table()
+    else:
+      positions, sizes, compressed = self._scan_archive(header_len + 1)
+    self.positions = numpy.array(positions, dtype="int64")
+    self.sizes = numpy.array(sizes, dtype="int64")
+    self.compressed = numpy.array(compressed, dtype="int64")
+    self.name_idx = {name: i for (i, name) in enumerate(self.names)}
+    self._short_seg_names = {os.path.basename(n): n for n in self.names}
+    if len(self._short_seg_names) < len(self.name_idx):
+      # We don't have a unique mapping, so we cannot use this.
+      self._short_seg_names.clear()
+
+  def __del__(self):
+    self.mmap.close()
+
+  def _read_file_info_table(self):
+    """
+    :return: positions, sizes, compressed, and fills self.names. like :func:`FileArchive.read_file_info_table`
+    :rtype: (list[int],list[int],list[int])
+    """
+    m = self.mmap
+    pos = unpack_from("q", m, len(m) - 8)[0]
+    count = unpack_from("i", m, pos)[0]
+    pos += 4
+    positions, sizes, compressed = [], [], []
+    for _ in range(max(count, 0)):
+      str_len = unpack_from("i", m, pos)[0]
+      name = m[pos + 4:pos + 4 + str_len].decode("ascii")
+      pos += 4 + str_len
+      entry_pos, size, comp = unpack_from("qii", m, pos)
+      pos += 16
+      self.names.append(name)
+      positions.append(entry_pos)
+      sizes.append(size)
+      compressed.append(comp)
+    return positions, sizes, compressed
+
+  def _scan_archive(self, pos):
+    """
+    :param int pos: after the header
+    :return: positions, sizes, compressed, and fills self.names. like :func:`FileArchive.scan_archive`
+    :rtype: (list[int],list[int],list[int])
+    """
+    m = self.mmap
+    positions, sizes, compressed = [], [], []
+    while pos + 4 <= len(m):
+      tag = unpack_from("I", m, pos)[0]
+      pos += 4
+      if tag != FileArchive.start_recovery_tag:
+        continue
+      fn_len = unpack_from("i", m, pos)[0]
+      name = m[pos + 4:pos + 4 + fn_len].decode("ascii")
+      pos += 4 + fn_len
+      size, comp = unpack_from("ii", m, pos)
+      self.names.append(name)
+      positions.append(pos)
+      sizes.append(size)
+      compressed.append(comp)
+      pos += 12 + size + 4  # size, comp, chk, data, end tag
+    return positions, sizes, compressed
+
+  def file_list(self):
+    """
+    :rtype: list[str]
+    """
+    return self.names
+
+  def has_entry(self, filename):
+    """
+    :param str filename: argument for self.read()
+    :return: True if we have this entry
+    """
+    return filename in self.name_idx
+
+  def get_size(self, filename):
+    """
+    :param str filename:
+    :return: size of the entry in bytes (uncompressed)
+    :rtype: int
+    """
+    return int(self.sizes[self._get_idx(filename)])
+
+  def _get_idx(self, filename):
+    """
+    :param str filename:
+    :rtype: int
+    """
+    if filename not in self.name_idx:
+      if filename in self._short_seg_names:
+        filename = self._short_seg_names[filename]
+    return self.name_idx[filename]
+
+  def _get_entry_buffer(self, filename):
+    """
+    :param str filename:
+    :return: the (uncompressed) content of the entry, or None if it is empty
+    :rtype: memoryview|bytes|None
+    """
+    pos = self.positions[self._get_idx(filename)]
+    size, comp = unpack_from("II", self.mmap, pos)
+    if size == 0:
+      return None
+    pos += 12  # size, comp, chk
+    if comp > 0:
+      return zlib.decompress(self.mmap[pos:pos + comp], 15 + 32)
+    if sys.version_info[0] < 3:  # Python 2 cannot make a memoryview of a mmap
+      return self.mmap[pos:pos + size]
+    return memoryview(self.mmap)[pos:pos + size]
+
+  def set_allophones(self, f):
+    """
+    :param str f: allophone filename. line-separated. will ignore lines starting with "#"
+    """
+    del self.allophones[:]
+    for line in open(f):
+      line = line.strip()
+      if line.startswith("#"):
+        continue
+      self.allophones.append(line)
+
+  def get_states(self, mixes):
+    """
+    Vectorized variant of :func:`FileArchive.get_state`.
+
+    :param numpy.ndarray mixes: (T,), allophone state idx (as in the archive)
+    :return: (allophone idx, state idx), both of shape (T,)
+    :rtype: (numpy.ndarray,numpy.ndarray)
+    """
+    assert self.allophones
+    max_states = 6
+    mixes = mixes.copy()
+    states = numpy.zeros_like(mixes)
+    active = numpy.ones(mixes.shape, dtype=bool)
+    for state in range(max_states):
+      states[active] = state
+      active &= mixes >= len(self.allophones)
+      mixes[active] -= (1 << 26)
+    assert numpy.all(mixes >= 0)
+    return mixes, states
+
+  def read_features(self, filename):
+    """
+    :param str filename: the entry-name in the archive
+    :return: (times, features), times of shape (T,2) float64 (start-time,end-time), features of shape (T,D) float32,
+      or None if the entry is empty
+    :rtype: (numpy.ndarray,numpy.ndarray)|None
+    """
+    buf = self._get_entry_buffer(filename)
+    if buf is None:
+      return None
+    type_len = unpack_from("I", buf, 0)[0]
+    typ = bytes(buf[4:4 + type_len]).decode("ascii")
+    assert typ == "vector-f32"
+    pos = 4 + type_len
+    count = unpack_from("I", buf, pos)[0]
+    pos += 4
+    dim = unpack_from("I", buf, pos)[0] if count > 0 else 0
+    # Each frame: size, size x f32, 2 x f64. With a fixed dim, we can read all frames at once.
+    frame_dtype = numpy.dtype([("size", "u4"), ("data", "f4", (dim,)), ("time", "f8", (2,))])
+    if len(buf) - pos >= count * frame_dtype.itemsize:
+      frames = numpy.frombuffer(buf, dtype=frame_dtype, count=count, offset=pos)
+      if numpy.all(frames["size"] == dim):
+        return frames["time"].copy(), frames["data"].copy()
+    raise Exception("%s: entry %r has frames of different dimension" % (self.filename, filename))
+
+  def read_alignment(self, filename, split_states=False):
+    """
+    :param str filename: the entry-name in the archive
+    :param bool split_states: split the allophone state idx via :func:`get_states` into (allophone, state),
+      like :func:`FileArchive.read` does for "align". needs :func:`set_allophones`
+    :return: (time, allophone state idx), both of shape (T,) int32, or None if the entry is empty.
+      With split_states, (time, allophone idx, state idx).
+    :rtype: (numpy.ndarray,numpy.ndarray)|(numpy.ndarray,numpy.ndarray,numpy.ndarray)|None
+    """
+    buf = self._get_entry_buffer(filename)
+    if buf is None:
+      return None
+    type_len = unpack_from("I", buf, 0)[0]
+    typ = bytes(buf[4:4 + type_len]).decode("ascii")
+    assert typ == "flow-alignment"
+    pos = 4 + type_len + 4  # flag
+    typ = bytes(buf[pos:pos + 8]).decode("ascii")
+    if typ not in ["ALIGNRLE", "AALPHRLE"]:
+      raise Exception("No valid alignment header found (found: %r). Wrong cache?" % typ)
+    size = unpack_from("I", buf, pos + 8)[0]
+    pos += 12
+    if size >= (1 << 31):
+      raise NotImplementedError("No support for weighted alignments yet.")
+    # We collect the runs of the RLE scheme, and then decode all values at once.
+    run_pos, run_num_values, run_repeats, run_times = [], [], [], []
+    time = num_frames = 0
+    while num_frames < size:
+      n = unpack_from("b", buf, pos)[0]
+      if n > 0:  # n different values
+        run_pos.append(pos + 1)
+        run_num_values.append(n)
+        run_repeats.append(1)
+        run_times.append(time)
+        pos += 1 + 4 * n
+        time += n
+        num_frames += n
+      elif n < 0:  # one value, repeated -n times
+        run_pos.append(pos + 1)
+        run_num_values.append(1)
+        run_repeats.append(-n)
+        run_times.append(time)
+        pos += 1 + 4
+        time += -n
+        num_frames += -n
+      else:
+        time = unpack_from("i", buf, pos + 1)[0]
+        pos += 1 + 4
+    run_pos = numpy.array(run_pos, dtype="int64")
+    run_num_values = numpy.array(run_num_values, dtype="int64")
+    run_repeats = numpy.array(run_repeats, dtype="int64")
+    run_times = numpy.array(run_times, dtype="int64")
+    value_run, value_idx_in_run = _get_run_idxs(run_num_values)
+    value_pos = run_pos[value_run] + 4 * value_idx_in_run
+    raw = numpy.frombuffer(buf, dtype="uint8")
+    values = raw[value_pos[:, None] + numpy.arange(4)[None, :]].copy().view("int32").reshape((len(value_pos),))
+    mixes = numpy.repeat(values, run_repeats[value_run])
+    frame_run, frame_idx_in_run = _get_run_idxs(run_num_values * run_repeats)
+    times = (run_times[frame_run] + frame_idx_in_run).astype("int32")
+    if split_states:
+      return (times,) + self.get_states(mixes)
+    return times, mixes
+
+  def read(self, filename, typ):
+    """
+    Like :func:`FileArchive.read`, with the same return types.
+
+    :param str filename: the entry-name in the archive
+    :param str typ: "str", "feat" or "align"
+    :rtype: str|(list[numpy.ndarray],list[numpy.ndarray])|list[(int,int,int)]|None
+    """
+    if typ == "str":
+      buf = self._get_entry_buffer(filename)
+      return bytes(buf).decode("ascii") if buf is not None else None
+    elif typ == "feat":
+      res = self.read_features(filename)
+      if res is None:
+        return None
+      times, feats = res
+      return list(times), list(feats)
+    elif typ in ["align", "align_raw"]:
+      res = self.read_alignment(filename)
+      if res is None:
+        return None
+      times, mixes = res
+      allos, states = self.get_states(mixes)
+      return list(zip(times.tolist(), allos.tolist(), states.tolist()))
+    else:
+      raise ValueError("invalid typ %r" % typ)
+
+
+def _get_run_idxs(run_lens):
+  """
+  :param numpy.ndarray run_lens: (num_runs,)
+  :return: (run idx, idx in run), both of shape (sum(run_lens),)
+  :rtype: (numpy.ndarray,numpy.ndarray)
+  """
+  run_idx = numpy.repeat(numpy.arange(len(run_lens)), run_lens)
+  idx_in_run = numpy.arange(len(run_idx)) - numpy.repeat(numpy.cumsum(run_lens) - run_lens, run_lens)
+  return run_idx, idx_in_run
+
+
 class FileArchiveBundle:
   """
   File archive bundle.
+  The archives of a bundle are opened lazily, on first access of some of its content.
   """
 
-  def __init__(self, filename=None):
+  def __init__(self, filename=None, use_mmap=False, num_threads=8, index_filename=None):
     """
     :param str|None filename: .bundle file
-    """
-    # filename -> FileArchive
-    self.archives = {}  # type: typing.Dict[str,FileArchive]
-    # archive content file -> FileArchive
-    self.files = {}  # type: typing.Dict[str,FileArchive]
+    :param bool use_mmap: use :class:`FileArchiveMmap` instead of :class:`FileArchive`
+    :param int num_threads: to read the file info tables of the archives of a bundle in parallel
+    :param str|bool|None index_filename: for the bundle (see :func:`add_bundle`).
+      If set, we store the merged index (content file -> archive) in this file,
+      and later we load it from there and skip reading the file info tables of the archives.
+      True means next to the bundle file.
+    """
+    self.use_mmap = use_mmap
+    self.num_threads = num_threads
+    # filename -> FileArchive, or None if not opened yet
+    self.archives = {}  # type: typing.Dict[str,typing.Optional[typing.Union[FileArchive,FileArchiveMmap]]]
+    # archive content file -> archive filename
+    self.files = {}  # type: typing.Dict[str,str]
     self._short_seg_names = {}
+    self._allophones_filename = None  # type: typing.Optional[str]
     if filename is not None:
-      self.add_bundle(filename=filename)
+      self.add_bundle(filename=filename, index_filename=index_filename)
 
-  def add_bundle(self, filename):
+  def add_bundle(self, filename, index_filename=None):
     """
     :param str filename: bundle
+    :param str|bool|None index_filename: see :func:`__init__`
     """
+    archive_filenames = []
     for line in open(filename).read().splitlines():
-      self.add_archive(filename=line)
+      if line not in self.archives and line not in archive_filenames:
+        archive_filenames.append(line)
+    if index_filename is True:
+      index_filename = filename + ".index"
+    if index_filename:
+      index = self._load_index(index_filename, archive_filenames)
+      if index is not None:
+        for archive_filename, content_filenames in zip(archive_filenames, index):
+          self.archives[archive_filename] = None  # open lazily
+          self._add_content_filenames(archive_filename, content_filenames)
+        return
+    if self.num_threads > 1 and len(archive_filenames) > 1:
+      archives = self._open_archives_parallel(archive_filenames)
+    else:
+      archives = [self._open_archive(archive_filename) for archive_filename in archive_filenames]
+    for archive_filename, archive in zip(archive_filenames, archives):
+      self.archives[archive_filename] = archive
+      self._add_content_filenames(archive_filename, list(archive.file_list()))
+    if index_filename:
+      self._save_index(
+        index_filename, archive_filenames, [list(archive.file_list()) for archive in archives])
+
+  def _open_archives_parallel(self, archive_filenames):
+    """
+    Like :func:`_open_archive` for each archive, but in multiple threads.
+    We use plain threads, as concurrent.futures is not available in Python 2 (e.g. the Python embedded in Sprint).
+
+    :param list[str] archive_filenames:
+    :rtype: list[FileArchive|FileArchiveMmap]
+    """
+    from threading import Thread
+    num_threads = min(self.num_threads, len(archive_filenames))
+    archives = [None] * len(archive_filenames)  # type: typing.List[typing.Union[FileArchive,FileArchiveMmap,None]]
+    exc_infos = []
+
+    def _thread_main(thread_idx):
+      """
+      :param int thread_idx:
+      """
+      # noinspection PyBroadException
+      try:
+        for i in range(thread_idx, len(archive_filenames), num_threads):
+          archives[i] = self._open_archive(archive_filenames[i])
+      except Exception:
+        exc_infos.append(sys.exc_info())
+
+    threads = [Thread(target=_thread_main, args=(i,)) for i in range(num_threads)]
+    for thread in threads:
+      thread.daemon = True
+      thread.start()
+    for thread in threads:
+      thread.join()
+    if exc_infos:
+      raise exc_infos[0][1]
+    return archives
+
+  @staticmethod
+  def _get_index_archives_info(archive_filenames):
+    """
+    :param list[str] archive_filenames:
+    :return: what we store in the index to check whether it is still valid
+    :rtype: list[(str,int,float)]
+    """
+    info = []
+    for archive_filename in archive_filenames:
+      stat = os.stat(archive_filename)
+      info.append((archive_filename, stat.st_size, stat.st_mtime))
+    return info
+
+  @classmethod
+  def _load_index(cls, index_filename, archive_filenames):
+    """
+    :param str index_filename:
+    :param list[str] archive_filenames:
+    :return: content filenames for each archive, or None if there is no (valid) index
+    :rtype: list[list[str]]|None
+    """
+    import pickle
+    if not os.path.exists(index_filename):
+      return None
+    try:
+      with open(index_filename, "rb") as f:
+        index = pickle.load(f)
+    except Exception:  # e.g. incomplete or different format. just recreate it
+      return None
+    if index.get("archives") != cls._get_index_archives_info(archive_filenames):
+      return None
+    return index["content_filenames"]
+
+  @classmethod
+  def _save_index(cls, index_filename, archive_filenames, content_filenames):
+    """
+    :param str index_filename:
+    :param list[str] archive_filenames:
+    :param list[list[str]] content_filenames: for each archive
+    """
+    import pickle
+    import tempfile
+    index = {"archives": cls._get_index_archives_info(archive_filenames), "content_filenames": content_filenames}
+    try:
+      # Write to a temp file and rename it, such that concurrent readers only see a complete index.
+      fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(index_filename)), prefix=".tmp-")
+      with os.fdopen(fd, "wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+      os.rename(tmp_filename, index_filename)
+    except OSError:  # e.g. no write access. the index is just an optimization, so ignore this
+      pass
+
+  def _open_archive(self, filename):
+    """
+    :param str filename: single archive
+    :rtype: FileArchive|FileArchiveMmap
+    """
+    if self.use_mmap:
+      a = FileArchiveMmap(filename)
+    else:
+      a = FileArchive(filename, must_exists=True)
+    if self._allophones_filename:
+      a.set_allophones(self._allophones_filename)
+    return a
+
+  def _add_content_filenames(self, archive_filename, content_filenames):
+    """
+    :param str archive_filename:
+    :param list[str] content_filenames:
+    """
+    for f in content_filenames:
+      self.files[f] = archive_filename
+    short_seg_names = {os.path.basename(n): n for n in content_filenames}
+    if len(short_seg_names) == len(content_filenames):  # only if we have a unique mapping, like FileArchive
+      self._short_seg_names.update(short_seg_names)
 
   def add_archive(self, filename):
     """
@@ -524,11 +954,8 @@ class FileArchiveBundle:
     """
     if filename in self.archives:
       return
-    self.archives[filename] = a = FileArchive(filename, must_exists=True)
-    for f in a.ft.keys():
-      self.files[f] = a
-    # noinspection PyProtectedMember
-    self._short_seg_names.update(a._short_seg_names)
+    self.archives[filename] = a = self._open_archive(filename)
+    self._add_content_filenames(filename, list(a.file_list()))
 
   def add_bundle_or_archive(self, filename):
     """
@@ -553,6 +980,21 @@ class FileArchiveBundle:
     """
     return filename in self.files
 
+  def _get_archive(self, filename):
+    """
+    :param str filename: the entry-name in the archive
+    :return: (archive, filename), where the archive is opened if not done yet
+    :rtype: (FileArchive|FileArchiveMmap,str)
+    """
+    if filename not in self.files:
+      if filename in self._short_seg_names:
+        filename = self._short_seg_names[filename]
+    archive_filename = self.files[filename]
+    archive = self.archives[archive_filename]
+    if archive is None:
+      self.archives[archive_filename] = archive = self._open_archive(archive_filename)
+    return archive, filename
+
   def read(self, filename, typ):
     """
     :param str filename: the entry-name in the archive
@@ -567,28 +1009,64 @@ class FileArchiveBundle:
 
     Uses FileArchive.read().
     """
-    if filename not in self.files:
-      if filename in self._short_seg_names:
-        filename = self._short_seg_names[filename]
-    return self.files[filename].read(filename, typ)
+    archive, filename = self._get_archive(filename)
+    return archive.read(filename, typ)
+
+  def get_size(self, filename):
+    """
+    :param str filename: the entry-name in the archive
+    :rtype: int
+    """
+    archive, filename = self._get_archive(filename)
+    if isinstance(archive, FileArchive):
+      return archive.ft[filename].size
+    return archive.get_size(filename)
+
+  def read_features(self, filename):
+    """
+    :param str filename: the entry-name in the archive
+    :return: see :func:`FileArchiveMmap.read_features`
+    :rtype: (numpy.ndarray,numpy.ndarray)|None
+    """
+    assert self.use_mmap
+    archive, filename = self._get_archive(filename)
+    return archive.read_features(filename)
+
+  def read_alignment(self, filename, split_states=False):
+    """
+    :param str filename: the entry-name in the archive
+    :param bool split_states:
+    :return: see :func:`FileArchiveMmap.read_alignment`
+    :rtype: (numpy.ndarray,numpy.ndarray)|(numpy.ndarray,numpy.ndarray,numpy.ndarray)|None
+    """
+    assert self.use_mmap
+    archive, filename = self._get_archive(filename)
+    return archive.read_alignment(filename, split_states=split_states)
 
   def set_allophones(self, filename):
     """
     :param str filename: allophone filename
     """
+    self._allophones_filename = filename
     for a in self.archives.values():
-      a.set_allophones(filename)
+      if a is not None:
+        a.set_allophones(filename)
 
 
-def open_file_archive(archive_filename, must_exists=True):
+def open_file_archive(archive_filename, must_exists=True, use_mmap=False, bundle_index=False):
   """
   :param str archive_filename:
   :param bool must_exists:
-  :rtype: FileArchiveBundle|FileArchive
+  :param bool use_mmap: read-only, via :class:`FileArchiveMmap`
+  :param bool bundle_index: for a bundle, store the merged index next to it. see :class:`FileArchiveBundle`
+  :rtype: FileArchiveBundle|FileArchive|FileArchiveMmap
   """
   if archive_filename.endswith(".bundle"):
     assert must_exists
-    return FileArchiveBundle(archive_filename)
+    return FileArchiveBundle(archive_filename, use_mmap=use_mmap, index_filename=bundle_index)
+  elif use_mmap:
+    assert must_exists
+    return FileArchiveMmap(archive_filename)
   else:
     return FileArchive(archive_filename, must_exists=must_exists)
 
@@ -10,6 +10,7 @@ from __future__ import print_function
 import sys
 import os
 import typing
+import numpy
 from returnn.util import better_exchook
 import returnn.util.task_system as task_system
 from returnn.util.task_system import Pickler
@@ -137,7 +138,8 @@ def _init_global_sprint_dataset(input_dim, output_dim, config):
   num_segments = len(segmentOrderList) if segmentOrderList is not None else None
   sprintDataset = ExternSprintDatasetSource(
     c2p_fd=int(config["c2p_fd"]), p2c_fd=int(config["p2c_fd"]),
-    input_dim=input_dim, output_dim=output_dim, num_segments=num_segments)
+    input_dim=input_dim, output_dim=output_dim, num_segments=num_segments,
+    shm_ring_buffer_filename=config.get("shm_ring_buffer"))
 
 
 # Name need to stay like this, for compatibility.
@@ -308,9 +310,13 @@ class ExternSprintDatasetSource:
   This will send data to ExternSprintDataset over a pipe.
   We expect that we are child process and the parent process has spawned us via ExternSprintDataset
   and is waiting for our data.
+
+  If the parent has given us a shared memory ring buffer (:class:`returnn.util.task_system.ShmRingBuffer`),
+  the numpy arrays are written into it, and the pipe only gets the references to them ("data_shm").
+  Arrays which do not fit into the buffer currently are sent over the pipe as usual.
   """
 
-  def __init__(self, c2p_fd, p2c_fd, input_dim, output_dim, num_segments):
+  def __init__(self, c2p_fd, p2c_fd, input_dim, output_dim, num_segments, shm_ring_buffer_filename=None):
     """
     :param int c2p_fd: child-to-parent file descriptor
     :param int p2c_fd: parent-to-child file descriptor
@@ -318,9 +324,13 @@ class ExternSprintDatasetSource:
     :type output_dim: int
     :type num_segments: int | None
     :param num_segments: can be None if not known in advance
+    :param str|None shm_ring_buffer_filename: created by the parent, see :class:`task_system.ShmRingBuffer`
     """
     self.pipe_c2p = os.fdopen(c2p_fd, "wb")
     self.pipe_p2c = os.fdopen(p2c_fd, "rb")
+    self.shm_ring_buffer = None  # type: typing.Optional[task_system.ShmRingBuffer]
+    if shm_ring_buffer_filename:
+      self.shm_ring_buffer = task_system.ShmRingBuffer(shm_ring_buffer_filename)
     self._send("init", (input_dim, output_dim, num_segments))
 
   def _send(self, data_type, args=None):
@@ -344,8 +354,26 @@ class ExternSprintDatasetSource:
     :param numpy.ndarray features: 2D array, (feature,time)
     :param dict[str,numpy.ndarray] targets: each target is either 1D (time->idx) or 2D (time,class)
     """
+    if self.shm_ring_buffer:
+      # The references are tuples. All other values (e.g. the orthography) are sent as-is.
+      features = self._write_shm(features)
+      targets = {key: self._write_shm(value) for (key, value) in targets.items()}
+      self._send("data_shm", (segment_name, features, targets))
+      return
     self._send("data", (segment_name, features, targets))
 
+  def _write_shm(self, value):
+    """
+    :param numpy.ndarray|object value:
+    :return: the reference from :func:`task_system.ShmRingBuffer.write_array`, or the value itself as fallback
+    :rtype: tuple|numpy.ndarray|object
+    """
+    if isinstance(value, numpy.ndarray) and not value.dtype.hasobject:
+      ref = self.shm_ring_buffer.write_array(value)
+      if ref is not None:
+        return ref
+    return value
+
   def close(self):
     """
     Close pipe fds.
@@ -353,5 +381,7 @@ class ExternSprintDatasetSource:
     self._send("exit")
     self.pipe_c2p.close()
     self.pipe_p2c.close()
+    if self.shm_ring_buffer:
+      self.shm_ring_buffer.close()
 
 # End Sprint PythonControl interface. }
@@ -14,7 +14,14 @@ from __future__ import print_function
 import os
 import sys
 import time
+from collections import deque
 from threading import Event, Thread
+try:
+  # noinspection PyCompatibility
+  from Queue import Queue, Empty, Full
+except ImportError:
+  # noinspection PyCompatibility
+  from queue import Queue, Empty, Full
 import typing
 import numpy
 
@@ -123,6 +130,8 @@ def init_python_feature_scorer(config, **kwargs):
   cls = PythonFeatureScorer
   if rnn.config.has("SprintInterfacePythonFeatureScorer"):
     cls = rnn.config.typed_value("SprintInterfacePythonFeatureScorer")
+  elif rnn.config.has("sprint_feature_scorer_lookahead_dataset"):
+    cls = BatchedPythonFeatureScorer
   return cls(sprint_opts=sprint_opts, **kwargs)
 
 
@@ -314,6 +323,236 @@ class PythonFeatureScorer(object):
     # print("get scores, time", time, "max_frames", self.scores.shape[1])
     return self.scores[:, time]
 
+
+class BatchedPythonFeatureScorer(PythonFeatureScorer):
+  """
+  Like :class:`PythonFeatureScorer`, but the scores are computed in batches over multiple segments,
+  in a background thread, ahead of the requests by Sprint.
+  This is used by default if ``sprint_feature_scorer_lookahead_dataset`` is set in the config.
+  Only implemented for TF.
+
+  Sprint gives us the features of a single segment and waits for its scores before it gives us the next one.
+  Thus we read the same segments in the same order from the lookahead dataset
+  (``sprint_feature_scorer_lookahead_dataset``, e.g. a HDF file with the dumped Sprint features),
+  and forward them in batches (``sprint_feature_scorer_batch_size`` frames, ``sprint_feature_scorer_max_seqs`` seqs).
+  The scores of up to ``sprint_feature_scorer_lookahead`` segments are kept in the queue.
+  In :func:`compute`, we search the features from Sprint in the next ``sprint_feature_scorer_lookahead``
+  precomputed segments (the lookahead window).
+  Precomputed segments before the match were skipped by Sprint (e.g. by a segment filter), and are dropped.
+  If no segment in the window matches, this segment is forwarded on its own (like the base class),
+  and we keep the window, as Sprint might have given us an extra or reordered segment.
+  Only after ``max_lookahead_misses`` segments in a row without a match, we stop the lookahead.
+  """
+
+  max_lookahead_misses = 5
+
+  def __init__(self, **kwargs):
+    super(BatchedPythonFeatureScorer, self).__init__(**kwargs)
+    self.lookahead_dataset = None  # type: typing.Optional[Dataset]
+    # Items are (seq_tag, features (time,input_dim), scores (time,output_dim)),
+    # or (None, None, None) at the end, or (None, exception, None).
+    self.lookahead_queue = None  # type: typing.Optional[Queue]
+    self.lookahead_thread = None  # type: typing.Optional[Thread]
+    self.lookahead_stop = False
+    # Items from the queue which Sprint did not request yet, same format as in the queue.
+    self.lookahead_window = deque()  # type: typing.Deque[typing.Tuple[str,numpy.ndarray,numpy.ndarray]]
+    self.lookahead_window_size = 0
+    self.lookahead_end = False  # the queue has no more segments
+    self.num_lookahead_misses = 0  # in a row
+    self.segment_name = None  # type: typing.Optional[str]
+    self.num_segments_batched = 0
+    self.num_segments_fallback = 0
+
+  def init(self, input_dim, output_dim):
+    """
+    Called by Sprint.
+
+    :param int input_dim:
+    :param int output_dim: number of emission classes
+    """
+    super(BatchedPythonFeatureScorer, self).init(input_dim=input_dim, output_dim=output_dim)
+    assert BackendEngine.is_tensorflow_selected(), "%s: only implemented for TF" % self.__class__.__name__
+    self.lookahead_dataset = init_dataset(self.config.typed_value("sprint_feature_scorer_lookahead_dataset"))
+    self.lookahead_window_size = self.config.int("sprint_feature_scorer_lookahead", 100)
+    self.lookahead_queue = Queue(maxsize=self.lookahead_window_size)
+    self.lookahead_window.clear()
+    self.lookahead_end = False
+    self.num_lookahead_misses = 0
+    self.lookahead_stop = False
+    self.lookahead_thread = Thread(target=self._lookahead_thread_main, name="%s lookahead" % self.__class__.__name__)
+    self.lookahead_thread.daemon = True
+    self.lookahead_thread.start()
+
+  def exit(self):
+    """
+    Called by Sprint at exit.
+    """
+    self._stop_lookahead()
+    print("SprintInterface: %s: exit(), %i segments via lookahead batches, %i segments via fallback" % (
+      self.__class__.__name__, self.num_segments_batched, self.num_segments_fallback))
+
+  def _lookahead_thread_main(self):
+    dataset = self.lookahead_dataset
+    # noinspection PyBroadException
+    try:
+      dataset.init_seq_order(epoch=1)
+      batches = dataset.generate_batches(
+        recurrent_net=True,
+        batch_size=self.config.int("sprint_feature_scorer_batch_size", 20000),
+        max_seqs=self.config.int("sprint_feature_scorer_max_seqs", 32),
+        used_data_keys={"data"})
+      while batches.has_more() and not self.lookahead_stop:
+        batch, = batches.peek_next_n(1)
+        batches.advance(1)
+        dataset.load_seqs(batch.start_seq, batch.end_seq)
+        seq_idxs = [part.seq_idx for part in batch.seqs]
+        features_list = [dataset.get_data(seq_idx, "data") for seq_idx in seq_idxs]
+        scores_list = self._compute_scores_batch(features_list)
+        for seq_idx, features, scores in zip(seq_idxs, features_list, scores_list):
+          if not self._lookahead_put((dataset.get_tag(seq_idx), features, scores)):
+            return
+      self._lookahead_put((None, None, None))
+    except Exception as exc:
+      print("SprintInterface: %s: lookahead failed: %s: %s" % (self.__class__.__name__, type(exc).__name__, exc))
+      sys.excepthook(*sys.exc_info())
+      self._lookahead_put((None, exc, None))
+
+  def _compute_scores_batch(self, features_list):
+    """
+    :param list[numpy.ndarray] features_list: each in format (time,input-feature)
+    :return: scores for each segment, in format (time,output-dim), in -log space
+    :rtype: list[numpy.ndarray]
+    """
+    scores, seq_lens = _forward_batch(features_list)  # posteriors (batch,time,output-dim)
+    if not scores.flags.writeable:
+      scores = scores.copy()
+    # Transfer to -log space, in-place for the whole batch. The padded frames are ignored.
+    with numpy.errstate(divide="ignore"):
+      numpy.log(scores, out=scores)
+    numpy.negative(scores, out=scores)
+    if self.priors is not None:
+      scores -= self.priors
+    return [scores[i, :seq_lens[i]] for i in range(len(features_list))]
+
+  def _lookahead_put(self, item):
+    """
+    :param (str|None,numpy.ndarray|Exception|None,numpy.ndarray|None) item:
+    :return: False if the lookahead was stopped meanwhile
+    :rtype: bool
+    """
+    while not self.lookahead_stop:
+      try:
+        self.lookahead_queue.put(item, timeout=1.)
+        return True
+      except Full:
+        continue
+    return False
+
+  def _lookahead_get(self):
+    """
+    :return: (seq_tag, features, scores), or None if the lookahead dataset has no more segments
+    :rtype: (str,numpy.ndarray,numpy.ndarray)|None
+    """
+    while True:
+      try:
+        # With a timeout, because of :func:`returnn.util.basic.init_thread_join_hack` in the main thread.
+        seq_tag, features, scores = self.lookahead_queue.get(timeout=1.)
+        break
+      except Empty:
+        continue
+    if isinstance(features, Exception):
+      raise features
+    if seq_tag is None:
+      return None
+    return seq_tag, features, scores
+
+  def _lookahead_find(self, features):
+    """
+    :param numpy.ndarray features: (time,input_dim), from Sprint
+    :return: index in the lookahead window of the matching segment, or None if no segment in the window matches
+    :rtype: int|None
+    """
+    idx = 0
+    while True:
+      if idx >= len(self.lookahead_window):
+        if self.lookahead_end or len(self.lookahead_window) >= self.lookahead_window_size:
+          return None
+        item = self._lookahead_get()
+        if item is None:
+          self.lookahead_end = True
+          return None
+        self.lookahead_window.append(item)
+      seq_tag, features_, scores = self.lookahead_window[idx]
+      if features_.shape == features.shape and numpy.allclose(features_, features):
+        return idx
+      idx += 1
+
+  def _stop_lookahead(self):
+    if not self.lookahead_thread:
+      return
+    self.lookahead_stop = True
+    self.lookahead_thread.join()
+    self.lookahead_thread = None
+    self.lookahead_queue = None
+    self.lookahead_window.clear()
+
+  def reset(self, num_frames):
+    """
+    Called by Sprint.
+    Called when we shall flush any buffers.
+
+    :param int num_frames:
+    """
+    super(BatchedPythonFeatureScorer, self).reset(num_frames=num_frames)
+    self.segment_name = None
+
+  def get_segment_name(self):
+    """
+    :rtype: str
+    """
+    if self.segment_name:
+      return self.segment_name
+    return super(BatchedPythonFeatureScorer, self).get_segment_name()
+
+  def compute(self, num_frames):
+    """
+    Called by Sprint.
+    All the features which we received so far should be evaluated.
+
+    :param int num_frames:
+    """
+    assert 0 < num_frames == len(self.features)
+    if self.lookahead_thread:
+      idx = self._lookahead_find(self.get_features().T)
+      if idx is not None:
+        if idx > 0:
+          print("SprintInterface: %s: segment %i: skipping %i lookahead segments, starting with %r" % (
+            self.__class__.__name__, self.segment_count, idx, self.lookahead_window[0][0]), file=log.v4)
+        for _ in range(idx):
+          self.lookahead_window.popleft()
+        seq_tag, features, scores = self.lookahead_window.popleft()
+        assert scores.shape == (num_frames, self.output_dim)
+        self.segment_name = seq_tag
+        self.scores = scores.T  # Sprint format (output-dim,time)
+        self.num_segments_batched += 1
+        self.num_lookahead_misses = 0
+        return
+      self.num_lookahead_misses += 1
+      if self.lookahead_end and not self.lookahead_window:
+        print("SprintInterface: %s: lookahead dataset has no more segments, fall back to single segments" % (
+          self.__class__.__name__,), file=log.v2)
+        self._stop_lookahead()
+      elif self.num_lookahead_misses >= self.max_lookahead_misses:
+        print(
+          "SprintInterface: %s: %i segments in a row not found in the lookahead, fall back to single segments" % (
+            self.__class__.__name__, self.num_lookahead_misses), file=log.v2)
+        self._stop_lookahead()
+      else:
+        print("SprintInterface: %s: segment %i not found in the lookahead, forward it on its own" % (
+          self.__class__.__name__, self.segment_count), file=log.v4)
+    self.num_segments_fallback += 1
+    super(BatchedPythonFeatureScorer, self).compute(num_frames=num_frames)
+
 # }
 # </editor-fold>
 
@@ -978,6 +1217,37 @@ def _forward(segment_name, features):
   return posteriors
 
 
+def _forward_batch(features_list):
+  """
+  Forwards multiple segments at once. Only implemented for TF.
+
+  :param list[numpy.ndarray] features_list: each in format (time,input-feature)
+  :return: posteriors in format (batch,time,output-dim) (padded), and the seq lens (batch,)
+  :rtype: (numpy.ndarray, numpy.ndarray)
+  """
+  assert engine is not None, "not initialized"
+  assert BackendEngine.is_tensorflow_selected(), "batched forwarding only implemented for TF"
+  from returnn.datasets.generating import StaticDataset
+  n_batch = len(features_list)
+  start_time = time.time()
+  dataset = StaticDataset(
+    data=[{"data": features} for features in features_list], output_dim={"data": (InputDim, 2)})
+  dataset.init_seq_order(epoch=1)
+  # We might be in another thread (e.g. :class:`BatchedPythonFeatureScorer`), which has its own default graph.
+  with engine.tf_session.graph.as_default():
+    # noinspection PyProtectedMember
+    output_data = engine._get_output_layer().output
+    posteriors = engine.run_single(
+      dataset=dataset, seq_idx=-1, output_dict={"posteriors": output_data.get_placeholder_as_batch_major()})
+    posteriors = posteriors["posteriors"]
+  # Like in :func:`_forward`, we expect the same time axis as the features.
+  seq_lens = numpy.array([features.shape[0] for features in features_list], dtype="int32")
+  assert posteriors.shape == (n_batch, max(seq_lens), OutputDim * MaxSegmentLength)
+  print("Sprint forward batch of %i segments, %i frames, time: %.3f" % (
+    n_batch, sum(seq_lens), time.time() - start_time))
+  return posteriors, seq_lens
+
+
 Criterion = None  # type: typing.Optional[typing.Any]
 
 
@@ -78,6 +78,9 @@ Also the preprocessing could involve some more complex operations which could be
 with Python + Numpy.
 Also the chunk shuffling is more difficult to implement and would be slower compared to a pure TF solution.
 
+When the same batches are needed many times (e.g. for hyper param tuning),
+they can be assembled once into a memory-mapped file, and then be replayed via :class:`BatchStoreDataProvider`.
+
 
 Implementation via new tf.dataset API
 -------------------------------------
@@ -115,14 +118,16 @@ It depends on whether the full network is recurrent or not.
 
 from __future__ import print_function
 
+import os
 import sys
+import time
 import typing
 try:
   # noinspection PyCompatibility
-  from Queue import Queue
+  from Queue import Queue, Empty
 except ImportError:
   # noinspection PyCompatibility,PyUnresolvedReferences
-  from queue import Queue
+  from queue import Queue, Empty
 from threading import Thread, Condition
 
 import numpy
@@ -211,6 +216,38 @@ class DataProviderBase(object):
     """
     raise NotImplementedError
 
+  def get_queue_fill_frac(self):
+    """
+    :return: fill level of the data queue, number between 0 and 1, e.g. for profiling. None if not available
+    :rtype: float|None
+    """
+    return None
+
+  def _get_feed_dict_for_batch_data(self, output):
+    """
+    :param dict[str,numpy.ndarray|list[str]] output: batch data, via :func:`FeedDictDataProvider.collect_batch_data`
+    :return: feed dict for the data placeholders and the seq lengths
+    :rtype: dict[tf.Tensor,numpy.ndarray|list[str]]
+    """
+    # The data itself.
+    d = {
+      self.extern_data.get_data(k).placeholder: output[k]
+      for k in self.data_keys
+      if k not in self.extern_data.extra_added_keys}
+    # And seq lengths info.
+    for k in self.data_keys:
+      if k in self.extern_data.extra_added_keys:
+        continue
+      data = self.extern_data.get_data(k)
+      for dim, len_placeholder in data.size_placeholder.items():
+        if dim == 0:  # time-dim
+          d[len_placeholder] = output["%s_seq_lens" % k]
+        else:
+          raise Exception(
+            "dataset currently does not support variable shape in other dimensions than the first. "
+            "dim=%i, placeholder=%r" % (dim, len_placeholder))
+    return d
+
 
 class FeedDictDataProvider(DataProviderBase):
   """
@@ -220,7 +257,7 @@ class FeedDictDataProvider(DataProviderBase):
   """
 
   def __init__(self, tf_session, dataset, batches, enforce_min_len1=False, capacity=10, tf_queue=None,
-               batch_slice=None, **kwargs):
+               batch_slice=None, worker_pool=None, buffer_ring=None, **kwargs):
     """
     :param tf.compat.v1.Session|tf.compat.v1.InteractiveSession tf_session:
     :param Dataset dataset:
@@ -231,6 +268,16 @@ class FeedDictDataProvider(DataProviderBase):
     :param int capacity:
     :param TFDataQueues|None tf_queue:
     :param slice|None batch_slice: select a subset of the batches
+    :param FeedDictBatchWorkerPool|None worker_pool: if given (and it has the dataset),
+      the batches are assembled in its worker processes, which pass the batch data back via shared memory.
+      The batch order stays the same.
+      If None (default), the batches are assembled in the data provider thread.
+    :param BatchBufferRing|None buffer_ring: if given, the batch arrays are taken from this ring,
+      and given back when the consumer requests the next feed dict (i.e. when ``session.run`` is done with them).
+      Thus the returned arrays are only valid until the next call to :func:`get_feed_dict`.
+      The ring can be shared across multiple data providers, as long as they are not used at the same time.
+      Not used with ``worker_pool``, and not with ``tf_queue``,
+      as TF might keep referencing the (aligned) fed arrays while the data is queued.
     """
     super(FeedDictDataProvider, self).__init__(**kwargs)
     self.tf_session = tf_session
@@ -247,6 +294,11 @@ class FeedDictDataProvider(DataProviderBase):
     self.thread_finished = False
     self.cur_batch_idx = 0
     self.reached_end = False
+    self.worker_pool = worker_pool if worker_pool and worker_pool.get_dataset_name(dataset) else None
+    self.workers = []  # type: typing.List[_FeedDictBatchWorker]
+    self.buffer_ring = buffer_ring if not self.worker_pool and not tf_queue else None
+    self._last_output = None  # type: typing.Optional[typing.Dict[str,numpy.ndarray]]  # to release to buffer_ring
+    self.stage_times = {}  # type: typing.Dict[str,float]
 
   def start_threads(self, session):
     """
@@ -254,6 +306,12 @@ class FeedDictDataProvider(DataProviderBase):
 
     :param tf.compat.v1.Session session:
     """
+    if self.worker_pool:
+      # Before we start the thread, such that the dataset is in a consistent state.
+      self.worker_pool.init_epoch(
+        dataset=self.dataset, extern_data=self.extern_data, data_keys=self.data_keys,
+        enforce_min_len1=self.enforce_min_len1)
+      self.workers = self.worker_pool.workers
     thread = Thread(target=self._thread_main, name="DataProvider thread")
     thread.daemon = True  # Thread will close when parent quits.
     thread.start()
@@ -268,6 +326,12 @@ class FeedDictDataProvider(DataProviderBase):
       self._flush_all_data()
       self.thread.join()
       self.thread = None
+    self._release_last_output()
+    if self.workers:
+      print("DataProvider %i workers, stage times: %s" % (
+        len(self.workers), ", ".join(["%s %.3fs" % item for item in sorted(self.stage_times.items())])),
+        file=log.v5)
+      self.workers = []
     self.dataset.finish_epoch()
 
   def get_next_batch(self, consider_batch_slice):
@@ -278,88 +342,70 @@ class FeedDictDataProvider(DataProviderBase):
     :returns: batch-data-value-dict or None. if not consider_batch_slice, will never be None
     :rtype: dict[str,numpy.ndarray]|None
     """
-    # See EngineUtil.assign_dev_data() for reference.
     cur_batch_idx = self.cur_batch_idx
     batch, = self.batches.peek_next_n(1)
     self.cur_batch_idx += 1
-    if consider_batch_slice and self.batch_slice is not None:
-      assert (self.batch_slice.start or 0) >= 0
-      start = self.batch_slice.start or 0
-      assert (self.batch_slice.step or 1) >= 1
-      step = self.batch_slice.step or 1
-      if cur_batch_idx < start:
-        return None
-      if self.batch_slice.stop is not None and cur_batch_idx >= self.batch_slice.stop:
-        return None
-      if step > 1 and (cur_batch_idx - start) % step != 0:
-        return None
-    from returnn.datasets.basic import Batch, shapes_for_batches
-    assert isinstance(batch, Batch)
-    # In Returnn with Theano, we usually have the shape (time,batch,feature).
-    # In TensorFlow, the default is (batch,time,feature).
-    # This is also what we use here, i.e. batch_dim_first=True.
-    # This must match the Data specification in TFNetwork.ExternData.init_from_config().
-    shapes = shapes_for_batches(
-      [batch], data_keys=self.data_keys, extern_data=self.extern_data, enforce_min_len1=self.enforce_min_len1)
-    data = {k: numpy.zeros(shape=shapes[k], dtype=self.extern_data.data[k].dtype)
-            for k in self.data_keys if self.extern_data.data[k].dtype != "string"}
-    # Numpy cannot handle "string" dtype. Just make it a list[str], which is what TF can handle.
-    data.update({k: [""] * batch.num_slices
-                 for k in self.data_keys if self.extern_data.data[k].dtype == "string"})
-    data.update({"seq_idx": [-1] * batch.num_slices, "seq_tag": [""] * batch.num_slices})
-    seq_lens = {k: numpy.zeros(shape=(shapes[k][0],), dtype=self.extern_data.data[k].size_dtype)
-                for k in self.data_keys if self.extern_data.data[k].have_time_axis()}
-    self.dataset.load_seqs(batch.start_seq, batch.end_seq)
-    from returnn.util.basic import slice_pad_zeros
-    with self.dataset.lock:
-      for seq in batch.seqs:
-        o = seq.batch_frame_offset
-        q = seq.batch_slice
-        length = seq.frame_length
-        # input-data, input-index will also be set in this loop. That is data-key "data".
-        for k in self.data_keys:
-          # Some special cases first, such as "seq_idx" and "seq_tag".
-          # See also :func:`TFNetwork.get_extern_data`.
-          if k in ["seq_idx", "seq_tag"]:
-            continue  # handled below. will always be added
-          if k in self.extern_data.extra_added_keys:
-            continue
-          if self.extern_data.data[k].have_time_axis():
-            if length.get(k) in [0, None]:
-              continue
-          v = self.dataset.get_data(seq.seq_idx, k)
-          if self.extern_data.data[k].have_time_axis():
-            v = slice_pad_zeros(v, begin=seq.seq_start_frame[k], end=seq.seq_end_frame[k])
-            ls = v.shape[0]
-            if ls != length[k]:
-              raise Exception("got shape[0]: %i, expected: %i, start/end: %r/%r, seq_idx: %i, seq len: %r" % (
-                ls, length[k], seq.seq_start_frame, seq.seq_end_frame, seq.seq_idx,
-                self.dataset.get_seq_length(seq.seq_idx)))
-            data[k][q, o[k]:o[k] + ls] = v
-            seq_lens[k][q] = max(seq_lens[k][q], o[k] + ls)
-          else:  # no time-axis
-            data[k][q] = v
-        data["seq_idx"][q] = seq.seq_idx
-        data["seq_tag"][q] = self.dataset.get_tag(seq.seq_idx)
-    for k in seq_lens.keys():
-      data["%s_seq_lens" % k] = seq_lens[k]
-    return data
+    if consider_batch_slice and self._is_batch_idx_skipped(cur_batch_idx):
+      return None
+    return self.collect_batch_data(
+      batch, alloc_arrays=self.buffer_ring.alloc_arrays if self.buffer_ring else None, stage_times=self.stage_times)
+
+  def _is_batch_idx_skipped(self, batch_idx):
+    """
+    :param int batch_idx:
+    :return: whether this batch is not part of self.batch_slice
+    :rtype: bool
+    """
+    if self.batch_slice is None:
+      return False
+    assert (self.batch_slice.start or 0) >= 0
+    start = self.batch_slice.start or 0
+    assert (self.batch_slice.step or 1) >= 1
+    step = self.batch_slice.step or 1
+    if batch_idx < start:
+      return True
+    if self.batch_slice.stop is not None and batch_idx >= self.batch_slice.stop:
+      return True
+    if step > 1 and (batch_idx - start) % step != 0:
+      return True
+    return False
+
+  def collect_batch_data(self, batch, alloc_arrays=None, stage_times=None):
+    """
+    Loads the data of all the seqs of the batch from the dataset and copies it (zero-padded) into the batch arrays.
+    This is called by the data provider thread. See :func:`_collect_batch_data`.
+
+    :param Batch batch:
+    :param ((list[(str,tuple[int],str)])->dict[str,numpy.ndarray])|None alloc_arrays:
+      gets list of (key, shape, dtype), returns zero-initialized arrays. numpy.zeros by default
+    :param dict[str,float]|None stage_times: if given, will accumulate the time spent in the stages
+    :returns: batch-data-value-dict
+    :rtype: dict[str,numpy.ndarray]
+    """
+    return _collect_batch_data(
+      batch, dataset=self.dataset, extern_data=self.extern_data, data_keys=self.data_keys,
+      enforce_min_len1=self.enforce_min_len1, alloc_arrays=alloc_arrays, stage_times=stage_times)
+
+  def _enqueue(self, data):
+    """
+    :param dict[str,numpy.ndarray] data:
+    """
+    start_time = time.time()
+    if self.queue:
+      self.queue.put(data)
+    else:
+      self.tf_queue.enqueue(tf_session=self.tf_session, data=data)
+    self.stage_times["enqueue"] = self.stage_times.get("enqueue", 0.) + time.time() - start_time
 
   def _thread_main(self):
     try:
       from returnn.util import better_exchook
       better_exchook.install()
 
-      while self.batches.has_more() and not self.coord.should_stop():
-        enqueue_args = self.get_next_batch(consider_batch_slice=True)
-        if enqueue_args is not None:
-          if self.queue:
-            self.queue.put(enqueue_args)
-          else:
-            self.tf_queue.enqueue(tf_session=self.tf_session, data=enqueue_args)
-        with self.state_change_cond:
-          self.state_change_cond.notifyAll()
-        self.batches.advance(1)
+      if self.workers:
+        self._thread_main_loop_workers()
+      else:
+        self._thread_main_loop()
 
       self.reached_end = not self.batches.has_more()
 
@@ -372,6 +418,68 @@ class FeedDictDataProvider(DataProviderBase):
         self.thread_finished = True
         self.state_change_cond.notifyAll()
 
+  def _thread_main_loop(self):
+    while self.batches.has_more() and not self.coord.should_stop():
+      enqueue_args = self.get_next_batch(consider_batch_slice=True)
+      if enqueue_args is not None:
+        self._enqueue(enqueue_args)
+      with self.state_change_cond:
+        self.state_change_cond.notifyAll()
+      self.batches.advance(1)
+
+  def _thread_main_loop_workers(self):
+    """
+    The batches are distributed round-robin over the workers,
+    and we collect the results in the same order as we have send them out,
+    thus the batch order is the same as in the single-threaded case.
+    """
+    from collections import deque
+    pending = deque()  # type: typing.Deque[_FeedDictBatchWorker]  # in batch order
+    max_pending = 2 * len(self.workers)
+    next_worker_idx = 0
+    try:
+      while not self.coord.should_stop():
+        while len(pending) < max_pending and self.batches.has_more():
+          batch_idx = self.cur_batch_idx
+          batch, = self.batches.peek_next_n(1)
+          self.cur_batch_idx += 1
+          self.batches.advance(1)
+          if self._is_batch_idx_skipped(batch_idx):
+            continue
+          worker = self.workers[next_worker_idx]
+          next_worker_idx = (next_worker_idx + 1) % len(self.workers)
+          worker.send_batch(batch_idx=batch_idx, batch=batch)
+          pending.append(worker)
+        if not pending:
+          break
+        start_time = time.time()
+        worker = pending.popleft()
+        data, worker_stage_times = worker.get_result()
+        for key, value in worker_stage_times.items():
+          self.stage_times[key] = self.stage_times.get(key, 0.) + value
+        self.stage_times["worker_wait"] = self.stage_times.get("worker_wait", 0.) + time.time() - start_time
+        self._enqueue(data)
+        with self.state_change_cond:
+          self.state_change_cond.notifyAll()
+    finally:
+      while pending:  # cleanup the shared memory of in-flight batches
+        worker = pending.popleft()
+        try:
+          worker.get_result()
+        except Exception as exc:
+          print("DataProvider: ignoring exception in worker %i: %r" % (worker.worker_idx, exc), file=log.v4)
+
+  def get_stage_times(self):
+    """
+    Accumulated time spent in the stages of the batch assembly, e.g. "load_seqs", "collect", "enqueue".
+    With ``worker_pool``, "load_seqs" and "collect" are summed over all workers,
+    and "worker_wait" is the time the data provider thread waited for the next batch from the workers.
+
+    :return: stage name -> time in secs
+    :rtype: dict[str,float]
+    """
+    return dict(self.stage_times)
+
   def have_more_data(self, session):
     """
     :param tf.compat.v1.Session|None session:
@@ -401,10 +509,20 @@ class FeedDictDataProvider(DataProviderBase):
     """
     while self.have_more_data(None):
       if self.queue:
-        self.queue.get()
+        output = self.queue.get()
+        if self.buffer_ring:
+          self.buffer_ring.release_arrays(output.values())
       else:
         raise NotImplementedError
 
+  def _release_last_output(self):
+    """
+    The consumer is done with the last output, so we can give the buffers back to the ring.
+    """
+    if self.buffer_ring and self._last_output:
+      self.buffer_ring.release_arrays(self._last_output.values())
+    self._last_output = None
+
   def get_feed_dict(self, single_threaded=False):
     """
     Gets the feed dict for TF session run().
@@ -418,6 +536,8 @@ class FeedDictDataProvider(DataProviderBase):
     """
     if self.tf_queue:
       return {}  # not needed to feed anything, it gets it via the queues
+    # We assume that the consumer is done with the previous batch.
+    self._release_last_output()
     if single_threaded:
       assert self.batches.has_more()
       assert self.batch_slice is None
@@ -426,24 +546,8 @@ class FeedDictDataProvider(DataProviderBase):
     else:
       output = self.queue.get()
     assert isinstance(output, dict)
-    # The data itself.
-    d = {
-      self.extern_data.get_data(k).placeholder: output[k]
-      for k in self.data_keys
-      if k not in self.extern_data.extra_added_keys}
-    # And seq lengths info.
-    for k in self.data_keys:
-      if k in self.extern_data.extra_added_keys:
-        continue
-      data = self.extern_data.get_data(k)
-      for dim, len_placeholder in data.size_placeholder.items():
-        if dim == 0:  # time-dim
-          d[len_placeholder] = output["%s_seq_lens" % k]
-        else:
-          raise Exception(
-            "dataset currently does not support variable shape in other dimensions than the first. "
-            "dim=%i, placeholder=%r" % (dim, len_placeholder))
-    return d, {"seq_idx": output["seq_idx"], "seq_tag": output["seq_tag"]}
+    self._last_output = output
+    return self._get_feed_dict_for_batch_data(output), {"seq_idx": output["seq_idx"], "seq_tag": output["seq_tag"]}
 
   def get_dataset_name(self):
     """
@@ -463,6 +567,605 @@ class FeedDictDataProvider(DataProviderBase):
     """
     return self.batches.completed_frac()
 
+  def get_queue_fill_frac(self):
+    """
+    :rtype: float|None
+    """
+    if not self.queue:
+      return None
+    return float(self.queue.qsize()) / self.queue.maxsize
+
+
+class BatchStoreDataProvider(DataProviderBase):
+  """
+  Replays precomputed batches from a :class:`returnn.engine.batch_store.MmapBatchStore` into the feed dict.
+  There is no data loading and no batch assembly, and the arrays are fed directly from the mapped file.
+  This is useful when the same batches are used over and over again, e.g. for hyper param tuning.
+  The store is created via :func:`create_batch_store`.
+  """
+
+  def __init__(self, batch_store, start_batch_idx=0, end_batch_idx=None, dataset_name=None, **kwargs):
+    """
+    :param returnn.engine.batch_store.MmapBatchStore batch_store:
+    :param int start_batch_idx:
+    :param int|None end_batch_idx: exclusive. None means until the end of the store
+    :param str|None dataset_name: e.g. "train"
+    :param ExternData extern_data:
+    :param set(str)|None data_keys:
+    """
+    super(BatchStoreDataProvider, self).__init__(**kwargs)
+    self.batch_store = batch_store
+    self.start_batch_idx = start_batch_idx
+    self.end_batch_idx = len(batch_store) if end_batch_idx is None else min(end_batch_idx, len(batch_store))
+    self.cur_batch_idx = start_batch_idx
+    self.dataset_name = dataset_name
+    for key in self.data_keys:
+      if key not in self.extern_data.extra_added_keys:
+        assert self.extern_data.data[key].batch_dim_axis == 0, "%s: %r must be batch-major" % (self, key)
+
+  @classmethod
+  def create_batch_store(cls, filename, dataset, batches, extern_data, data_keys=None, enforce_min_len1=False,
+                         meta=None):
+    """
+    Assembles all the batches (like :class:`FeedDictDataProvider`) and writes them to the store.
+
+    :param str filename:
+    :param Dataset dataset:
+    :param BatchSetGenerator batches:
+    :param ExternData extern_data:
+    :param set(str)|None data_keys:
+    :param bool enforce_min_len1:
+    :param dict[str]|None meta: see :func:`MmapBatchStore.write`
+    :rtype: returnn.engine.batch_store.MmapBatchStore
+    """
+    from returnn.engine.batch_store import MmapBatchStore
+    provider = FeedDictDataProvider(
+      tf_session=None, dataset=dataset, batches=batches, enforce_min_len1=enforce_min_len1,
+      extern_data=extern_data, data_keys=data_keys)
+
+    def _iterate_batch_data():
+      while batches.has_more():
+        yield provider.get_next_batch(consider_batch_slice=False)
+        batches.advance(1)
+
+    return MmapBatchStore.write(filename, _iterate_batch_data(), meta=meta)
+
+  def start_threads(self, session):
+    """
+    :param tf.compat.v1.Session session:
+    """
+
+  def stop_threads(self):
+    """
+    Nothing to do.
+    """
+
+  def have_more_data(self, session):
+    """
+    :param tf.compat.v1.Session|None session:
+    :rtype: bool
+    """
+    return self.cur_batch_idx < self.end_batch_idx
+
+  def get_feed_dict(self, single_threaded=False):
+    """
+    :param bool single_threaded: ignored, we never use a thread
+    :rtype: (dict[tf.Tensor,numpy.ndarray],dict[str])
+    """
+    assert self.have_more_data(None)
+    output = self.batch_store.get_batch(self.cur_batch_idx)
+    self.cur_batch_idx += 1
+    return self._get_feed_dict_for_batch_data(output), {"seq_idx": output["seq_idx"], "seq_tag": output["seq_tag"]}
+
+  def get_dataset_name(self):
+    """
+    :rtype: str|None
+    """
+    return self.dataset_name
+
+  def have_reached_end(self):
+    """
+    :rtype: bool
+    """
+    return self.cur_batch_idx >= self.end_batch_idx
+
+  def get_complete_frac(self):
+    """
+    :rtype: float
+    """
+    num_batches = self.end_batch_idx - self.start_batch_idx
+    if num_batches <= 0:
+      return 1.
+    return float(self.cur_batch_idx - self.start_batch_idx) / num_batches
+
+
+def _collect_batch_data(batch, dataset, extern_data, data_keys, enforce_min_len1=False,
+                        alloc_arrays=None, stage_times=None):
+  """
+  Loads the data of all the seqs of the batch from the dataset and copies it (zero-padded) into the batch arrays.
+  This is called by :func:`FeedDictDataProvider.collect_batch_data`, or in the worker processes.
+
+  :param Batch batch:
+  :param Dataset dataset:
+  :param ExternData|_ExternDataSpec extern_data:
+  :param list[str]|set[str] data_keys:
+  :param bool enforce_min_len1:
+  :param ((list[(str,tuple[int],str)])->dict[str,numpy.ndarray])|None alloc_arrays:
+    gets list of (key, shape, dtype), returns zero-initialized arrays. numpy.zeros by default
+  :param dict[str,float]|None stage_times: if given, will accumulate the time spent in the stages
+  :returns: batch-data-value-dict
+  :rtype: dict[str,numpy.ndarray]
+  """
+  # See EngineUtil.assign_dev_data() for reference.
+  from returnn.datasets.basic import Batch, shapes_for_batches
+  assert isinstance(batch, Batch)
+  if alloc_arrays is None:
+    alloc_arrays = _alloc_arrays_numpy
+  # In Returnn with Theano, we usually have the shape (time,batch,feature).
+  # In TensorFlow, the default is (batch,time,feature).
+  # This is also what we use here, i.e. batch_dim_first=True.
+  # This must match the Data specification in TFNetwork.ExternData.init_from_config().
+  shapes = shapes_for_batches(
+    [batch], data_keys=data_keys, extern_data=extern_data, enforce_min_len1=enforce_min_len1)
+  array_specs = [
+    (k, shapes[k], extern_data.data[k].dtype)
+    for k in data_keys if extern_data.data[k].dtype != "string"]
+  array_specs += [
+    ("%s_seq_lens" % k, (shapes[k][0],), extern_data.data[k].size_dtype)
+    for k in data_keys if extern_data.data[k].have_time_axis()]
+  arrays = alloc_arrays(array_specs)
+  data = {k: arrays[k] for k in data_keys if extern_data.data[k].dtype != "string"}
+  # Numpy cannot handle "string" dtype. Just make it a list[str], which is what TF can handle.
+  data.update({k: [""] * batch.num_slices
+               for k in data_keys if extern_data.data[k].dtype == "string"})
+  data.update({"seq_idx": [-1] * batch.num_slices, "seq_tag": [""] * batch.num_slices})
+  seq_lens = {k: arrays["%s_seq_lens" % k] for k in data_keys if extern_data.data[k].have_time_axis()}
+  start_time = time.time()
+  dataset.load_seqs(batch.start_seq, batch.end_seq)
+  load_time = time.time()
+  from returnn.util.basic import copy_slice_pad_zeros
+  with dataset.lock:
+    for seq in batch.seqs:
+      o = seq.batch_frame_offset
+      q = seq.batch_slice
+      length = seq.frame_length
+      # input-data, input-index will also be set in this loop. That is data-key "data".
+      for k in data_keys:
+        # Some special cases first, such as "seq_idx" and "seq_tag".
+        # See also :func:`TFNetwork.get_extern_data`.
+        if k in ["seq_idx", "seq_tag"]:
+          continue  # handled below. will always be added
+        if k in extern_data.extra_added_keys:
+          continue
+        if extern_data.data[k].have_time_axis():
+          if length.get(k) in [0, None]:
+            continue
+        v = dataset.get_data(seq.seq_idx, k)
+        if extern_data.data[k].have_time_axis():
+          ls = length[k]
+          out = data[k][q, o[k]:o[k] + ls]
+          if out.shape[0] != ls:
+            raise Exception("got shape[0]: %i, expected: %i, start/end: %r/%r, seq_idx: %i, seq len: %r" % (
+              out.shape[0], ls, seq.seq_start_frame, seq.seq_end_frame, seq.seq_idx,
+              dataset.get_seq_length(seq.seq_idx)))
+          # Copy directly into the batch array. The padded frames are already zero.
+          copy_slice_pad_zeros(v, begin=seq.seq_start_frame[k], end=seq.seq_end_frame[k], out=out)
+          seq_lens[k][q] = max(seq_lens[k][q], o[k] + ls)
+        else:  # no time-axis
+          data[k][q] = v
+      data["seq_idx"][q] = seq.seq_idx
+      data["seq_tag"][q] = dataset.get_tag(seq.seq_idx)
+  for k in seq_lens.keys():
+    data["%s_seq_lens" % k] = seq_lens[k]
+  if stage_times is not None:
+    stage_times["load_seqs"] = stage_times.get("load_seqs", 0.) + load_time - start_time
+    stage_times["collect"] = stage_times.get("collect", 0.) + time.time() - load_time
+  return data
+
+
+def _alloc_arrays_numpy(specs):
+  """
+  :param list[(str,tuple[int],str)] specs: list of (key, shape, dtype)
+  :rtype: dict[str,numpy.ndarray]
+  """
+  return {key: numpy.zeros(shape=shape, dtype=dtype) for (key, shape, dtype) in specs}
+
+
+class BatchBufferRing(object):
+  """
+  Preallocated buffers for the batch arrays of :class:`FeedDictDataProvider`, which are recycled
+  once the consumer is done with the batch, i.e. once ``session.run`` has used them.
+  This avoids to allocate new (potentially big) arrays for every key for every batch.
+
+  The buffers are flat arrays, bucketed by their size in bytes (rounded up, see :func:`_get_bucket_num_bytes`),
+  and we return C-contiguous views of the requested shape on them.
+  Free buffers are kept in the order they were released, and the oldest ones are dropped
+  if we have more than ``max_free_bytes``.
+  """
+
+  def __init__(self, max_free_bytes=2 * 1024 ** 3):
+    """
+    :param int max_free_bytes: upper limit for the size of all free buffers together
+    """
+    from threading import Lock
+    self.max_free_bytes = max_free_bytes
+    self.lock = Lock()  # alloc is used from the data provider thread, release from the consumer thread
+    self.free_buffers = []  # type: typing.List[numpy.ndarray]  # oldest first
+    self.free_num_bytes = 0
+    self.used_buffers = {}  # type: typing.Dict[int,numpy.ndarray]  # id -> buffer
+    self.num_allocs = 0
+    self.num_reuses = 0
+
+  def __repr__(self):
+    return "<%s used %i, free %i (%i bytes), allocs %i, reuses %i>" % (
+      self.__class__.__name__, len(self.used_buffers), len(self.free_buffers), self.free_num_bytes,
+      self.num_allocs, self.num_reuses)
+
+  def alloc_arrays(self, specs):
+    """
+    :param list[(str,tuple[int],str)] specs: list of (key, shape, dtype)
+    :return: zero-initialized arrays
+    :rtype: dict[str,numpy.ndarray]
+    """
+    return {key: self.alloc_array(shape=shape, dtype=dtype) for (key, shape, dtype) in specs}
+
+  def alloc_array(self, shape, dtype):
+    """
+    :param tuple[int] shape:
+    :param str|numpy.dtype dtype:
+    :return: zero-initialized array, which is a view on one of our buffers
+    :rtype: numpy.ndarray
+    """
+    dtype = numpy.dtype(dtype)
+    num_elements = int(numpy.prod(shape))
+    num_bytes = _get_bucket_num_bytes(num_elements * dtype.itemsize)
+    buffer = None
+    with self.lock:
+      for i, free_buffer in enumerate(self.free_buffers):
+        if free_buffer.dtype == dtype and free_buffer.nbytes == num_bytes:
+          buffer = self.free_buffers.pop(i)
+          self.free_num_bytes -= buffer.nbytes
+          self.num_reuses += 1
+          break
+    if buffer is None:
+      buffer = numpy.empty((num_bytes // dtype.itemsize,), dtype=dtype)
+      self.num_allocs += 1
+    with self.lock:
+      self.used_buffers[id(buffer)] = buffer
+    array = buffer[:num_elements].reshape(shape)
+    array.fill(0)
+    return array
+
+  def release_arrays(self, arrays):
+    """
+    Gives the buffers back to the ring.
+    The arrays (and other views on the same buffers) must not be used anymore after this call.
+
+    :param typing.Iterable[numpy.ndarray|object] arrays: e.g. the values of the batch data dict.
+      Other objects, or arrays which are not from this ring, are ignored.
+    """
+    with self.lock:
+      for array in arrays:
+        if not isinstance(array, numpy.ndarray) or array.base is None:
+          continue
+        buffer = self.used_buffers.pop(id(array.base), None)
+        if buffer is None:
+          continue
+        self.free_buffers.append(buffer)
+        self.free_num_bytes += buffer.nbytes
+      while self.free_num_bytes > self.max_free_bytes and self.free_buffers:
+        buffer = self.free_buffers.pop(0)
+        self.free_num_bytes -= buffer.nbytes
+
+
+def _get_bucket_num_bytes(num_bytes, num_steps_per_power_of_two=8):
+  """
+  :param int num_bytes:
+  :param int num_steps_per_power_of_two: granularity. the overhead is at most 1/num_steps_per_power_of_two
+  :return: num_bytes rounded up such that similar sizes get the same bucket
+  :rtype: int
+  """
+  step = max((1 << max(num_bytes - 1, 1).bit_length()) // num_steps_per_power_of_two, 64)
+  return max((num_bytes + step - 1) // step * step, step)
+
+
+def _get_shared_mem_dir():
+  """
+  :return: directory for the shared memory files. /dev/shm is memory backed, i.e. no real disk IO
+  :rtype: str
+  """
+  if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+    return "/dev/shm"
+  import tempfile
+  return tempfile.gettempdir()
+
+
+class _SharedMemArraysWriter(object):
+  """
+  Allocates all the arrays of one batch in one single shared memory file.
+  The reader side is :func:`_read_shared_mem_arrays`.
+  """
+
+  def __init__(self):
+    self.filename = None  # type: typing.Optional[str]
+    self.layout = None  # type: typing.Optional[typing.List[typing.Tuple[str,typing.Tuple[int,...],str,int]]]
+
+  def __call__(self, specs):
+    """
+    :param list[(str,tuple[int],str)] specs: list of (key, shape, dtype)
+    :return: zero-initialized arrays, backed by the shared memory file
+    :rtype: dict[str,numpy.ndarray]
+    """
+    import mmap
+    import tempfile
+    assert self.filename is None, "%s: can only allocate once" % self
+    self.layout = []
+    offset = 0
+    for key, shape, dtype in specs:
+      offset = (offset + 63) // 64 * 64  # align
+      self.layout.append((key, tuple(shape), numpy.dtype(dtype).str, offset))
+      offset += int(numpy.prod(shape)) * numpy.dtype(dtype).itemsize
+    fd, self.filename = tempfile.mkstemp(prefix="returnn-batch-", dir=_get_shared_mem_dir())
+    try:
+      os.ftruncate(fd, max(offset, 1))  # new file content is zero
+      mem = mmap.mmap(fd, max(offset, 1))
+    finally:
+      os.close(fd)
+    return {key: numpy.ndarray(shape=shape, dtype=dtype, buffer=mem, offset=offset)
+            for (key, shape, dtype, offset) in self.layout}
+
+
+def _read_shared_mem_arrays(filename, layout):
+  """
+  Maps the arrays of the file (see :class:`_SharedMemArraysWriter`) without any copy,
+  and removes the file. The memory stays valid as long as the arrays are referenced.
+
+  :param str filename:
+  :param list[(str,tuple[int],str,int)] layout: key, shape, dtype, offset
+  :rtype: dict[str,numpy.ndarray]
+  """
+  import mmap
+  try:
+    with open(filename, "r+b") as f:
+      mem = mmap.mmap(f.fileno(), 0)
+  finally:
+    os.remove(filename)
+  return {key: numpy.ndarray(shape=shape, dtype=dtype, buffer=mem, offset=offset)
+          for (key, shape, dtype, offset) in layout}
+
+
+class FeedDictBatchWorkerPool(object):
+  """
+  Worker processes for :class:`FeedDictDataProvider` (``feed_dict_num_workers``),
+  which assemble the batches (load and zero-pad) and pass them back via shared memory.
+  The processes are forked when the pool is created, thus they have their own copy of the given datasets.
+  Forking a process which already has a TF session (threads, locks, device state) is unsafe,
+  thus the pool must be created before any TF session exists (see :func:`Engine.init_train_from_config`).
+
+  For every data provider (i.e. every epoch), the workers call :func:`Dataset.init_seq_order`
+  with the same epoch as the parent, and we check via :func:`Dataset.get_current_seq_order` (if available)
+  that they got the same seq order. I.e. the seq order must only depend on the epoch.
+  """
+
+  def __init__(self, datasets, num_workers):
+    """
+    :param dict[str,Dataset] datasets: name -> dataset. the data providers can only use the workers for these
+    :param int num_workers:
+    """
+    assert num_workers > 0
+    self.datasets = datasets
+    self.workers = [_FeedDictBatchWorker(datasets=datasets, worker_idx=i) for i in range(num_workers)]
+
+  def __repr__(self):
+    return "<%s %i workers, datasets %r>" % (self.__class__.__name__, len(self.workers), sorted(self.datasets.keys()))
+
+  def get_dataset_name(self, dataset):
+    """
+    :param Dataset dataset:
+    :return: name of the dataset in the pool, or None if the workers do not have it
+    :rtype: str|None
+    """
+    for name, dataset_ in self.datasets.items():
+      if dataset_ is dataset:
+        return name
+    return None
+
+  def init_epoch(self, dataset, extern_data, data_keys, enforce_min_len1=False):
+    """
+    Prepares all workers for the batches of the dataset in its current seq order.
+    Blocks until all workers are ready.
+
+    :param Dataset dataset: one of :attr:`datasets`, after :func:`Dataset.init_seq_order`
+    :param ExternData extern_data:
+    :param list[str]|set[str] data_keys:
+    :param bool enforce_min_len1:
+    """
+    dataset_name = self.get_dataset_name(dataset)
+    assert dataset_name, "%s: unknown dataset %r" % (self, dataset)
+    try:
+      seq_order = numpy.array(dataset.get_current_seq_order())
+    except NotImplementedError:
+      seq_order = None
+    opts = dict(
+      dataset_name=dataset_name, epoch=dataset.epoch, seq_order=seq_order,
+      extern_data=_ExternDataSpec(extern_data=extern_data, data_keys=data_keys), data_keys=list(data_keys),
+      enforce_min_len1=enforce_min_len1)
+    for worker in self.workers:
+      worker.send_init_epoch(opts)
+    for worker in self.workers:
+      worker.get_result()
+
+  def stop(self):
+    """
+    Stops all the worker processes.
+    """
+    for worker in self.workers:
+      worker.stop()
+    self.workers = []
+
+
+class _FeedDictBatchWorker(object):
+  """
+  Worker process of :class:`FeedDictBatchWorkerPool`.
+  It receives :class:`Batch` instances, collects the (padded) data directly into a shared memory file,
+  and only sends back the memory layout and the small meta information (seq tags etc).
+  The tasks of one worker are processed in order.
+  """
+
+  def __init__(self, datasets, worker_idx):
+    """
+    :param dict[str,Dataset] datasets:
+    :param int worker_idx:
+    """
+    import multiprocessing
+    # Python 2 has no get_context, but uses fork anyway (on Unix).
+    ctx = multiprocessing.get_context("fork") if hasattr(multiprocessing, "get_context") else multiprocessing
+    self.worker_idx = worker_idx
+    self.task_queue = ctx.Queue()
+    self.result_queue = ctx.Queue()
+    self.process = ctx.Process(
+      target=self._process_main, kwargs={"datasets": datasets}, name="DataProvider worker %i" % worker_idx)
+    self.process.daemon = True
+    self.process.start()
+
+  def __repr__(self):
+    return "<%s %i>" % (self.__class__.__name__, self.worker_idx)
+
+  def _process_main(self, datasets):
+    """
+    :param dict[str,Dataset] datasets:
+    """
+    import traceback
+    collect_opts = None  # type: typing.Optional[typing.Dict[str]]  # for _collect_batch_data
+    while True:
+      task = self.task_queue.get()
+      if task is None:
+        break
+      batch_idx, batch, init_epoch_opts = task
+      writer = None
+      try:
+        if init_epoch_opts:
+          collect_opts = self._init_epoch(datasets=datasets, **init_epoch_opts)
+          self.result_queue.put((batch_idx, None, None))
+          continue
+        assert collect_opts, "%s: init_epoch missing" % self
+        stage_times = {}
+        writer = _SharedMemArraysWriter()
+        data = _collect_batch_data(batch, alloc_arrays=writer, stage_times=stage_times, **collect_opts)
+        meta = {key: value for (key, value) in data.items() if not isinstance(value, numpy.ndarray)}
+        del data  # release the memory map
+        self.result_queue.put((batch_idx, (writer.filename, writer.layout, meta, stage_times), None))
+      except Exception as exc:
+        if writer and writer.filename and os.path.exists(writer.filename):
+          os.remove(writer.filename)
+        self.result_queue.put((batch_idx, None, "%r\n%s" % (exc, traceback.format_exc())))
+
+  @staticmethod
+  def _init_epoch(datasets, dataset_name, epoch, seq_order, **collect_opts):
+    """
+    :param dict[str,Dataset] datasets:
+    :param str dataset_name:
+    :param int|None epoch:
+    :param numpy.ndarray|None seq_order: of the dataset in the parent process
+    :param collect_opts: for :func:`_collect_batch_data`
+    :return: collect_opts, including the dataset
+    :rtype: dict[str]
+    """
+    dataset = datasets[dataset_name]
+    dataset.init_seq_order(epoch=epoch)
+    if seq_order is not None:
+      assert numpy.array_equal(numpy.array(dataset.get_current_seq_order()), seq_order), (
+        "dataset %r, epoch %r: different seq order in the worker process;"
+        " the seq order must only depend on the epoch" % (dataset_name, epoch))
+    collect_opts["dataset"] = dataset
+    return collect_opts
+
+  def send_init_epoch(self, opts):
+    """
+    :param dict[str] opts: see :func:`FeedDictBatchWorkerPool.init_epoch`. :func:`get_result` returns None for it
+    """
+    self.task_queue.put((-1, None, opts))
+
+  def send_batch(self, batch_idx, batch):
+    """
+    :param int batch_idx:
+    :param Batch batch:
+    """
+    self.task_queue.put((batch_idx, batch, None))
+
+  def get_result(self):
+    """
+    Blocks until the oldest pending task of this worker is done.
+
+    :return: batch-data-value-dict (like :func:`FeedDictDataProvider.collect_batch_data`), stage times,
+      or None for :func:`send_init_epoch`
+    :rtype: (dict[str,numpy.ndarray],dict[str,float])|None
+    """
+    while True:
+      try:
+        batch_idx, result, error = self.result_queue.get(timeout=1.)
+        break
+      except Empty:
+        if not self.process.is_alive():
+          raise Exception("%s died with exit code %r" % (self, self.process.exitcode))
+    if error:
+      raise Exception("%s: exception for batch %i: %s" % (self, batch_idx, error))
+    if result is None:
+      return None
+    filename, layout, meta, stage_times = result
+    data = _read_shared_mem_arrays(filename=filename, layout=layout)
+    data.update(meta)
+    return data, stage_times
+
+  def stop(self):
+    """
+    Stops the process. Assumes that there are no pending batches anymore.
+    """
+    if self.process.is_alive():
+      self.task_queue.put(None)
+      self.process.join(timeout=10.)
+    if self.process.is_alive():
+      self.process.terminate()
+      self.process.join()
+
+
+class _ExternDataSpec(object):
+  """
+  The part of :class:`ExternData` which :func:`_collect_batch_data` needs.
+  Unlike :class:`ExternData`, this can be pickled, to send it to the worker processes.
+  """
+
+  def __init__(self, extern_data, data_keys):
+    """
+    :param ExternData extern_data:
+    :param list[str]|set[str] data_keys:
+    """
+    self.data = {key: _DataSpec(extern_data.data[key]) for key in data_keys}
+    self.extra_added_keys = set(extern_data.extra_added_keys)
+
+
+class _DataSpec(object):
+  """
+  The part of :class:`Data` which :func:`_collect_batch_data` needs. Can be pickled.
+  """
+
+  def __init__(self, data):
+    """
+    :param returnn.tf.util.data.Data data:
+    """
+    self.batch_shape = data.batch_shape
+    self.batch_dim_axis = data.batch_dim_axis
+    self.time_dim_axis = data.time_dim_axis
+    self.dtype = data.dtype
+    self.size_dtype = data.size_dtype
+    self._have_time_axis = data.have_time_axis()
+
+  def have_time_axis(self):
+    """
+    :rtype: bool
+    """
+    return self._have_time_axis
+
 
 class InputContext(object):
   """
@@ -28,17 +28,19 @@ import tensorflow as tf
 from tensorflow.python.client import timeline
 
 from returnn.engine.base import EngineBase
+from returnn.engine.step_profiler import StepProfiler
 from returnn.datasets.basic import Dataset, Batch, BatchSetGenerator, init_dataset
 from returnn.datasets.util.vocabulary import Vocabulary
 from returnn.learning_rate_control import load_learning_rate_control_from_config, LearningRateControl
 from returnn.log import log
 from returnn.pretrain import pretrain_from_config
 import returnn.tf.compat as tf_compat
-from returnn.tf.network import TFNetwork, ExternData, help_on_tf_exception
+from returnn.tf.network import TFNetwork, ExternData, AsyncCheckpointSaver, help_on_tf_exception
 from returnn.tf.util.data import Data
 from returnn.tf.layers.base import LayerBase
 from returnn.tf.updater import Updater
-from returnn.tf.data_pipeline import FeedDictDataProvider, DatasetDataProvider
+from returnn.tf.data_pipeline import FeedDictDataProvider, DatasetDataProvider, BatchBufferRing
+from returnn.tf.data_pipeline import FeedDictBatchWorkerPool
 import returnn.tf.horovod as tf_horovod
 from returnn.util.basic import hms, NumbersDict, BackendEngine, BehaviorVersion
 from pprint import pprint
@@ -59,7 +61,7 @@ class Runner(object):
   def __init__(self, engine,
                dataset_name=None, dataset=None, batches=None,
                train=False, eval=True, train_flag=None,
-               extra_fetches=None, extra_fetches_callback=None):
+               extra_fetches=None, extra_fetches_callback=None, data_provider=None):
     """
     :param Engine engine:
     :param str|None dataset_name: "train", "dev" or so
@@ -74,14 +76,20 @@ class Runner(object):
       where each item corresponds to the batch-seq.
       It might also be useful to add `network.get_extern_data("seq_idx")` and `network.get_extern_data("seq_tag")`.
     :param (**dict[str,numpy.ndarray|str|list[numpy.ndarray|str])->None extra_fetches_callback: called if extra_fetches
+    :param returnn.tf.data_pipeline.DataProviderBase|None data_provider: if given, used instead of the default
+      data provider for the dataset and batches, e.g. :class:`returnn.tf.data_pipeline.BatchStoreDataProvider`.
+      The dataset is then only used for the check of the data dims
     """
     from returnn.tf.data_pipeline import DataProviderBase
     engine.network.extern_data.check_matched_dataset(
       dataset=dataset, used_data_keys=engine.network.get_used_data_keys())
     self.engine = engine
     self.dataset_name = dataset_name
-    # noinspection PyProtectedMember
-    self.data_provider = self.engine._get_data_provider(dataset_name=dataset_name, dataset=dataset, batches=batches)
+    if not data_provider:
+      # noinspection PyProtectedMember
+      data_provider = self.engine._get_data_provider(
+        dataset_name=dataset_name, dataset=dataset, batches=batches, reuse_buffers=True)
+    self.data_provider = data_provider
     assert isinstance(self.data_provider, DataProviderBase)
     if train_flag is None:
       train_flag = train
@@ -113,6 +121,7 @@ class Runner(object):
       assert extra_fetches_callback
     self.extra_fetches_callback = extra_fetches_callback
     self._step_start_time = None  # type: typing.Optional[float]
+    self.profiler = StepProfiler()
     self._horovod_last_param_sync_time = time.time()  # we assume it is synced right now
     self._horovod_stopped_runner = False
     self._horovod_finish_all = False
@@ -625,15 +634,21 @@ class Runner(object):
       if self.store_tf_profile:
         tf.profiler.experimental.start(logdir)
       hvd_stop = hvd_error = False
+      profiler = self.profiler
+      profiler.mark()
       while self.data_provider.have_more_data(session=sess):
+        profiler.mark("data_wait")  # have_more_data blocks until the next batch is ready (or the end is reached)
+        queue_fill = self.data_provider.get_queue_fill_frac()
         self._step_start_time = time.time()
         hvd_stop, hvd_error = self._horovod_signal_have_more_data(local_step=step)
+        profiler.mark("horovod")
         if hvd_error:
           raise Exception("Some other Horovod peer failed.")
         if hvd_stop:
           # Some other peer does not have data anymore, but no error occurred.
           break
         feed_dict, meta_step_info = self.data_provider.get_feed_dict()
+        profiler.mark("data_wait")
         if isinstance(self.engine.network.train_flag, tf.Tensor):
           feed_dict[self.engine.network.train_flag] = self._train_flag
         if isinstance(self.engine.network.epoch_step, tf.Tensor):
@@ -659,6 +674,7 @@ class Runner(object):
           debug_shell(user_ns=locals(), user_global_ns=globals(), exit_afterwards=False)
 
         # Now do one calculation step. Optionally with metadata.
+        profiler.mark("other")
         try:
           if self.store_metadata_mod_step and step % self.store_metadata_mod_step == 0:
             # Slow run that stores extra information for debugging.
@@ -702,9 +718,12 @@ class Runner(object):
           # Extra info will be printed below.
           raise
 
+        profiler.mark("session_run")
         eval_info = self._collect_eval_info(fetches_results=fetches_results)
         self._maybe_handle_extra_fetches(fetches_results)
+        profiler.mark("eval_info")
         elapsed_time_tf += self._horovod_sync_params(local_step=step)
+        profiler.mark("horovod")
         duration = time.time() - start_time
         self._print_process(report_prefix=report_prefix, step=step, step_duration=duration, eval_info=eval_info)
 
@@ -716,6 +735,7 @@ class Runner(object):
             raise Exception("Inf/nan score in step %i." % step)
 
         step += 1
+        profiler.end_step(queue_fill=queue_fill)
         if self.cancel_flag:
           raise CancelTrainingException("cancel_flag is set")
 
@@ -741,6 +761,8 @@ class Runner(object):
       elapsed_tf_percentage = (elapsed_time_tf / elapsed) if (elapsed > 0) else 0.0
       print("%s, finished after %i steps, %s elapsed (%.1f%% computing time)" % (
         report_prefix, step, hms(elapsed), (elapsed_tf_percentage * 100.)), file=log.v3)
+      print("%s, step time breakdown: %s" % (report_prefix, profiler.get_summary_str()), file=log.v4)
+      self._write_profile(writer=writer, step=step + step_offset)
 
     except KeyboardInterrupt as exc:
       print("KeyboardInterrupt in step %r." % step)
@@ -774,6 +796,47 @@ class Runner(object):
       try_and_ignore_exception(lambda: self.engine.network.set_run_finished(error_occurred=True))
       self.elapsed = time.time() - self.start_time
 
+  def _write_profile(self, writer, step):
+    """
+    Writes the summary of :class:`StepProfiler` as one JSON line to ``run_profile_file``,
+    and as TF summaries if ``run_profile_tf_summaries``.
+
+    :param tf.compat.v1.summary.FileWriter|None writer:
+    :param int step: global train step
+    """
+    config = self.engine.config
+    profile_filename = config.bool_or_other("run_profile_file", None)
+    # noinspection PyProtectedMember
+    if profile_filename and self.engine._do_save():
+      if profile_filename is True:
+        # Default: next to the learning rate file (or the model).
+        lr_control = self.engine.learning_rate_control
+        if lr_control and lr_control.filename:
+          profile_filename = "%s/run_profile.jsonl" % (os.path.dirname(os.path.abspath(lr_control.filename)),)
+        elif self.engine.model_filename:
+          profile_filename = "%s/run_profile.jsonl" % (os.path.dirname(os.path.abspath(self.engine.model_filename)),)
+        else:
+          profile_filename = None
+          print("run_profile_file: no learning rate file or model, cannot write the profile.", file=log.v3)
+      if profile_filename:
+        info = {"epoch": self.engine.epoch, "dataset": self.dataset_name, "report_prefix": self.report_prefix}
+        if isinstance(self.data_provider, FeedDictDataProvider):
+          info["data_provider_stage_times"] = self.data_provider.get_stage_times()
+        self.profiler.write_json_line(profile_filename, **info)
+    if writer and config.bool("run_profile_tf_summaries", False):
+      summary = self.profiler.get_summary()
+      values = {"num_steps": summary["num_steps"], "elapsed": summary["elapsed"]}
+      values.update({"time_%s" % phase: value for (phase, value) in summary["time"].items()})
+      values.update({"frac_%s" % phase: value for (phase, value) in summary["frac"].items()})
+      values.update({
+        key: value for (key, value) in summary.items()
+        if key.startswith("queue_") or key.startswith("rss_")})
+      writer.add_summary(
+        tf_compat.v1.Summary(value=[
+          tf_compat.v1.Summary.Value(tag="profile/%s" % key, simple_value=value)
+          for (key, value) in sorted(values.items())]),
+        step)
+
   def exit_due_to_error(self):
     """
     Exit due to an previous error.
@@ -820,6 +883,8 @@ class Engine(EngineBase):
     self._merge_all_summaries = None
     self.dataset_batches = {}  # type: typing.Dict[str,BatchSetGenerator]
     self.dataset_provider = None  # type: typing.Optional[DatasetDataProvider]
+    self._feed_dict_buffer_ring = None  # type: typing.Optional[BatchBufferRing]
+    self._feed_dict_worker_pool = None  # type: typing.Optional[FeedDictBatchWorkerPool]
     self.train_data = None  # type: typing.Optional[Dataset]
     self.eval_datasets = {}  # type: typing.Dict[str,Dataset]
     self.start_epoch = None  # type: typing.Optional[int]
@@ -830,11 +895,19 @@ class Engine(EngineBase):
     self._const_cache = {}  # type: typing.Dict[str,tf.Tensor]
     self.preload_from_files = None  # type: typing.Optional[typing.Dict[str,typing.Dict[str]]]
     self.max_seqs = None  # type: typing.Optional[int]
+    self._async_checkpoint_saver = None  # type: typing.Optional[AsyncCheckpointSaver]
 
   def finalize(self, error_occurred=False):
     """
     Finalizes the TF session, network, graph.
     """
+    if self._async_checkpoint_saver:
+      # Make sure that all pending checkpoints are written.
+      self._async_checkpoint_saver.close()
+      self._async_checkpoint_saver = None
+    if self._feed_dict_worker_pool:
+      self._feed_dict_worker_pool.stop()
+      self._feed_dict_worker_pool = None
     self._close_tf_session()
     self._reset_graph(error_occurred=error_occurred)
 
@@ -961,6 +1034,8 @@ class Engine(EngineBase):
     if epoch:
       assert not filename
       filename = self.get_epoch_model_filename(epoch=epoch)
+    if self._async_checkpoint_saver and self._async_checkpoint_saver.is_pending(filename):
+      self._async_checkpoint_saver.wait()
     print("Load model %s" % (filename,), file=log.v4)
     self.network.load_params_from_file(filename, session=self.tf_session)
 
@@ -973,7 +1048,12 @@ class Engine(EngineBase):
     if not filename:
       filename = self.get_epoch_model_filename()
     print("Save model under %s" % (filename,), file=log.v4)
-    self.network.save_params_to_file(filename, session=self.tf_session)
+    if self.config.bool("save_async", False) and not self._async_checkpoint_saver:
+      self._async_checkpoint_saver = AsyncCheckpointSaver(
+        tmp_dir=self.config.value("save_async_tmp_dir", None),
+        max_queue_size=self.config.int("save_async_max_queue_size", 1))
+    self.network.save_params_to_file(
+      filename, session=self.tf_session, async_saver=self._async_checkpoint_saver)
 
   @staticmethod
   def delete_model(filename):
@@ -1023,6 +1103,7 @@ class Engine(EngineBase):
     self.start_epoch, self.start_batch = self.get_train_start_epoch_batch(config)
     self.batch_size = config.typed_value('batch_size', 1)
     self.shuffle_batches = config.bool('shuffle_batches', False)
+    self.length_bucketing = config.typed_value('length_bucketing', None)
     self.update_batch_size = config.int('update_batch_size', 0)
     self.save_model_epoch_interval = config.int('save_interval', 1)
     self.save_epoch1_initial_model = config.bool('save_epoch1_initial_model', False)
@@ -1052,9 +1133,31 @@ class Engine(EngineBase):
       self.min_seq_length = NumbersDict(self.min_seq_length)
     assert isinstance(self.min_seq_length, (int, float, NumbersDict))
     self.max_pad_size = config.typed_value("max_pad_size", None)
+    self._init_feed_dict_worker_pool(config)
     # And also initialize the network. That depends on some vars here such as pretrain.
     self.init_network_from_config(config)
 
+  def _init_feed_dict_worker_pool(self, config):
+    """
+    The worker processes for ``feed_dict_num_workers`` are forked here, before the TF session is created,
+    as it is unsafe to fork a process with TF state.
+
+    :param Config.Config config:
+    """
+    num_workers = config.int("feed_dict_num_workers", 0)
+    if num_workers <= 0 or self._feed_dict_worker_pool:
+      return
+    if self.tf_session:
+      print("WARNING: feed_dict_num_workers: TF session already exists, cannot fork workers anymore", file=log.v2)
+      return
+    datasets = {"train": self.train_data}
+    datasets.update(self.eval_datasets)
+    datasets = {name: dataset for (name, dataset) in datasets.items() if dataset}
+    if not datasets:
+      return
+    self._feed_dict_worker_pool = FeedDictBatchWorkerPool(datasets=datasets, num_workers=num_workers)
+    print("Using %r." % self._feed_dict_worker_pool, file=log.v3)
+
   def get_net_dict_for_epoch(self, epoch, config=None):
     """
     :param int epoch:
@@ -1148,7 +1251,8 @@ class Engine(EngineBase):
           ignore_missing=opts.get("ignore_missing", False),
           ignore_params=opts.get("ignore_params", ()),
           ignore_params_prefixes=opts.get("ignore_params_prefixes", ()),
-          var_name_mapping=opts.get("var_name_mapping", {}))
+          var_name_mapping=opts.get("var_name_mapping", {}),
+          num_threads=self.config.int("load_num_threads", 0) or None)
         # `set_as_custom_init` is also a marker for the vars, that they are preloaded,
         # such that further checkpoint loaders will not load them again.
         loader.set_as_custom_init()
@@ -1535,7 +1639,8 @@ class Engine(EngineBase):
       print("save initial epoch1 model", epoch0_model_filename, file=log.v4)
       self.save_model(epoch0_model_filename)
 
-    if 'train' not in self.dataset_batches or not self.train_data.batch_set_generator_cache_whole_epoch():
+    if ('train' not in self.dataset_batches or not self.train_data.batch_set_generator_cache_whole_epoch()
+          or self.length_bucketing):
       self.dataset_batches['train'] = self.train_data.generate_batches(
         recurrent_net=self.network.recurrent,
         batch_size=self.batch_size,
@@ -1545,6 +1650,7 @@ class Engine(EngineBase):
         max_pad_size=self.max_pad_size,
         seq_drop=self.seq_drop,
         shuffle_batches=self.shuffle_batches,
+        length_bucketing=self.length_bucketing,
         used_data_keys=self.network.get_used_data_keys())
     else:
       print("reusing previous dataset batch order for 'train' dataset", file=log.v4)
@@ -1992,12 +2098,14 @@ class Engine(EngineBase):
         self.tf_session.run(tf_compat.v1.variables_initializer(uninitialized_vars))
       self._checked_uninitialized_vars = True
 
-  def _get_data_provider(self, dataset_name=None, dataset=None, batches=None, feed_dict=None):
+  def _get_data_provider(self, dataset_name=None, dataset=None, batches=None, feed_dict=None, reuse_buffers=False):
     """
     :param str|None dataset_name:
     :param Dataset.Dataset|None dataset:
     :param BatchSetGenerator|None batches:
     :param bool|None feed_dict:
+    :param bool reuse_buffers: whether the caller is fine that the arrays of the feed dict are reused
+      after the next :func:`FeedDictDataProvider.get_feed_dict` (only if enabled via ``feed_dict_reuse_buffers``)
     :rtype: FeedDictDataProvider|DatasetDataProvider
     """
     if self.dataset_provider and feed_dict is not True and dataset_name:
@@ -2014,9 +2122,22 @@ class Engine(EngineBase):
         data_keys=self.network.get_used_data_keys(),
         dataset=dataset, batches=batches,
         batch_slice=batch_slice,
-        enforce_min_len1=self.config.is_true("enforce_min_len1", False))
+        enforce_min_len1=self.config.is_true("enforce_min_len1", False),
+        worker_pool=self._feed_dict_worker_pool,
+        buffer_ring=self._get_feed_dict_buffer_ring() if reuse_buffers else None)
       return data_provider
 
+  def _get_feed_dict_buffer_ring(self):
+    """
+    :return: buffer ring shared by all the data providers of the engine, if enabled via ``feed_dict_reuse_buffers``
+    :rtype: BatchBufferRing|None
+    """
+    if not self.config.bool("feed_dict_reuse_buffers", False):
+      return None
+    if not self._feed_dict_buffer_ring:
+      self._feed_dict_buffer_ring = BatchBufferRing()
+    return self._feed_dict_buffer_ring
+
   def get_specific_feed_dict(self, dataset, seq_idx):
     """
     :param Dataset.Dataset dataset:
@@ -2105,7 +2226,7 @@ class Engine(EngineBase):
     :param int batch_size:
     :param LayerBase output_layer:
     """
-    from returnn.datasets.hdf import SimpleHDFWriter
+    from returnn.datasets.hdf import SimpleHDFWriter, AsyncSimpleHDFWriter
 
     if not output_layer:
       output_layer = self._get_output_layer()
@@ -2129,7 +2250,13 @@ class Engine(EngineBase):
     else:
       assert not os.path.exists(output_file)
     print("Forward output:", output, file=log.v3)
-    writer = SimpleHDFWriter(filename=output_file, dim=output.dim, ndim=output.ndim, labels=labels)
+    write_queue_size = self.config.int("forward_hdf_write_queue_size", 10)
+    if write_queue_size > 0:
+      # Write in a background thread, such that the forward pass does not wait for the HDF writes.
+      writer = AsyncSimpleHDFWriter(
+        filename=output_file, dim=output.dim, ndim=output.ndim, labels=labels, max_queue_size=write_queue_size)
+    else:
+      writer = SimpleHDFWriter(filename=output_file, dim=output.dim, ndim=output.ndim, labels=labels)
 
     def extra_fetches_cb(inputs, seq_tag, **kwargs):
       """
@@ -2221,14 +2348,19 @@ class Engine(EngineBase):
       analyzer.exit_due_to_error()
     return analyzer
 
-  def search(self, dataset, do_eval=True, output_layer_names="output", output_file=None, output_file_format="txt"):
+  def search(self, dataset, do_eval=True, output_layer_names="output", output_file=None, output_file_format="txt",
+             resume=False):
     """
     :param Dataset dataset:
     :param bool do_eval: calculate errors and print reference. can only be done if we have the reference target
     :param str|list[str] output_layer_names:
     :param str output_file:
+      The outputs are written incrementally to ``output_file + ".partial"`` (see :class:`SearchOutputRecordFile`),
+      and only at the end, this is converted to the final output file.
     :param str output_file_format: "txt" or "py"
+    :param bool resume: if the partial output file exists (e.g. the job was preempted), skip the seqs found in there
     """
+    from returnn.engine.search_output import SearchOutputRecordFile
     print("Search with network on %r." % dataset, file=log.v1)
     if not self.use_search_flag or not self.network or self.use_dynamic_train_flag:
       self.use_search_flag = True
@@ -2255,13 +2387,36 @@ class Engine(EngineBase):
     assert not max_seq_length, (
       "Set max_seq_length = 0 for search (i.e. no maximal length). We want to keep all source sentences.")
 
+    output_records = None  # type: typing.Optional[SearchOutputRecordFile]
+    if output_file:
+      assert output_file_format in {"txt", "py"}
+      if isinstance(output_layer_names, list):
+        assert output_file_format == "py", "Text format not supported in the case of multiple output layers."
+      if resume and os.path.exists(output_file):
+        print("Search output file %r exists already, nothing to do (search_resume)." % output_file, file=log.v1)
+        return
+      assert not os.path.exists(output_file)
+      print("Will write outputs to: %s" % output_file, file=log.v2)
+      output_records = SearchOutputRecordFile(output_file + ".partial", resume=resume)
+
     dataset.init_seq_order(epoch=self.epoch)
+    seq_filter = None
+    if output_records is not None and len(output_records) > 0:
+      def seq_filter(seq_idx_):
+        """
+        :param int seq_idx_:
+        :return: whether to keep the seq, i.e. it is not in the partial output yet
+        :rtype: bool
+        """
+        return dataset.get_tag(seq_idx_) not in output_records
+
     batches = dataset.generate_batches(
       recurrent_net=self.network.recurrent,
       batch_size=self.config.int('batch_size', 1),
       max_seqs=self.config.int('max_seqs', -1),
       max_seq_length=max_seq_length,
-      used_data_keys=self.network.get_used_data_keys())
+      used_data_keys=self.network.get_used_data_keys(),
+      seq_filter=seq_filter)
 
     output_is_dict = isinstance(output_layer_names, list)
     if not output_is_dict:
@@ -2291,18 +2446,6 @@ class Engine(EngineBase):
         target_key = self.network.extern_data.default_target
       target_keys.append(target_key)
 
-    out_cache = None
-    seq_idx_to_tag = {}
-    if output_file:
-      assert output_file_format in {"txt", "py"}
-      if output_is_dict:
-        assert output_file_format == "py", "Text format not supported in the case of multiple output layers."
-      assert not os.path.exists(output_file)
-      print("Will write outputs to: %s" % output_file, file=log.v2)
-      output_file = open(output_file, "w")
-      # corpus-seq-idx -> str|list[(float,str)]|dict[str -> str|list[(float,str)]],
-      # depending on output_is_dict and whether output is after decision
-      out_cache = {}
     if not log.verbose[4]:
       print("Set log_verbosity to level 4 or higher to see seq info on stdout.", file=log.v2)
 
@@ -2390,13 +2533,9 @@ class Engine(EngineBase):
         serialized_targets.append(serialized_target)
 
       for batch_idx in range(len(seq_idx)):
-        corpus_seq_idx = None
-        if out_cache is not None:
-          corpus_seq_idx = dataset.get_corpus_seq_idx(seq_idx[batch_idx])
-          assert corpus_seq_idx not in out_cache
-          seq_idx_to_tag[corpus_seq_idx] = seq_tag[batch_idx]
-          if output_is_dict:
-            out_cache[corpus_seq_idx] = {}
+        # str|list[(float,str)]|dict[str -> str|list[(float,str)]],
+        # depending on output_is_dict and whether output is after decision
+        seq_out_data = {} if output_is_dict else None
 
         # noinspection PyShadowingNames
         for output_layer_idx in range(num_output_layers):
@@ -2426,7 +2565,7 @@ class Engine(EngineBase):
                   serialized_outputs[output_layer_idx][out_idx + beam_idx],
                   file=log.v4)
 
-          if out_cache is not None:
+          if output_records is not None:
             if out_beam_sizes[output_layer_idx] is None:
               out_data = serialized_outputs[output_layer_idx][out_idx]
             else:
@@ -2437,11 +2576,15 @@ class Engine(EngineBase):
                   for beam_idx in range(out_beam_sizes[output_layer_idx])]
 
             if output_is_dict:
-              assert output_layer_names[output_layer_idx] not in out_cache[corpus_seq_idx]
-              out_cache[corpus_seq_idx][output_layer_names[output_layer_idx]] = out_data
+              assert output_layer_names[output_layer_idx] not in seq_out_data
+              seq_out_data[output_layer_names[output_layer_idx]] = out_data
             else:
-              assert corpus_seq_idx not in out_cache
-              out_cache[corpus_seq_idx] = out_data
+              seq_out_data = out_data
+
+        if output_records is not None:
+          output_records.add(
+            corpus_seq_idx=dataset.get_corpus_seq_idx(seq_idx[batch_idx]), seq_tag=seq_tag[batch_idx],
+            data=seq_out_data)
 
     train = self._maybe_prepare_train_in_eval(targets_via_search=True)
 
@@ -2465,26 +2608,13 @@ class Engine(EngineBase):
     runner.run(report_prefix=self.get_epoch_str() + " search")
     if not runner.finalized:
       print("Error happened. Exit now.")
+      if output_records is not None:
+        output_records.close()
       runner.exit_due_to_error()
     print("Search done. Num steps %i, Final: score %s error %s" % (
       runner.num_steps, self.format_score(runner.score), self.format_score(runner.error)), file=log.v1)
-    if output_file:
-      assert out_cache
-      assert 0 in out_cache
-      assert len(out_cache) - 1 in out_cache
-      if output_file_format == "txt":
-        for i in range(len(out_cache)):
-          output_file.write("%s\n" % out_cache[i])
-      elif output_file_format == "py":
-        from returnn.util.basic import better_repr
-        output_file.write("{\n")
-        with numpy.printoptions(threshold=sys.maxsize):
-          for i in range(len(out_cache)):
-            output_file.write("%r: %s,\n" % (seq_idx_to_tag[i], better_repr(out_cache[i])))
-        output_file.write("}\n")
-      else:
-        raise Exception("invalid output_file_format %r" % output_file_format)
-      output_file.close()
+    if output_records is not None:
+      output_records.write_final(output_file, output_file_format=output_file_format)
 
   def search_single(self, dataset, seq_idx, output_layer_name=None):
     """
@@ -2651,16 +2781,40 @@ class Engine(EngineBase):
     """
     Starts a web-server with a simple API to forward data through the network
     (or search if the flag is set).
+    See :func:`create_web_server`.
 
     :param int port: for the http server
-    :return:
     """
-    assert sys.version_info[0] >= 3, "only Python 3 supported"
+    self.create_web_server(port=port)
+    print("Simple search web server, listening on port %i." % self.httpd.server_address[1], file=log.v2)
+    try:
+      self.httpd.serve_forever()
+    finally:
+      self.web_server_batcher.close()
+
+  def create_web_server(self, port):
+    """
+    Creates the web-server for :func:`web_server`, as ``self.httpd``, without starting it.
+
+    Every request is handled in its own thread.
+    The requests are merged dynamically into batches via :class:`DynamicBatcher` (``self.web_server_batcher``),
+    such that there is only one ``session.run`` for all pending requests.
+    See the config options ``web_server_max_batch_size``, ``web_server_max_batch_frames``
+    and ``web_server_max_wait_time``.
+
+    POST with a ``file`` (text or audio) returns the search output.
+    GET ``/stats`` returns the latency percentiles and the queue depth as JSON.
+
+    :param int port: for the http server. 0 to pick some free port (see ``self.httpd.server_address``)
+    :rtype: http.server.ThreadingHTTPServer
+    """
+    assert sys.version_info[:2] >= (3, 7), "only Python >=3.7 supported"
     # noinspection PyCompatibility
-    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
     from returnn.datasets.generating import StaticDataset
     from returnn.datasets.util.feature_extraction import ExtractAudioFeatures
     from returnn.datasets.util.vocabulary import Vocabulary, BytePairEncoding
+    from returnn.engine.dynamic_batching import DynamicBatcher
 
     if not self.use_search_flag or not self.network or self.use_dynamic_train_flag:
       self.use_search_flag = True
@@ -2703,7 +2857,7 @@ class Engine(EngineBase):
     output_layer = self.network.layers[output_layer_name]
     output_t = output_layer.output.get_placeholder_as_batch_major()
     output_seq_lens_t = output_layer.output.get_sequence_lengths()
-    out_beam_size = output_layer.output.beam.beam_size
+    out_beam_size = output_layer.output.beam.beam_size if output_layer.output.beam else None
     output_layer_beam_scores_t = None
     if out_beam_size is None:
       print("Given output %r is after decision (no beam)." % output_layer, file=log.v1)
@@ -2711,6 +2865,42 @@ class Engine(EngineBase):
       print("Given output %r has beam size %i." % (output_layer, out_beam_size), file=log.v1)
       output_layer_beam_scores_t = output_layer.get_search_choices().beam_scores
 
+    def run_batch(features_list):
+      """
+      :param list[numpy.ndarray] features_list: per request
+      :return: per request: outputs (per beam), seq lens (per beam), beam scores (or None)
+      :rtype: list[(numpy.ndarray,numpy.ndarray,numpy.ndarray|None)]
+      """
+      targets = numpy.array([], dtype="int32")  # empty...
+      dataset = StaticDataset(
+        data=[{input_data.name: features, output_data.name: targets} for features in features_list],
+        output_dim=num_outputs)
+      dataset.init_seq_order(epoch=1)
+      start_time = time.time()
+      output_d = engine.run_single(dataset=dataset, seq_idx=-1, output_dict={
+        "output": output_t,
+        "seq_lens": output_seq_lens_t,
+        "beam_scores": output_layer_beam_scores_t})
+      print("Took %.3f secs for decoding %i seqs." % (time.time() - start_time, len(features_list)), file=log.v4)
+      n_batch = len(features_list)
+      n_beam = out_beam_size or 1
+      output, seq_lens, beam_scores = output_d["output"], output_d["seq_lens"], output_d["beam_scores"]
+      assert len(output) == len(seq_lens) == n_batch * n_beam
+      if out_beam_size:
+        assert beam_scores.shape == (n_batch, out_beam_size)  # (batch, beam)
+      return [
+        (output[i * n_beam:(i + 1) * n_beam], seq_lens[i * n_beam:(i + 1) * n_beam],
+         beam_scores[i] if out_beam_size else None)
+        for i in range(n_batch)]
+
+    max_batch_frames = self.config.int("web_server_max_batch_frames", 0)
+    batcher = DynamicBatcher(
+      run_batch_func=run_batch,
+      max_batch_size=self.config.int("web_server_max_batch_size", 32),
+      max_batch_frames=max_batch_frames or None,
+      max_wait_time=self.config.float("web_server_max_wait_time", 0.01),
+      name="web server batcher")
+
     class Handler(BaseHTTPRequestHandler):
       """
       Handle POST requests.
@@ -2726,6 +2916,20 @@ class Engine(EngineBase):
           sys.excepthook(*sys.exc_info())
           raise
 
+      # noinspection PyPep8Naming
+      def do_GET(self):
+        """
+        Handle GET request. Only /stats is supported.
+        """
+        import json
+        if self.path.rstrip("/") != "/stats":
+          self.send_error(404)
+          return
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(batcher.get_stats()).encode("utf8"))
+
       def _do_post(self):
         import cgi
         form = cgi.FieldStorage(
@@ -2755,30 +2959,17 @@ class Engine(EngineBase):
           seq = input_vocab.get_seq(sentence)
           print("Input seq:", input_vocab.get_seq_labels(seq), file=log.v4)
           features = numpy.array(seq, dtype="int32")
-        targets = numpy.array([], dtype="int32")  # empty...
-        dataset = StaticDataset(
-          data=[{input_data.name: features, output_data.name: targets}], output_dim=num_outputs)
-        dataset.init_seq_order(epoch=1)
 
-        self.send_response(200)
-        self.send_header('Content-type', 'text/plain')
-        self.end_headers()
         start_time = time.time()
-        output_d = engine.run_single(dataset=dataset, seq_idx=0, output_dict={
-          "output": output_t,
-          "seq_lens": output_seq_lens_t,
-          "beam_scores": output_layer_beam_scores_t})
+        output, seq_lens, beam_scores = batcher(features, num_frames=max(len(features), 1))
         delta_time = time.time() - start_time
-        print("Took %.3f secs for decoding." % delta_time, file=log.v4)
+        print("Took %.3f secs for the request (including waiting)." % delta_time, file=log.v4)
         if audio_len:
           print("Real-time-factor: %.3f" % (delta_time / audio_len), file=log.v4)
-        output = output_d["output"]
-        seq_lens = output_d["seq_lens"]
-        beam_scores = output_d["beam_scores"]
-        assert len(output) == len(seq_lens) == (out_beam_size or 1)
-        if out_beam_size:
-          assert beam_scores.shape == (1, out_beam_size)  # (batch, beam)
 
+        self.send_response(200)
+        self.send_header('Content-type', 'text/plain')
+        self.end_headers()
         first_best_txt = output_vocab.get_seq_labels(output[0][:seq_lens[0]])
         print("Best output: %s" % first_best_txt, file=log.v4)
 
@@ -2786,18 +2977,20 @@ class Engine(EngineBase):
           self.wfile.write(b"[\n")
           for i in range(out_beam_size):
             txt = output_vocab.get_seq_labels(output[i][:seq_lens[i]])
-            score = beam_scores[0][i]
+            score = beam_scores[i]
             self.wfile.write(("(%r, %r)\n" % (score, txt)).encode("utf8"))
           self.wfile.write(b"]\n")
 
         else:
           self.wfile.write(("%r\n" % first_best_txt).encode("utf8"))
 
-    print("Simple search web server, listening on port %i." % port, file=log.v2)
     server_address = ('', port)
     # noinspection PyAttributeOutsideInit
-    self.httpd = HTTPServer(server_address, Handler)
-    self.httpd.serve_forever()
+    self.web_server_batcher = batcher
+    # noinspection PyAttributeOutsideInit
+    self.httpd = ThreadingHTTPServer(server_address, Handler)
+    self.httpd.daemon_threads = True
+    return self.httpd
 
 
 def get_global_engine():
@@ -14,17 +14,27 @@ The current logic probably can be improved.
 Currently, each search is a training started from the scratch, and the accumulated train score
 is used as an evaluation measure.
 This probably also can be improved.
-Also, instead of always starting from scratch, we could keep intermediate results and resume from them,
-or use real training intermediate results and resume from them.
+With ``"early_stopping": "asha"``, bad individuals are stopped after a few train steps,
+and only the promising ones are trained further, resuming from their intermediate checkpoint
+(asynchronous successive halving, see :class:`_AshaScheduler`).
+We could also use real training intermediate results and resume from them.
 We could even do some simple search in the beginning of each epoch when we keep it cheap enough.
 
+The individuals are trained in a pool of threads in this process (``"executor": "thread"``, the default),
+or in a pool of subprocesses (``"executor": "process"``), where each has its own Python interpreter (no shared GIL),
+its own TF thread pools (``threads_per_worker``), and only sees its assigned GPU.
+The padded train batches are assembled only once, into a read-only memory-mapped file
+(``"batch_store": True``, the default), which all the workers replay directly into the feed dict.
+
 Also, we could store the population of hyper params on disk to allow resuming of a search.
 """
 
 from __future__ import print_function
 
+import os
 import sys
 import time
+import json
 import typing
 import numpy
 import returnn.tf.compat as tf_compat
@@ -32,6 +42,7 @@ from returnn.config import Config
 from returnn.log import log
 from returnn.datasets import Dataset
 from returnn.datasets.generating import StaticDataset
+from returnn.engine.batch_store import MmapBatchStore
 from returnn.tf.engine import Engine, Runner, CancelTrainingException
 from returnn.util.basic import CollectionReadCheckCovered, hms_fraction, guess_requested_max_num_threads
 
@@ -291,6 +302,14 @@ class Individual:
     self.hyper_param_mapping = hyper_param_mapping
     self.cost = None
     self.name = name
+    self.stopped_at_rung = None  # type: typing.Optional[int]  # if early stopped, see :class:`_AshaScheduler`
+
+  def get_sort_key(self):
+    """
+    :return: key to sort by, best first. Early stopped individuals come after fully trained ones
+    :rtype: (bool,int,float)
+    """
+    return self.stopped_at_rung is not None, -(self.stopped_at_rung or 0), self.cost
 
   def cross_over(self, hyper_params, population, random_seed):
     """
@@ -349,6 +368,19 @@ class Optimization:
       "num_kill_individuals", self.num_individuals // 2)
     self.num_best = self.opts.get("num_best", 10)
     self.num_threads = self.opts.get("num_threads", guess_requested_max_num_threads())
+    self.executor = self.opts.get("executor", "thread")
+    assert self.executor in {"thread", "process"}, "hyper_param_tuning: invalid executor %r" % self.executor
+    # Only used for the process executor. The thread executor shares the TF thread pools of this process.
+    self.threads_per_worker = self.opts.get(
+      "threads_per_worker", max(guess_requested_max_num_threads() // self.num_threads, 1))
+    self.early_stopping = self.opts.get("early_stopping", None)
+    assert self.early_stopping in {None, "asha"}, (
+      "hyper_param_tuning: invalid early_stopping %r" % self.early_stopping)
+    self.asha_min_steps = self.opts.get("asha_min_steps", 10)
+    self.asha_reduction_factor = self.opts.get("asha_reduction_factor", 3)
+    self.asha_num_rungs = self.opts.get("asha_num_rungs", 3)
+    self.use_batch_store = self.opts.get("batch_store", True)
+    self.batch_store = None  # type: typing.Optional[MmapBatchStore]  # see _create_batch_store
     self.opts.assert_all_read()
 
   def _find_hyper_params(self, base=None, visited=None):
@@ -439,15 +471,52 @@ class Optimization:
     gpu_opts.visible_device_list = ",".join(map(str, sorted(gpu_ids)))
     return config
 
+  def _create_batch_store(self):
+    """
+    Assembles the padded train batches once (for the default hyper params) into a memory-mapped file.
+    All individuals with the same batching options replay them from there (see :func:`_train_individual`),
+    in all the threads or processes, i.e. they share the memory, and there is no batching per individual.
+
+    :rtype: MmapBatchStore
+    """
+    import tempfile
+    from returnn.tf.data_pipeline import BatchStoreDataProvider
+    from returnn.util.basic import human_bytes_size
+    start_time = time.time()
+    config = self.create_config_instance({p: p.get_default_value() for p in self.hyper_params}, gpu_ids=set())
+    # init_train_from_config expects to have the train task
+    config.set("task", "train")
+    config.set("device", "cpu")  # we don't run anything, so don't occupy any GPU
+    engine = Engine(config=config)
+    train_data = StaticDataset.copy_from_dataset(self.train_data)
+    engine.init_train_from_config(config=config, train_data=train_data)
+    engine.epoch = 1
+    try:
+      fd, filename = tempfile.mkstemp(prefix="returnn-hyper-param-tuning-batches-")
+      os.close(fd)
+      batch_store = BatchStoreDataProvider.create_batch_store(
+        filename, dataset=train_data, batches=_generate_batches(engine, train_data),
+        extern_data=engine.network.extern_data, data_keys=engine.network.get_used_data_keys(),
+        enforce_min_len1=config.is_true("enforce_min_len1", False),
+        meta={"batching_opts": _get_batching_opts(engine)})
+    finally:
+      engine.finalize()
+    print("Created batch store %r with %i batches, %s, in %s." % (
+      batch_store.filename, len(batch_store), human_bytes_size(batch_store.get_num_bytes()),
+      hms_fraction(time.time() - start_time)), file=log.v2)
+    return batch_store
+
   def work(self):
     """
     Start the optimization.
     """
-    print("Starting hyper param search. Using %i threads." % self.num_threads, file=log.v1)
+    print("Starting hyper param search. Using %i %s workers." % (self.num_threads, self.executor), file=log.v1)
     from returnn.tf.util.basic import get_available_gpu_devices
     from returnn.log import wrap_log_streams, StreamDummy
     from threading import Thread, Condition
     from returnn.util.basic import progress_bar, hms, is_tty
+    import tempfile
+    import shutil
 
     class Outstanding:
       """
@@ -455,13 +524,14 @@ class Optimization:
       """
       cond = Condition()
       threads = []  # type: typing.List[WorkerThread]
-      population = []
+      scheduler = None  # type: typing.Optional[_Scheduler]
       exit = False
       exception = None
 
     class WorkerThread(Thread):
       """
       Worker threader.
+      With the process executor, this just controls its own worker subprocess.
       """
       def __init__(self, gpu_ids):
         """
@@ -479,9 +549,8 @@ class Optimization:
         """
         with Outstanding.cond:
           if self.trainer:
-            self.trainer.cancel_flag = True
-            if self.trainer.runner:
-              self.trainer.runner.cancel_flag = True
+            self.trainer.cancel()
+          Outstanding.cond.notify_all()
         if join:
           self.join()
 
@@ -499,20 +568,34 @@ class Optimization:
         """
         Run thread.
         """
+        worker = None
+        gpu_ids = self_thread.gpu_ids
         try:
+          if self.executor == "process":
+            worker = _ProcessWorker(optim=self, gpu_ids=gpu_ids if have_gpus else set())
+            gpu_ids = {0}  # the worker only sees its own GPU
           while True:
             with Outstanding.cond:
-              if Outstanding.exit or Outstanding.exception:
-                return
-              if not Outstanding.population:
+              while True:
+                if Outstanding.exit or Outstanding.exception:
+                  return
+                job = Outstanding.scheduler.get_next_job()
+                if job or not Outstanding.scheduler.num_running:
+                  break
+                # The results of the running jobs might allow to promote some individual.
+                Outstanding.cond.wait()
+              if not job:
                 self_thread.finished = True
                 Outstanding.cond.notify_all()
                 return
-              # noinspection PyShadowingNames
-              individual = Outstanding.population.pop(0)
-              self_thread.trainer = _IndividualTrainer(optim=self, individual=individual, gpu_ids=self_thread.gpu_ids)
-            self_thread.name = "Hyper param tune train thread on %r" % individual.name
+              self_thread.trainer = _IndividualTrainer(
+                optim=self, individual=job.individual, gpu_ids=gpu_ids, job=job, worker=worker)
+            self_thread.name = "Hyper param tune train thread on %r" % job.individual.name
             self_thread.trainer.run()
+            with Outstanding.cond:
+              Outstanding.scheduler.report_finished(job)
+              self_thread.trainer = None
+              Outstanding.cond.notify_all()
         except Exception as exc:
           with Outstanding.cond:
             if not Outstanding.exception:
@@ -525,14 +608,20 @@ class Optimization:
             with Outstanding.cond:  # So that we don't mix up multiple on sys.stderr.
               # This would normally dump it on sys.stderr so it's fine.
               sys.excepthook(*sys.exc_info())
+        finally:
+          if worker:
+            worker.close()
 
     best_individuals = []
     population = []
     num_gpus = len(get_available_gpu_devices())
     print("Num available GPUs:", num_gpus)
+    have_gpus = num_gpus > 0
     num_gpus = num_gpus or 1  # Would be ignored anyway.
     interactive = is_tty()
     try:
+      if self.use_batch_store:
+        self.batch_store = self._create_batch_store()
       print("Population of %i individuals (hyper param setting instances), running for %i evaluation iterations." % (
         self.num_individuals, self.num_iterations), file=log.v2)
       for cur_iteration_idx in range(1, self.num_iterations + 1):
@@ -551,20 +640,26 @@ class Optimization:
           # Later we will strip away all log output.
           print("Very first try with log output:", file=log.v2)
           _IndividualTrainer(optim=self, individual=population[0], gpu_ids={0}).run()
-        print("Starting training with thread pool of %i threads." % self.num_threads)
+        print("Starting training with pool of %i %s workers." % (self.num_threads, self.executor))
         iteration_start_time = time.time()
+        checkpoint_dir = None
+        if self.early_stopping == "asha":
+          checkpoint_dir = tempfile.mkdtemp(prefix="returnn-hyper-param-tuning-")
+          Outstanding.scheduler = _AshaScheduler(
+            population=population, checkpoint_dir=checkpoint_dir,
+            min_steps=self.asha_min_steps, reduction_factor=self.asha_reduction_factor, num_rungs=self.asha_num_rungs)
+        else:
+          Outstanding.scheduler = _Scheduler(population=population)
         with wrap_log_streams(StreamDummy(), also_sys_stdout=True, tf_log_verbosity="WARN"):
           Outstanding.exit = False
-          Outstanding.population = list(population)
           Outstanding.threads = [WorkerThread(gpu_ids={i % num_gpus}) for i in range(self.num_threads)]
           try:
             while True:
               with Outstanding.cond:
                 if all([thread.finished for thread in Outstanding.threads]) or Outstanding.exception:
                   break
-                complete_frac = max(len(population) - len(Outstanding.population) - len(Outstanding.threads), 0)
-                complete_frac += sum([thread.get_complete_frac() for thread in Outstanding.threads])
-                complete_frac /= float(len(population))
+                complete_frac = Outstanding.scheduler.get_complete_frac(
+                  running_complete_frac=sum([thread.get_complete_frac() for thread in Outstanding.threads]))
                 remaining_str = ""
                 if complete_frac > 0:
                   start_elapsed = time.time() - iteration_start_time
@@ -585,16 +680,20 @@ class Optimization:
             Outstanding.exit = True
             for thread in Outstanding.threads:
               thread.cancel(join=True)
+            if checkpoint_dir:
+              shutil.rmtree(checkpoint_dir, ignore_errors=True)
         Outstanding.threads = []
         print("Training iteration elapsed time:", hms(time.time() - iteration_start_time))
         if Outstanding.exception:
           raise Outstanding.exception
-        assert not Outstanding.population
+        assert not Outstanding.scheduler.pending
         print("Training iteration finished.")
-        population.sort(key=lambda p: p.cost)
+        if isinstance(Outstanding.scheduler, _AshaScheduler):
+          print("Number of trained individuals per rung:", Outstanding.scheduler.get_num_individuals_per_rung())
+        population.sort(key=Individual.get_sort_key)
         del population[-self.num_kill_individuals:]
         best_individuals.extend(population)
-        best_individuals.sort(key=lambda p: p.cost)
+        best_individuals.sort(key=Individual.get_sort_key)
         del best_individuals[self.num_best:]
         population = best_individuals[:self.num_kill_individuals // 4] + population
         print("Current best setting, individual %s" % best_individuals[0].name, "cost:", best_individuals[0].cost)
@@ -602,6 +701,10 @@ class Optimization:
           print(" %s -> %s" % (p.description(), best_individuals[0].hyper_param_mapping[p]))
     except KeyboardInterrupt:
       print("KeyboardInterrupt, canceled search.")
+    finally:
+      if self.batch_store:
+        self.batch_store.unlink()
+        self.batch_store = None
 
     print("Best %i settings:" % len(best_individuals))
     for individual in best_individuals:
@@ -611,62 +714,429 @@ class Optimization:
 
 
 class _IndividualTrainer:
-  def __init__(self, optim, individual, gpu_ids):
+  def __init__(self, optim, individual, gpu_ids, job=None, worker=None):
     """
     :param Optimization optim:
     :param Individual individual:
     :param set[int] gpu_ids:
+    :param _TrainJob|None job: via the scheduler. if None, trains on all the data (if not trained yet)
+    :param _ProcessWorker|None worker: if given, trains in this subprocess
     """
     self.optim = optim
     self.individual = individual
     self.runner = None  # type: typing.Optional[Runner]
     self.gpu_ids = gpu_ids
+    self.job = job
+    self.worker = worker
     self.cancel_flag = False
 
+  def cancel(self):
+    """
+    Cancels the training. Can be called from another thread.
+    """
+    self.cancel_flag = True
+    if self.runner:
+      self.runner.cancel_flag = True
+    if self.worker:
+      self.worker.terminate()
+
   def run(self):
     """
     Run the trainer.
     """
-    if self.individual.cost is not None:
+    if self.job is None and self.individual.cost is not None:
       return self.individual.cost
+    job = self.job or _TrainJob(individual=self.individual)
     start_time = time.time()
     hyper_param_mapping = self.individual.hyper_param_mapping
-    print("Training %r using hyper params:" % self.individual.name, file=log.v2)
+    print("Training %r (%s) using hyper params:" % (self.individual.name, job.get_steps_str()), file=log.v2)
     for p in self.optim.hyper_params:
       print(" %s -> %s" % (p.description(), hyper_param_mapping[p]), file=log.v2)
     config = self.optim.create_config_instance(hyper_param_mapping, gpu_ids=self.gpu_ids)
-    # init_train_from_config expects to have the train task
-    config.set("task", "train")
-    engine = Engine(config=config)
-    train_data = StaticDataset.copy_from_dataset(self.optim.train_data)
-    engine.init_train_from_config(config=config, train_data=train_data)
-    # Not directly calling train() as we want to have full control.
-    engine.epoch = 1
-    train_data.init_seq_order(epoch=engine.epoch)
-    batches = train_data.generate_batches(
-      recurrent_net=engine.network.recurrent,
-      batch_size=engine.batch_size,
-      max_seqs=engine.max_seqs,
-      max_seq_length=int(engine.max_seq_length),
-      seq_drop=engine.seq_drop,
-      shuffle_batches=engine.shuffle_batches,
-      used_data_keys=engine.network.used_data_keys)
-    engine.updater.set_learning_rate(engine.learning_rate, session=engine.tf_session)
-    trainer = Runner(engine=engine, dataset=train_data, batches=batches, train=True)
-    self.runner = trainer
-    if self.cancel_flag:
-      raise CancelTrainingException("Trainer cancel flag is set")
-    trainer.run(report_prefix="hyper param tune train %r" % self.individual.name)
-    if not trainer.finalized:
-      print("Trainer exception:", trainer.run_exception, file=log.v1)
-      raise trainer.run_exception
-    cost = trainer.score["cost:output"]
+    train_kwargs = dict(
+      name=self.individual.name, start_step=job.start_step, end_step=job.end_step,
+      load_filename=job.load_filename, save_filename=job.save_filename)
+    if self.worker:
+      cost = self.worker.train(config=config, trainer=self, **train_kwargs)
+    else:
+      cost = _train_individual(
+        config=config, train_data=self.optim.train_data, batch_store=self.optim.batch_store, trainer=self,
+        **train_kwargs)
+    if cost is None:  # no train steps left, i.e. the previous rung already covered all the train data
+      cost = self.individual.cost
     print(
-      "Individual %s:" % self.individual.name,
+      "Individual %s (%s):" % (self.individual.name, job.get_steps_str()),
       "Train cost:", cost,
       "elapsed time:", hms_fraction(time.time() - start_time),
       file=self.optim.log)
     self.individual.cost = cost
+    return cost
+
+
+def _iterate_batches(batches):
+  """
+  :param returnn.engine.batch.BatchSetGenerator batches:
+  :rtype: typing.Iterator[returnn.engine.batch.Batch]
+  """
+  while batches.has_more():
+    batch, = batches.peek_next_n(1)
+    batches.advance(1)
+    yield batch
+
+
+def _get_batching_opts(engine):
+  """
+  :param Engine engine: after :func:`Engine.init_train_from_config`
+  :return: all the options which define the train batches, JSON compatible, to compare them to the batch store
+  :rtype: dict[str]
+  """
+  return json.loads(json.dumps(dict(
+    recurrent_net=engine.network.recurrent,
+    batch_size=engine.batch_size,
+    max_seqs=engine.max_seqs,
+    max_seq_length=int(engine.max_seq_length),
+    seq_drop=engine.seq_drop,
+    shuffle_batches=engine.shuffle_batches,
+    used_data_keys=sorted(engine.network.used_data_keys),
+    data_keys=sorted(engine.network.get_used_data_keys()),
+    enforce_min_len1=engine.config.is_true("enforce_min_len1", False))))
+
+
+def _generate_batches(engine, train_data):
+  """
+  :param Engine engine: after :func:`Engine.init_train_from_config`
+  :param Dataset train_data:
+  :rtype: returnn.engine.batch.BatchSetGenerator
+  """
+  train_data.init_seq_order(epoch=engine.epoch)
+  return train_data.generate_batches(
+    recurrent_net=engine.network.recurrent,
+    batch_size=engine.batch_size,
+    max_seqs=engine.max_seqs,
+    max_seq_length=int(engine.max_seq_length),
+    seq_drop=engine.seq_drop,
+    shuffle_batches=engine.shuffle_batches,
+    used_data_keys=engine.network.used_data_keys)
+
+
+def _train_individual(config, train_data, name, start_step=0, end_step=None, load_filename=None, save_filename=None,
+                      batch_store=None, trainer=None, finalize_engine=False):
+  """
+  Trains one individual, maybe only on a range of the train steps, resuming from a checkpoint.
+  This runs either in this process (via :class:`_IndividualTrainer`) or in a :class:`_ProcessWorker`.
+
+  :param Config config: via :func:`Optimization.create_config_instance`
+  :param StaticDataset train_data:
+  :param str name: of the individual
+  :param int start_step: index of the first batch
+  :param int|None end_step: index of the batch to stop before. None means until the end of the train data
+  :param str|None load_filename: checkpoint to resume from
+  :param str|None save_filename: checkpoint to save to after training
+  :param returnn.engine.batch_store.MmapBatchStore|None batch_store: replay the batches from here,
+    if they were created with the same batching options
+  :param _IndividualTrainer|None trainer: gets the runner, and we check its cancel flag
+  :param bool finalize_engine: close the session and reset the graph at the end
+  :return: train cost of the trained steps, or None if there are no train steps in the given range
+  :rtype: float|None
+  """
+  from itertools import islice
+  from returnn.engine.batch import BatchSetGenerator
+  from returnn.tf.data_pipeline import BatchStoreDataProvider
+  # init_train_from_config expects to have the train task
+  config.set("task", "train")
+  engine = Engine(config=config)
+  # The dataset is only used for the data dims, unless we need to generate the batches (see below).
+  engine.init_train_from_config(config=config, train_data=train_data)
+  try:
+    # Not directly calling train() as we want to have full control.
+    engine.epoch = 1
+    if batch_store is not None and batch_store.meta["batching_opts"] == _get_batching_opts(engine):
+      if start_step >= len(batch_store):
+        return None
+      data_provider = BatchStoreDataProvider(
+        batch_store=batch_store, start_batch_idx=start_step, end_batch_idx=end_step, dataset_name="train",
+        extern_data=engine.network.extern_data, data_keys=engine.network.get_used_data_keys())
+      runner_kwargs = dict(data_provider=data_provider)
+    else:
+      # E.g. some hyper param changes the batching. The copy is cheap, it shares the data.
+      train_data = StaticDataset.copy_from_dataset(train_data)
+      batches = _generate_batches(engine, train_data)
+      if start_step or end_step is not None:
+        # The batches are deterministic, so this continues exactly where the previous range stopped.
+        batch_list = list(islice(_iterate_batches(batches), start_step, end_step))
+        if not batch_list:
+          return None
+        batches = BatchSetGenerator(dataset=train_data, generator=iter(batch_list))
+      runner_kwargs = dict(batches=batches)
+    if load_filename:
+      engine.load_model(filename=load_filename)
+    engine.updater.set_learning_rate(engine.learning_rate, session=engine.tf_session)
+    runner = Runner(engine=engine, dataset=train_data, train=True, **runner_kwargs)
+    if trainer:
+      trainer.runner = runner
+      if trainer.cancel_flag:
+        raise CancelTrainingException("Trainer cancel flag is set")
+    runner.run(report_prefix="hyper param tune train %r" % name)
+    if not runner.finalized:
+      print("Trainer exception:", runner.run_exception, file=log.v1)
+      raise runner.run_exception
+    if save_filename:
+      engine.save_model(save_filename)
+    return runner.score["cost:output"]
+  finally:
+    if finalize_engine:
+      engine.finalize()
+
+
+class _TrainJob:
+  """
+  Training of an individual on some range of the train steps, via :class:`_Scheduler`.
+  """
+
+  def __init__(self, individual, rung=0, start_step=0, end_step=None, load_filename=None, save_filename=None):
+    """
+    :param Individual individual:
+    :param int rung: see :class:`_AshaScheduler`
+    :param int start_step:
+    :param int|None end_step: None means until the end of the train data
+    :param str|None load_filename: checkpoint of the previous rung
+    :param str|None save_filename: checkpoint for the next rung
+    """
+    self.individual = individual
+    self.rung = rung
+    self.start_step = start_step
+    self.end_step = end_step
+    self.load_filename = load_filename
+    self.save_filename = save_filename
+
+  def get_steps_str(self):
+    """
+    :rtype: str
+    """
+    if not self.start_step and self.end_step is None:
+      return "all steps"
+    return "rung %i, steps %i-%s" % (self.rung, self.start_step, self.end_step if self.end_step is not None else "end")
+
+
+class _Scheduler:
+  """
+  Decides which individual is trained next, and on which train steps.
+  This is the default: every individual which was not trained yet is trained on all the train data.
+  Not thread-safe, the caller must take care of the locking.
+  """
+
+  def __init__(self, population):
+    """
+    :param list[Individual] population:
+    """
+    self.pending = [individual for individual in population if individual.cost is None]
+    self.num_running = 0
+    self.num_finished = 0
+
+  def get_next_job(self):
+    """
+    :return: next job, or None if there is currently nothing to do (which might change when running jobs finish)
+    :rtype: _TrainJob|None
+    """
+    if not self.pending:
+      return None
+    self.num_running += 1
+    return _TrainJob(individual=self.pending.pop(0))
+
+  def report_finished(self, job):
+    """
+    :param _TrainJob job: finished, i.e. the cost of the individual is set
+    """
+    self.num_running -= 1
+    self.num_finished += 1
+
+  def get_complete_frac(self, running_complete_frac):
+    """
+    :param float running_complete_frac: sum of the complete frac of all running jobs
+    :return: estimated complete frac, between 0 and 1
+    :rtype: float
+    """
+    num_total = self.num_finished + self.num_running + len(self.pending)
+    if not num_total:
+      return 1.
+    return (self.num_finished + running_complete_frac) / float(num_total)
+
+
+class _AshaScheduler(_Scheduler):
+  """
+  Asynchronous successive halving (ASHA), https://arxiv.org/abs/1810.05934.
+  Rung k trains until step ``min_steps * reduction_factor ** k``, the last rung until the end of the train data.
+  Every free worker first checks (from the highest rung down) whether some individual which is within
+  the best ``1 / reduction_factor`` of the finished ones of its rung can be promoted to the next rung.
+  It then continues the training from the checkpoint of its rung, i.e. there is no retraining of the first steps.
+  Otherwise, it starts a new individual in rung 0.
+  So the bad individuals are stopped early, and the workers never wait for a full rung to finish.
+  Note that only the model params are kept in the checkpoint, not the optimizer state (e.g. Adam moments).
+  """
+
+  def __init__(self, population, checkpoint_dir, min_steps=10, reduction_factor=3, num_rungs=3):
+    """
+    :param list[Individual] population:
+    :param str checkpoint_dir: for the intermediate checkpoints. the caller cleans it up
+    :param int min_steps: number of train steps in rung 0
+    :param int reduction_factor: eta in the paper
+    :param int num_rungs:
+    """
+    assert min_steps > 0 and reduction_factor > 1 and num_rungs > 0
+    for individual in population:
+      if individual.stopped_at_rung is not None:
+        # From the previous iteration. We don't keep the checkpoints, so train it again from scratch.
+        individual.cost = None
+        individual.stopped_at_rung = None
+    super(_AshaScheduler, self).__init__(population=population)
+    self.checkpoint_dir = checkpoint_dir
+    self.reduction_factor = reduction_factor
+    # Last step (exclusive) per rung. None means until the end of the train data.
+    self.rung_end_steps = (
+      [min_steps * reduction_factor ** k for k in range(num_rungs - 1)] +
+      [None])  # type: typing.List[typing.Optional[int]]
+    # Per rung: (cost, individual) for all finished jobs of this rung.
+    self.rung_results = [[] for _ in range(num_rungs)]  # type: typing.List[typing.List[typing.Tuple[float,Individual]]]
+    self.promoted = set()  # type: typing.Set[typing.Tuple[int,int]]  # (rung, id(individual))
+    self.checkpoints = {}  # type: typing.Dict[int,str]  # id(individual) -> filename
+    self.num_jobs = 0
+
+  def get_next_job(self):
+    """
+    :rtype: _TrainJob|None
+    """
+    for rung in reversed(range(len(self.rung_end_steps) - 1)):
+      results = sorted(self.rung_results[rung], key=lambda result: result[0])
+      for cost, individual in results[:len(results) // self.reduction_factor]:
+        if (rung, id(individual)) not in self.promoted:
+          self.promoted.add((rung, id(individual)))
+          return self._start_job(individual, rung=rung + 1)
+    if self.pending:
+      return self._start_job(self.pending.pop(0), rung=0)
+    return None
+
+  def _start_job(self, individual, rung):
+    """
+    :param Individual individual:
+    :param int rung:
+    :rtype: _TrainJob
+    """
+    self.num_running += 1
+    self.num_jobs += 1
+    save_filename = None
+    if rung < len(self.rung_end_steps) - 1:
+      save_filename = "%s/job%i-rung%i" % (self.checkpoint_dir, self.num_jobs, rung)
+    return _TrainJob(
+      individual=individual, rung=rung,
+      start_step=self.rung_end_steps[rung - 1] if rung > 0 else 0, end_step=self.rung_end_steps[rung],
+      load_filename=self.checkpoints.get(id(individual)) if rung > 0 else None, save_filename=save_filename)
+
+  def report_finished(self, job):
+    """
+    :param _TrainJob job:
+    """
+    super(_AshaScheduler, self).report_finished(job)
+    individual = job.individual
+    is_last_rung = job.rung == len(self.rung_end_steps) - 1
+    individual.stopped_at_rung = None if is_last_rung else job.rung
+    self.rung_results[job.rung].append((individual.cost, individual))
+    if job.save_filename:
+      self.checkpoints[id(individual)] = job.save_filename
+
+  def get_num_individuals_per_rung(self):
+    """
+    :rtype: list[int]
+    """
+    return [len(results) for results in self.rung_results]
+
+
+class _ProcessWorker:
+  """
+  Subprocess (fork+exec via :class:`AsyncTask`) which trains individuals, one after another.
+  It has its own Python interpreter, its own TF thread pools, and only sees its assigned GPUs.
+  """
+
+  def __init__(self, optim, gpu_ids):
+    """
+    :param Optimization optim:
+    :param set[int] gpu_ids: GPUs which this worker should use. empty for CPU only
+    """
+    from returnn.util.task_system import AsyncTask
+    self.task = AsyncTask(
+      func=_process_worker_main, name="Hyper param tune worker", mustExec=True,
+      env_update={"CUDA_VISIBLE_DEVICES": ",".join(map(str, sorted(gpu_ids)))})
+    train_data = optim.train_data
+    # The batch store is just reopened in the subprocess.
+    self.task.conn.send((optim.threads_per_worker, optim.batch_store, dict(
+      data=train_data.data, target_list=train_data.target_list,
+      output_dim=train_data.num_outputs, input_dim=train_data.num_inputs)))
+
+  def train(self, config, trainer, **kwargs):
+    """
+    :param Config config:
+    :param _IndividualTrainer trainer: for the cancel flag
+    :param kwargs: passed to :func:`_train_individual`
+    :return: train cost, or None
+    :rtype: float|None
+    """
+    try:
+      self.task.conn.send((config, kwargs))
+      status, result = self.task.conn.recv()
+    except Exception as exc:
+      if trainer.cancel_flag:
+        raise CancelTrainingException("Trainer cancel flag is set")
+      raise TrainException("Hyper param tune worker died: %s: %s" % (type(exc).__name__, exc))
+    if status != "ok":
+      raise TrainException("Hyper param tune worker, train %r failed: %s" % (kwargs["name"], result))
+    return result
+
+  def terminate(self):
+    """
+    Kills the subprocess. Can be called from another thread.
+    """
+    self.task.terminate()
+
+  def close(self):
+    """
+    Lets the subprocess quit and waits for it.
+    """
+    if self.task.child_pid:  # not terminated
+      try:
+        self.task.conn.send(None)
+      except Exception:
+        pass  # probably died already
+    self.task.join()
+
+
+def _process_worker_main(task):
+  """
+  Main loop of a :class:`_ProcessWorker` subprocess.
+
+  :param returnn.util.task_system.AsyncTask task:
+  """
+  from returnn.log import wrap_log_streams, StreamDummy
+  from returnn.tf.util.basic import setup_tf_thread_pools
+  num_threads, batch_store, train_data_kwargs = task.conn.recv()
+  log.initialize(verbosity=[0])
+  setup_tf_thread_pools(num_threads=num_threads)
+  train_data = StaticDataset(**train_data_kwargs)
+  with wrap_log_streams(StreamDummy(), also_sys_stdout=True, tf_log_verbosity="WARN"):
+    while True:
+      msg = task.conn.recv()
+      if msg is None:
+        break
+      config, train_kwargs = msg
+      assert isinstance(config, Config)
+      tf_session_opts = config.typed_dict.setdefault("tf_session_opts", {})
+      tf_session_opts.setdefault("intra_op_parallelism_threads", num_threads)
+      tf_session_opts.setdefault("inter_op_parallelism_threads", num_threads)
+      try:
+        cost = _train_individual(
+          config=config, train_data=train_data, batch_store=batch_store, finalize_engine=True, **train_kwargs)
+      except Exception as exc:
+        task.conn.send(("error", "%s: %s" % (type(exc).__name__, exc)))
+      else:
+        task.conn.send(("ok", cost))
 
 
 class _AttribOrKey:
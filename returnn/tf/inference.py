@@ -0,0 +1,197 @@
+"""
+Lightweight inference (forward or search) on a graph compiled via ``tools/compile_tf_graph.py``.
+
+This does not need the config, and does not construct the network,
+i.e. it does not import the layer construction code (:mod:`returnn.tf.layers`, :mod:`returnn.tf.network`).
+So the startup is much faster than via :class:`returnn.tf.engine.Engine`.
+
+Compile the graph like this::
+
+  tools/compile_tf_graph.py returnn.config --search 1 \\
+    --output_file graph.meta --output_file_inference_info graph.inference.json
+
+And then use it like this::
+
+  runner = InferenceRunner("graph.meta", checkpoint="model.080", info_filename="graph.inference.json")
+  results = runner.run_seqs([{"data": features}], output_names=["decision"])
+
+Note that if the graph contains custom native ops, they must have been loaded before.
+"""
+
+from __future__ import print_function
+
+import os
+import json
+import time
+import typing
+import numpy
+import tensorflow as tf
+import returnn.tf.compat as tf_compat
+from returnn.log import log
+
+
+class InferenceRunner:
+  """
+  Loads the compiled graph (and the checkpoint), and runs it on batches, created from numpy inputs or a dataset.
+  The extern data placeholders and the output tensors are found via the info file
+  (``--output_file_inference_info`` of ``tools/compile_tf_graph.py``).
+  """
+
+  def __init__(self, graph_filename, info_filename, checkpoint=None, session_config=None):
+    """
+    :param str graph_filename: ".meta" or ".metatxt" (including the saver).
+      A ".pb" or ".pbtxt" graph from ``tools/compile_tf_graph.py`` is not supported,
+      as it contains the variables (not frozen) but not the saver, so the checkpoint could not be loaded.
+    :param str info_filename: JSON, via ``--output_file_inference_info``
+    :param str|None checkpoint: e.g. "model.080". if None, the variables are randomly initialized
+    :param tf.compat.v1.ConfigProto|None session_config:
+    """
+    start_time = time.time()
+    ext = os.path.splitext(graph_filename)[1]
+    assert ext in {".meta", ".metatxt"}, "%s: graph filename %r must be a meta graph (.meta or .metatxt)" % (
+      self.__class__.__name__, graph_filename)
+    with open(info_filename) as f:
+      self.info = json.load(f)  # type: typing.Dict[str]
+    self.extern_data = self.info["extern_data"]  # type: typing.Dict[str,typing.Dict[str]]
+    self.outputs = self.info["outputs"]  # type: typing.Dict[str,typing.Dict[str]]
+    self.graph = tf.Graph()
+    with self.graph.as_default():
+      saver = tf_compat.v1.train.import_meta_graph(graph_filename, clear_devices=True)
+      self.session = tf_compat.v1.Session(graph=self.graph, config=session_config)
+      if checkpoint:
+        assert saver, "%s: no saver in graph %r" % (self.__class__.__name__, graph_filename)
+        saver.restore(self.session, checkpoint)
+      elif tf_compat.v1.global_variables():
+        print("%s: no checkpoint given, random init of the variables." % self.__class__.__name__, file=log.v2)
+        self.session.run(tf_compat.v1.global_variables_initializer())
+    self.startup_time = time.time() - start_time
+    print("%s: loaded %r in %.3f secs." % (self.__class__.__name__, graph_filename, self.startup_time), file=log.v3)
+
+  def close(self):
+    """
+    Closes the session.
+    """
+    self.session.close()
+
+  def get_output_names(self):
+    """
+    :return: layer names which can be used as output
+    :rtype: list[str]
+    """
+    return sorted(self.outputs.keys())
+
+  def run_batch(self, inputs, seq_lens, output_names):
+    """
+    :param dict[str,numpy.ndarray] inputs: extern data key -> batch-major padded input
+    :param dict[str,dict[int,numpy.ndarray]] seq_lens: extern data key -> axis (without batch) -> seq lens
+    :param list[str] output_names: layer names, see :func:`get_output_names`
+    :return: layer name -> "output" (batch-major, padded, with beam merged into batch), "seq_lens", "beam_scores"
+    :rtype: dict[str,dict[str,numpy.ndarray|None]]
+    """
+    feed_dict = {}
+    for key, value in inputs.items():
+      data_info = self.extern_data[key]
+      assert data_info["batch_dim_axis"] == 0, "%s: %r must be batch-major" % (self, key)
+      feed_dict[data_info["placeholder"]] = value
+      for axis, size_name in data_info["size_placeholder"].items():
+        feed_dict[size_name] = seq_lens[key][int(axis)]
+    if self.info["train_flag"]:
+      feed_dict[self.info["train_flag"]] = False
+    if self.info["epoch_step"]:
+      feed_dict[self.info["epoch_step"]] = 0
+    fetches = {}
+    for name in output_names:
+      output_info = self.outputs[name]
+      fetches[name] = {key: output_info[key] for key in ["output", "seq_lens", "beam_scores"] if output_info[key]}
+    results = self.session.run(fetches, feed_dict=feed_dict)
+    for name in output_names:
+      results[name].setdefault("beam_scores", None)
+    return results
+
+  def run_seqs(self, seqs, output_names=None, seq_tags=None):
+    """
+    Runs all the given seqs in one batch.
+
+    :param list[dict[str,numpy.ndarray]] seqs: per seq: extern data key -> data, time-major without batch dim
+    :param list[str]|None output_names: layer names, see :func:`get_output_names`. by default "output"
+    :param list[str]|None seq_tags: only needed if the graph uses the "seq_tag" extern data
+    :return: per seq: layer name -> output (without padding),
+      or list of (score, output) if the output has a beam
+    :rtype: list[dict[str,numpy.ndarray|list[(float,numpy.ndarray)]]]
+    """
+    if not output_names:
+      output_names = ["output"]
+    n_batch = len(seqs)
+    assert n_batch > 0
+    inputs = {}
+    seq_lens = {}
+    for key in seqs[0].keys():
+      data_info = self.extern_data[key]
+      values = [numpy.asarray(seq[key]) for seq in seqs]
+      dyn_axes = sorted(int(axis) for axis in data_info["size_placeholder"].keys())
+      max_shape = [max(value.shape[axis] for value in values) for axis in range(values[0].ndim)]
+      padded = numpy.zeros([n_batch] + max_shape, dtype=data_info["dtype"])
+      for i, value in enumerate(values):
+        padded[(i,) + tuple(slice(0, dim) for dim in value.shape)] = value
+      inputs[key] = padded
+      seq_lens[key] = {
+        axis: numpy.array([value.shape[axis] for value in values], dtype="int32") for axis in dyn_axes}
+    if "seq_tag" in self.extern_data and "seq_tag" in self.info["used_data_keys"] and "seq_tag" not in inputs:
+      if not seq_tags:
+        seq_tags = ["seq-%i" % i for i in range(n_batch)]
+      inputs["seq_tag"] = numpy.array(seq_tags, dtype=object)
+    results = self.run_batch(inputs=inputs, seq_lens=seq_lens, output_names=output_names)
+
+    out_seqs = [{} for _ in range(n_batch)]  # type: typing.List[typing.Dict[str,typing.Any]]
+    for name in output_names:
+      output_info = self.outputs[name]
+      output, output_seq_lens, beam_scores = [results[name][key] for key in ["output", "seq_lens", "beam_scores"]]
+      beam_size = output_info["beam_size"] or 1
+      assert len(output) == len(output_seq_lens) == n_batch * beam_size
+      time_axis = output_info["time_dim_axis"] - 1  # without batch dim
+
+      def _get_seq(idx):
+        """
+        :param int idx: in batch*beam
+        :rtype: numpy.ndarray
+        """
+        return output[idx][(slice(None),) * time_axis + (slice(0, output_seq_lens[idx]),)]
+
+      for i in range(n_batch):
+        if output_info["beam_size"] is None:
+          out_seqs[i][name] = _get_seq(i)
+        else:
+          out_seqs[i][name] = [
+            (float(beam_scores[i][j]) if beam_scores is not None else None, _get_seq(i * beam_size + j))
+            for j in range(beam_size)]
+    return out_seqs
+
+  def run_dataset(self, dataset, output_names=None, batch_size=5000, max_seqs=-1, epoch=1):
+    """
+    Runs over the whole dataset, in batches.
+
+    :param returnn.datasets.basic.Dataset dataset:
+    :param list[str]|None output_names: layer names, see :func:`get_output_names`. by default "output"
+    :param int batch_size: max number of (padded) frames in one batch
+    :param int max_seqs: max number of seqs in one batch
+    :param int epoch: for :func:`Dataset.init_seq_order`
+    :return: yields (seq_idx, seq_tag, outputs), where outputs are like in :func:`run_seqs`
+    :rtype: typing.Iterator[(int,str,dict[str,numpy.ndarray|list[(float,numpy.ndarray)]])]
+    """
+    data_keys = [
+      key for key in self.info["used_data_keys"]
+      if key in dataset.get_data_keys() and key in self.extern_data]
+    dataset.init_seq_order(epoch=epoch)
+    batches = dataset.generate_batches(
+      recurrent_net=True, batch_size=batch_size, max_seqs=max_seqs, used_data_keys=set(data_keys))
+    while batches.has_more():
+      batch, = batches.peek_next_n(1)
+      batches.advance(1)
+      seq_idxs = [part.seq_idx for part in batch.seqs]
+      dataset.load_seqs(batch.start_seq, batch.end_seq)
+      seq_tags = [dataset.get_tag(seq_idx) for seq_idx in seq_idxs]
+      outputs = self.run_seqs(
+        [{key: dataset.get_data(seq_idx, key) for key in data_keys} for seq_idx in seq_idxs],
+        output_names=output_names, seq_tags=seq_tags)
+      for seq_idx, seq_tag, seq_outputs in zip(seq_idxs, seq_tags, outputs):
+        yield seq_idx, seq_tag, seq_outputs
@@ -9301,12 +9301,13 @@ class HDFDumpLayer(LayerBase):
   Common usage would be to add this to your network with "is_output_layer": True,
   such that you don't need to make other layers depend on it.
 
-  It currently uses :class:`SimpleHDFWriter` internally.
+  It currently uses :class:`SimpleHDFWriter` internally
+  (or :class:`AsyncSimpleHDFWriter`, with ``write_queue_size``).
   """
   layer_class = "hdf_dump"
 
   def __init__(self, filename, extra=None, dump_whole_batches=False, labels=None,
-               extend_existing_file=False, dump_per_run=False,
+               extend_existing_file=False, dump_per_run=False, write_queue_size=0,
                **kwargs):
     """
     :param str|(()->str) filename:
@@ -9315,6 +9316,8 @@ class HDFDumpLayer(LayerBase):
     :param list[str]|None labels:
     :param bool extend_existing_file: True also means we expect that it exists
     :param bool dump_per_run: write via :func:`TFNetwork.register_run_finished_callback`
+    :param int write_queue_size: if >0, we write in a background thread (:class:`AsyncSimpleHDFWriter`),
+      with at most this number of batches in the queue, such that the session run does not wait for the HDF writes
     """
     super(HDFDumpLayer, self).__init__(**kwargs)
     assert len(self.sources) == 1
@@ -9327,7 +9330,7 @@ class HDFDumpLayer(LayerBase):
     elif data.vocab:
       labels = data.vocab.labels
 
-    from returnn.datasets.hdf import SimpleHDFWriter
+    from returnn.datasets.hdf import SimpleHDFWriter, AsyncSimpleHDFWriter
     import numpy
     import sys
     self.filename = filename
@@ -9367,7 +9370,7 @@ class HDFDumpLayer(LayerBase):
             assert dump_per_run  # does not make sense otherwise
             filename_ = filename_(**self.network.get_run_opts())
           assert isinstance(filename_, str)
-          self.hdf_writer = SimpleHDFWriter(
+          writer_opts = dict(
             filename=filename_,
             extend_existing_file=extend_existing_file,
             dim=data.dim, ndim=ndim,
@@ -9379,6 +9382,10 @@ class HDFDumpLayer(LayerBase):
                 value.dtype)
               for (key, value) in self.extra.items()
             })
+          if write_queue_size > 0:
+            self.hdf_writer = AsyncSimpleHDFWriter(max_queue_size=write_queue_size, **writer_opts)
+          else:
+            self.hdf_writer = SimpleHDFWriter(**writer_opts)
           if dump_per_run:
             self.network.register_run_finished_callback(self._maybe_close)
           else:
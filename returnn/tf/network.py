@@ -1800,36 +1800,30 @@ class TFNetwork(object):
       self.saver = tf_compat.v1.train.Saver(
         var_list=self.get_saveable_params_list(), max_to_keep=2 ** 31 - 1)
 
-  def save_params_to_file(self, filename, session):
+  def save_params_to_file(self, filename, session, async_saver=None):
     """
     Will save the model parameters to the filename.
     Note that the model parameters live inside the current TF session.
 
     :param str filename:
     :param tf.compat.v1.Session session:
+    :param AsyncCheckpointSaver|None async_saver: if given, we save to its local tmp dir,
+      and it moves the checkpoint to the filename in the background
     """
     import os
     filename = os.path.abspath(filename)  # TF needs absolute path
-    from returnn.util.basic import maybe_make_dirs
-    maybe_make_dirs(os.path.dirname(filename))
     if not self.saver:
       self._create_saver()
+    if async_saver:
+      tmp_filename = async_saver.get_tmp_filename(filename)
+      self.saver.save(sess=session, save_path=tmp_filename, write_state=False)
+      async_saver.add(tmp_filename=tmp_filename, filename=filename)
+      return
+    from returnn.util.basic import maybe_make_dirs
+    maybe_make_dirs(os.path.dirname(filename))
     # We add some extra logic to try again for DiskQuota and other errors.
     # This could save us multiple hours of computation.
-    try_again_wait_time = 10
-    while True:
-      try:
-        self.saver.save(sess=session, save_path=filename)
-        break
-      except IOError as e:
-        import errno
-        import time
-        if e.errno in [errno.EBUSY, errno.EDQUOT, errno.EIO, errno.ENOSPC]:
-          print("Exception while saving:", e, file=log.v3)
-          print("Trying again in %s secs." % try_again_wait_time, file=log.v3)
-          time.sleep(try_again_wait_time)
-          continue
-        raise
+    call_with_io_error_retry(lambda: self.saver.save(sess=session, save_path=filename))
 
   def load_params_from_file(self, filename, session):
     """
@@ -1851,10 +1845,14 @@ class TFNetwork(object):
     ignore_missing_vars = self.get_config().bool("load_ignore_missing_vars", False)
     if ignore_missing_vars:
       must_use_custom_checkpoint_loader = True
+    # The CustomCheckpointLoader reads the tensors with multiple threads in parallel.
+    load_num_threads = self.get_config().int("load_num_threads", 0) or None
+    if load_num_threads:
+      must_use_custom_checkpoint_loader = True
     if must_use_custom_checkpoint_loader:
       loader = CustomCheckpointLoader(
         filename=filename, saveable_params=saveable_params, network=self,
-        ignore_missing=ignore_missing_vars)
+        ignore_missing=ignore_missing_vars, num_threads=load_num_threads)
       loader.load_now(session=session)
       return
     if not self.saver:
@@ -1871,7 +1869,7 @@ class TFNetwork(object):
       try:
         loader = CustomCheckpointLoader(
           filename=filename, saveable_params=saveable_params, network=self,
-          ignore_missing=self.get_config().bool("load_ignore_missing_vars", False))
+          ignore_missing=ignore_missing_vars)
         if not loader.missing_var_names:
           print("Strange, nothing missing? Pre-loaded missing variables from other checkpoints?", file=log.v2)
         loader.load_now(session=session)
@@ -3500,7 +3498,7 @@ class CustomCheckpointLoader:
 
   def __init__(self, filename, saveable_params, params_prefix="", load_if_prefix="", ignore_missing=False,
                ignore_params=(), ignore_params_prefixes=(), var_name_mapping=None,
-               network=None):
+               network=None, num_threads=None):
     """
     :param str filename: filepattern for NewCheckpointReader or .index/.meta file path
     :param list[tf.Variable|tensorflow.python.training.saver.BaseSaverBuilder.SaveableObject] saveable_params:
@@ -3514,8 +3512,11 @@ class CustomCheckpointLoader:
     :param dict[str,str] var_name_mapping: defines a custom mapping (new_name -> name_in_checkpoint) for
       renamed vars in the checkpoint
     :param TFNetwork network:
+    :param int|None num_threads: for :func:`load_now`, num of threads to read the tensors from the checkpoint.
+      None means automatic (depending on the num of CPUs)
     """
     self.filepattern = util.get_checkpoint_filepattern(filename)
+    self.num_threads = num_threads
     self.network = network
     self.ignore_missing = ignore_missing
     self.params_prefix = params_prefix
@@ -3539,7 +3540,7 @@ class CustomCheckpointLoader:
         continue
       self.saveable_params.append(param)
     assert count > 0, "%s: no saveable vars" % self
-    self.reader = tf_compat.v1.train.NewCheckpointReader(self.filepattern)
+    self.reader = self.ThreadLocalCheckpointReader(self.filepattern)
     self.net_vars = [v for v in self.saveable_params if isinstance(v, tf.Variable)]
     self.net_saveables = [v for v in self.saveable_params if not isinstance(v, tf.Variable)]
     # All variables in the checkpoint:
@@ -3560,6 +3561,50 @@ class CustomCheckpointLoader:
       self.__class__.__name__,
       ", ".join(["%s=%r" % (key, getattr(self, key, "<unset>")) for key in keys]))
 
+  class ThreadLocalCheckpointReader:
+    """
+    Wraps `tf.train.NewCheckpointReader`, with one underlying reader per thread,
+    such that we can read tensors from multiple threads in parallel (see :func:`CustomCheckpointLoader.load_now`).
+    """
+
+    def __init__(self, filepattern):
+      """
+      :param str filepattern:
+      """
+      import threading
+      self.filepattern = filepattern
+      self._local = threading.local()
+      self._get_reader()  # directly open it in this thread, to fail early if the checkpoint is invalid
+
+    def _get_reader(self):
+      """
+      :rtype: tensorflow.python.training.py_checkpoint_reader.CheckpointReader
+      """
+      reader = getattr(self._local, "reader", None)
+      if reader is None:
+        reader = tf_compat.v1.train.NewCheckpointReader(self.filepattern)
+        self._local.reader = reader
+      return reader
+
+    def get_tensor(self, name):
+      """
+      :param str name:
+      :rtype: numpy.ndarray
+      """
+      return self._get_reader().get_tensor(name)
+
+    def get_variable_to_shape_map(self):
+      """
+      :rtype: dict[str,list[int]]
+      """
+      return self._get_reader().get_variable_to_shape_map()
+
+    def debug_string(self):
+      """
+      :rtype: bytes
+      """
+      return self._get_reader().debug_string()
+
   class CustomParamImporter:
     """
     Helper class for custom param loading.
@@ -3653,38 +3698,53 @@ class CustomCheckpointLoader:
     Helper to assign some variable.
     """
 
-    def __init__(self, value=None, custom_param_importer=None):
+    def __init__(self, value=None, value_getter=None, custom_param_importer=None):
       """
       :param numpy.ndarray|None value:
+      :param (()->numpy.ndarray)|None value_getter: lazy loading of the value, see :func:`get_value`
       :param CustomCheckpointLoader.CustomParamImporter|None custom_param_importer:
       """
-      assert value is not None or custom_param_importer
+      assert value is not None or value_getter or custom_param_importer
       self.value = value
+      self.value_getter = value_getter
       self.custom_param_importer = custom_param_importer
 
+    def get_value(self):
+      """
+      :return: the value, loaded via value_getter if not loaded yet
+      :rtype: numpy.ndarray
+      """
+      if self.value is None:
+        assert self.value_getter
+        self.value = self.value_getter()
+        self.value_getter = None
+      return self.value
+
     def assign_var(self, var, session):
       """
       :param tf.Variable var:
       :param tf.compat.v1.Session session:
       """
-      if self.value is not None:
-        tf_util.VariableAssigner(var=var).assign(value=self.value, session=session)
-      else:
+      if self.custom_param_importer:
         self.custom_param_importer.assign_var(var=var, session=session)
+      else:
+        tf_util.VariableAssigner(var=var).assign(value=self.get_value(), session=session)
 
   def get_variable_value_map(self):
     """
-    :return: var -> numpy array
+    The values are loaded lazily, see :func:`VariableValue.get_value`.
+
+    :return: var -> value
     :rtype: dict[tf.Variable,CustomCheckpointLoader.VariableValue]
     """
+    from functools import partial
     variable_values = {}
     if not self.missing_var_names and not self.custom_param_importers:
       # Fast path.
       for v in self.saveable_params:
         assert isinstance(v, tf.Variable), "not yet implemented otherwise..."
         v_name = self._get_param_name(v)
-        value = self.reader.get_tensor(v_name)
-        variable_values[v] = self.VariableValue(value=value)
+        variable_values[v] = self.VariableValue(value_getter=partial(self.reader.get_tensor, v_name))
       return variable_values
 
     reader = self.reader
@@ -3977,14 +4037,14 @@ class CustomCheckpointLoader:
         if custom_importer:
           variable_values[v] = self.VariableValue(custom_param_importer=custom_importer)
         elif v_name in var_ckpt_names:
-          variable_values[v] = self.VariableValue(value=reader.get_tensor(v_name))
+          variable_values[v] = self.VariableValue(value_getter=partial(reader.get_tensor, v_name))
         else:
           if self.ignore_missing and v_name not in var_name_map:
             print(
               "Warning, did not find match for var %r (%r, params_prefix %r, load_if_prefix %r) in checkpoint %r." % (
                 v, v_name, self.params_prefix, self.load_if_prefix, self.filepattern), file=log.v3)
             continue
-          variable_values[v] = self.VariableValue(value=var_name_map[v_name]())
+          variable_values[v] = self.VariableValue(value_getter=var_name_map[v_name])
       assert variable_values, "no vars to load; saveable vars are %r. load_if_prefix %r." % (
         self.saveable_params, self.load_if_prefix)
       print("Successfully loaded all variables. Any new save will use the updated variable names.", file=log.v3)
@@ -4021,13 +4081,93 @@ class CustomCheckpointLoader:
         node_def=None, op=None,
         message="CustomCheckpointLoader. could_not_find_map_list: %r" % (could_not_find_map_list,))
 
+  def _read_values(self, var_value_map):
+    """
+    Reads all the values from the checkpoint (via :func:`VariableValue.get_value`),
+    with multiple threads in parallel (see num_threads).
+    Each thread uses its own checkpoint reader.
+
+    :param dict[tf.Variable,CustomCheckpointLoader.VariableValue] var_value_map:
+    :return: var -> read time in secs
+    :rtype: dict[tf.Variable,float]
+    """
+    import threading
+    import time
+    from collections import deque
+    queue = deque([
+      (var, value) for (var, value) in var_value_map.items() if not value.custom_param_importer])
+    num_threads = self.num_threads or min(util.get_number_available_cpus() or 1, 16)
+    num_threads = max(min(num_threads, len(queue)), 1)
+    read_times = {}  # type: typing.Dict[tf.Variable,float]
+    exceptions = []
+
+    def _thread_main():
+      try:
+        while True:
+          try:
+            var_, value_ = queue.popleft()
+          except IndexError:  # empty
+            return
+          start_time = time.time()
+          value_.get_value()
+          read_times[var_] = time.time() - start_time
+      except Exception as exc:
+        exceptions.append(exc)
+        queue.clear()
+
+    if num_threads == 1:
+      _thread_main()
+    else:
+      threads = [
+        threading.Thread(target=_thread_main, name="%s read thread %i" % (self.__class__.__name__, i))
+        for i in range(num_threads)]
+      for thread in threads:
+        thread.daemon = True
+        thread.start()
+      for thread in threads:
+        thread.join()
+    if exceptions:
+      raise exceptions[0]
+    return read_times
+
   def load_now(self, session):
     """
+    Reads all the tensors from the checkpoint in parallel (see num_threads),
+    and assigns them all together in a single ``session.run``.
+    Layers with a custom param importer are handled afterwards, one by one.
+
     :param tf.compat.v1.Session session:
     :return: nothing, will assign the variables in the session
     """
-    for var, value in self.get_variable_value_map().items():
-      value.assign_var(var=var, session=session)
+    import time
+    var_value_map = self.get_variable_value_map()
+    start_time = time.time()
+    read_times = self._read_values(var_value_map)
+    read_time = time.time() - start_time
+    start_time = time.time()
+    assign_ops = []
+    feed_dict = {}
+    for var, value in var_value_map.items():
+      if value.custom_param_importer:
+        continue
+      assign_op = tf_util.VariableAssigner(var=var).assign_op
+      assign_ops.append(assign_op)
+      feed_dict[assign_op.inputs[1]] = value.get_value()
+    if assign_ops:
+      session.run(assign_ops, feed_dict=feed_dict)
+    for var, value in var_value_map.items():
+      if value.custom_param_importer:
+        value.assign_var(var=var, session=session)
+    assign_time = time.time() - start_time
+    num_bytes = sum([value.value.nbytes for value in var_value_map.values() if value.value is not None])
+    print("%s: read %i vars (%s) in %.3f secs, assigned in %.3f secs." % (
+      self, len(read_times), util.human_bytes_size(num_bytes), read_time, assign_time), file=log.v3)
+    if log.verbose[4]:
+      print("Read time per var:", file=log.v4)
+      for var, var_read_time in sorted(read_times.items(), key=lambda item: -item[1]):
+        value = var_value_map[var].value
+        print("  %s: %.3f secs, shape %s, %s" % (
+          var.name, var_read_time, value.shape, util.human_bytes_size(value.nbytes)), file=log.v4)
 
   def set_as_custom_init(self):
     """
@@ -4087,3 +4227,166 @@ def have_custom_post_init(var):
     assert callable(custom_post_init)
     return True
   return False
+
+
+def call_with_io_error_retry(func, try_again_wait_time=10):
+  """
+  Calls func, and tries again for DiskQuota and other errors which might only be temporary,
+  e.g. when saving a checkpoint.
+
+  :param ()->T func:
+  :param int|float try_again_wait_time: in secs
+  :return: whatever func returns
+  :rtype: T
+  """
+  while True:
+    try:
+      return func()
+    except IOError as e:
+      import errno
+      import time
+      if e.errno in [errno.EBUSY, errno.EDQUOT, errno.EIO, errno.ENOSPC]:
+        print("Exception while saving:", e, file=log.v3)
+        print("Trying again in %s secs." % try_again_wait_time, file=log.v3)
+        time.sleep(try_again_wait_time)
+        continue
+      raise
+
+
+class AsyncCheckpointSaver:
+  """
+  Saving a checkpoint directly to a shared filesystem can take a long time,
+  and it would block the training loop.
+  Via :func:`TFNetwork.save_params_to_file` with ``async_saver``,
+  the checkpoint is saved to a local tmp dir (e.g. ``/dev/shm``, i.e. host memory) instead,
+  which is fast, and then a background thread moves the files to the final destination.
+
+  Every file is first copied to ``<file>.tmp`` and then renamed,
+  and the ``.index`` file comes last,
+  so the checkpoint is only visible (e.g. to :func:`EngineBase.get_existing_models`) once it is complete.
+  """
+
+  def __init__(self, tmp_dir=None, max_queue_size=1):
+    """
+    :param str|None tmp_dir: local dir for the snapshots. if None, the default tmp dir of the system
+    :param int max_queue_size: max number of queued checkpoints, in addition to the one which is being written.
+      :func:`add` blocks if there are more. E.g. with the default 1, saving only blocks if
+      the previous checkpoint is still queued, because the one before it is still being written.
+      Every pending checkpoint occupies its size in the tmp dir.
+    """
+    import tempfile
+    from threading import Thread
+    try:
+      # noinspection PyCompatibility
+      from Queue import Queue
+    except ImportError:
+      # noinspection PyCompatibility
+      from queue import Queue
+    self.tmp_dir = tempfile.mkdtemp(prefix="returnn-checkpoint-", dir=tmp_dir)
+    self._queue = Queue(maxsize=max_queue_size)  # type: Queue[typing.Optional[typing.Tuple[str,str]]]
+    self._pending = set()  # type: typing.Set[str]
+    self._exc_info = None
+    self._thread = Thread(target=self._thread_main, name=self.__class__.__name__)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def __repr__(self):
+    return "<%s tmp dir %r>" % (self.__class__.__name__, self.tmp_dir)
+
+  def get_tmp_filename(self, filename):
+    """
+    :param str filename: final checkpoint filename
+    :return: checkpoint filename in the tmp dir
+    :rtype: str
+    """
+    import os
+    if self.is_pending(filename):
+      self.wait()  # we would overwrite the snapshot in the tmp dir otherwise
+    self._check_exception()
+    return "%s/%s" % (self.tmp_dir, os.path.basename(filename))
+
+  def add(self, tmp_filename, filename):
+    """
+    :param str tmp_filename: checkpoint which was saved to :func:`get_tmp_filename`
+    :param str filename: final checkpoint filename
+    """
+    self._check_exception()
+    self._pending.add(filename)
+    self._queue.put((tmp_filename, filename))
+
+  def is_pending(self, filename):
+    """
+    :param str filename: final checkpoint filename
+    :return: whether this checkpoint is not written yet
+    :rtype: bool
+    """
+    import os
+    return os.path.abspath(filename) in self._pending
+
+  def wait(self):
+    """
+    Waits until all pending checkpoints are written.
+    """
+    self._queue.join()
+    self._check_exception()
+
+  def close(self):
+    """
+    Waits until all pending checkpoints are written, stops the thread, and removes the tmp dir.
+    """
+    import shutil
+    self._queue.put(None)
+    self._thread.join()
+    shutil.rmtree(self.tmp_dir, ignore_errors=True)
+    self._check_exception()
+
+  def _check_exception(self):
+    if self._exc_info:
+      exc_info, self._exc_info = self._exc_info, None
+      # The traceback was already printed in the thread. In Python 3, it is also kept in the exception.
+      raise exc_info[1]
+
+  def _thread_main(self):
+    while True:
+      item = self._queue.get()
+      try:
+        if item is None:
+          return
+        tmp_filename, filename = item
+        # noinspection PyBroadException
+        try:
+          self._move_checkpoint(tmp_filename=tmp_filename, filename=filename)
+        except Exception:
+          self._exc_info = sys.exc_info()
+          print("%s: exception while writing %r." % (self, filename), file=log.v1)
+          sys.excepthook(*self._exc_info)
+        self._pending.discard(filename)
+      finally:
+        self._queue.task_done()
+
+  @staticmethod
+  def _move_checkpoint(tmp_filename, filename):
+    """
+    :param str tmp_filename:
+    :param str filename:
+    """
+    import os
+    import shutil
+    import time
+    from glob import glob
+    from returnn.util.basic import maybe_make_dirs, human_bytes_size
+    start_time = time.time()
+    maybe_make_dirs(os.path.dirname(filename))
+    tmp_files = glob(tmp_filename + ".*")
+    # The index file must be the last one, see get_existing_models.
+    tmp_files.sort(key=lambda fn: fn.endswith(".index"))
+    assert tmp_files and tmp_files[-1].endswith(".index"), "no checkpoint found at %r" % tmp_filename
+    num_bytes = 0
+    for tmp_file in tmp_files:
+      final_file = filename + tmp_file[len(tmp_filename):]
+      num_bytes += os.path.getsize(tmp_file)
+      call_with_io_error_retry(lambda: shutil.copyfile(tmp_file, final_file + ".tmp"))
+      os.rename(final_file + ".tmp", final_file)
+      os.remove(tmp_file)
+    print("Saved model %s (%s) in background in %.3f secs." % (
+      filename, human_bytes_size(num_bytes), time.time() - start_time), file=log.v4)
@@ -1433,6 +1433,26 @@ def slice_pad_zeros(x, begin, end, axis=0):
   return np.pad(x[begin:end], [(pad_left, pad_right)] + [(0, 0)] * (x.ndim - 1), mode="constant")
 
 
+def copy_slice_pad_zeros(x, begin, end, out, axis=0):
+  """
+  Like ``out[...] = slice_pad_zeros(x, begin, end)``, but without the intermediate copy of :func:`slice_pad_zeros`.
+  The padded frames in ``out`` are not touched, i.e. ``out`` is expected to be zero-initialized.
+
+  :param numpy.ndarray x: of shape (..., time, ...)
+  :param int begin:
+  :param int end:
+  :param numpy.ndarray out: of shape (end - begin, ...)
+  :param int axis:
+  """
+  assert axis == 0, "not yet fully implemented otherwise"
+  assert end >= begin and out.shape[0] == end - begin, "out shape %r does not match begin/end %r/%r" % (
+    out.shape, begin, end)
+  src_begin = max(begin, 0)
+  src_end = min(end, x.shape[axis])
+  if src_end > src_begin:
+    out[src_begin - begin:src_end - begin] = x[src_begin:src_end]
+
+
 def random_orthogonal(shape, gain=1., seed=None):
   """
   Returns a random orthogonal matrix of the given shape.
@@ -1723,6 +1743,13 @@ class NumbersDict:
     self.value = broadcast_value
     self.max = self.__max_error
 
+  def __getstate__(self):
+    # self.max cannot be pickled. This is needed to pass batches to other processes.
+    return {"dict": self.dict, "value": self.value}
+
+  def __setstate__(self, state):
+    self.__init__(numbers_dict=state["dict"], broadcast_value=state["value"])
+
   def copy(self):
     """
     :rtype: NumbersDict
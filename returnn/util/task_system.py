@@ -668,6 +668,138 @@ def numpy_alloc(shape, dtype, fortran_for_shared=False):
   return numpy.ndarray(shape, dtype=dtype)
 
 
+class ShmRingBuffer:
+  """
+  Ring buffer in a mmapped file (by default in /dev/shm), to transfer numpy arrays
+  from a single writer process to a single reader process without pickling them,
+  e.g. from the Sprint child process to :class:`ExternSprintDataset`.
+
+  The writer copies the array once into the buffer via :func:`write_array`,
+  and sends only the small reference (see there) over some other channel, e.g. a pipe.
+  The reader gets a zero-copy view via :func:`get_array`,
+  and must release the memory in the same order via :func:`release` once the array is not used anymore.
+  The header of the buffer contains the release position (written by the reader),
+  so the writer never overwrites unreleased data.
+  If there is not enough free space, :func:`write_array` returns None (it never waits),
+  and the writer should use its fallback (e.g. send the array via the pipe).
+  """
+
+  HeaderSize = 64
+  Alignment = 64
+
+  def __init__(self, filename, size=None):
+    """
+    :param str filename: if size is given, this file will be created, otherwise it must exist
+    :param int|None size: in bytes, without the header
+    """
+    import mmap
+    self.filename = filename
+    if size is not None:
+      assert size > 0
+      size += -size % self.Alignment
+      with open(filename, "wb") as f:
+        f.truncate(self.HeaderSize + size)
+    else:
+      size = os.path.getsize(filename) - self.HeaderSize
+      assert size > 0 and size % self.Alignment == 0, "ShmRingBuffer: invalid file %r" % filename
+    self.size = size
+    with open(filename, "r+b") as f:
+      self.mmap = mmap.mmap(f.fileno(), self.HeaderSize + size)
+    self._release_pos = numpy.frombuffer(self.mmap, dtype="uint64", count=1)  # written by the reader
+    self.write_pos = 0  # only used by the writer
+
+  @classmethod
+  def create(cls, size, dirname=None):
+    """
+    :param int size: in bytes
+    :param str|None dirname: by default /dev/shm if it exists, otherwise the default temp dir
+    :rtype: ShmRingBuffer
+    """
+    import tempfile
+    if not dirname and os.path.isdir("/dev/shm"):
+      dirname = "/dev/shm"
+    fd, filename = tempfile.mkstemp(prefix="returnn-shm-ring-buffer-", dir=dirname)
+    os.close(fd)
+    return cls(filename=filename, size=size)
+
+  def __repr__(self):
+    return "<%s %r size %i>" % (self.__class__.__name__, self.filename, self.size)
+
+  def get_free_size(self):
+    """
+    :return: free bytes, from the writer point of view
+    :rtype: int
+    """
+    return self.size - (self.write_pos - int(self._release_pos[0]))
+
+  def write_array(self, array):
+    """
+    Called by the writer.
+
+    :param numpy.ndarray array:
+    :return: reference (pos, end_pos, shape, dtype str), to be passed to :func:`get_array` and :func:`release`,
+      or None if there is not enough free space
+    :rtype: (int,int,tuple[int],str)|None
+    """
+    assert isinstance(array, numpy.ndarray) and not array.dtype.hasobject
+    num_bytes = array.nbytes + (-array.nbytes % self.Alignment)
+    pos = self.write_pos
+    if (pos % self.size) + num_bytes > self.size:
+      pos += self.size - (pos % self.size)  # not enough space until the end, thus skip to the beginning
+    end_pos = pos + num_bytes
+    if end_pos - int(self._release_pos[0]) > self.size:
+      return None
+    # Copy directly into the buffer (C-contiguous), i.e. this is the only copy.
+    numpy.frombuffer(
+      self.mmap, dtype=array.dtype, count=array.size, offset=self.HeaderSize + pos % self.size
+    ).reshape(array.shape)[...] = array
+    self.write_pos = end_pos
+    return pos, end_pos, tuple(array.shape), array.dtype.str
+
+  def get_array(self, ref):
+    """
+    Called by the reader.
+
+    :param (int,int,tuple[int],str) ref: from :func:`write_array`
+    :return: view into the buffer, valid until :func:`release` is called for it
+    :rtype: numpy.ndarray
+    """
+    pos, end_pos, shape, dtype = ref
+    if not isinstance(dtype, str):
+      dtype = dtype.decode("utf8")  # e.g. from a Python 2 writer
+    count = int(numpy.prod(shape, dtype="int64"))
+    return numpy.frombuffer(
+      self.mmap, dtype=dtype, count=count, offset=self.HeaderSize + pos % self.size).reshape(shape)
+
+  def release(self, end_pos):
+    """
+    Called by the reader. Marks all data until this position as unused.
+
+    :param int end_pos: from the reference of the last array which is not used anymore
+    """
+    assert end_pos >= int(self._release_pos[0])
+    self._release_pos[0] = end_pos
+
+  def unlink(self):
+    """
+    Removes the file. Every process which has it already mapped can continue to use it.
+    """
+    if self.filename and os.path.exists(self.filename):
+      os.remove(self.filename)
+
+  def close(self):
+    """
+    Removes the file (if not done yet) and closes our mapping.
+    If there are still arrays referencing the buffer, the mapping will be closed once they are deleted.
+    """
+    self.unlink()
+    self._release_pos = None
+    try:
+      self.mmap.close()
+    except BufferError:  # there are still views on it
+      pass
+
+
 try:
   _BasePickler = pickle._Pickler  # use the pure Python implementation
 except AttributeError:
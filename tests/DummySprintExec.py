@@ -85,23 +85,38 @@ def main(argv):
     assert dataset.num_outputs == {"classes": (output_dim, 1), "data": (input_dim, 2)}
     dataset.init_seq_order(epoch=1)
 
+    # Like the Sprint corpus segments.
+    segments = []
     seq_idx = 0
     while dataset.is_less_than_num_seqs(seq_idx):
       dataset.load_seqs(seq_idx, seq_idx + 1)
       features = dataset.get_data(seq_idx, "data")
       features = features.T  # Sprint-like
-      kwargs = {"features": features}
+      kwargs = {"features": features, "segmentName": dataset.get_tag(seq_idx)}
       if target_mode == "target-generic":
         if "orth" in dataset.get_target_list():
           kwargs["orthography"] = dataset.get_targets("orth", seq_idx)
         if "classes" in dataset.get_target_list():
           kwargs["alignment"] = dataset.get_targets("classes", seq_idx)
-        print("DummySprintExec seq_idx %i feedInputAndTarget(**%r)" % (seq_idx, kwargs))
-        sprint_api.feedInputAndTarget(**kwargs)
       else:
         raise NotImplementedError("targetMode = %s" % target_mode)
+      segments.append(kwargs)
       seq_idx += 1
 
+    # Like the Sprint corpus options. The partitioning is via the segment index modulo.
+    if args.get("corpus.partition"):
+      num_partitions, partition = int(args.get("corpus.partition")), int(args.get("corpus.select-partition", 0))
+      segments = [kwargs for (i, kwargs) in enumerate(segments) if i % num_partitions == partition]
+    if args.get("corpus.segments.file"):
+      seq_tags = open(args.get("corpus.segments.file")).read().splitlines()
+      segments = [kwargs for kwargs in segments if kwargs["segmentName"] in seq_tags]
+      if args.get("corpus.segment-order"):
+        segments.sort(key=lambda kwargs_: seq_tags.index(kwargs_["segmentName"]))
+
+    for kwargs in segments:
+      print("DummySprintExec feedInputAndTarget(**%r)" % (kwargs,))
+      sprint_api.feedInputAndTarget(**kwargs)
+
   print("DummySprintExec exit")
   sprint_api.exit()
 
@@ -8,9 +8,11 @@ import _setup_test_env  # noqa
 import unittest
 import numpy
 from nose.tools import assert_equal, assert_is_instance, assert_in, assert_not_in, assert_true, assert_false
+from nose.tools import assert_raises
 from returnn.datasets.generating import GeneratingDataset, DummyDataset, DummyDatasetMultipleSequenceLength
 from returnn.engine.batch import Batch
-from returnn.datasets.basic import Dataset
+from returnn.datasets.basic import Dataset, DatasetSeq
+from returnn.datasets.cached2 import CachedDataset2
 from returnn.util.basic import NumbersDict
 
 from returnn.util import better_exchook
@@ -355,6 +357,134 @@ def test_get_seq_order():
     assert set(all_partitions_seq_index) == set(seq_index)
 
 
+def test_get_seq_order_seq_lens_cache():
+  num_seqs = 30
+  seq_lens = numpy.array([i ** 2 % 17 for i in range(num_seqs)])
+  num_calls = [0]
+
+  def get_seq_len(i):
+    num_calls[0] += 1
+    return int(seq_lens[i])
+
+  for seq_ordering in ["sorted", "sorted_reverse", "laplace:3", "laplace:.10", "sort_bin_shuffle:3"]:
+    dataset = Dataset(seq_ordering=seq_ordering)
+    num_calls[0] = 0
+    for epoch in range(1, 4):
+      seq_index = dataset.get_seq_order_for_epoch(epoch, num_seqs, get_seq_len, seq_lens_cache_key="data")
+      # Same order when the seq lens are given directly as array.
+      assert_equal(list(seq_index), list(dataset.get_seq_order_for_epoch(epoch, num_seqs, seq_lens)))
+    assert_equal(num_calls[0], num_seqs)  # only in the first epoch
+    if seq_ordering == "sorted":
+      assert_equal(list(seq_lens[seq_index]), sorted(seq_lens))
+    if seq_ordering == "sorted_reverse":
+      assert_equal(list(seq_lens[seq_index]), sorted(seq_lens, reverse=True))
+
+
+class _SequentialRandomDataset(CachedDataset2):
+  """
+  The data of each seq depends on a shared random state, i.e. on the order of `_collect_single_seq` calls,
+  and the num seqs is not known in advance.
+  """
+
+  def __init__(self, num_seqs=23, **kwargs):
+    super(_SequentialRandomDataset, self).__init__(**kwargs)
+    self.num_inputs = 3
+    self.num_outputs = {"data": [3, 2]}
+    self._total_num_seqs = num_seqs
+    self._random = numpy.random.RandomState(1)
+
+  def init_seq_order(self, epoch=None, seq_list=None, seq_order=None):
+    """
+    :param int|None epoch:
+    :param list[str]|None seq_list:
+    :param list[int]|None seq_order:
+    :rtype: bool
+    """
+    super(_SequentialRandomDataset, self).init_seq_order(epoch=epoch, seq_list=seq_list, seq_order=seq_order)
+    self._random.seed(epoch or 1)
+    return True
+
+  def _collect_single_seq(self, seq_idx):
+    """
+    :param int seq_idx:
+    :rtype: DatasetSeq|None
+    """
+    if seq_idx >= self._total_num_seqs:
+      return None
+    seq_len = self._random.randint(1, 10)
+    return DatasetSeq(seq_idx=seq_idx, features=self._random.uniform(size=(seq_len, 3)).astype("float32"))
+
+
+def _get_all_seqs_data(dataset, epoch):
+  """
+  :param Dataset dataset:
+  :param int epoch:
+  :rtype: list[numpy.ndarray]
+  """
+  dataset.init_seq_order(epoch=epoch)
+  res = []
+  seq_idx = 0
+  while dataset.is_less_than_num_seqs(seq_idx):
+    dataset.load_seqs(seq_idx, seq_idx + 1)
+    res.append(dataset.get_data(seq_idx, "data"))
+    seq_idx += 1
+  return res
+
+
+def test_CachedDataset2_prefetch():
+  dataset = _SequentialRandomDataset()
+  dataset.initialize()
+  dataset_prefetch = _SequentialRandomDataset(prefetch=5)
+  dataset_prefetch.initialize()
+  for epoch in [1, 2, 1]:
+    data = _get_all_seqs_data(dataset, epoch=epoch)
+    data_prefetch = _get_all_seqs_data(dataset_prefetch, epoch=epoch)
+    assert_equal(len(data), 23)
+    assert_equal(len(data_prefetch), len(data))
+    for x, y in zip(data, data_prefetch):
+      numpy.testing.assert_array_equal(x, y)
+    assert_equal(dataset_prefetch.get_num_timesteps(), dataset.get_num_timesteps())
+
+
+def test_CachedDataset2_prefetch_bounded():
+  dataset = _SequentialRandomDataset(num_seqs=100, prefetch=3)
+  dataset.initialize()
+  dataset.init_seq_order(epoch=1)
+  for seq_idx in range(50):
+    assert dataset.is_less_than_num_seqs(seq_idx)
+    dataset.load_seqs(seq_idx, seq_idx + 1)
+    assert len(dataset._prefetch_futures) <= 3
+    assert max(dataset._prefetch_futures) <= seq_idx + 4
+  dataset.finish_epoch()
+  assert_equal(len(dataset._prefetch_futures), 0)
+
+
+def test_MapDatasetWrapper_prefetch_num_workers():
+  from returnn.datasets.map import MapDatasetBase, MapDatasetWrapper
+
+  class _MapDataset(MapDatasetBase):
+    def __len__(self):
+      return 31
+
+    def __getitem__(self, seq_idx):
+      return {"data": numpy.arange(seq_idx % 7 + 1, dtype="float32")[:, None] + seq_idx}
+
+  class _ParallelSafeMapDatasetWrapper(MapDatasetWrapper):
+    _collect_single_seq_is_parallel_safe = True  # _MapDataset.__getitem__ is thread-safe
+
+  with assert_raises(AssertionError):  # not parallel safe by default
+    MapDatasetWrapper(_MapDataset(data_types={"data": {"shape": (None, 1)}}), prefetch=4, prefetch_num_workers=3)
+  for prefetch, num_workers in [(0, 1), (4, 1), (4, 3)]:
+    dataset = _ParallelSafeMapDatasetWrapper(
+      _MapDataset(data_types={"data": {"shape": (None, 1)}}), seq_ordering="random",
+      prefetch=prefetch, prefetch_num_workers=num_workers)
+    data = _get_all_seqs_data(dataset, epoch=2)
+    seq_order = dataset.get_current_seq_order()
+    assert_equal(len(data), 31)
+    for seq_idx, x in enumerate(data):
+      numpy.testing.assert_array_equal(x, _MapDataset()[seq_order[seq_idx]]["data"])
+
+
 if __name__ == "__main__":
   better_exchook.install()
   if len(sys.argv) <= 1:
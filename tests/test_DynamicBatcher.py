@@ -0,0 +1,112 @@
+from __future__ import print_function
+
+import _setup_test_env  # noqa
+import sys
+import time
+import unittest
+from threading import Thread, Event
+from nose.tools import assert_equal, assert_true, assert_raises
+from returnn.engine.dynamic_batching import DynamicBatcher
+from returnn.util import better_exchook
+
+
+def test_DynamicBatcher_single():
+  batch_sizes = []
+
+  def run_batch(inputs):
+    batch_sizes.append(len(inputs))
+    return [x * 2 for x in inputs]
+
+  batcher = DynamicBatcher(run_batch_func=run_batch, max_wait_time=0.)
+  assert_equal(batcher(3), 6)
+  assert_equal(batcher(5), 10)
+  batcher.close()
+  assert_equal(batch_sizes, [1, 1])
+  stats = batcher.get_stats()
+  assert_equal(stats["num_requests"], 2)
+  assert_equal(stats["num_batches"], 2)
+  assert_equal(stats["queue_depth"], 0)
+  assert_true(stats["latency_p50"] >= 0.)
+
+
+def test_DynamicBatcher_concurrent():
+  batch_sizes = []
+  started = Event()
+
+  def run_batch(inputs):
+    started.wait()
+    batch_sizes.append(len(inputs))
+    return ["res-%i" % x for x in inputs]
+
+  batcher = DynamicBatcher(run_batch_func=run_batch, max_batch_size=4, max_wait_time=1.)
+  num_requests = 10
+  results = {}
+
+  def request(i):
+    results[i] = batcher(i)
+
+  threads = [Thread(target=request, args=(i,)) for i in range(num_requests)]
+  for thread in threads:
+    thread.start()
+  time.sleep(0.1)  # all requests are pending now
+  assert_true(batcher.get_stats()["max_queue_depth"] >= 6)
+  started.set()
+  for thread in threads:
+    thread.join()
+  batcher.close()
+  # Each result goes back to its caller.
+  assert_equal(results, {i: "res-%i" % i for i in range(num_requests)})
+  assert_equal(sum(batch_sizes), num_requests)
+  assert_true(max(batch_sizes) <= 4)
+  assert_true(len(batch_sizes) <= 4)  # the first batch might be smaller, but otherwise they are full
+  print(batcher.get_stats_str())
+
+
+def test_DynamicBatcher_max_batch_frames():
+  batches = []
+
+  def run_batch(inputs):
+    batches.append(list(inputs))
+    return inputs
+
+  batcher = DynamicBatcher(run_batch_func=run_batch, max_batch_frames=10, max_wait_time=0.5)
+  futures = [batcher.submit(i, num_frames=n) for (i, n) in enumerate([3, 4, 5, 2, 9])]
+  while not all(fut.done() for fut in futures):
+    time.sleep(0.01)
+  assert_equal([fut.result() for fut in futures], [0, 1, 2, 3, 4])
+  batcher.close()
+  assert_equal(batches, [[0, 1], [2, 3], [4]])  # padded frames: 2*4, 2*5, 1*9
+
+
+def test_DynamicBatcher_exception():
+  def run_batch(inputs):
+    raise ValueError("invalid inputs %r" % (inputs,))
+
+  batcher = DynamicBatcher(run_batch_func=run_batch, max_wait_time=0.)
+  assert_raises(ValueError, lambda: batcher(1))
+  # The worker thread is still alive.
+  assert_raises(ValueError, lambda: batcher(2))
+  batcher.close()
+
+
+if __name__ == "__main__":
+  better_exchook.install()
+  if len(sys.argv) <= 1:
+    for k, v in sorted(globals().items()):
+      if k.startswith("test_"):
+        print("-" * 40)
+        print("Executing: %s" % k)
+        try:
+          v()
+        except unittest.SkipTest as exc:
+          print("SkipTest:", exc)
+        print("-" * 40)
+    print("Finished all tests.")
+  else:
+    assert len(sys.argv) >= 2
+    for arg in sys.argv[1:]:
+      print("Executing: %s" % arg)
+      if arg in globals():
+        globals()[arg]()  # assume function and execute
+      else:
+        eval(arg)  # assume Python code and execute
@@ -0,0 +1,120 @@
+from __future__ import print_function
+
+import _setup_test_env  # noqa
+import os
+import sys
+import tempfile
+import shutil
+import unittest
+import numpy
+from nose.tools import assert_equal, assert_true, assert_false
+from returnn.datasets.util.feature_cache import FeatureCache
+from returnn.datasets.util.feature_extraction import ExtractAudioFeatures
+from returnn.util import better_exchook
+
+
+class _TmpDir:
+  def __init__(self):
+    self.path = tempfile.mkdtemp()
+
+  def __enter__(self):
+    return self.path
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    shutil.rmtree(self.path)
+
+
+def test_FeatureCache_add_get():
+  rnd = numpy.random.RandomState(42)
+  values = {"seq-%i" % i: rnd.normal(size=(rnd.randint(1, 20), 5)).astype("float32") for i in range(10)}
+  values["int"] = numpy.arange(7, dtype="int32")
+  with _TmpDir() as tmp_dir:
+    cache = FeatureCache(tmp_dir)
+    for key, value in values.items():
+      assert cache.get(key) is None
+      cache.add(key, value)
+    assert_equal(len(cache), len(values))
+    for key, value in values.items():
+      value_ = cache.get(key)
+      assert_equal(value_.dtype, value.dtype)
+      numpy.testing.assert_array_equal(value_, value)
+      value_ += 1  # must be a writeable copy
+    numpy.testing.assert_array_equal(cache.get("seq-0"), values["seq-0"])
+
+    # Another instance (e.g. another process) sees all complete entries, while the first one is still writing.
+    cache2 = FeatureCache(tmp_dir)
+    assert_equal(len(cache2), len(values))
+    for key, value in values.items():
+      numpy.testing.assert_array_equal(cache2.get(key), value)
+    assert_equal(cache2.num_hits, len(values))
+    cache.close()
+    cache2.close()
+
+
+def test_FeatureCache_incomplete_index():
+  with _TmpDir() as tmp_dir:
+    cache = FeatureCache(tmp_dir)
+    cache.add("a", numpy.ones((3, 2), dtype="float32"))
+    cache.close()
+    index_fn, = [fn for fn in os.listdir(tmp_dir) if fn.endswith(FeatureCache.IndexFileExt)]
+    with open(os.path.join(tmp_dir, index_fn), "a") as f:
+      f.write('["b", 64, "<f4", [1')  # writer was interrupted
+    cache = FeatureCache(tmp_dir)
+    assert_equal(len(cache), 1)
+    numpy.testing.assert_array_equal(cache.get("a"), numpy.ones((3, 2), dtype="float32"))
+    assert cache.get("b") is None
+
+
+def test_FeatureCache_lru_evict():
+  value = numpy.zeros((1000,), dtype="float32")  # 4000 bytes
+  with _TmpDir() as tmp_dir:
+    cache = FeatureCache(tmp_dir, max_size=10000, shard_max_size=1)  # one entry per shard
+    for i in range(3):
+      cache.add("seq-%i" % i, value)
+      shard = cache._entries["seq-%i" % i][0]
+      os.utime(os.path.join(tmp_dir, shard + FeatureCache.IndexFileExt), (1000 + i, 1000 + i))
+    # Mark seq-0 as recently used.
+    os.utime(os.path.join(tmp_dir, cache._entries["seq-0"][0] + FeatureCache.IndexFileExt), None)
+    cache.add("seq-3", value)  # starts a new shard, and evicts the least recently used one
+    assert_true("seq-0" in cache)
+    assert_false("seq-1" in cache)
+    assert_true("seq-2" in cache)
+    assert_true("seq-3" in cache)
+    assert_equal(len(os.listdir(tmp_dir)), 3 * 2)
+    cache.close()
+
+
+def test_ExtractAudioFeatures_get_cache_hash():
+  ext = ExtractAudioFeatures(features="mfcc", num_feature_filters=40)
+  assert_true(ext.can_cache_features())
+  h = ext.get_cache_hash()
+  assert_equal(ExtractAudioFeatures(features="mfcc", num_feature_filters=40).get_cache_hash(), h)
+  assert ExtractAudioFeatures(features="mfcc", num_feature_filters=30).get_cache_hash() != h
+  assert ExtractAudioFeatures(
+    features="mfcc", num_feature_filters=40, norm_mean=numpy.ones((40,), dtype="float32")).get_cache_hash() != h
+  assert ExtractAudioFeatures(
+    features="mfcc", num_feature_filters=40, feature_options={"fmin": 10}).get_cache_hash() != h
+  assert_false(ExtractAudioFeatures(random_permute=True).can_cache_features())
+
+
+if __name__ == "__main__":
+  better_exchook.install()
+  if len(sys.argv) <= 1:
+    for k, v in sorted(globals().items()):
+      if k.startswith("test_"):
+        print("-" * 40)
+        print("Executing: %s" % k)
+        try:
+          v()
+        except unittest.SkipTest as exc:
+          print("SkipTest:", exc)
+        print("-" * 40)
+    print("Finished all tests.")
+  else:
+    assert len(sys.argv) >= 2
+    for arg in sys.argv[1:]:
+      print("Executing: %s" % arg)
+      if arg in globals():
+        globals()[arg]()  # assume function and execute
+      else:
+        eval(arg)  # assume Python code and execute
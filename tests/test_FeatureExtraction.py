@@ -0,0 +1,181 @@
+from __future__ import print_function
+
+import _setup_test_env  # noqa
+import sys
+import time
+import unittest
+import numpy
+from nose.tools import assert_equal
+from returnn.datasets.util import feature_extraction
+from returnn.datasets.util.feature_extraction import ExtractAudioFeatures, get_mel_filterbank_matrix
+from returnn.util import better_exchook
+
+
+def _get_random_audios(num_seqs=5, min_len=1000, max_len=20000, seed=42):
+  """
+  :rtype: list[numpy.ndarray]
+  """
+  rnd = numpy.random.RandomState(seed)
+  return [
+    rnd.uniform(-1., 1., size=(rnd.randint(min_len, max_len),)) * rnd.uniform(0.01, 1.)
+    for _ in range(num_seqs)]
+
+
+def _import_librosa():
+  try:
+    import librosa  # noqa
+  except ImportError:
+    raise unittest.SkipTest("librosa not installed")
+  return librosa
+
+
+def _naive_mel_spectrogram(audio, sample_rate, n_fft, hop_length, n_mels):
+  """
+  Straightforward (slow) computation, frame by frame.
+
+  :rtype: numpy.ndarray
+  """
+  audio = numpy.pad(audio, n_fft // 2, mode="reflect")
+  window = numpy.hanning(n_fft + 1)[:-1]  # periodic
+  mel = get_mel_filterbank_matrix(sample_rate, n_fft=n_fft, n_mels=n_mels)
+  res = []
+  for t in range(1 + (len(audio) - n_fft) // hop_length):
+    spectrum = numpy.fft.rfft(audio[t * hop_length:t * hop_length + n_fft] * window)
+    res.append(mel.dot(numpy.abs(spectrum) ** 2))
+  return numpy.array(res)
+
+
+def test_get_mel_filterbank_matrix():
+  mel = get_mel_filterbank_matrix(16000, n_fft=400, n_mels=80)
+  assert_equal(mel.shape, (80, 201))
+  assert_equal(mel.dtype, numpy.float32)
+  assert get_mel_filterbank_matrix(16000, n_fft=400, n_mels=80) is mel  # cached
+  assert numpy.all(mel >= 0)
+  assert numpy.all(numpy.max(mel, axis=1) > 0)
+  # Each FFT bin contributes to at most two mel bands.
+  assert numpy.max(numpy.sum(mel > 0, axis=0)) <= 2
+
+
+def test_get_mel_filterbank_matrix_librosa():
+  librosa = _import_librosa()
+  for sample_rate, n_fft, n_mels, fmin, fmax in [
+        (16000, 400, 80, 0., None), (8000, 200, 40, 60., 3800.), (22050, 551, 128, 0., None)]:
+    ref = librosa.filters.mel(sample_rate, n_fft, n_mels=n_mels, fmin=fmin, fmax=fmax)
+    mel = get_mel_filterbank_matrix(sample_rate, n_fft=n_fft, n_mels=n_mels, fmin=fmin, fmax=fmax)
+    numpy.testing.assert_allclose(mel, ref, rtol=1e-5, atol=1e-8)
+
+
+def test_get_dct_matrix():
+  import scipy.fftpack
+  x = numpy.random.RandomState(42).normal(size=(7, 128))
+  ref = scipy.fftpack.dct(x, axis=1, type=2, norm="ortho")[:, :40]
+  numpy.testing.assert_allclose(x.dot(feature_extraction._get_dct_matrix(128, 40)), ref, rtol=1e-7, atol=1e-10)
+
+
+def test_mel_spectrogram_batch_naive():
+  audios = _get_random_audios()
+  mel, energy, num_frames = feature_extraction._get_mel_spectrogram_batch(
+    audios, sample_rate=16000, n_fft=400, hop_length=160, n_mels=80, with_energy=True, block_size=100)
+  assert_equal(mel.shape, (sum(num_frames), 80))
+  for audio, mel_ in zip(audios, feature_extraction._split_frames(mel, num_frames)):
+    ref = _naive_mel_spectrogram(audio, sample_rate=16000, n_fft=400, hop_length=160, n_mels=80)
+    numpy.testing.assert_allclose(mel_, ref, rtol=1e-7, atol=1e-10)
+  energy_ = feature_extraction._split_frames(energy, num_frames)[0]
+  frames = feature_extraction._get_frames(audios[0], frame_length=400, hop_length=160)
+  numpy.testing.assert_allclose(energy_, numpy.sqrt(numpy.mean(numpy.square(frames), axis=1)))
+
+
+def test_audio_features_batch_single():
+  audios = _get_random_audios()
+  for features, opts in [
+        ("mfcc", {}), ("log_mel_filterbank", {}), ("log_log_mel_filterbank", {}),
+        ("db_mel_filterbank", {"fmin": 60, "center": False})]:
+    extractor = ExtractAudioFeatures(features=features, feature_options=opts or None, peak_normalization=False)
+    batch = extractor.get_audio_features_batch([audio.copy() for audio in audios], sample_rate=16000)
+    for audio, x in zip(audios, batch):
+      single = extractor.get_audio_features(audio.copy(), sample_rate=16000)
+      assert_equal(x.dtype, numpy.float32)
+      assert_equal(x.shape, (x.shape[0], extractor.get_feature_dimension()))
+      numpy.testing.assert_allclose(x, single, rtol=1e-5, atol=1e-5)
+
+
+def _get_librosa_features(librosa, features, audio, sample_rate, window_len=0.025, step_len=0.010,
+                          num_feature_filters=80):
+  """
+  The librosa-based implementation which we had before.
+
+  :rtype: numpy.ndarray
+  """
+  hop_length, n_fft = int(step_len * sample_rate), int(window_len * sample_rate)
+  if features == "mfcc":
+    x = librosa.feature.mfcc(audio, sr=sample_rate, n_mfcc=num_feature_filters, hop_length=hop_length, n_fft=n_fft)
+    x[0] = librosa.feature.rms(audio, hop_length=hop_length, frame_length=n_fft)
+    return x.transpose().astype("float32")
+  mel = librosa.feature.melspectrogram(
+    audio, sr=sample_rate, n_mels=num_feature_filters, hop_length=hop_length, n_fft=n_fft)
+  if features == "log_mel_filterbank":
+    return numpy.log(numpy.maximum(1e-3, mel)).transpose().astype("float32")
+  if features == "log_log_mel_filterbank":
+    return librosa.core.amplitude_to_db(numpy.log(numpy.maximum(1e-3, mel))).transpose().astype("float32")
+  if features == "db_mel_filterbank":
+    return (20 * numpy.log10(numpy.maximum(1e-10, mel))).transpose().astype("float32")
+  raise ValueError(features)
+
+
+def test_audio_features_librosa():
+  librosa = _import_librosa()
+  for sample_rate in [8000, 16000]:
+    for features in ["mfcc", "log_mel_filterbank", "log_log_mel_filterbank", "db_mel_filterbank"]:
+      for audio in _get_random_audios(seed=sample_rate):
+        ref = _get_librosa_features(librosa, features, audio, sample_rate=sample_rate)
+        x = feature_extraction._BatchFeatureFunctions[features](
+          [audio], sample_rate=sample_rate, num_feature_filters=80)[0]
+        assert_equal(x.shape, ref.shape)
+        numpy.testing.assert_allclose(x, ref, rtol=1e-5, atol=1e-5 * numpy.max(numpy.abs(ref)))
+
+
+def test_audio_features_benchmark():
+  audios = _get_random_audios(num_seqs=100, min_len=8000, max_len=80000)
+  for features in ["mfcc", "log_mel_filterbank"]:
+    func = feature_extraction._BatchFeatureFunctions[features]
+    func(audios[:1], sample_rate=16000)  # warmup, fill caches
+    start_time = time.time()
+    for audio in audios:
+      func([audio], sample_rate=16000)
+    single_time = time.time() - start_time
+    start_time = time.time()
+    func(audios, sample_rate=16000)
+    batch_time = time.time() - start_time
+    msg = "%s, %i seqs: single %.3f sec, batch %.3f sec" % (features, len(audios), single_time, batch_time)
+    try:
+      librosa = _import_librosa()
+      start_time = time.time()
+      for audio in audios:
+        _get_librosa_features(librosa, features, audio, sample_rate=16000)
+      msg += ", librosa %.3f sec" % (time.time() - start_time)
+    except unittest.SkipTest:
+      pass
+    print(msg)
+
+
+if __name__ == "__main__":
+  better_exchook.install()
+  if len(sys.argv) <= 1:
+    for k, v in sorted(globals().items()):
+      if k.startswith("test_"):
+        print("-" * 40)
+        print("Executing: %s" % k)
+        try:
+          v()
+        except unittest.SkipTest as exc:
+          print("SkipTest:", exc)
+        print("-" * 40)
+    print("Finished all tests.")
+  else:
+    assert len(sys.argv) >= 2
+    for arg in sys.argv[1:]:
+      print("Executing: %s" % arg)
+      if arg in globals():
+        globals()[arg]()  # assume function and execute
+      else:
+        eval(arg)  # assume Python code and execute
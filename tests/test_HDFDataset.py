@@ -249,6 +249,177 @@ def test_HDFDataset_partition_epoch():
       assert_equal(hdf_reader.data[key][seq_idx].tolist(), orig_reader.data[key][seq_idx].tolist())
 
 
+def test_HDFDataset_index_cache():
+  import tempfile
+  import shutil
+  from returnn.datasets.cached import CachedDataset
+  hdf_fn = generate_hdf_from_other({"class": "Task12AXDataset", "num_seqs": 23})
+  index_cache_dir = tempfile.mkdtemp()
+  try:
+    hdf_ref = HDFDataset(files=[hdf_fn, hdf_fn])
+    hdf_new = HDFDataset(files=[hdf_fn, hdf_fn], index_cache_dir=index_cache_dir)
+    assert_equal(len(os.listdir(index_cache_dir)), 1)
+    hdf_cached = HDFDataset(files=[hdf_fn, hdf_fn], index_cache_dir=index_cache_dir)
+    assert isinstance(hdf_cached.file_seq_start[0], np.memmap)
+    all_tags = hdf_ref.get_all_tags()
+    seq_list = [all_tags[i] for i in [5, 3, 22, 0]]
+    # The tags in the two files are the same. Like the generic implementation, the last one wins.
+    ref_idxs = CachedDataset._get_real_idxs_by_tags(hdf_ref, seq_list)
+    assert_equal(ref_idxs, [28, 26, 45, 23])
+    for hdf in [hdf_ref, hdf_new, hdf_cached]:
+      assert_equal(len(hdf.file_seq_start), 2)
+      for seq_start, seq_start_ref in zip(hdf.file_seq_start, hdf_ref.file_seq_start):
+        assert_equal(seq_start.tolist(), seq_start_ref.tolist())
+      assert_equal(hdf.get_num_timesteps(), hdf_ref.get_num_timesteps())
+      assert_equal(hdf._get_real_idxs_by_tags(seq_list), ref_idxs)
+      assert_raises(KeyError, lambda: hdf._get_real_idxs_by_tags(["non-existing-tag"]))
+      hdf.init_seq_order(epoch=1, seq_list=seq_list)
+      assert_equal([hdf.get_tag(i) for i in range(hdf.num_seqs)], seq_list)
+  finally:
+    shutil.rmtree(index_cache_dir)
+
+
+def test_HDFDataset_use_mmap():
+  import time
+  hdf_fn = generate_hdf_from_other({"class": "Task12AXDataset", "num_seqs": 500})
+  times = {}
+  all_data = {}
+  for use_mmap in [False, True]:
+    hdf = HDFDataset(files=[hdf_fn], use_mmap=use_mmap)
+    hdf.init_seq_order(epoch=1)
+    all_data[use_mmap] = []
+    start_time = time.time()
+    for seq_idx in range(hdf.num_seqs):
+      hdf.load_seqs(seq_idx, seq_idx + 1)
+      for key in ["data", "classes"]:
+        data = hdf.get_data(seq_idx, key)
+        if use_mmap:
+          assert isinstance(data, np.memmap)
+        all_data[use_mmap].append(data)
+    times[use_mmap] = time.time() - start_time
+  print("h5py: %.3f sec, mmap: %.3f sec" % (times[False], times[True]))
+  assert_equal(len(all_data[False]), len(all_data[True]))
+  for data_h5py, data_mmap in zip(all_data[False], all_data[True]):
+    assert_equal(data_h5py.dtype, data_mmap.dtype)
+    assert_equal(data_h5py.tolist(), data_mmap.tolist())
+
+
+def test_HDFDataset_use_mmap_chunked_fallback():
+  fn = get_test_tmp_file()
+  os.remove(fn)  # SimpleHDFWriter expects that the file does not exist
+  writer = SimpleHDFWriter(filename=fn, dim=3)
+  writer.insert_batch(
+    inputs=np.random.normal(size=(2, 5, 3)).astype("float32"), seq_len=[5, 4], seq_tag=["seq-0", "seq-1"])
+  writer.close()
+  hdf_h5py = HDFDataset(files=[fn])
+  hdf_h5py.init_seq_order(epoch=1)
+  hdf_mmap = HDFDataset(files=[fn], use_mmap=True)
+  hdf_mmap.init_seq_order(epoch=1)
+  for seq_idx in range(2):
+    data = hdf_mmap.get_data(seq_idx, "data")
+    assert not isinstance(data, np.memmap)  # SimpleHDFWriter uses chunked layout
+    assert_equal(data.tolist(), hdf_h5py.get_data(seq_idx, "data").tolist())
+
+
+def _get_batches_as_lists(dataset, **kwargs):
+  """
+  :param Dataset dataset:
+  :return: all batches, via _generate_batches, in a comparable format
+  :rtype: list
+  """
+  res = []
+  for batch in dataset._generate_batches(**kwargs):
+    res.append((
+      batch.max_num_frames_per_slice.dict, batch.max_num_frames_per_slice.value, batch.num_slices,
+      [(seq.seq_idx, seq.seq_start_frame.dict, seq.seq_start_frame.value,
+        seq.seq_end_frame.dict, seq.seq_end_frame.value, seq.batch_slice, seq.batch_frame_offset.value)
+       for seq in batch.seqs]))
+  return res
+
+
+def test_HDFDataset_generate_batches_arrays():
+  hdf_fn = generate_hdf_from_other({"class": "Task12AXDataset", "num_seqs": 50})
+  for chunking, kwargs in [
+        ("0", dict(batch_size=50)),
+        ("0", dict(batch_size=100, max_seqs=3, max_pad_size=10)),
+        ("0", dict(batch_size={"data": 80}, max_seq_length=30, min_seq_length=5, seq_drop=0.3)),
+        ("10:5", dict(batch_size=50)),
+        ("20:7", dict(batch_size=100, max_seqs=4, max_pad_size=5, seq_drop=0.2)),
+        ({"data": 10, "classes": 10}, dict(batch_size=30, used_data_keys={"data", "classes"}))]:
+    print("chunking %r, %r" % (chunking, kwargs))
+    hdf_fast = HDFDataset(files=[hdf_fn], chunking=chunking, seq_ordering="laplace:5")
+    hdf_fast.init_seq_order(epoch=1)
+    assert hdf_fast.get_all_seq_lengths() is not None
+    hdf_generic = HDFDataset(files=[hdf_fn], chunking=chunking, seq_ordering="laplace:5")
+    hdf_generic.get_all_seq_lengths = lambda: None  # use the generic code path
+    hdf_generic.init_seq_order(epoch=1)
+    batches_fast = _get_batches_as_lists(hdf_fast, recurrent_net=True, **kwargs)
+    batches_generic = _get_batches_as_lists(hdf_generic, recurrent_net=True, **kwargs)
+    assert len(batches_fast) > 1
+    assert_equal(batches_fast, batches_generic)
+
+
+def test_HDFDataset_generate_batches_length_bucketing():
+  hdf_fn = generate_hdf_from_other({"class": "Task12AXDataset", "num_seqs": 100})
+  kwargs = dict(recurrent_net=True, batch_size=200, max_seqs=10)
+  hdf = HDFDataset(files=[hdf_fn], seq_ordering="random")
+  hdf.init_seq_order(epoch=1)
+  batches_default = hdf._generate_batch_set_arrays(
+    **_get_batch_set_arrays_kwargs(kwargs))
+  batches_epoch1 = hdf._generate_batch_set_arrays(
+    length_bucketing=True, **_get_batch_set_arrays_kwargs(kwargs))
+  assert_equal(sorted(batches_epoch1.seq_idx.tolist()), list(range(hdf.num_seqs)))
+  for batch in batches_epoch1:
+    assert batch.num_slices <= 10
+    assert batch.max_num_frames_per_slice["data"] * batch.num_slices <= 200
+  padding_default = batches_default.get_padding_ratio()["data"]
+  padding_bucketing = batches_epoch1.get_padding_ratio()["data"]
+  print("padding ratio: default %.4f, with length bucketing %.4f" % (padding_default, padding_bucketing))
+  assert padding_bucketing < padding_default
+  # Deterministic per epoch.
+  batches_epoch1_again = hdf._generate_batch_set_arrays(
+    length_bucketing=True, **_get_batch_set_arrays_kwargs(kwargs))
+  assert_equal(batches_epoch1.seq_idx.tolist(), batches_epoch1_again.seq_idx.tolist())
+  assert_equal(batches_epoch1.batch_start.tolist(), batches_epoch1_again.batch_start.tolist())
+  hdf.init_seq_order(epoch=2)
+  batches_epoch2 = hdf._generate_batch_set_arrays(
+    length_bucketing={"key": "data", "bucket_width": 0.2}, **_get_batch_set_arrays_kwargs(kwargs))
+  assert_equal(sorted(batches_epoch2.seq_idx.tolist()), list(range(hdf.num_seqs)))
+  assert batches_epoch1.seq_idx.tolist() != batches_epoch2.seq_idx.tolist()
+  # Via the public API.
+  batches = hdf.generate_batches(length_bucketing=True, **kwargs)
+  seq_idxs = []
+  while batches.has_more():
+    batch, = batches.peek_next_n(1)
+    batches.advance(1)
+    seq_idxs.extend([seq.seq_idx for seq in batch.seqs])
+  assert_equal(sorted(seq_idxs), list(range(hdf.num_seqs)))
+
+
+def test_HDFDataset_generate_batches_length_bucketing_with_cache():
+  hdf_fn = generate_hdf_from_other({"class": "Task12AXDataset", "num_seqs": 100})
+  kwargs = dict(recurrent_net=True, batch_size=200, max_seqs=10)
+  hdf = HDFDataset(files=[hdf_fn], seq_ordering="random", cache_byte_size=10 ** 6)
+  hdf.init_seq_order(epoch=1)
+  assert not hdf.can_load_seq_ranges_sparsely()
+  # Falls back to the default batching, where each batch covers only a small seq range.
+  batches = _get_batches_as_lists(hdf, length_bucketing=True, **kwargs)
+  assert_equal(batches, _get_batches_as_lists(hdf, **kwargs))
+
+
+def _get_batch_set_arrays_kwargs(kwargs):
+  """
+  :param dict[str] kwargs: for generate_batches
+  :return: kwargs for Dataset._generate_batch_set_arrays
+  :rtype: dict[str]
+  """
+  from returnn.util.basic import NumbersDict
+  return dict(
+    batch_size=NumbersDict(kwargs["batch_size"]), max_seqs=kwargs["max_seqs"], max_seq_length=NumbersDict(sys.maxsize),
+    max_pad_size=NumbersDict(None), min_seq_length=NumbersDict(0), seq_drop=0.0,
+    chunk_size=0, chunk_step=0, used_data_keys=None)
+
+
 def test_SimpleHDFWriter():
   fn = get_test_tmp_file(suffix=".hdf")
   os.remove(fn)  # SimpleHDFWriter expects that the file does not exist
@@ -433,6 +604,155 @@ def test_SimpleHDFWriter_extend_existing_file():
     assert reader.seq_lens[i]["data"] == seq_len
 
 
+def _write_simple_hdf_random(fn, buffer_size, num_batches=20, n_dim=5, max_queue_size=None):
+  """
+  :param str fn:
+  :param int buffer_size:
+  :param int num_batches:
+  :param int n_dim:
+  :param int|None max_queue_size: if given, use :class:`AsyncSimpleHDFWriter`
+  :return: seqs (list of (tag, data, classes, orth))
+  :rtype: list[(str,numpy.ndarray,numpy.ndarray,str)]
+  """
+  rnd = numpy.random.RandomState(42)
+  if max_queue_size:
+    writer = AsyncSimpleHDFWriter(
+      filename=fn, dim=n_dim, labels=None, buffer_size=buffer_size, max_queue_size=max_queue_size)
+  else:
+    writer = SimpleHDFWriter(filename=fn, dim=n_dim, labels=None, buffer_size=buffer_size)
+  seqs = []
+  for batch_idx in range(num_batches):
+    n_batch = rnd.randint(1, 5)
+    seq_lens = rnd.randint(1, 20, size=(n_batch,))
+    inputs = rnd.normal(size=(n_batch, max(seq_lens), n_dim)).astype("float32")
+    classes = rnd.randint(0, 10, size=(n_batch, max(seq_lens))).astype("int32")
+    orth = numpy.array([["text %i %i" % (batch_idx, i)] for i in range(n_batch)], dtype=object)
+    tags = ["seq-%i-%i" % (batch_idx, i) for i in range(n_batch)]
+    writer.insert_batch(
+      inputs=inputs, seq_len=seq_lens.tolist(), seq_tag=tags, extra={"classes": classes, "orth": orth})
+    for i in range(n_batch):
+      seqs.append((tags[i], inputs[i, :seq_lens[i]].copy(), classes[i].copy(), orth[i, 0]))
+    # The writer must not depend on the arrays after insert_batch returned.
+    inputs.fill(0.)
+    classes.fill(0)
+  writer.close()
+  return seqs
+
+
+def test_SimpleHDFWriter_buffered():
+  fns = {}
+  for buffer_size in [0, 1000, 10 ** 6]:
+    fn = get_test_tmp_file(suffix=".hdf")
+    os.remove(fn)  # SimpleHDFWriter expects that the file does not exist
+    seqs = _write_simple_hdf_random(fn, buffer_size=buffer_size)
+    fns[buffer_size] = fn
+
+    dataset = HDFDataset(files=[fn])
+    dataset.init_seq_order(epoch=1)
+    assert_equal(dataset.num_seqs, len(seqs))
+    for seq_idx, (tag, data, classes, orth) in enumerate(seqs):
+      dataset.load_seqs(seq_idx, seq_idx + 1)
+      assert_equal(dataset.get_tag(seq_idx), tag)
+      assert_equal(dataset.get_data(seq_idx, "data").tolist(), data.tolist())
+      assert_equal(dataset.get_data(seq_idx, "classes").tolist(), classes.tolist())
+      assert_equal([x.decode("utf8") for x in dataset.get_data(seq_idx, "orth").tolist()], [orth])
+
+  # The file content must not depend on the buffering.
+  content = _get_simple_hdf_content(fns[0])
+  for buffer_size, fn in fns.items():
+    assert_equal(_get_simple_hdf_content(fn), content)
+
+
+def _get_simple_hdf_content(fn):
+  """
+  :param str fn:
+  :rtype: dict[str]
+  """
+  import h5py
+  res = {}
+  with h5py.File(fn, "r") as f:
+    res["attrs"] = dict(f.attrs)
+    for name in ["inputs", "seqLengths", "seqTags", "targets/data/classes", "targets/data/orth"]:
+      res[name] = f[name][...].tolist()
+  return res
+
+
+def test_AsyncSimpleHDFWriter():
+  contents = []
+  for max_queue_size in [None, 1, 10]:
+    fn = get_test_tmp_file(suffix=".hdf")
+    os.remove(fn)  # SimpleHDFWriter expects that the file does not exist
+    seqs = _write_simple_hdf_random(fn, buffer_size=1000, max_queue_size=max_queue_size)
+    dataset = HDFDataset(files=[fn])
+    dataset.init_seq_order(epoch=1)
+    assert_equal(dataset.num_seqs, len(seqs))
+    dataset.load_seqs(0, len(seqs))
+    for seq_idx, (tag, data, classes, orth) in enumerate(seqs):
+      assert_equal(dataset.get_tag(seq_idx), tag)
+      assert_equal(dataset.get_data(seq_idx, "data").tolist(), data.tolist())
+      assert_equal(dataset.get_data(seq_idx, "classes").tolist(), classes.tolist())
+    contents.append(_get_simple_hdf_content(fn))
+  for content in contents[1:]:
+    assert_equal(content, contents[0])
+
+
+def test_AsyncSimpleHDFWriter_exception():
+  import tempfile
+  import shutil
+  tmp_dir = tempfile.mkdtemp()
+  fn = os.path.join(tmp_dir, "out.hdf")
+  writer = AsyncSimpleHDFWriter(filename=fn, dim=3, labels=None, max_queue_size=2)
+  writer.insert_batch(inputs=numpy.zeros((2, 4, 3), dtype="float32"), seq_len=[4, 3], seq_tag=["seq-0", "seq-1"])
+  # Wrong dim. This is only checked in the writer thread.
+  writer.insert_batch(inputs=numpy.zeros((1, 4, 5), dtype="float32"), seq_len=[4], seq_tag=["seq-2"])
+  try:
+    writer.close()
+  except AssertionError as exc:
+    print("Got expected exception:", repr(exc))
+  else:
+    assert False, "expected exception"
+  assert not os.path.exists(fn)
+  shutil.rmtree(tmp_dir)
+
+
+def test_SimpleHDFWriter_buffered_benchmark():
+  import time
+  times = {}
+  loaded = {}
+  for buffer_size in [0, 32 * 1024 * 1024]:
+    fn = get_test_tmp_file(suffix=".hdf")
+    os.remove(fn)  # SimpleHDFWriter expects that the file does not exist
+    start_time = time.time()
+    _write_simple_hdf_random(fn, buffer_size=buffer_size, num_batches=300, n_dim=40)
+    times[buffer_size] = time.time() - start_time
+    loaded[buffer_size] = _load_all_hdf_seqs(fn)
+  print("SimpleHDFWriter, unbuffered: %.3f sec, buffered: %.3f sec" % (times[0], times[32 * 1024 * 1024]))
+  # The buffered writes must result in the same data.
+  assert_equal(len(loaded[0]), len(loaded[32 * 1024 * 1024]))
+  assert len(loaded[0]) >= 300
+  for seq_unbuffered, seq_buffered in zip(loaded[0], loaded[32 * 1024 * 1024]):
+    assert_equal(seq_unbuffered[0], seq_buffered[0])  # tag
+    for key in ["data", "classes"]:
+      assert_equal(seq_unbuffered[1][key].tolist(), seq_buffered[1][key].tolist())
+
+
+def _load_all_hdf_seqs(fn):
+  """
+  :param str fn:
+  :return: list of (tag, data dict) for all seqs, via :class:`HDFDataset`
+  :rtype: list[(str,dict[str,numpy.ndarray])]
+  """
+  dataset = HDFDataset(files=[fn])
+  dataset.init_seq_order(epoch=1)
+  res = []
+  seq_idx = 0
+  while dataset.is_less_than_num_seqs(seq_idx):
+    dataset.load_seqs(seq_idx, seq_idx + 1)
+    res.append((dataset.get_tag(seq_idx), {key: dataset.get_data(seq_idx, key) for key in ["data", "classes"]}))
+    seq_idx += 1
+  return res
+
+
 @unittest.skip("unfinished...")
 def test_SimpleHDFWriter_swmr():
   fn = get_test_tmp_file(suffix=".hdf")
@@ -0,0 +1,317 @@
+from __future__ import print_function
+
+import _setup_test_env  # noqa
+import os
+import sys
+import time
+import zlib
+import tempfile
+import shutil
+import unittest
+import numpy
+from struct import pack
+from nose.tools import assert_equal
+from returnn.sprint.cache import FileArchive, FileArchiveMmap
+from returnn.util import better_exchook
+
+
+class _TmpDir:
+  def __init__(self):
+    self.path = tempfile.mkdtemp()
+
+  def __enter__(self):
+    return self.path
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    shutil.rmtree(self.path)
+
+
+def _write_entry(archive, name, data, compress=False):
+  """
+  Writes some raw entry, like :func:`FileArchive.add_feature_cache`.
+
+  :param FileArchive archive:
+  :param str name:
+  :param bytes data:
+  :param bool compress:
+  """
+  from returnn.sprint.cache import FileInfo
+  archive.write_U32(archive.start_recovery_tag)
+  archive.write_u32(len(name))
+  archive.write_str(name)
+  pos = archive.f.tell()
+  comp_data = zlib.compress(data) if compress else data
+  archive.write_u32(len(data))
+  archive.write_u32(len(comp_data) if compress else 0)
+  archive.write_u32(0)
+  archive.f.write(comp_data)
+  archive.ft[name] = FileInfo(name, pos, len(data), len(comp_data) if compress else 0, len(archive.ft))
+  archive.write_U32(archive.end_recovery_tag)
+
+
+def _get_alignment_data(alignment):
+  """
+  :param list[(int,int,int)] alignment: list of (time, mix, state), like FileArchive.read returns
+  :return: RLE encoded entry
+  :rtype: bytes
+  """
+  rle = b""
+  expected_time = 0
+  i = 0
+  while i < len(alignment):
+    time_, mix, state = alignment[i]
+    if time_ != expected_time:
+      rle += pack("b", 0) + pack("i", time_)
+    value = mix + state * (1 << 26)
+    n = 1
+    while i + n < len(alignment) and n < 127 and alignment[i + n][1:] == (mix, state):
+      n += 1
+    if n > 1:
+      rle += pack("b", -n) + pack("i", value)
+    else:  # collect a run of different values
+      n = 1
+      while i + n < len(alignment) and n < 127 and alignment[i + n][1:] != alignment[i + n - 1][1:]:
+        n += 1
+      rle += pack("b", n) + b"".join(pack("i", a[1] + a[2] * (1 << 26)) for a in alignment[i:i + n])
+    i += n
+    expected_time = time_ + n
+  typ = b"flow-alignment"
+  return pack("I", len(typ)) + typ + pack("i", 0) + b"ALIGNRLE" + pack("I", len(alignment)) + rle
+
+
+def _get_random_alignment(rnd, num_frames, num_allophones, with_time_jump=False):
+  """
+  :param numpy.random.RandomState rnd:
+  :param int num_frames:
+  :param int num_allophones:
+  :param bool with_time_jump:
+  :rtype: list[(int,int,int)]
+  """
+  alignment = []
+  t = 0
+  while len(alignment) < num_frames:
+    mix, state = rnd.randint(0, num_allophones), rnd.randint(0, 3)
+    for _ in range(min(rnd.randint(1, 10), num_frames - len(alignment))):
+      alignment.append((t, mix, state))
+      t += 1
+    if with_time_jump and len(alignment) == num_frames // 2:
+      t += 5
+  return alignment
+
+
+def _write_allophone_files(tmp_dir, num_allophones):
+  """
+  :param str tmp_dir:
+  :param int num_allophones: excluding silence
+  :return: kwargs for AllophoneLabeling
+  :rtype: dict[str]
+  """
+  phonemes = ["si"] + ["p%i" % i for i in range(num_allophones)]
+  allophone_file = os.path.join(tmp_dir, "allophones")
+  with open(allophone_file, "w") as f:
+    f.write("# allophones\n")
+    for p in phonemes:
+      f.write("%s{#+#}@i@f\n" % p)
+  phoneme_file = os.path.join(tmp_dir, "phonemes")
+  with open(phoneme_file, "w") as f:
+    f.write("\n".join(phonemes))
+  return {"silence_phone": "si", "allophone_file": allophone_file, "phoneme_file": phoneme_file}
+
+
+def _write_feature_archive(filename, num_seqs, dim, rnd):
+  """
+  :param str filename:
+  :param int num_seqs:
+  :param int dim:
+  :param numpy.random.RandomState rnd:
+  :return: seq name -> features
+  :rtype: dict[str,numpy.ndarray]
+  """
+  archive = FileArchive(filename, must_exists=False)
+  all_feats = {}
+  for i in range(num_seqs):
+    name = "corpus/seq-%i" % i
+    feats = rnd.normal(size=(rnd.randint(1, 50), dim)).astype("float32")
+    times = [(0.01 * t, 0.01 * (t + 1)) for t in range(len(feats))]
+    archive.add_feature_cache(name, feats, times)
+    all_feats[name] = feats
+  archive.finalize()
+  archive.f.close()
+  return all_feats
+
+
+def test_FileArchiveMmap_read_features():
+  rnd = numpy.random.RandomState(42)
+  with _TmpDir() as tmp_dir:
+    fn = os.path.join(tmp_dir, "features.cache")
+    all_feats = _write_feature_archive(fn, num_seqs=50, dim=7, rnd=rnd)
+    archive = FileArchive(fn)
+    archive_mmap = FileArchiveMmap(fn)
+    assert_equal(sorted(archive.file_list()), sorted(archive_mmap.file_list()))
+    for name, feats in all_feats.items():
+      times, feats_mmap = archive_mmap.read_features(name)
+      assert_equal(feats_mmap.dtype, numpy.float32)
+      assert_equal(feats_mmap.shape, feats.shape)
+      numpy.testing.assert_array_equal(feats_mmap, feats)
+      times_legacy, feats_legacy = archive.read(name, "feat")
+      numpy.testing.assert_array_equal(feats_mmap, numpy.array(feats_legacy))
+      numpy.testing.assert_array_equal(times, numpy.array(times_legacy))
+      assert_equal(archive_mmap.read(name + ".attribs", "str"), archive.read(name + ".attribs", "str"))
+      assert_equal(archive_mmap.get_size(name), archive.ft[name].size)
+
+
+def test_FileArchiveMmap_read_alignment():
+  rnd = numpy.random.RandomState(42)
+  num_allophones = 5
+  with _TmpDir() as tmp_dir:
+    fn = os.path.join(tmp_dir, "alignment.cache")
+    labeling_opts = _write_allophone_files(tmp_dir, num_allophones=num_allophones)
+    archive = FileArchive(fn, must_exists=False)
+    alignments = {}
+    for i in range(20):
+      name = "corpus/seq-%i" % i
+      alignments[name] = _get_random_alignment(rnd, rnd.randint(1, 100), num_allophones + 1, with_time_jump=i % 2 == 0)
+      _write_entry(archive, name, _get_alignment_data(alignments[name]), compress=i % 3 == 0)
+    archive.finalize()
+    archive.f.close()
+    archive = FileArchive(fn)
+    archive.set_allophones(labeling_opts["allophone_file"])
+    archive_mmap = FileArchiveMmap(fn)
+    archive_mmap.set_allophones(labeling_opts["allophone_file"])
+    for name, alignment in alignments.items():
+      assert_equal(archive.read(name, "align"), alignment)
+      assert_equal(archive_mmap.read(name, "align"), alignment)
+      times, allo_state_idxs = archive_mmap.read_alignment(name)
+      assert_equal(times.tolist(), [t for (t, _, _) in alignment])
+      allos, states = archive_mmap.get_states(allo_state_idxs)
+      assert_equal(allos.tolist(), [a for (_, a, _) in alignment])
+      assert_equal(states.tolist(), [s for (_, _, s) in alignment])
+
+
+def test_SprintCacheDataset_use_mmap():
+  from returnn.datasets.sprint import SprintCacheDataset
+  rnd = numpy.random.RandomState(42)
+  num_seqs = 10
+  with _TmpDir() as tmp_dir:
+    feat_fn = os.path.join(tmp_dir, "features.cache")
+    all_feats = _write_feature_archive(feat_fn, num_seqs=num_seqs, dim=3, rnd=rnd)
+    align_fn = os.path.join(tmp_dir, "alignment.cache")
+    labeling_opts = _write_allophone_files(tmp_dir, num_allophones=4)
+    archive = FileArchive(align_fn, must_exists=False)
+    for name, feats in all_feats.items():
+      _write_entry(archive, name, _get_alignment_data(_get_random_alignment(rnd, len(feats), 5)))
+    archive.finalize()
+    archive.f.close()
+    bundle_fn = os.path.join(tmp_dir, "alignment.bundle")
+    with open(bundle_fn, "w") as f:
+      f.write("%s\n" % align_fn)
+    res = {}
+    for use_mmap in [False, True]:
+      dataset = SprintCacheDataset(data={
+        "data": {"filename": feat_fn, "use_mmap": use_mmap},
+        "classes": {"filename": bundle_fn, "allophone_labeling": labeling_opts, "use_mmap": use_mmap}})
+      dataset.init_seq_order(epoch=1)
+      assert_equal(dataset.num_inputs, 3)
+      res[use_mmap] = {}  # by seq tag. the seq order can differ (e.g. Python 2 dict order in FileArchive)
+      seq_idx = 0
+      while dataset.is_less_than_num_seqs(seq_idx):
+        dataset.load_seqs(seq_idx, seq_idx + 1)
+        res[use_mmap][dataset.get_tag(seq_idx)] = {key: dataset.get_data(seq_idx, key) for key in ["data", "classes"]}
+        seq_idx += 1
+    assert_equal(len(res[False]), num_seqs)
+    assert_equal(sorted(res[False].keys()), sorted(res[True].keys()))
+    for seq_tag, seq_legacy in res[False].items():
+      seq_mmap = res[True][seq_tag]
+      for key in ["data", "classes"]:
+        assert_equal(seq_legacy[key].dtype, seq_mmap[key].dtype)
+        numpy.testing.assert_array_equal(seq_legacy[key], seq_mmap[key])
+
+
+def test_FileArchiveBundle_lazy_index():
+  from returnn.sprint.cache import FileArchiveBundle
+  rnd = numpy.random.RandomState(42)
+  with _TmpDir() as tmp_dir:
+    all_feats = {}
+    bundle_fn = os.path.join(tmp_dir, "features.bundle")
+    with open(bundle_fn, "w") as f:
+      for i in range(5):
+        fn = os.path.join(tmp_dir, "features.cache.%i" % (i + 1))
+        feats = _write_feature_archive(fn, num_seqs=3, dim=2, rnd=rnd)
+        all_feats.update({"%s-%i" % (name, i): feats[name] for name in feats})
+        f.write("%s\n" % fn)
+    index_fn = bundle_fn + ".index"
+    for use_mmap in [False, True]:
+      if os.path.exists(index_fn):
+        os.remove(index_fn)
+      bundle = FileArchiveBundle(bundle_fn, use_mmap=use_mmap, index_filename=True)
+      assert os.path.exists(index_fn)
+      assert all(a is not None for a in bundle.archives.values())  # we had to read the archives to create the index
+      content = sorted(bundle.file_list())
+      bundle = FileArchiveBundle(bundle_fn, use_mmap=use_mmap, index_filename=True)
+      assert_equal(len(bundle.archives), 5)
+      assert all(a is None for a in bundle.archives.values())  # not opened yet
+      assert_equal(sorted(bundle.file_list()), content)
+      assert bundle.has_entry("corpus/seq-0")
+      times, feats = bundle.read("seq-1", "feat")  # short seg name. the content names are the same in all archives
+      assert_equal(len([a for a in bundle.archives.values() if a is not None]), 1)  # opened only on access
+      assert_equal(numpy.array(feats).shape, all_feats["corpus/seq-1-4"].shape)
+      numpy.testing.assert_array_equal(numpy.array(feats), all_feats["corpus/seq-1-4"])
+    # Modifying an archive invalidates the index.
+    stat = os.stat(os.path.join(tmp_dir, "features.cache.1"))
+    os.utime(os.path.join(tmp_dir, "features.cache.1"), (stat.st_atime, stat.st_mtime + 1))
+    bundle = FileArchiveBundle(bundle_fn, index_filename=True, num_threads=1)
+    assert all(a is not None for a in bundle.archives.values())
+
+
+def test_FileArchiveMmap_benchmark():
+  rnd = numpy.random.RandomState(42)
+  num_allophones = 50
+  with _TmpDir() as tmp_dir:
+    feat_fn = os.path.join(tmp_dir, "features.cache")
+    all_feats = _write_feature_archive(feat_fn, num_seqs=100, dim=40, rnd=rnd)
+    align_fn = os.path.join(tmp_dir, "alignment.cache")
+    labeling_opts = _write_allophone_files(tmp_dir, num_allophones=num_allophones)
+    archive = FileArchive(align_fn, must_exists=False)
+    for name in all_feats.keys():
+      _write_entry(archive, name, _get_alignment_data(_get_random_alignment(rnd, 1000, num_allophones + 1)))
+    archive.finalize()
+    archive.f.close()
+    names = sorted(all_feats.keys())
+    times = {}
+    for use_mmap in [False, True]:
+      feat_archive = FileArchiveMmap(feat_fn) if use_mmap else FileArchive(feat_fn)
+      align_archive = FileArchiveMmap(align_fn) if use_mmap else FileArchive(align_fn)
+      align_archive.set_allophones(labeling_opts["allophone_file"])
+      start_time = time.time()
+      for name in names:
+        if use_mmap:
+          feat_archive.read_features(name)
+          align_archive.get_states(align_archive.read_alignment(name)[1])
+        else:
+          numpy.array(feat_archive.read(name, "feat")[1])
+          align_archive.read(name, "align")
+      times[use_mmap] = time.time() - start_time
+    print("FileArchive: %.3f sec, FileArchiveMmap: %.3f sec" % (times[False], times[True]))
+
+
+if __name__ == "__main__":
+  better_exchook.install()
+  if len(sys.argv) <= 1:
+    for k, v in sorted(globals().items()):
+      if k.startswith("test_"):
+        print("-" * 40)
+        print("Executing: %s" % k)
+        try:
+          v()
+        except unittest.SkipTest as exc:
+          print("SkipTest:", exc)
+        print("-" * 40)
+    print("Finished all tests.")
+  else:
+    assert len(sys.argv) >= 2
+    for arg in sys.argv[1:]:
+      print("Executing: %s" % arg)
+      if arg in globals():
+        globals()[arg]()  # assume function and execute
+      else:
+        eval(arg)  # assume Python code and execute
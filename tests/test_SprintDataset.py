@@ -154,6 +154,92 @@ def test_window():
     dataset2._exit_handler()
 
 
+def _read_all_seqs(dataset, epoch, seq_list=None):
+  """
+  :param ExternSprintDataset dataset:
+  :param int epoch:
+  :param list[str]|None seq_list:
+  :return: list of (seq tag, data)
+  :rtype: list[(str,numpy.ndarray)]
+  """
+  dataset.init_seq_order(epoch=epoch, seq_list=seq_list)
+  res = []
+  seq_idx = 0
+  while dataset.is_less_than_num_seqs(seq_idx):
+    dataset.load_seqs(seq_idx, seq_idx + 1)
+    # Copy, as the data might be in the shared memory ring buffer, which is reused later.
+    res.append((dataset.get_tag(seq_idx), dataset.get_data(seq_idx, "data").copy()))
+    seq_idx += 1
+  return res
+
+
+def test_num_workers():
+  num_seqs = 11
+  dataset_kwargs = dict(
+    sprintTrainerExecPath=[sys.executable, sprintExecPath],
+    sprintConfigStr=(
+      "--*.feature-dimension=2 --*.trainer-output-dimension=3 "
+      "--*.crnn-dataset=DummyDataset(2,3,num_seqs=%i,seq_len=5)" % num_seqs))
+  all_tags = ["seq-%i" % i for i in range(num_seqs)]
+  dataset1 = ExternSprintDataset(**dataset_kwargs)
+  dataset3 = ExternSprintDataset(num_workers=3, **dataset_kwargs)
+  dataset3_partition = ExternSprintDataset(num_workers=3, partition_epoch=2, **dataset_kwargs)
+  try:
+    seqs1 = _read_all_seqs(dataset1, epoch=1)
+    seqs3 = _read_all_seqs(dataset3, epoch=1)
+    assert_equal([tag for (tag, _) in seqs1], all_tags)
+    # The dummy Sprint partitions by the segment index modulo, thus the round-robin merge gives the same order.
+    assert_equal([tag for (tag, _) in seqs3], all_tags)
+    for (tag1, data1), (tag3, data3) in zip(seqs1, seqs3):
+      assert_equal(data1.tolist(), data3.tolist())
+
+    # Predefined seq list. This is split over the workers, and merged again in the same order.
+    seq_list = [all_tags[i] for i in np.random.RandomState(42).permutation(num_seqs)]
+    seqs3 = _read_all_seqs(dataset3, epoch=2, seq_list=seq_list)
+    assert_equal([tag for (tag, _) in seqs3], seq_list)
+
+    # Partition epoch. Each worker gets a sub-partition of the epoch partition.
+    tags_ep1 = [tag for (tag, _) in _read_all_seqs(dataset3_partition, epoch=1)]
+    tags_ep2 = [tag for (tag, _) in _read_all_seqs(dataset3_partition, epoch=2)]
+    assert_true(0 < len(tags_ep1) < num_seqs)
+    assert_equal(sorted(tags_ep1 + tags_ep2, key=all_tags.index), all_tags)
+    # Deterministic.
+    assert_equal([tag for (tag, _) in _read_all_seqs(dataset3_partition, epoch=3)], tags_ep1)
+  finally:
+    dataset1._exit_handler()
+    dataset3._exit_handler()
+    dataset3_partition._exit_handler()
+
+
+def test_shm_ring_buffer():
+  num_seqs = 11
+  dataset_kwargs = dict(
+    sprintTrainerExecPath=[sys.executable, sprintExecPath],
+    sprintConfigStr=(
+      "--*.feature-dimension=2 --*.trainer-output-dimension=3 "
+      "--*.crnn-dataset=DummyDataset(2,3,num_seqs=%i,seq_len=5)" % num_seqs))
+  dataset = ExternSprintDataset(**dataset_kwargs)
+  # Each seq needs 128 bytes (features and classes, each aligned to 64 bytes). Thus this uses also the fallback.
+  dataset_shm = ExternSprintDataset(shm_ring_buffer_size=256, **dataset_kwargs)
+  dataset_shm2 = ExternSprintDataset(shm_ring_buffer_size=1024 * 1024, num_workers=2, **dataset_kwargs)
+  try:
+    seqs = _read_all_seqs(dataset, epoch=1)
+    assert_equal(len(seqs), num_seqs)
+    for dataset_ in [dataset_shm, dataset_shm2]:
+      for epoch in [1, 2]:
+        seqs_shm = _read_all_seqs(dataset_, epoch=epoch)
+        assert_equal([tag for (tag, _) in seqs_shm], [tag for (tag, _) in seqs])
+        for (_, data), (_, data_shm) in zip(seqs, seqs_shm):
+          assert_equal(data.tolist(), data_shm.tolist())
+        assert_equal(len(dataset_.shm_ring_buffers), dataset_.num_workers)
+        for ring_buffer in dataset_.shm_ring_buffers:
+          assert not os.path.exists(ring_buffer.filename)  # unlinked after init
+  finally:
+    dataset._exit_handler()
+    dataset_shm._exit_handler()
+    dataset_shm2._exit_handler()
+
+
 def test_py2_client():
   # like test_read_all
   config = Config()
@@ -0,0 +1,156 @@
+"""
+Tests for the PythonFeatureScorer of :mod:`returnn.sprint.interface`, with the TF backend.
+We imitate the calls which Sprint does.
+"""
+
+from __future__ import print_function
+
+import _setup_test_env  # noqa
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy
+import numpy.testing
+from subprocess import check_call
+from nose.tools import assert_equal, assert_is_instance
+from returnn.util import better_exchook
+
+
+my_dir = os.path.dirname(os.path.abspath(__file__))
+returnn_dir = os.path.dirname(my_dir)
+py = sys.executable
+
+
+def _create_model(tmp_dir):
+  """
+  Creates the config and a random init checkpoint (in a subprocess, to not init the backend here).
+
+  :param str tmp_dir:
+  :return: config filename
+  :rtype: str
+  """
+  config_dict = {
+    "use_tensorflow": True,
+    "num_inputs": 2, "num_outputs": 3,
+    "network": {
+      "hidden": {"class": "linear", "activation": "tanh", "n_out": 5, "from": "data"},
+      "output": {"class": "softmax", "from": "hidden", "target": "classes", "loss": "ce"}},
+    "model": "%s/model" % tmp_dir,
+    "sprint_feature_scorer_lookahead_dataset": "%s/lookahead.hdf" % tmp_dir,
+    "sprint_feature_scorer_max_seqs": 2,
+  }
+  config_filename = "%s/returnn.config" % tmp_dir
+  with open(config_filename, "w") as f:
+    f.write("#!rnn.py\n")
+    for key, value in config_dict.items():
+      f.write("%s = %r\n" % (key, value))
+  check_call([
+    py, "%s/rnn.py" % returnn_dir, config_filename,
+    "++task", "initialize_model", "++model", "%s/model.001" % tmp_dir, "++log_verbosity", "2"])
+  return config_filename
+
+
+def _feed_segment(scorer, features):
+  """
+  Like Sprint, for a single segment.
+
+  :param returnn.sprint.interface.PythonFeatureScorer scorer:
+  :param numpy.ndarray features: (time,input_dim)
+  :return: scores (time,output_dim)
+  :rtype: numpy.ndarray
+  """
+  for t in range(features.shape[0]):
+    scorer.add_feature(features[t], t)
+  scorer.compute(features.shape[0])
+  scores = numpy.array([scorer.get_scores(t) for t in range(features.shape[0])])
+  scorer.reset(features.shape[0])
+  return scores
+
+
+def _run_batched_scorer(lookahead_segments, sprint_segments):
+  """
+  Writes the lookahead dataset, and feeds the segments to the scorer like Sprint, and checks the scores.
+
+  :param list[numpy.ndarray] lookahead_segments: each (time,input_dim), for the lookahead dataset
+  :param list[numpy.ndarray] sprint_segments: each (time,input_dim), what Sprint gives us
+  :return: (num_segments_batched, num_segments_fallback)
+  :rtype: (int,int)
+  """
+  from returnn.datasets.hdf import SimpleHDFWriter
+  import returnn.sprint.interface as sprint_api
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    config_filename = _create_model(tmp_dir)
+    writer = SimpleHDFWriter(filename="%s/lookahead.hdf" % tmp_dir, dim=2)
+    for i, features in enumerate(lookahead_segments):
+      writer.insert_batch(
+        inputs=features[None, :, :], seq_len={0: [features.shape[0]]}, seq_tag=["seg-%i" % i])
+    writer.close()
+    prior_filename = "%s/prior.txt" % tmp_dir
+    log_prior = numpy.log(numpy.array([0.2, 0.3, 0.5], dtype="float32"))
+    numpy.savetxt(prior_filename, log_prior)
+
+    scorer = sprint_api.init(
+      name="Sprint.PythonControl", sprint_unit="PythonFeatureScorer",
+      config="action:forward,configfile:%s,epoch:1,prior_scale:0.5,prior_file:%s" % (
+        config_filename, prior_filename),
+      callback=None, version_number=1)
+    assert_is_instance(scorer, sprint_api.BatchedPythonFeatureScorer)
+    scorer.init(input_dim=2, output_dim=3)
+    assert_equal(scorer.get_feature_buffer_size(), -1)
+    for i, features in enumerate(sprint_segments):
+      scores = _feed_segment(scorer, features)
+      posteriors = sprint_api._forward(segment_name="ref-%i" % i, features=features.T).T
+      ref_scores = -numpy.log(posteriors) + 0.5 * log_prior
+      numpy.testing.assert_allclose(scores, ref_scores, rtol=1e-5, atol=1e-5)
+    res = scorer.num_segments_batched, scorer.num_segments_fallback
+    scorer.exit()
+    sprint_api.exit()
+    return res
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+def test_BatchedPythonFeatureScorer():
+  rnd = numpy.random.RandomState(42)
+  segments = [rnd.normal(size=(rnd.randint(3, 11), 2)).astype("float32") for _ in range(7)]
+  # The lookahead dataset has the first 5 segments. The 5th one does not match what Sprint gives us.
+  lookahead_segments = segments[:4] + [segments[4] + 1.]
+  num_batched, num_fallback = _run_batched_scorer(lookahead_segments=lookahead_segments, sprint_segments=segments)
+  assert_equal(num_batched, 4)
+  assert_equal(num_fallback, 3)
+
+
+def test_BatchedPythonFeatureScorer_skipped_segment():
+  rnd = numpy.random.RandomState(43)
+  segments = [rnd.normal(size=(rnd.randint(3, 11), 2)).astype("float32") for _ in range(7)]
+  # Sprint skips the 4th segment (e.g. via a segment filter). The lookahead must re-sync.
+  sprint_segments = segments[:3] + segments[4:]
+  num_batched, num_fallback = _run_batched_scorer(lookahead_segments=segments, sprint_segments=sprint_segments)
+  assert_equal(num_batched, 6)
+  assert_equal(num_fallback, 0)
+
+
+if __name__ == "__main__":
+  better_exchook.install()
+  if len(sys.argv) <= 1:
+    for k, v in sorted(globals().items()):
+      if k.startswith("test_"):
+        print("-" * 40)
+        print("Executing: %s" % k)
+        try:
+          v()
+        except unittest.SkipTest as exc:
+          print("SkipTest:", exc)
+        print("-" * 40)
+    print("Finished all tests.")
+  else:
+    assert len(sys.argv) >= 2
+    for arg in sys.argv[1:]:
+      print("Executing: %s" % arg)
+      if arg in globals():
+        globals()[arg]()  # assume function and execute
+      else:
+        eval(arg)  # assume Python code and execute
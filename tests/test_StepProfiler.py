@@ -0,0 +1,71 @@
+from __future__ import print_function
+
+import _setup_test_env  # noqa
+import os
+import sys
+import json
+import time
+import tempfile
+import unittest
+from nose.tools import assert_equal, assert_true, assert_almost_equal
+from returnn.engine.step_profiler import StepProfiler, get_host_rss_bytes
+from returnn.util import better_exchook
+
+
+def test_StepProfiler():
+  profiler = StepProfiler()
+  profiler.mark()
+  for i in range(3):
+    time.sleep(0.01)
+    profiler.mark("data_wait")
+    time.sleep(0.02)
+    profiler.mark("session_run")
+    profiler.end_step(queue_fill=float(i) / 2)
+  summary = profiler.get_summary()
+  assert_equal(summary["num_steps"], 3)
+  assert_equal(list(summary["time"].keys()), ["data_wait", "session_run", "other"])
+  assert_true(summary["time"]["session_run"] > summary["time"]["data_wait"] >= 0.03)
+  assert_almost_equal(sum(summary["time"].values()), summary["elapsed"])
+  assert_almost_equal(summary["queue_fill_avg"], 0.5)
+  assert_equal(summary["queue_fill_min"], 0.)
+  assert_almost_equal(summary["queue_empty_frac"], 1. / 3)
+  assert_true(summary["rss_max"] > 0)
+  print(profiler.get_summary_str())
+
+  fd, filename = tempfile.mkstemp(suffix=".jsonl")
+  os.close(fd)
+  profiler.write_json_line(filename, epoch=1, dataset="train")
+  profiler.write_json_line(filename, epoch=2, dataset="train")
+  with open(filename) as f:
+    lines = [json.loads(line) for line in f.read().splitlines()]
+  os.remove(filename)
+  assert_equal([(d["epoch"], d["num_steps"]) for d in lines], [(1, 3), (2, 3)])
+
+
+def test_get_host_rss_bytes():
+  rss = get_host_rss_bytes()
+  print("RSS:", rss)
+  assert_true(rss > 1024 * 1024)
+
+
+if __name__ == "__main__":
+  better_exchook.install()
+  if len(sys.argv) <= 1:
+    for k, v in sorted(globals().items()):
+      if k.startswith("test_"):
+        print("-" * 40)
+        print("Executing: %s" % k)
+        try:
+          v()
+        except unittest.SkipTest as exc:
+          print("SkipTest:", exc)
+        print("-" * 40)
+    print("Finished all tests.")
+  else:
+    assert len(sys.argv) >= 2
+    for arg in sys.argv[1:]:
+      print("Executing: %s" % arg)
+      if arg in globals():
+        globals()[arg]()  # assume function and execute
+      else:
+        eval(arg)  # assume Python code and execute
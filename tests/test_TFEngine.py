@@ -10,7 +10,7 @@ from returnn.tf.engine import *
 from returnn.tf.util.data import Dim, SpatialDim, FeatureDim
 from returnn.tf.network import ExternData
 from returnn.config import Config
-from nose.tools import assert_equal, assert_is_instance, assert_raises
+from nose.tools import assert_equal, assert_is_instance, assert_raises, assert_in, assert_true
 import unittest
 import numpy
 import numpy.testing
@@ -141,6 +141,90 @@ def test_FeedDictDataProvider():
     feed_dict, meta = data_provider.get_feed_dict(single_threaded=True)
 
 
+def test_FeedDictDataProvider_num_workers():
+  from returnn.datasets.generating import Task12AXDataset, StaticDataset
+  from returnn.tf.data_pipeline import FeedDictBatchWorkerPool
+  source_dataset = Task12AXDataset(num_seqs=20)
+  source_dataset.init_seq_order(epoch=1)
+  # The workers get a copy of the dataset, thus it must be deterministic w.r.t. the seq idx.
+  dataset = StaticDataset.copy_from_dataset(source_dataset)
+  extern_data = ExternData()
+  extern_data.init_from_dataset(source_dataset)
+
+  batches_ref = _get_all_feed_dict_batches(dataset=dataset, extern_data=extern_data)
+  # Usually the Engine creates the pool before the TF session exists.
+  worker_pool = FeedDictBatchWorkerPool(datasets={"train": dataset}, num_workers=3)
+  try:
+    batches_workers = _get_all_feed_dict_batches(dataset=dataset, extern_data=extern_data, worker_pool=worker_pool)
+  finally:
+    worker_pool.stop()
+  _check_feed_dict_batches_equal(batches_ref, batches_workers)
+
+
+def _get_all_feed_dict_batches(dataset, extern_data, **kwargs):
+  """
+  :param Dataset dataset:
+  :param ExternData extern_data:
+  :param kwargs: passed to FeedDictDataProvider
+  :rtype: list[(dict[tf.Tensor,numpy.ndarray],dict[str])]
+  """
+  from returnn.tf.data_pipeline import FeedDictDataProvider
+  dataset.init_seq_order(epoch=1)
+  data_provider = FeedDictDataProvider(
+    tf_session=session, extern_data=extern_data,
+    data_keys=["data", "classes"],
+    dataset=dataset, batches=dataset.generate_batches(recurrent_net=True, batch_size=30, max_seqs=3),
+    **kwargs)
+  data_provider.start_threads(session=session)
+  res = []
+  while data_provider.have_more_data(session=session):
+    feed_dict, meta = data_provider.get_feed_dict()
+    # Copy, because with buffer_ring, the arrays will be reused.
+    res.append(({key: numpy.array(value) for (key, value) in feed_dict.items()}, meta))
+  assert data_provider.have_reached_end()
+  print("stage times:", data_provider.get_stage_times())
+  data_provider.stop_threads()
+  return res
+
+
+def _check_feed_dict_batches_equal(batches_ref, batches):
+  """
+  :param list[(dict[tf.Tensor,numpy.ndarray],dict[str])] batches_ref:
+  :param list[(dict[tf.Tensor,numpy.ndarray],dict[str])] batches:
+  """
+  assert len(batches_ref) == len(batches) > 3
+  for (feed_dict_ref, meta_ref), (feed_dict, meta) in zip(batches_ref, batches):
+    assert_equal(meta_ref, meta)
+    assert_equal(set(feed_dict_ref.keys()), set(feed_dict.keys()))
+    for key, value in feed_dict_ref.items():
+      assert_equal(value.dtype, feed_dict[key].dtype)
+      numpy.testing.assert_array_equal(value, feed_dict[key])
+
+
+def test_FeedDictDataProvider_buffer_ring():
+  from returnn.datasets.generating import Task12AXDataset
+  from returnn.tf.data_pipeline import BatchBufferRing
+  dataset = Task12AXDataset(num_seqs=20)
+  extern_data = ExternData()
+  extern_data.init_from_dataset(dataset)
+  batches_ref = _get_all_feed_dict_batches(dataset=dataset, extern_data=extern_data)
+  buffer_ring = BatchBufferRing()
+  for epoch in range(2):
+    batches = _get_all_feed_dict_batches(dataset=dataset, extern_data=extern_data, buffer_ring=buffer_ring)
+    print(buffer_ring)
+    _check_feed_dict_batches_equal(batches_ref, batches)
+    assert not buffer_ring.used_buffers
+  assert buffer_ring.num_reuses > buffer_ring.num_allocs > 0
+
+
+def test_engine_train_feed_dict_num_workers():
+  test_engine_train(additional_config={"feed_dict_num_workers": 2})
+
+
+def test_engine_train_feed_dict_reuse_buffers():
+  test_engine_train(additional_config={"feed_dict_reuse_buffers": True})
+
+
 def test_DatasetDataProvider():
   from returnn.datasets.generating import DummyDataset
   seq_len = 5
@@ -237,6 +321,59 @@ def test_engine_train(additional_config=None):
   engine.finalize()
 
 
+def test_engine_train_save_async():
+  from glob import glob
+  from returnn.datasets.generating import DummyDataset
+  train_data = DummyDataset(input_dim=2, output_dim=3, num_seqs=4, seq_len=5)
+  train_data.init_seq_order(epoch=1)
+  cv_data = DummyDataset(input_dim=2, output_dim=3, num_seqs=2, seq_len=5)
+  cv_data.init_seq_order(epoch=1)
+  config = Config()
+  config.update({
+    "model": "%s/model" % _get_tmp_dir(),
+    "num_outputs": 3,
+    "num_inputs": 2,
+    "network": {"output": {"class": "softmax", "loss": "ce", "from": "data:data"}},
+    "start_epoch": 1,
+    "num_epochs": 3,
+    "save_async": True,
+    "save_async_tmp_dir": _get_tmp_dir(),
+  })
+  _cleanup_old_models(config)
+  engine = Engine(config=config)
+  engine.init_train_from_config(config=config, train_data=train_data, dev_data=cv_data, eval_data=None)
+  engine.train()
+  async_saver = engine._async_checkpoint_saver
+  assert async_saver
+  params = {param.name[:-2]: value for (param, value) in zip(
+    engine.network.get_params_list(), engine.tf_session.run(engine.network.get_params_list()))}
+  engine.finalize()
+  assert_equal(sorted(Engine.get_existing_models(config).keys()), [1, 2, 3])
+  assert_equal(glob("%s.*.tmp" % config.value("model", None)), [])
+  assert not os.path.exists(async_saver.tmp_dir)
+  reader = tf_compat.v1.train.NewCheckpointReader(Engine.get_existing_models(config)[3])
+  for name, value in params.items():
+    numpy.testing.assert_array_equal(reader.get_tensor(name), value)
+
+
+def test_engine_train_run_profile():
+  import json
+  tmp_dir = _get_tmp_dir()
+  test_engine_train({
+    "learning_rate_file": "%s/learning_rates" % tmp_dir,
+    "run_profile_file": True,
+    "run_profile_tf_summaries": True})
+  with open("%s/run_profile.jsonl" % tmp_dir) as f:
+    lines = [json.loads(line) for line in f.read().splitlines()]
+  assert_equal([(d["epoch"], d["dataset"]) for d in lines], [(1, "train"), (1, "dev"), (2, "train"), (2, "dev")])
+  for d in lines:
+    assert_true(d["num_steps"] > 0)
+    assert_in("session_run", d["time"])
+    assert_in("data_wait", d["time"])
+    assert_in("queue_fill_avg", d)
+    assert_true(d["rss_max"] > 0)
+
+
 def test_engine_train_newbob():
   additional_config = {
     "num_epochs": 5,
@@ -3857,6 +3994,178 @@ def test_engine_search_output_file():
   engine.finalize()
 
 
+def test_engine_search_output_file_resume():
+  import tempfile
+  from returnn.datasets.generating import StaticDataset
+  from returnn.engine.search_output import SearchOutputRecordFile
+  seq_len = 5
+  n_data_dim = 10
+  n_classes_dim = 3
+  num_seqs = 6
+  rnd = numpy.random.RandomState(42)
+  dataset = StaticDataset([{
+    "data": rnd.randint(0, n_data_dim, size=(seq_len,), dtype=numpy.int32),
+    "classes": rnd.randint(0, n_classes_dim, size=(seq_len,), dtype=numpy.int32),
+  } for _ in range(num_seqs)], output_dim={"data": (n_data_dim, 1), "classes": (n_classes_dim, 1)})
+  dataset.labels = {"classes": [str(i) for i in range(n_classes_dim)]}
+  dataset.init_seq_order(epoch=1)
+
+  config = Config()
+  config.update({
+    "model": "%s/model" % _get_tmp_dir(),
+    "batch_size": 5000,
+    "max_seqs": 2,
+    "extern_data": {
+      'data': {'dim': n_data_dim, 'sparse': True},
+      'classes': {'dim': n_classes_dim, 'sparse': True},
+    },
+    "network": {
+      "enc0": {"class": "linear", "activation": "sigmoid", "n_out": 3, "from": "data:data"},
+      "enc1": {"class": "reduce", "mode": "max", "axis": "t", "from": "enc0"},
+      "output": {
+        "class": "rec", "from": [], "max_seq_len": 10, 'target': 'classes',
+        "unit": {
+          "embed": {"class": "linear", "from": "prev:output", "activation": "sigmoid", "n_out": 3},
+          "prob": {"class": "softmax", "from": ["embed", "base:enc1"], "loss": "ce", "target": "classes"},
+          "output": {"class": "choice", "beam_size": 4, "from": "prob", "target": "classes", "initial_output": 0},
+          "end": {"class": "compare", "from": "output", "value": 0}
+        }
+      },
+      "decision": {"class": "decide", "from": "output", "loss": "edit_distance", "target": "classes"},
+    },
+  })
+  _cleanup_old_models(config)
+  engine = Engine(config=config)
+  engine.init_train_from_config(config=config, train_data=dataset, dev_data=None, eval_data=None)
+  engine.use_search_flag = True
+  engine.use_dynamic_train_flag = False
+  engine.init_network_from_config(config=config)
+
+  def _read_output(fn):
+    """
+    :param str fn:
+    :rtype: dict[str]
+    """
+    with open(fn) as f:
+      return eval(f.read())
+
+  output_file = tempfile.mktemp(suffix=".py", prefix="search_output_file")
+  engine.search(dataset=dataset, output_layer_names="decision", output_file=output_file, output_file_format="py")
+  assert not os.path.exists(output_file + ".partial")
+  output = _read_output(output_file)
+  assert_equal(len(output), num_seqs)
+
+  # Simulate a partial output from an earlier preempted run.
+  output_file2 = tempfile.mktemp(suffix=".py", prefix="search_output_file")
+  records = SearchOutputRecordFile(output_file2 + ".partial")
+  for corpus_seq_idx in [0, 3]:
+    records.add(corpus_seq_idx=corpus_seq_idx, seq_tag="seq-%i" % corpus_seq_idx, data="dummy")
+  records.close()
+  with open(output_file2 + ".partial", "ab") as f:
+    f.write(b"\x42\x00\x00")  # incomplete record
+  engine.search(
+    dataset=dataset, output_layer_names="decision", output_file=output_file2, output_file_format="py", resume=True)
+  output2 = _read_output(output_file2)
+  assert_equal(sorted(output2.keys()), sorted(output.keys()))
+  for seq_tag, seq_output in output.items():
+    if seq_tag in {"seq-0", "seq-3"}:
+      assert_equal(output2[seq_tag], "dummy")
+    else:
+      assert_equal(output2[seq_tag], seq_output)
+
+  # The final output exists, thus nothing to do.
+  engine.search(
+    dataset=dataset, output_layer_names="decision", output_file=output_file2, output_file_format="py", resume=True)
+  assert_equal(_read_output(output_file2), output2)
+  os.remove(output_file)
+  os.remove(output_file2)
+  engine.finalize()
+
+
+def test_engine_web_server_dynamic_batching():
+  if sys.version_info < (3, 7):
+    raise unittest.SkipTest("Engine.create_web_server requires Python >= 3.7")
+  import json
+  from threading import Thread
+  from urllib.request import urlopen, Request
+  from returnn.datasets.util.vocabulary import Vocabulary
+  n_dim = 10
+  data_vocab = Vocabulary(None, labels=["w%i" % i for i in range(n_dim)], unknown_label=None)
+  classes_vocab = Vocabulary(None, labels=["c%i" % i for i in range(n_dim)], unknown_label=None)
+  config = Config()
+  config.update({
+    "model": "%s/model" % _get_tmp_dir(),
+    "extern_data": {
+      'data': {'dim': n_dim, 'sparse': True, 'vocab': data_vocab},
+      'classes': {'dim': n_dim, 'sparse': True, 'vocab': classes_vocab},
+    },
+    "network": {
+      "output": {"class": "linear", "activation": "sigmoid", "n_out": 3, "from": "data:data"},
+      # Dummy network which just echoes the input, such that we can check the results per request.
+      "decision": {"class": "copy", "from": "data:data", "is_output_layer": True},
+    },
+    "search_output_layer": "decision",
+    "web_server_max_batch_size": 4,
+    "web_server_max_wait_time": 0.5,
+  })
+  _cleanup_old_models(config)
+  engine = Engine(config=config)
+  engine.init_train_from_config(config=config, train_data=None, dev_data=None, eval_data=None)
+  httpd = engine.create_web_server(port=0)
+  server_thread = Thread(target=httpd.serve_forever)
+  server_thread.daemon = True
+  server_thread.start()
+  url = "http://localhost:%i" % httpd.server_address[1]
+
+  def _post(sentence):
+    """
+    :param str sentence:
+    :rtype: str
+    """
+    boundary = "----returnn-test-boundary"
+    body = (
+      "--%s\r\n"
+      "Content-Disposition: form-data; name=\"file\"; filename=\"input.txt\"\r\n"
+      "Content-Type: text/plain\r\n\r\n"
+      "%s\r\n"
+      "--%s--\r\n") % (boundary, sentence, boundary)
+    req = Request(
+      url, data=body.encode("utf8"), headers={"Content-Type": "multipart/form-data; boundary=%s" % boundary})
+    return urlopen(req, timeout=60).read().decode("utf8")
+
+  sentences = ["w1 w2 w3", "w4", "w5 w6 w7 w8 w9", "w0 w3"]
+  results_single = [_post(sentence) for sentence in sentences]
+  print("single results:", results_single)
+  assert_equal(results_single, ["%r\n" % sentence.replace("w", "c") for sentence in sentences])
+  num_batches = engine.web_server_batcher.get_stats()["num_batches"]
+  assert_equal(num_batches, len(sentences))
+
+  results = {}
+
+  def _request(i):
+    results[i] = _post(sentences[i])
+
+  threads = [Thread(target=_request, args=(i,)) for i in range(len(sentences))]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  # The results are demultiplexed to the callers, and must be the same as when run individually.
+  assert_equal([results[i] for i in range(len(sentences))], results_single)
+
+  stats = json.loads(urlopen(url + "/stats", timeout=60).read().decode("utf8"))
+  print("stats:", stats)
+  assert_equal(stats["num_requests"], 2 * len(sentences))
+  assert stats["num_batches"] < 2 * len(sentences)  # some requests were merged
+  assert_equal(stats["queue_depth"], 0)
+  assert stats["latency_p90"] > 0
+
+  httpd.shutdown()
+  httpd.server_close()
+  engine.web_server_batcher.close()
+  engine.finalize()
+
+
 if __name__ == "__main__":
   try:
     better_exchook.install()
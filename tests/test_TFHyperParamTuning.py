@@ -0,0 +1,143 @@
+"""
+Tests for :mod:`returnn.tf.hyper_param_tuning`.
+"""
+
+from __future__ import print_function
+
+import _setup_test_env  # noqa
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import pickle
+import numpy
+import numpy.testing
+from subprocess import check_output
+from nose.tools import assert_equal, assert_in, assert_is_none, assert_false
+from returnn.util import better_exchook
+
+
+my_dir = os.path.dirname(os.path.abspath(__file__))
+returnn_dir = os.path.dirname(my_dir)
+py = sys.executable
+
+
+def test_AshaScheduler():
+  from returnn.tf.hyper_param_tuning import Individual, _AshaScheduler
+  population = [Individual(hyper_param_mapping={}, name="%i" % i) for i in range(9)]
+  scheduler = _AshaScheduler(
+    population=population, checkpoint_dir="/tmp/ckpt", min_steps=2, reduction_factor=3, num_rungs=3)
+  jobs = []
+  while True:
+    job = scheduler.get_next_job()
+    if not job:
+      break
+    jobs.append(job)
+    # Lower individual idx is better, and further training is better.
+    job.individual.cost = float(int(job.individual.name) - job.rung)
+    scheduler.report_finished(job)
+  assert_equal(scheduler.num_running, 0)
+  assert_equal(scheduler.get_num_individuals_per_rung(), [9, 3, 1])
+  assert_equal(
+    [(job.individual.name, job.rung) for job in jobs],
+    [("0", 0), ("1", 0), ("2", 0), ("0", 1), ("3", 0), ("4", 0), ("5", 0), ("1", 1),
+     ("6", 0), ("7", 0), ("8", 0), ("2", 1), ("0", 2)])
+  job0_rung0, job0_rung1, job0_rung2 = [job for job in jobs if job.individual is population[0]]
+  assert_equal((job0_rung0.start_step, job0_rung0.end_step), (0, 2))
+  assert_equal((job0_rung1.start_step, job0_rung1.end_step), (2, 6))
+  assert_equal((job0_rung2.start_step, job0_rung2.end_step), (6, None))
+  assert_is_none(job0_rung0.load_filename)
+  assert_equal(job0_rung1.load_filename, job0_rung0.save_filename)
+  assert_equal(job0_rung2.load_filename, job0_rung1.save_filename)
+  assert_is_none(job0_rung2.save_filename)
+  population.sort(key=Individual.get_sort_key)
+  assert_equal([individual.name for individual in population], ["0", "1", "2", "3", "4", "5", "6", "7", "8"])
+  assert_equal([individual.stopped_at_rung for individual in population], [None, 1, 1] + [0] * 6)
+
+
+def test_MmapBatchStore():
+  from returnn.engine.batch_store import MmapBatchStore
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    rnd = numpy.random.RandomState(42)
+    batches = [
+      {"data": rnd.normal(size=(2, n_time, 3)).astype("float32"),
+       "data_seq_lens": numpy.array([n_time, n_time - 1], dtype="int32"),
+       "seq_tag": ["seq-%i-0" % n_time, "seq-%i-1" % n_time]}
+      for n_time in [5, 3, 7]]
+    store = MmapBatchStore.write("%s/batches" % tmp_dir, batches=batches, meta={"batch_size": numpy.int64(100)})
+    assert_equal(len(store), 3)
+    assert_equal(store.meta, {"batch_size": 100})
+    store = pickle.loads(pickle.dumps(store))  # reopens the file
+    for idx, ref in enumerate(batches):
+      batch = store.get_batch(idx)
+      assert_equal(sorted(batch.keys()), sorted(ref.keys()))
+      assert_equal(batch["seq_tag"], ref["seq_tag"])
+      for key in ["data", "data_seq_lens"]:
+        assert_equal(batch[key].dtype, ref[key].dtype)
+        numpy.testing.assert_array_equal(batch[key], ref[key])
+        assert_false(batch[key].flags.writeable)
+    store.unlink()
+    assert_false(os.path.exists(store.filename))
+    numpy.testing.assert_array_equal(store.get_batch(2)["data"], batches[2]["data"])  # still mapped
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+def test_hyper_param_tuning_process_executor_asha():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    config_filename = "%s/returnn.config" % tmp_dir
+    with open(config_filename, "w") as f:
+      f.write("\n".join([
+        "#!rnn.py",
+        "from returnn.tf.hyper_param_tuning import HyperParam",
+        "use_tensorflow = True",
+        "task = 'hyper_param_tuning'",
+        "train = {'class': 'Task12AXDataset', 'num_seqs': 20}",
+        "num_inputs = 9",
+        "num_outputs = 2",
+        "batch_size = 100",
+        "max_seqs = 2",
+        "network = {",
+        "  'hidden': {'class': 'linear', 'activation': 'tanh', 'from': 'data',",
+        "             'n_out': HyperParam(int, [1, 10], default=5)},",
+        "  'output': {'class': 'softmax', 'loss': 'ce', 'from': 'hidden'}}",
+        "learning_rate = HyperParam(float, [1e-4, 1], log=True, default=0.01)",
+        "model = %r" % ("%s/model" % tmp_dir),
+        "hyper_param_tuning = {",
+        "  'num_train_steps': 20, 'num_tune_iterations': 1, 'num_individuals': 4, 'num_threads': 2,",
+        "  'dry_run_first_individual': False, 'executor': 'process', 'threads_per_worker': 1,",
+        "  'early_stopping': 'asha', 'asha_min_steps': 2, 'asha_reduction_factor': 2, 'asha_num_rungs': 2}",
+        "log_verbosity = 3",
+        ""]))
+    out = check_output([py, "%s/rnn.py" % returnn_dir, config_filename]).decode("utf8")
+    print(out)
+    assert_in("Number of trained individuals per rung: [4, 2]", out)
+    assert_in("Best 2 settings:", out)
+  finally:
+    shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+  better_exchook.install()
+  if len(sys.argv) <= 1:
+    for k, v in sorted(globals().items()):
+      if k.startswith("test_"):
+        print("-" * 40)
+        print("Executing: %s" % k)
+        try:
+          v()
+        except unittest.SkipTest as exc:
+          print("SkipTest:", exc)
+        print("-" * 40)
+    print("Finished all tests.")
+  else:
+    assert len(sys.argv) >= 2
+    for arg in sys.argv[1:]:
+      print("Executing: %s" % arg)
+      if arg in globals():
+        globals()[arg]()  # assume function and execute
+      else:
+        eval(arg)  # assume Python code and execute
@@ -0,0 +1,229 @@
+from __future__ import print_function
+
+import _setup_test_env  # noqa
+import os
+import sys
+import time
+import tempfile
+import shutil
+import unittest
+import numpy
+import numpy.testing
+from subprocess import check_output
+from nose.tools import assert_equal, assert_in, assert_raises
+from returnn.config import Config
+from returnn.datasets.generating import StaticDataset
+from returnn.tf.inference import InferenceRunner
+from returnn.util import better_exchook
+
+
+my_dir = os.path.dirname(os.path.abspath(__file__))
+returnn_dir = os.path.dirname(my_dir)
+py = sys.executable
+
+
+class _TmpDir:
+  def __init__(self):
+    self.path = tempfile.mkdtemp()
+
+  def __enter__(self):
+    return self.path
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    shutil.rmtree(self.path)
+
+
+forward_net_dict = {
+  "hidden": {"class": "linear", "activation": "tanh", "n_out": 7, "from": "data"},
+  "output": {"class": "softmax", "from": "hidden", "target": "classes", "loss": "ce"},
+}
+
+search_net_dict = {
+  "enc0": {"class": "linear", "from": "data", "activation": "sigmoid", "n_out": 3},
+  "enc1": {"class": "reduce", "mode": "max", "axis": "t", "from": "enc0"},
+  "output": {
+    "class": "rec", "from": [], "target": "classes", "max_seq_len": 10,
+    "unit": {
+      "embed": {"class": "linear", "from": "prev:output", "activation": "sigmoid", "n_out": 3},
+      "prob": {"class": "softmax", "from": ["embed", "base:enc1"], "loss": "ce", "target": "classes"},
+      "output": {"class": "choice", "beam_size": 4, "from": "prob", "target": "classes", "initial_output": 0},
+      "end": {"class": "compare", "from": "output", "value": 0}
+    }
+  },
+  "decision": {"class": "decide", "from": "output", "loss": "edit_distance", "target": "classes"}
+}
+
+
+def _get_dataset(num_seqs=5, n_in=5, n_out=3):
+  """
+  :param int num_seqs:
+  :param int n_in:
+  :param int n_out:
+  :rtype: StaticDataset
+  """
+  rnd = numpy.random.RandomState(42)
+  data = []
+  for i in range(num_seqs):
+    seq_len = rnd.randint(3, 11)
+    data.append({
+      "data": rnd.normal(size=(seq_len, n_in)).astype("float32"),
+      "classes": rnd.randint(0, n_out, size=(seq_len,)).astype("int32")})
+  dataset = StaticDataset(data=data, output_dim={"data": (n_in, 2), "classes": (n_out, 1)})
+  dataset.init_seq_order(epoch=1)
+  return dataset
+
+
+def _create_model(tmp_dir, net_dict, search):
+  """
+  Creates a random init checkpoint via the engine,
+  and compiles the graph via ``tools/compile_tf_graph.py``.
+
+  :param str tmp_dir:
+  :param dict[str] net_dict:
+  :param bool search:
+  :return: engine (in search mode if search), graph filename, info filename, checkpoint filename
+  :rtype: (returnn.tf.engine.Engine,str,str,str)
+  """
+  from returnn.tf.engine import Engine
+  config_dict = {
+    "use_tensorflow": True,
+    "num_inputs": 5, "num_outputs": 3,
+    "network": net_dict,
+    "model": "%s/model" % tmp_dir,
+  }
+  config_filename = "%s/returnn.config" % tmp_dir
+  with open(config_filename, "w") as f:
+    f.write("#!rnn.py\n")
+    for key, value in config_dict.items():
+      f.write("%s = %r\n" % (key, value))
+  config = Config()
+  config.update(config_dict)
+  engine = Engine(config=config)
+  engine.init_train_from_config(config=config)
+  checkpoint = "%s/model.001" % tmp_dir
+  engine.save_model(checkpoint)
+  if search:
+    engine.use_search_flag = True
+    engine.use_dynamic_train_flag = False
+    engine.init_network_from_config(config=config)
+    engine.load_model(epoch=1)
+
+  graph_filename = "%s/graph.meta" % tmp_dir
+  info_filename = "%s/graph.inference.json" % tmp_dir
+  check_output([
+    py, "%s/tools/compile_tf_graph.py" % returnn_dir, config_filename, "--search", "1" if search else "0",
+    "--output_file", graph_filename, "--output_file_inference_info", info_filename])
+  return engine, graph_filename, info_filename, checkpoint
+
+
+def test_InferenceRunner_forward():
+  dataset = _get_dataset()
+  with _TmpDir() as tmp_dir:
+    engine, graph_filename, info_filename, checkpoint = _create_model(tmp_dir, forward_net_dict, search=False)
+    refs = [engine.forward_single(dataset=dataset, seq_idx=seq_idx) for seq_idx in range(dataset.num_seqs)]
+    engine.finalize()
+
+    runner = InferenceRunner(graph_filename, info_filename=info_filename, checkpoint=checkpoint)
+    assert_in("output", runner.get_output_names())
+    assert_in("hidden", runner.get_output_names())
+    # All seqs in one batch.
+    dataset.init_seq_order(epoch=1)
+    dataset.load_seqs(0, dataset.num_seqs)
+    outputs = runner.run_seqs([
+      {"data": dataset.get_data(seq_idx, "data")} for seq_idx in range(dataset.num_seqs)])
+    assert_equal(len(outputs), dataset.num_seqs)
+    for seq_idx in range(dataset.num_seqs):
+      numpy.testing.assert_allclose(outputs[seq_idx]["output"], refs[seq_idx], rtol=1e-5, atol=1e-6)
+    # Via the dataset, in multiple batches.
+    num_seqs = 0
+    for seq_idx, seq_tag, seq_outputs in runner.run_dataset(dataset, batch_size=30, max_seqs=2):
+      assert_equal(seq_tag, dataset.get_tag(seq_idx))
+      numpy.testing.assert_allclose(seq_outputs["output"], refs[seq_idx], rtol=1e-5, atol=1e-6)
+      num_seqs += 1
+    assert_equal(num_seqs, dataset.num_seqs)
+    runner.close()
+
+
+def test_InferenceRunner_search():
+  dataset = _get_dataset()
+  with _TmpDir() as tmp_dir:
+    engine, graph_filename, info_filename, checkpoint = _create_model(tmp_dir, search_net_dict, search=True)
+    ref_hyps = engine.search_single(dataset=dataset, seq_idx=-1, output_layer_name="output")
+    refs = [ref_hyps[seq_idx * 4:(seq_idx + 1) * 4] for seq_idx in range(dataset.num_seqs)]
+    engine.finalize()
+
+    runner = InferenceRunner(graph_filename, info_filename=info_filename, checkpoint=checkpoint)
+    outputs = list(runner.run_dataset(dataset, output_names=["output", "decision"]))
+    assert_equal(len(outputs), dataset.num_seqs)
+    for seq_idx, seq_tag, seq_outputs in outputs:
+      hyps = seq_outputs["output"]
+      assert_equal(len(hyps), 4)  # beam size
+      assert_equal(len(hyps), len(refs[seq_idx]))
+      for (score, hyp), (ref_score, ref_hyp) in zip(hyps, refs[seq_idx]):
+        numpy.testing.assert_allclose(score, ref_score, rtol=1e-5)
+        assert_equal(hyp.tolist(), ref_hyp.tolist())
+      assert_equal(seq_outputs["decision"].tolist(), hyps[0][1].tolist())
+    runner.close()
+
+
+def test_InferenceRunner_no_pb_graph():
+  # A .pb graph from compile_tf_graph does not have the saver (and the variables are not frozen).
+  with _TmpDir() as tmp_dir:
+    assert_raises(
+      AssertionError, InferenceRunner, "%s/graph.pb" % tmp_dir, info_filename="%s/graph.inference.json" % tmp_dir)
+
+
+def test_InferenceRunner_no_layer_imports():
+  # The runner should not need the network construction code.
+  out = check_output([py, "-c", "; ".join([
+    "import sys",
+    "sys.path.insert(0, %r)" % returnn_dir,
+    "import returnn.tf.inference",
+    "print([mod for mod in ['returnn.tf.layers.basic', 'returnn.tf.network', 'returnn.tf.engine'] "
+    "if mod in sys.modules])"])])
+  assert_equal(out.decode("utf8").strip().splitlines()[-1], "[]")
+
+
+def test_InferenceRunner_startup_benchmark():
+  from returnn.tf.engine import Engine
+  with _TmpDir() as tmp_dir:
+    engine, graph_filename, info_filename, checkpoint = _create_model(tmp_dir, search_net_dict, search=True)
+    engine.finalize()
+
+    start_time = time.time()
+    config = Config()
+    config.load_file("%s/returnn.config" % tmp_dir)
+    config.set("load", checkpoint)
+    config.set("search_output_layer", "output")
+    engine = Engine(config=config)
+    engine.use_search_flag = True
+    engine.init_network_from_config(config=config)
+    engine_startup_time = time.time() - start_time
+    engine.finalize()
+
+    runner = InferenceRunner(graph_filename, info_filename=info_filename, checkpoint=checkpoint)
+    print("Startup time: Engine %.3f secs, InferenceRunner %.3f secs." % (engine_startup_time, runner.startup_time))
+    runner.close()
+
+
+if __name__ == "__main__":
+  better_exchook.install()
+  if len(sys.argv) <= 1:
+    for k, v in sorted(globals().items()):
+      if k.startswith("test_"):
+        print("-" * 40)
+        print("Executing: %s" % k)
+        try:
+          v()
+        except unittest.SkipTest as exc:
+          print("SkipTest:", exc)
+        print("-" * 40)
+    print("Finished all tests.")
+  else:
+    assert len(sys.argv) >= 2
+    for arg in sys.argv[1:]:
+      print("Executing: %s" % arg)
+      if arg in globals():
+        globals()[arg]()  # assume function and execute
+      else:
+        eval(arg)  # assume Python code and execute
@@ -625,6 +625,35 @@ def test_batch_norm_param_v1_to_v2_import():
   _test_batch_norm_param_old_to_new_import(old_version=1, new_version=2)
 
 
+def test_CustomCheckpointLoader_parallel():
+  import tempfile
+  model_tmp_dir = tempfile.mkdtemp("tmp-checkpoint")
+  model_filename = model_tmp_dir + "/model"
+  net_dict = {
+    "layer%i" % i: {"class": "linear", "activation": "tanh", "n_out": 5, "from": "layer%i" % (i - 1) if i else "data"}
+    for i in range(6)}
+  net_dict["output"] = {"class": "copy", "from": "layer5"}
+
+  with make_scope() as session:
+    config = Config({"extern_data": {"data": {"dim": 3}}})
+    network = TFNetwork(config=config, train_flag=True)
+    network.construct_from_dict(net_dict)
+    network.initialize_params(session)
+    network.save_params_to_file(filename=model_filename, session=session)
+    ref_values = {param.name: value for (param, value) in zip(
+      network.get_params_list(), session.run(network.get_params_list()))}
+    assert_equal(len(ref_values), 12)
+
+  with make_scope() as session:
+    config = Config({"extern_data": {"data": {"dim": 3}}, "load_num_threads": 4})
+    network = TFNetwork(config=config, train_flag=True)
+    network.construct_from_dict(net_dict)
+    network.load_params_from_file(filename=model_filename, session=session)
+    values = session.run(network.get_params_list())
+    for param, value in zip(network.get_params_list(), values):
+      numpy.testing.assert_array_equal(value, ref_values[param.name])
+
+
 def test_batch_norm_fused():
   n_in = 3
   net_dict = {
@@ -132,3 +132,34 @@ def test_AsyncTask_chdir():
   assert_equal(proc.conn.recv(), "hello c2p")
   proc.conn.send("hello p2c")
   proc.join()
+
+
+def test_ShmRingBuffer():
+  import numpy
+  writer = ShmRingBuffer.create(1024)
+  reader = ShmRingBuffer(writer.filename)
+  reader.unlink()  # both have it mapped, thus we do not need the file anymore
+  assert_equal(writer.size, 1024)
+  pending = []  # (ref, array)
+  num_fallbacks = 0
+  for i in range(50):
+    n = i % 20
+    array = numpy.arange(n * 3, dtype="float32").reshape((n, 3)).T  # not contiguous
+    ref = writer.write_array(array)
+    if ref is None:  # full. release all but the last one
+      num_fallbacks += 1
+      reader.release(pending[-2][0][1])
+      pending = pending[-1:]
+      ref = writer.write_array(array)
+      assert ref is not None
+    pending.append((ref, array))
+    for ref_, array_ in pending:
+      view = reader.get_array(ref_)
+      assert_equal(view.dtype, array_.dtype)
+      assert_equal(view.tolist(), array_.tolist())
+  assert num_fallbacks > 0
+  reader.release(pending[-1][0][1])
+  assert_equal(writer.get_free_size(), 1024)
+  assert writer.write_array(numpy.zeros((2000,), dtype="uint8")) is None  # never fits
+  writer.close()
+  reader.close()
@@ -59,6 +59,14 @@ def test_slice_pad_zeros():
   assert_equal(list(slice_pad_zeros(np.array([1, 2, 3, 4]), begin=2, end=6)), [3, 4, 0, 0])
 
 
+def test_copy_slice_pad_zeros():
+  x = np.array([1, 2, 3, 4])
+  for begin, end in [(1, 3), (-2, 2), (-2, 6), (2, 6), (5, 7), (0, 0)]:
+    out = np.zeros((end - begin,), dtype=x.dtype)
+    copy_slice_pad_zeros(x, begin=begin, end=end, out=out)
+    assert_equal(list(out), list(slice_pad_zeros(x, begin=begin, end=end)))
+
+
 def test_parse_orthography_into_symbols():
   assert_equal(list("hi"), parse_orthography_into_symbols("hi"))
   assert_equal(list(" hello "), parse_orthography_into_symbols(" hello "))
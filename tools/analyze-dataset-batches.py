@@ -52,6 +52,7 @@ def analyze_dataset(options):
   seq_drop = config.float('seq_drop', 0.0)
   max_seq_length = config.typed_value('max_seq_length', None) or config.float('max_seq_length', 0)
   max_pad_size = config.typed_value("max_pad_size", None)
+  length_bucketing = config.typed_value("length_bucketing", None)
 
   batches = dataset.generate_batches(
     recurrent_net=recurrent,
@@ -60,6 +61,7 @@ def analyze_dataset(options):
     max_seq_length=max_seq_length,
     max_pad_size=max_pad_size,
     seq_drop=seq_drop,
+    length_bucketing=length_bucketing,
     used_data_keys=used_data_keys)
 
   step = 0
@@ -121,6 +123,7 @@ def analyze_dataset(options):
       print("  Num frames: %s" % total_num_frames[key], file=log.v1)
       print("  Num used frames: %s" % total_num_used_frames[key], file=log.v1)
       print("  Fraction used frames: %s" % (total_num_used_frames / total_num_frames)[key], file=log.v1)
+      print("  Padding ratio: %s" % (1. - (total_num_used_frames / total_num_frames)[key]), file=log.v1)
     dataset.finish_epoch()
 
 
@@ -643,6 +643,68 @@ class ChoiceStateVarLayer(LayerBase):
   get_out_data_from_opts = ChoiceLayer.get_out_data_from_opts
 
 
+def get_inference_output_info(layer, output_t):
+  """
+  Creates the further tensors (seq lens, beam scores) for the layer output in the current name scope,
+  and returns the info for :class:`returnn.tf.inference.InferenceRunner`.
+
+  :param LayerBase layer:
+  :param tf.Tensor output_t: output_batch_major
+  :rtype: dict[str]
+  """
+  output = layer.output.copy_as_batch_major()
+  info = {
+    "output": output_t.name,
+    "dtype": output.dtype,
+    "shape": list(output.shape),
+    "sparse": output.sparse,
+    "dim": output.dim,
+    "time_dim_axis": output.time_dim_axis,
+    "seq_lens": tf.identity(output.get_sequence_lengths(), name="output_seq_lens").name,
+    "beam_size": None,
+    "beam_scores": None}
+  if output.beam:
+    info["beam_size"] = output.beam.beam_size
+    search_choices = layer.get_search_choices()
+    if search_choices:
+      info["beam_scores"] = tf.identity(search_choices.beam_scores, name="output_beam_scores").name
+  return info
+
+
+def write_inference_info(network, outputs, filename):
+  """
+  Writes all the tensor names for :class:`returnn.tf.inference.InferenceRunner`,
+  such that it can feed the extern data and fetch the outputs without constructing the network.
+
+  :param TFNetwork network:
+  :param dict[str,dict[str]] outputs: layer name -> info, via :func:`get_inference_output_info`
+  :param str filename: JSON
+  """
+  import json
+  extern_data = {}
+  for key, data in network.extern_data.data.items():
+    if data.placeholder is None:
+      continue
+    extern_data[key] = {
+      "placeholder": data.placeholder.name,
+      "dtype": data.dtype,
+      "shape": list(data.shape),
+      "batch_dim_axis": data.batch_dim_axis,
+      "time_dim_axis": data.time_dim_axis,
+      "sparse": data.sparse,
+      "dim": data.dim,
+      "size_placeholder": {str(axis): size.name for (axis, size) in sorted(data.size_placeholder.items())}}
+  info = {
+    "extern_data": extern_data,
+    "used_data_keys": sorted(network.get_used_data_keys()),
+    "outputs": outputs,
+    "train_flag": network.train_flag.name if isinstance(network.train_flag, tf.Tensor) else None,
+    "epoch_step": network.epoch_step.name if network.epoch_step is not None else None}
+  with open(filename, "w") as f:
+    json.dump(info, f, indent=2, sort_keys=True)
+    f.write("\n")
+
+
 def main(argv):
   """
   Main entry.
@@ -659,6 +721,9 @@ def main(argv):
   argparser.add_argument("--output_file", help='allowed extensions: pb, pbtxt, meta, metatxt, logdir')
   argparser.add_argument("--output_file_model_params_list", help="line-based, names of model params")
   argparser.add_argument("--output_file_state_vars_list", help="line-based, name of state vars")
+  argparser.add_argument(
+    "--output_file_inference_info",
+    help="store extern_data and output tensor names for returnn.tf.inference.InferenceRunner (JSON)")
   args = argparser.parse_args(argv[1:])
   assert args.train in [0, 1, -1] and args.eval in [0, 1] and args.search in [0, 1]
   init(config_filename=args.config, log_verbosity=args.verbosity)
@@ -685,6 +750,7 @@ def main(argv):
         rec_layer_name=args.rec_step_by_step, network=network, output_file_name=args.rec_step_by_step_output_file)
 
     from returnn.tf.layers.base import LayerBase
+    inference_outputs = {}  # layer name -> info
     for layer in network.layers.values():
       assert isinstance(layer, LayerBase)
       if layer.output.time_dim_axis is None:
@@ -692,7 +758,13 @@ def main(argv):
       if layer.output.batch_dim_axis is None:
         continue
       with tf_util.reuse_name_scope(layer.get_absolute_name_scope_prefix()[:-1], absolute=True):
-        tf.identity(layer.output.get_placeholder_as_batch_major(), name="output_batch_major")
+        output_t = tf.identity(layer.output.get_placeholder_as_batch_major(), name="output_batch_major")
+        if args.output_file_inference_info:
+          inference_outputs[layer.name] = get_inference_output_info(layer, output_t)
+
+    if args.output_file_inference_info:
+      print("Write inference info to:", args.output_file_inference_info)
+      write_inference_info(network, inference_outputs, filename=args.output_file_inference_info)
 
     tf.group(*network.get_post_control_dependencies(), name="post_control_dependencies")
 